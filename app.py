@@ -3,26 +3,152 @@ load_dotenv()
 import secrets
 
 import os
-import json
+import sys
+import time
 from datetime import date, datetime, timedelta
-from groq import Groq
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, send_from_directory, g, stream_with_context
+from flask.json.provider import JSONProvider
+from functools import wraps
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import requests
 from bs4 import BeautifulSoup
 
+# Shared modules live alongside the Netlify functions
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "netlify", "functions"))
+
+from llm import get_provider, build_messages
+from prompt_builder import load_user_context, context_cache
+from passwords import hash_password, verify_password, needs_rehash, shutdown_pool
+from auth import extract_token, authenticate, revoke
+from ratelimit import RateLimiter, create_store, rate_limit_headers
+import shortlist_store
+import requirements_store
+import user_state
+import analytics
+import history_io
+import price_watch
+import matcher
+import dedup
+import shared_cache
+import responses
+import tracing
+import logs
+import metrics
+from tracing import span
+from write_buffer import WriteBehindBuffer
+from migrate import schema_status
+from turso import TursoClient
+
+# Routes are registered on a blueprint; create_app() builds the Flask app
+bp = Blueprint("app", __name__)
+log = logs.get_logger("app")
+
+
+class FastJSONProvider(JSONProvider):
+    """jsonify through responses.dumps: orjson when available, always compact"""
+
+    def dumps(self, obj, **kwargs):
+        return responses.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return responses.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(responses.dumps(obj), mimetype="application/json")
+
+
+@bp.after_app_request
+def compress_response(response):
+    """gzip/brotli bodies above COMPRESS_MIN_BYTES when the client accepts it"""
+    # Streamed bodies (/history/export) would have to be buffered whole
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or not responses.is_compressible(response.mimetype)):
+        return response
+
+    data = response.get_data()
+    if len(data) < responses.COMPRESS_MIN_BYTES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body, encoding = responses.encode_body(data, request.headers.get("Accept-Encoding"), response.mimetype)
+    if encoding:
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+@bp.before_app_request
+def start_trace():
+    # Registered before load_user_from_token so token checks are timed too
+    endpoint = request.endpoint
+    # One label for every unmatched path, so 404 probes can't add metric series
+    route = endpoint.rpartition(".")[2] if endpoint else "unmatched"
+    g.log_token = logs.begin_request(route)
+    g.trace = tracing.start(route)
+    g.route = route
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def add_server_timing(response):
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers["Server-Timing"] = tracing.server_timing(trace)
+        g.trace_status = response.status_code
+    return response
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if "request_started" in g:
+        metrics.observe_request(g.route, request.method, response.status_code,
+                                time.perf_counter() - g.request_started)
+    return response
+
+@bp.teardown_app_request
+def finish_trace(exc):
+    # Popped: a streamed response (stream_with_context) tears down twice
+    tracing.finish(g.pop("trace", None), g.get("trace_status", 500), request.method)
+    if "log_token" in g:
+        logs.end_request(g.pop("log_token"))
 
-app = Flask(__name__)
-CORS(app)
-
-# Configure Turso SQLite database
+# -------------------------
+# Per-process state
+# -------------------------
 
-TURSO_DATABASE_URL = os.getenv("TURSO_DATABASE_URL")
-TURSO_AUTH_TOKEN = os.getenv("TURSO_AUTH_TOKEN")
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+# Clients, sessions and buffers hold sockets and threads, which don't survive
+# a fork: init_worker() builds them in every worker process (gunicorn calls
+# it from post_fork, see gunicorn.conf.py) and shutdown_worker() flushes them.
+turso = None
+http = None
+rate_limiter = None
+write_buffer = None
+
+def init_worker(config):
+    """Build this process's database client, HTTP session, limiter and buffer"""
+    global turso, http, rate_limiter, write_buffer
+    if write_buffer is not None:
+        write_buffer.close()
+    # A hashing pool inherited from the parent process can't be used
+    shutdown_pool()
+
+    turso = TursoClient(config["TURSO_DATABASE_URL"] or "", config["TURSO_AUTH_TOKEN"] or "")
+    http = requests.Session()
+    rate_limiter = RateLimiter(create_store(config["RATE_LIMIT_STORE"], execute_batch))
+    # Saves are acknowledged immediately and written to Turso in coalesced
+    # batches; reads for the same user see their pending writes.
+    write_buffer = WriteBehindBuffer(execute_batch, config["WRITE_BUFFER_WINDOW"])
+    metrics.start_worker()
+
+def shutdown_worker():
+    """Graceful shutdown: write buffered saves, stop pools, close connections"""
+    if write_buffer is not None:
+        write_buffer.close()
+    shutdown_pool()
+    if turso is not None:
+        turso.close()
+    metrics.stop_worker()
 
 
 # -------------------------
@@ -31,88 +157,37 @@ app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
 
 def execute_query(sql, params=None):
     """Execute SQL query on Turso database via HTTP API"""
-    url = TURSO_DATABASE_URL.replace("libsql://", "https://")
-    
-    headers = {
-        "Authorization": f"Bearer {TURSO_AUTH_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "statements": [
-            {
-                "q": sql,
-                "params": params or []
-            }
-        ]
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    return response.json()
+    return execute_batch([(sql, params)])
+
+def execute_batch(statements):
+    """Execute several (sql, params) statements in one HTTP round trip"""
+    if turso is None or not turso.host:
+        raise ValueError("TURSO_DATABASE_URL and TURSO_AUTH_TOKEN must be set")
+    return turso.execute(statements)
 
 # -------------------------
-# Database Models (Manual)
+# Database Schema
 # -------------------------
 
-def init_db():
-    """Initialize database tables"""
-
-    # Create Users table
-    execute_query("""
-        CREATE TABLE IF NOT EXISTS user (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Create User History table (renamed from history)
-    execute_query("""
-        CREATE TABLE IF NOT EXISTS user_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            url TEXT NOT NULL,
-            date TEXT NOT NULL,
-            results TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Create User Requirements table
-    execute_query("""
-        CREATE TABLE IF NOT EXISTS user_requirements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            requirements TEXT NOT NULL,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Create User Shortlist table
-    execute_query("""
-        CREATE TABLE IF NOT EXISTS user_shortlist (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            shortlist TEXT NOT NULL,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Add useful indexes for performance
-    execute_query("CREATE INDEX IF NOT EXISTS idx_user_history_user_id ON user_history(user_id);")
-    execute_query("CREATE INDEX IF NOT EXISTS idx_user_history_date ON user_history(user_id, date);")
-    execute_query("CREATE INDEX IF NOT EXISTS idx_requirements_user_id ON user_requirements(user_id);")
-    execute_query("CREATE INDEX IF NOT EXISTS idx_shortlist_user_id ON user_shortlist(user_id);")
-
-    print("✅ Database tables initialized successfully")
+def check_schema():
+    """One round trip at startup: warn when migrations are pending.
+
+    Migrations are applied with `python scripts/migrate.py`, never on startup.
+    """
+    try:
+        status = schema_status(execute_batch)
+    except Exception as e:
+        log.warning("⚠️ Could not check the database schema: %s", e)
+        return
+    if status.pending:
+        log.warning("⚠️ Database schema is at version %s, latest is %s. Run: python scripts/migrate.py",
+                    status.current, status.latest)
 
 # -------------------------
 # Authentication Routes
 # -------------------------
 
-@app.route("/register", methods=["POST"])
+@bp.route("/register", methods=["POST"])
 def register():
     data = request.get_json()
     username = data.get("username")
@@ -140,7 +215,7 @@ def register():
         return jsonify({"error": "Email already exists"}), 400
 
     try:
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         execute_query(
             "INSERT INTO user (username, email, password_hash) VALUES (?, ?, ?)",
             [username, email, password_hash]
@@ -149,7 +224,7 @@ def register():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/login", methods=["POST"])
+@bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
     username = data.get("username")
@@ -169,17 +244,24 @@ def login():
     stored_username = user[1]
     password_hash = user[3]
 
-    if not check_password_hash(password_hash, password):
+    if not verify_password(password_hash, password):
         return jsonify({"error": "Invalid username or password"}), 401
 
     try:
+        # Upgrade hashes made with outdated method/cost parameters
+        if needs_rehash(password_hash):
+            execute_query(
+                "UPDATE user SET password_hash = ? WHERE id = ?",
+                [hash_password(password), user_id]
+            )
+
         token = jwt.encode(
             {
                 "user_id": user_id,
                 "username": stored_username,
                 "exp": datetime.utcnow() + timedelta(hours=24)
             },
-            app.config["SECRET_KEY"],
+            current_app.config["SECRET_KEY"],
             algorithm="HS256"
         )
         return jsonify({
@@ -191,36 +273,71 @@ def login():
         return jsonify({"error": str(e)}), 500
 
 def verify_token(token):
-    try:
-        data = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
-        return data
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
-
-@app.route("/verify_token", methods=["GET"])
+    """Verify JWT token and return user data (cached until the token expires)"""
+    return authenticate(token, current_app.config["SECRET_KEY"], execute_query)
+
+@bp.before_app_request
+def load_user_from_token():
+    """Decode the bearer token once per request and keep the claims in g"""
+    g.token = extract_token(request.headers.get("Authorization", ""))
+    g.user = verify_token(g.token) if g.token else None
+
+def login_required(view):
+    """Return 401 unless the request carries a valid token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not g.get("user"):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def rate_limited(route):
+    """Apply the per-user and per-IP token buckets configured for route"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user = g.get("user") or {}
+            g.rate_limit = rate_limiter.check(route, user.get("user_id"), request.remote_addr)
+            if g.rate_limit and not g.rate_limit.allowed:
+                return jsonify({"error": "Too many requests, please slow down"}), 429
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@bp.after_app_request
+def add_rate_limit_headers(response):
+    response.headers.update(rate_limit_headers(g.get("rate_limit")))
+    return response
+
+@bp.route("/verify_token", methods=["GET"])
 def verify_token_route():
-    token = request.headers.get("Authorization", "").replace("Bearer ", "")
-    
-    if not token:
+    if not g.token:
         return jsonify({"error": "No token provided"}), 401
     
-    user_data = verify_token(token)
+    user_data = g.user
     
     if not user_data:
         return jsonify({"error": "Invalid or expired token"}), 401
     
     return jsonify({"valid": True, "user_id": user_data.get("user_id"), "username": user_data.get("username")}), 200
 
+@bp.route("/logout", methods=["POST"])
+@login_required
+def logout():
+    try:
+        revoke(g.token, g.user, execute_query)
+        return jsonify({"message": "Logged out"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-@app.route("/debug_data")
+
+@bp.route("/debug_data")
 def debug_data():
-    print("🔍 Debug endpoint called")
+    log.debug("🔍 Debug endpoint called")
     try:
         # Test user_history table
         result = execute_query("SELECT * FROM user_history")
-        print(f"📊 user_history query result: {result}")
+        log.debug("📊 user_history query result: %s", logs.payload(result))
         
         if result and result[0].get("results"):
             rows = result[0]["results"].get("rows", [])
@@ -232,14 +349,15 @@ def debug_data():
         else:
             return jsonify({"error": "No results", "raw_response": result})
     except Exception as e:
-        print(f"❌ Debug error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Debug error: %s", e)
         return jsonify({"error": str(e)}), 500
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+@bp.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target: totals across every worker of this server"""
+    return current_app.response_class(metrics.collect(), mimetype="text/plain; version=0.0.4")
 
-@app.route('/index')
+@bp.route('/index')
 def serve_index():
     return send_from_directory('.', 'index.html')
 
@@ -248,72 +366,49 @@ def serve_index():
 # -------------------------
 
 def get_user_from_token():
-    """Extract user_id and username from JWT token"""
-    token = request.headers.get("Authorization", "").replace("Bearer ", "")
-    
-    if not token:
-        return None
-    
-    user_data = verify_token(token)
-    
-    if not user_data:
-        return None
-    
-    return user_data
+    """Return the claims decoded for this request by load_user_from_token"""
+    return g.get("user")
 
 # -------------------------
 # 🕷️ Web Scraper (User-Specific)
 # -------------------------
-@app.route("/scrape", methods=["GET"])
+@bp.route("/scrape", methods=["GET"])
+@login_required
+@rate_limited("scrape")
 def scrape():
-    # Get user data from token
-    user_data = get_user_from_token()
-    if not user_data:
-        return jsonify({"error": "Unauthorized"}), 401
+    user_data = g.user
 
     user_id = user_data.get("user_id")
     username = user_data.get("username")
 
-    print(f"🔐 User authenticated - user_id: {user_id}, username: {username}")
+    log.debug("🔐 User authenticated - user_id: %s, username: %s", user_id, username)
 
     url = request.args.get("url")
     if not url:
         return jsonify({"error": "No URL provided"}), 400
 
     try:
-        print(f"🌐 Fetching URL: {url}")
+        log.info("🌐 Fetching URL: %s", url)
         headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, "html.parser")
-        result_count = soup.find("div", class_="ResultsCount_resultsCount__Kqeah")
+        with span("portal"), metrics.upstream("portal") as call:
+            response = http.get(url, headers=headers, timeout=30)
+            call.status = response.status_code
+        with span("parse"):
+            soup = BeautifulSoup(response.text, "html.parser")
+            result_count = soup.find("div", class_="ResultsCount_resultsCount__Kqeah")
 
         count_text = result_count.text.strip() if result_count else "0"
         today = str(date.today())
 
-        print(f"🔍 Scraping for user_id: {user_id}, URL: {url}, Date: {today}, Results: {count_text}")
-
-        # Check if entry exists for same user, date, and URL
-        check_query = "SELECT * FROM user_history WHERE user_id = ? AND date = ? AND url = ?"
-        check_result = execute_query(check_query, [user_id, today, url])
+        log.info("🔍 Scraped for user_id: %s, URL: %s, Date: %s, Results: %s", user_id, url, today, count_text)
 
-        # ✅ Handle results correctly
-        existing_rows = []
-        if check_result and "results" in check_result[0] and "rows" in check_result[0]["results"]:
-            existing_rows = check_result[0]["results"]["rows"]
-
-        if existing_rows:
-            update_query = "UPDATE user_history SET results = ? WHERE user_id = ? AND date = ? AND url = ?"
-            execute_query(update_query, [count_text, user_id, today, url])
-            print("✏️ Updated existing entry")
-        else:
-            insert_query = "INSERT INTO user_history (user_id, url, date, results) VALUES (?, ?, ?, ?)"
-            execute_query(insert_query, [user_id, url, today, count_text])
-            print("➕ Inserted new entry")
+        # One row per user, URL and day: a re-scrape overwrites today's count
+        execute_query(history_io.upsert_sql(1), [user_id, url, today, count_text])
 
         # ✅ Now fetch ALL history for this user (not just today)
         history_query = """
             SELECT url, date, results
-            FROM user_history
+            FROM user_history_merged
             WHERE user_id = ?
             ORDER BY date DESC, created_at DESC
         """
@@ -329,50 +424,106 @@ def scrape():
                     "results": row[2]
                 })
 
-        print(f"📋 Returning history data: {len(history_data)} entries")
+        log.debug("📋 Returning history data: %d entries", len(history_data))
 
         return jsonify({"results": count_text, "history": history_data})
 
     except Exception as e:
-        print(f"❌ Scrape error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Scrape error: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/history", methods=["GET"])
+@bp.route("/history", methods=["GET"])
+@login_required
 def history():
-    user_data = get_user_from_token()
-    if not user_data:
-        return jsonify({"error": "Unauthorized"}), 401
+    user_data = g.user
 
     user_id = user_data.get("user_id")
 
     try:
         result = execute_query(
-            "SELECT url, date, results FROM user_history WHERE user_id = ? ORDER BY date DESC, created_at DESC",
+            "SELECT url, date, results FROM user_history_merged WHERE user_id = ? ORDER BY date DESC, created_at DESC",
             [user_id]
         )
         rows = result[0]["results"]["rows"]
         return jsonify([{"url": r[0], "date": r[1], "results": r[2]} for r in rows])
     except Exception as e:
-        print(f"History error: {e}")
+        log.exception("❌ History error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
-# -------------------------
-# 🧠  "Ask an Expert" Feature
-# -------------------------
+@bp.route("/history/analytics", methods=["GET"])
+@login_required
+def history_analytics():
+    """Rolling means, deltas and anomaly flags for every tracked search"""
+    try:
+        days, window, z = analytics.parse_params(request.args)
+    except ValueError:
+        return jsonify({"error": "days and window must be integers, z a number"}), 400
+
+    try:
+        return jsonify(analytics.load_analytics(execute_batch, g.user.get("user_id"), days, window, z))
+    except Exception as e:
+        log.exception("❌ Analytics error: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 
+@bp.route("/history/export", methods=["GET"])
+@login_required
+def history_export():
+    """The user's whole history as streamed NDJSON, a page of rows at a time"""
+    after = request.args.get("after", 0, type=int)
+    pages = history_io.export_pages(execute_batch, g.user.get("user_id"), after)
+
+    try:
+        # Fetch the first page now so a database error is still a 500
+        first = next(pages, None)
+    except Exception as e:
+        log.exception("❌ Export error: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-if not GROQ_API_KEY:
-    raise ValueError("❌ GROQ_API_KEY not found in .env")
+    def generate():
+        if first is not None:
+            yield history_io.ndjson_lines(first)
+        for page in pages:
+            yield history_io.ndjson_lines(page)
 
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
+    return Response(stream_with_context(generate()), mimetype=history_io.NDJSON_TYPE,
+                    headers={"Content-Disposition": 'attachment; filename="history.ndjson"'})
+
+
+@bp.route("/me/state", methods=["GET"])
+@login_required
+def me_state():
+    """History page, requirements and shortlist in one batched read"""
+    user_id = g.user.get("user_id")
+
+    try:
+        # Read-your-writes: buffered requirements are served as-is,
+        # buffered shortlist edits are written before reading
+        if write_buffer.pending("shortlist", user_id) is not None:
+            write_buffer.flush_user(user_id)
+        state = user_state.load_state(
+            execute_batch, g.user, requirements=write_buffer.pending("requirements", user_id)
+        )
+
+        headers = dict(user_state.CACHE_HEADERS, ETag=user_state.state_etag(state))
+        if user_state.etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+            return "", 304, headers
+        return jsonify(state), 200, headers
+    except Exception as e:
+        log.exception("❌ State error: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-@app.route("/ask_expert", methods=["POST"])
+
+# -------------------------
+# 🧠  "Ask an Expert" Feature
+# -------------------------
+
+# The LLM provider (Groq by default) is built lazily on the first question,
+# see netlify/functions/llm.py for configuration.
+
+@bp.route("/ask_expert", methods=["POST"])
+@rate_limited("ask_expert")
 def ask_expert():
     try:
         data = request.get_json()
@@ -381,30 +532,28 @@ def ask_expert():
         if not question:
             return jsonify({"error": "No question provided"}), 400
 
-        print(f"📥 Question: {question}")
-
-        response = client.chat.completions.create(
-            model="meta-llama/llama-4-maverick-17b-128e-instruct",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional real estate advisor. Give clear, practical, and honest advice about house buying in the UK."
-                },
-                {"role": "user", "content": question}
-            ],
-            temperature=0.7,
-            max_tokens=1024,
-        )
+        log.info("📥 Question: %s", logs.payload(question))
+
+        # Opt-in: personalise the answer with the user's stored requirements and shortlist
+        user_context = None
+        if data.get("use_context"):
+            user_data = get_user_from_token()
+            if not user_data:
+                return jsonify({"error": "Unauthorized"}), 401
+            write_buffer.flush_user(user_data.get("user_id"))
+            user_context = load_user_context(execute_batch, user_data.get("user_id"))
 
-        answer = response.choices[0].message.content
-        print(f"✅ Answer generated: {answer[:100]}...")
+        with span("llm"), metrics.upstream("llm"):
+            completion = get_provider().complete(build_messages(question, context=user_context))
+        metrics.observe_tokens(completion.prompt_tokens, completion.completion_tokens)
+
+        answer = completion.text
+        log.debug("✅ Answer generated: %s", logs.payload(answer))
 
         return jsonify({"answer": answer})
 
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Expert answer error: %s", e)
         return jsonify({"error": str(e)}), 500
     
 
@@ -412,187 +561,201 @@ def ask_expert():
 # 📋 Requirements & Shortlist Routes
 # -------------------------
 
-@app.route('/requirements', methods=['GET'])
+@bp.route('/requirements', methods=['GET'])
+@login_required
 def get_requirements():
-    user_data = get_user_from_token()
-    
-    if not user_data:
-        return jsonify({'error': 'Unauthorized'}), 401
+    user_data = g.user
     
-    username = user_data.get("username")
-    print(f"📋 Fetching requirements for username: {username}")
+    user_id = user_data.get("user_id")
     
     try:
-        result = execute_query(
-            "SELECT requirements FROM user_requirements WHERE username = ? ORDER BY updated_at DESC LIMIT 1",
-            [username]
-        )
-        
-        print(f"📊 Requirements query result: {result}")
-        
-        rows = result[0]["results"]["rows"]
-        
-        if rows:
-            requirements = json.loads(rows[0][0])
-            print(f"✅ Found requirements: {requirements}")
-            return jsonify(requirements), 200
-        else:
-            print(f"⚠️ No requirements found for username: {username}")
-            return jsonify([]), 200
+        requirements = write_buffer.pending("requirements", user_id)
+        if requirements is None:
+            requirements = requirements_store.load_requirements(execute_batch, user_id)
+        return jsonify(requirements), 200
             
     except Exception as e:
-        print(f"❌ Error fetching requirements: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error fetching requirements: %s", e)
         return jsonify({'error': 'Failed to fetch requirements'}), 500
 
-@app.route('/requirements', methods=['POST'])
+@bp.route('/requirements', methods=['POST'])
+@login_required
 def save_requirements():
-    user_data = get_user_from_token()
+    user_data = g.user
     
-    if not user_data:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
-    username = user_data.get("username")
+    user_id = user_data.get("user_id")
     
     data = request.get_json()
-    print(f"💾 Saving requirements for username: {username}, data: {data}")
     
     if 'requirements' not in data:
         return jsonify({'error': 'Missing requirements data'}), 400
     
     try:
-        requirements_json = json.dumps(data['requirements'])
-        
-        # Check if user already has requirements
-        result = execute_query(
-            "SELECT id FROM user_requirements WHERE username = ?",
-            [username]
+        version = write_buffer.put(
+            "requirements", user_id, data['requirements'], requirements_store.replace_statements
         )
         
-        print(f"📊 Check existing requirements: {result}")
-        
-        existing = result[0]["results"]["rows"]
-        
-        if existing:
-            # Update existing
-            update_result = execute_query(
-                "UPDATE user_requirements SET requirements = ?, updated_at = CURRENT_TIMESTAMP WHERE username = ?",
-                [requirements_json, username]
-            )
-            print(f"✏️ Updated requirements: {update_result}")
-        else:
-            # Insert new
-            insert_result = execute_query(
-                "INSERT INTO user_requirements (username, requirements) VALUES (?, ?)",
-                [username, requirements_json]
-            )
-            print(f"➕ Inserted requirements: {insert_result}")
+        # Expert context and compiled requirements for this user are stale now
+        context_cache.invalidate(user_id)
+        matcher.matcher_cache.invalidate(user_id)
         
-        return jsonify({'success': True}), 200
+        return jsonify({'success': True, 'version': version}), 200
         
     except Exception as e:
-        print(f"❌ Error saving requirements: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error saving requirements: %s", e)
         return jsonify({'error': 'Failed to save requirements'}), 500
 
-@app.route('/shortlist', methods=['GET'])
+@bp.route('/shortlist', methods=['GET'])
+@login_required
 def get_shortlist():
-    user_data = get_user_from_token()
-    
-    if not user_data:
-        return jsonify({'error': 'Unauthorized'}), 401
+    user_data = g.user
     
-    username = user_data.get("username")
-    print(f"📋 Fetching shortlist for username: {username}")
+    user_id = user_data.get("user_id")
     
     try:
-        result = execute_query(
-            "SELECT shortlist FROM user_shortlist WHERE username = ? ORDER BY updated_at DESC LIMIT 1",
-            [username]
+        # Read-your-writes: push this user's buffered edits out first
+        if write_buffer.pending("shortlist", user_id) is not None:
+            write_buffer.flush_user(user_id)
+        # Each item carries its "match" against the (possibly buffered) requirements
+        shortlist = matcher.load_scored_items(
+            execute_batch, user_id, requirements=write_buffer.pending("requirements", user_id)
         )
-        
-        print(f"📊 Shortlist query result: {result}")
-        
-        rows = result[0]["results"]["rows"]
-        
-        if rows:
-            shortlist = json.loads(rows[0][0])
-            print(f"✅ Found shortlist: {shortlist}")
-            return jsonify(shortlist), 200
-        else:
-            print(f"⚠️ No shortlist found for username: {username}")
-            return jsonify([]), 200
+        return jsonify(shortlist), 200
             
     except Exception as e:
-        print(f"❌ Error fetching shortlist: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error fetching shortlist: %s", e)
         return jsonify({'error': 'Failed to fetch shortlist'}), 500
 
-@app.route('/shortlist', methods=['POST'])
+@bp.route('/shortlist', methods=['POST'])
+@login_required
 def save_shortlist():
-    user_data = get_user_from_token()
+    """Replace the whole shortlist (kept for older clients; prefer PATCH)"""
+    user_data = g.user
     
-    if not user_data:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
-    username = user_data.get("username")
+    user_id = user_data.get("user_id")
     
     data = request.get_json()
-    print(f"💾 Saving shortlist for username: {username}, data: {data}")
     
     if 'shortlist' not in data:
         return jsonify({'error': 'Missing shortlist data'}), 400
     
     try:
-        shortlist_json = json.dumps(data['shortlist'])
-        
-        # Check if user already has shortlist
-        result = execute_query(
-            "SELECT id FROM user_shortlist WHERE username = ?",
-            [username]
+        items = shortlist_store.prepare_items(data['shortlist'])
+        # Same house from two portals: flag it, or fold it into the first copy
+        items, duplicates = dedup.dedupe_items(items, data.get('dedupe'))
+        version = write_buffer.put(
+            "shortlist", user_id, shortlist_store.buffered_value(replace=items),
+            shortlist_store.buffered_statements, shortlist_store.coalesce
         )
         
-        print(f"📊 Check existing shortlist: {result}")
+        # Expert context for this user is stale now
+        context_cache.invalidate(user_id)
         
-        existing = result[0]["results"]["rows"]
+        return jsonify({'success': True, 'version': version, 'ids': [item['id'] for item in items],
+                        'duplicates': duplicates}), 200
         
-        if existing:
-            # Update existing
-            update_result = execute_query(
-                "UPDATE user_shortlist SET shortlist = ?, updated_at = CURRENT_TIMESTAMP WHERE username = ?",
-                [shortlist_json, username]
-            )
-            print(f"✏️ Updated shortlist: {update_result}")
-        else:
-            # Insert new
-            insert_result = execute_query(
-                "INSERT INTO user_shortlist (username, shortlist) VALUES (?, ?)",
-                [username, shortlist_json]
-            )
-            print(f"➕ Inserted shortlist: {insert_result}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception("❌ Error saving shortlist: %s", e)
+        return jsonify({'error': 'Failed to save shortlist'}), 500
+
+@bp.route('/shortlist', methods=['PATCH'])
+@login_required
+def patch_shortlist():
+    """Apply add/update/remove/reorder operations to individual items"""
+    user_data = g.user
+    
+    user_id = user_data.get("user_id")
+    
+    data = request.get_json() or {}
+    
+    try:
+        ops = data.get('ops')
+        added_ids = shortlist_store.prepare_ops(ops)
+        # A legacy blob never read yet is moved into rows before rows are added next to it
+        shortlist_store.ensure_migrated(execute_batch, user_id)
+        version = write_buffer.put(
+            "shortlist", user_id, shortlist_store.buffered_value(ops=ops),
+            shortlist_store.buffered_statements, shortlist_store.coalesce
+        )
+        
+        # Adds, removes and address edits can make or break duplicates:
+        # write the buffer out and re-check the whole shortlist
+        duplicates = None
+        if dedup.affects_duplicates(ops):
+            write_buffer.flush_user(user_id)
+            duplicates = dedup.refresh_flags(execute_batch, user_id)
         
-        return jsonify({'success': True}), 200
+        context_cache.invalidate(user_id)
         
+        response = {'success': True, 'version': version, 'ids': added_ids}
+        if duplicates is not None:
+            response['duplicates'] = duplicates
+        return jsonify(response), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Error saving shortlist: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': 'Failed to save shortlist'}), 500
+        log.exception("❌ Error patching shortlist: %s", e)
+        return jsonify({'error': 'Failed to update shortlist'}), 500
+
+@bp.route('/matches', methods=['GET', 'POST'])
+@login_required
+def matches():
+    """Score the shortlist (GET) or posted listings (POST {"listings": [...]}) against the user's requirements"""
+    user_id = g.user.get("user_id")
+    listings = None
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        listings = data.get('listings') if isinstance(data, dict) else None
+        if listings is None:
+            return jsonify({'error': 'Missing listings'}), 400
+
+    try:
+        if write_buffer.pending("shortlist", user_id) is not None:
+            write_buffer.flush_user(user_id)
+        return jsonify(matcher.load_matches(
+            execute_batch, user_id, listings, requirements=write_buffer.pending("requirements", user_id)
+        )), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception("❌ Error scoring listings: %s", e)
+        return jsonify({'error': 'Failed to score listings'}), 500
+
+@bp.route('/shortlist/changes', methods=['GET'])
+@login_required
+def shortlist_changes():
+    """Price and status changes of shortlisted listings since ?since= (Unix time or ISO 8601)"""
+    try:
+        since = price_watch.parse_since(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({'error': 'since must be a Unix timestamp or an ISO 8601 date'}), 400
+
+    try:
+        return jsonify(price_watch.load_changes(execute_batch, g.user.get("user_id"), since)), 200
+    except Exception as e:
+        log.exception("❌ Error fetching price changes: %s", e)
+        return jsonify({'error': 'Failed to fetch price changes'}), 500
 
 # -------------------------
 # 🗺️ Geocoding Route (for Map Feature)
 # -------------------------
 
-@app.route('/geocode', methods=['POST'])
+# Geocodes are kept per process, or shared by the workers on this host
+# when "geocode" is in SHARED_CACHE_NAMESPACES
+geocode_cache = shared_cache.namespace(
+    "geocode", int(os.getenv("GEOCODE_CACHE_SIZE", 1024)), float(os.getenv("GEOCODE_CACHE_TTL", 30 * 86400))
+)
+_MISSING = object()
+
+@bp.route('/geocode', methods=['POST'])
+@login_required
+@rate_limited("geocode")
 def geocode():
     """Convert address to coordinates using Nominatim (OpenStreetMap)"""
-    user_data = get_user_from_token()
-    
-    if not user_data:
-        return jsonify({'error': 'Unauthorized'}), 401
+    user_data = g.user
     
     data = request.get_json()
     address = data.get('address')
@@ -601,8 +764,14 @@ def geocode():
         return jsonify({'error': 'Address is required'}), 400
     
     try:
+        key = " ".join(address.lower().split())
+        cached = geocode_cache.get(key, _MISSING)
+        metrics.cache_lookup("geocode", cached is not _MISSING)
+        if cached is not _MISSING:
+            return (jsonify(cached), 200) if cached else (jsonify({'error': 'Address not found'}), 404)
+        
         # Use Nominatim API (free OpenStreetMap geocoding)
-        url = "https://nominatim.openstreetmap.org/search"
+        url = current_app.config["NOMINATIM_URL"]
         params = {
             'q': address,
             'format': 'json',
@@ -613,23 +782,61 @@ def geocode():
             'User-Agent': 'HouseHuntingApp/1.0'  # Required by Nominatim
         }
         
-        response = requests.get(url, params=params, headers=headers)
+        with span("nominatim"), metrics.upstream("nominatim") as call:
+            response = http.get(url, params=params, headers=headers, timeout=10)
+            call.status = response.status_code
         results = response.json()
         
+        result = None
         if results:
-            return jsonify({
+            result = {
                 'lat': float(results[0]['lat']),
                 'lon': float(results[0]['lon']),
                 'display_name': results[0]['display_name']
-            }), 200
+            }
+        # "Not found" is cached too, as a null result
+        geocode_cache.set(key, result)
+        
+        if result:
+            return jsonify(result), 200
         else:
             return jsonify({'error': 'Address not found'}), 404
             
     except Exception as e:
-        print(f"Geocoding error: {e}")
+        log.exception("❌ Geocoding error: %s", e)
         return jsonify({'error': 'Failed to geocode address'}), 500
 
 
+# -------------------------
+# App Factory
+# -------------------------
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    config: optional mapping overriding the settings read from the
+    environment (TURSO_DATABASE_URL, TURSO_AUTH_TOKEN, SECRET_KEY,
+    RATE_LIMIT_STORE, WRITE_BUFFER_WINDOW, NOMINATIM_URL).
+    """
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY=os.getenv("SECRET_KEY"),
+        TURSO_DATABASE_URL=os.getenv("TURSO_DATABASE_URL"),
+        TURSO_AUTH_TOKEN=os.getenv("TURSO_AUTH_TOKEN"),
+        RATE_LIMIT_STORE=os.getenv("RATE_LIMIT_STORE", "memory"),
+        WRITE_BUFFER_WINDOW=float(os.getenv("WRITE_BUFFER_WINDOW", 2.0)),
+        NOMINATIM_URL=os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search"),
+    )
+    app.config.update(config or {})
+
+    CORS(app)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(bp)
+    init_worker(app.config)
+    return app
+
+
 if __name__ == "__main__":
-    init_db()  # Initialize tables
+    app = create_app()
+    check_schema()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Time of the /history/analytics computation over synthetic history.
+
+Builds (id, url, date, results) rows for every URL x day with some days
+missing, as Turso returns them, and times:
+
+    decode   turning every row into arrays (a cold or invalidated cache)
+    append   decoding one more day of rows onto cached arrays
+    compute  analytics.compute() on cached arrays, output included
+    dumps    serialising the output
+
+    python benchmarks/bench_analytics.py [--urls 100 2000] [--days 365 730]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import analytics
+import responses
+
+
+def make_rows(urls, days, rng, missing=0.1):
+    start = date(2024, 1, 1)
+    dates = [str(start + timedelta(days=d)) for d in range(days)]
+    rows = []
+    for u in range(urls):
+        url = f"https://www.rightmove.co.uk/property-for-sale/find.html?locationIdentifier=REGION%5E{u}"
+        level = rng.randint(50, 3000)
+        for day in dates:
+            level = max(0, level + rng.randint(-20, 20))
+            if rng.random() >= missing:
+                rows.append([url, day, f"{level:,} results"])
+    # Turso returns rows in insertion order: day by day, not URL by URL
+    rows.sort(key=lambda r: r[1])
+    return [[i + 1] + row for i, row in enumerate(rows)]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--urls", type=int, nargs="+", default=[100, 2000])
+    parser.add_argument("--days", type=int, nargs="+", default=[365, 730])
+    parser.add_argument("--series-days", type=int, default=analytics.DEFAULT_DAYS,
+                        help="days of series returned per URL")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    results = []
+    print(f"{'urls':>6} {'days':>5} {'rows':>10} {'decode ms':>10} {'append ms':>10} "
+          f"{'compute ms':>11} {'dumps ms':>9} {'bytes':>12}")
+    for urls in args.urls:
+        for days in args.days:
+            rows = make_rows(urls, days + 1, rng)
+            # The last day's rows arrive after the rest were cached
+            split = next(i for i, row in enumerate(rows) if row[2] == rows[-1][2])
+            decode_ms, history = best_of(lambda: analytics.History().appended(rows[:split]), args.repeat)
+            append_ms, history = best_of(lambda: history.appended(rows[split:]), args.repeat)
+            compute_ms, out = best_of(lambda: analytics.compute(history, args.series_days), args.repeat)
+            dumps_ms, body = best_of(lambda: responses.dumps(out), args.repeat)
+            anomalies = sum(len(u["anomalies"]) for u in out["urls"])
+            results.append({"urls": urls, "days": days, "rows": split, "decode_ms": round(decode_ms, 2),
+                            "append_ms": round(append_ms, 2), "compute_ms": round(compute_ms, 2),
+                            "dumps_ms": round(dumps_ms, 2), "bytes": len(body), "anomalies": anomalies})
+            print(f"{urls:>6} {days:>5} {split:>10,} {decode_ms:>10.1f} {append_ms:>10.1f} "
+                  f"{compute_ms:>11.1f} {dumps_ms:>9.1f} {len(body):>12,}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
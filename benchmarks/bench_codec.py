@@ -0,0 +1,112 @@
+"""
+Stored size and encode/decode time of the blob codec.
+
+Encodes synthetic requirements lists and legacy shortlist blobs of several
+sizes as plain JSON and with each codec variant available here.
+
+    python benchmarks/bench_codec.py [--repeat 200]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import codec
+
+WORDS = ("garden parking garage south facing quiet street near station good schools "
+         "double glazing gas central heating en-suite loft conversion period features").split()
+STREETS = ["High Street", "Church Road", "Station Road", "Victoria Road", "Green Lane", "Manor Road"]
+TOWNS = ["Leeds", "York", "Harrogate", "Bristol", "Bath", "Reading"]
+
+
+def make_requirements(n, rng):
+    return [{"text": " ".join(rng.sample(WORDS, rng.randint(2, 5))), "checked": rng.random() < 0.4}
+            for _ in range(n)]
+
+
+def make_shortlist(n, rng):
+    return [
+        {
+            "address": f"{rng.randint(1, 200)} {rng.choice(STREETS)}, {rng.choice(TOWNS)}",
+            "price": f"£{rng.randint(150, 900) * 1000:,}",
+            "bedrooms": str(rng.randint(1, 5)),
+            "type": rng.choice(["Detached", "Semi-detached", "Terraced", "Flat"]),
+            "link": f"https://www.rightmove.co.uk/properties/{rng.randint(10**8, 10**9)}",
+            "coordinates": {"lat": round(rng.uniform(50, 55), 6), "lng": round(rng.uniform(-3, 0), 6)},
+        }
+        for _ in range(n)
+    ]
+
+
+def variants():
+    """(name, format, compression) for every variant that can run here"""
+    out = [("json + zlib", "j", "d")]
+    if codec.zstandard is not None:
+        out.append(("json + zstd", "j", "z"))
+    if codec.msgpack is not None:
+        out.append(("msgpack", "m", ""))
+        out.append(("msgpack + zlib", "m", "d"))
+        if codec.zstandard is not None:
+            out.append(("msgpack + zstd", "m", "z"))
+    return out
+
+
+def encode_as(value, fmt, compression):
+    data = codec._pack(value, fmt)
+    if compression:
+        data = codec._compress(data, compression)
+    return f"{codec.HEADER_PREFIX}{fmt}{compression}:" + codec.base64.b64encode(data).decode("ascii")
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) / repeat * 1e6, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    samples = [
+        ("requirements x5", make_requirements(5, rng)),
+        ("requirements x20", make_requirements(20, rng)),
+        ("shortlist x20", make_shortlist(20, rng)),
+        ("shortlist x200", make_shortlist(200, rng)),
+    ]
+
+    results = []
+    print(f"{'value':<18} {'encoding':<16} {'bytes':>8} {'ratio':>6} {'enc µs':>8} {'dec µs':>8}")
+    for label, value in samples:
+        plain_us, plain = timed(lambda: codec._json(value), args.repeat)
+        dec_us, _ = timed(lambda: json.loads(plain), args.repeat)
+        rows = [("plain json", plain, plain_us, dec_us)]
+        for name, fmt, compression in variants():
+            enc_us, text = timed(lambda: encode_as(value, fmt, compression), args.repeat)
+            dec_us, decoded = timed(lambda: codec.decode(text), args.repeat)
+            assert decoded == value
+            rows.append((name, text, enc_us, dec_us))
+        chosen_us, chosen = timed(lambda: codec.encode(value), args.repeat)
+        rows.append(("codec.encode", chosen, chosen_us, timed(lambda: codec.decode(chosen), args.repeat)[0]))
+
+        for name, text, enc_us, dec_us in rows:
+            ratio = len(plain) / len(text)
+            results.append({"value": label, "encoding": name, "bytes": len(text), "ratio": ratio,
+                            "encode_us": enc_us, "decode_us": dec_us})
+            print(f"{label:<18} {name:<16} {len(text):>8} {ratio:>6.2f} {enc_us:>8.1f} {dec_us:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Duplicate detection over a synthetic address set: blocking keys vs all pairs.
+
+Generates --houses distinct houses (streets split into postcodes, some flats
+and named houses) and re-lists --dup-rate of them once or twice the way
+another portal or agent would write them: abbreviated street types, lower
+case, no postcode, no commas, "Apartment" for "Flat", the same link with
+tracking parameters. Then times
+
+    normalise   parsing every address
+    blocked     dedup.find_groups() on the whole set
+    naive       confirm() on every pair of the first --naive items, scaled up
+
+and scores the blocked groups against the known ground truth (pairwise
+precision and recall).
+
+    python benchmarks/bench_dedup.py --houses 70000 --dup-rate 0.3
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import dedup
+
+STREETS = ["Elm", "Oak", "Mill", "Church", "Station", "Victoria", "Park", "Queens", "Kings", "High",
+           "Manor", "School", "Chapel", "Green", "Grange", "Meadow", "Orchard", "Springfield", "Windsor", "York"]
+TYPES = [("Road", "Rd"), ("Street", "St"), ("Avenue", "Ave"), ("Lane", "Ln"), ("Close", "Cl"),
+         ("Drive", "Dr"), ("Gardens", "Gdns"), ("Terrace", "Tce"), ("Grove", "Gr"), ("Crescent", "Cres")]
+TOWNS = ["Bristol", "Bath", "Leeds", "York", "Norwich", "Exeter", "Derby", "Reading", "Oxford", "Chester"]
+NAMES = ["Rose Cottage", "The Old Rectory", "Ivy House", "Orchard View", "The Barn", "Willow Lodge"]
+AREAS = ["BS", "BA", "LS", "YO", "NR", "EX", "DE", "RG", "OX", "CH"]
+
+
+def make_houses(rng, count):
+    """(fields, street type abbreviation) per distinct house"""
+    houses = []
+    while len(houses) < count:
+        town = rng.randrange(len(TOWNS))
+        street = f"{rng.choice(STREETS)} {rng.choice(TYPES)[0]}"
+        abbreviation = dict(TYPES)[street.split()[1]]
+        district = rng.randint(1, 40)
+        # A street runs through a few postcodes of ~15 houses each
+        for start in range(1, rng.randint(20, 120), 15):
+            postcode = f"{AREAS[town]}{district} {rng.randint(1, 9)}{rng.choice('ABDEFGHJLNPQRSTUWXYZ')}" \
+                       f"{rng.choice('ABDEFGHJLNPQRSTUWXYZ')}"
+            for number in range(start, start + 15):
+                house = {"number": str(number), "street": street, "abbr": abbreviation,
+                         "town": TOWNS[town], "postcode": postcode, "flat": None, "name": None}
+                kind = rng.random()
+                if kind < 0.1:
+                    house["flat"] = str(rng.randint(1, 6))
+                elif kind < 0.13:
+                    house["name"] = rng.choice(NAMES)
+                    house["number"] = None
+                houses.append(house)
+    return houses[:count]
+
+
+def write(house, rng, variant):
+    """An address string for a house; variant 0 is the canonical form"""
+    street = house["street"]
+    postcode = house["postcode"]
+    flat = "Flat"
+    if variant:
+        if rng.random() < 0.5:
+            street = street.replace(street.split()[1], house["abbr"])
+        if rng.random() < 0.3:
+            postcode = None
+        if rng.random() < 0.5:
+            flat = "Apartment"
+        if rng.random() < 0.3:
+            postcode = postcode and postcode.replace(" ", "").lower()
+    parts = []
+    if house["flat"]:
+        parts.append(f"{flat} {house['flat']}")
+    if house["name"]:
+        parts.append(house["name"])
+    parts.append(f"{house['number']} {street}" if house["number"] else street)
+    parts.append(house["town"])
+    if postcode:
+        parts.append(postcode)
+    text = ", ".join(parts)
+    if variant and rng.random() < 0.3:
+        text = text.replace(",", "").upper()
+    return text
+
+
+def make_items(rng, houses, dup_rate):
+    """(items, ground-truth house index per item), duplicates shuffled in"""
+    items, truth = [], []
+    for n, house in enumerate(houses):
+        copies = 1 + (rng.choice((1, 1, 2)) if rng.random() < dup_rate else 0)
+        link = f"https://portal{n % 3}.example/properties/{n}"
+        for variant in range(copies):
+            item = {"address": write(house, rng, variant), "price": "£300,000"}
+            if variant and rng.random() < 0.3:
+                # Same portal page, different tracking parameters
+                item["link"] = f"{link}?utm_source=share&channel=RES_BUY"
+            else:
+                item["link"] = link if not variant else f"https://agent{rng.randint(1, 50)}.example/{n}-{variant}"
+            items.append(item)
+            truth.append(n)
+    order = list(range(len(items)))
+    rng.shuffle(order)
+    items = [items[i] for i in order]
+    truth = [truth[i] for i in order]
+    for i, item in enumerate(items):
+        item["id"] = str(i)
+    return items, truth
+
+
+def pairs(labels):
+    return sum(count * (count - 1) // 2 for count in Counter(labels).values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--houses", type=int, default=70000)
+    parser.add_argument("--dup-rate", type=float, default=0.3, help="share of houses listed more than once")
+    parser.add_argument("--naive", type=int, default=3000, help="items compared pairwise for the baseline")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    items, truth = make_items(rng, make_houses(rng, args.houses), args.dup_rate)
+    n = len(items)
+
+    started = time.perf_counter()
+    for item in items:
+        dedup.normalise(item["address"])
+    normalise_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parents, comparisons = dedup.find_groups(items)
+    blocked_s = time.perf_counter() - started
+
+    true_pairs = pairs(truth)
+    found_pairs = pairs(parents)
+    correct = pairs(list(zip(parents, truth)))
+
+    subset = items[:args.naive]
+    normalised = [dedup.normalise(item["address"]) for item in subset]
+    links = [dedup._link(item) for item in subset]
+    started = time.perf_counter()
+    for i in range(len(subset)):
+        for j in range(i + 1, len(subset)):
+            dedup.confirm(normalised[i], normalised[j], links[i], links[j])
+    naive_s = time.perf_counter() - started
+    all_pairs = n * (n - 1) // 2
+    naive_est = naive_s / (len(subset) * (len(subset) - 1) // 2) * all_pairs
+
+    print(f"{n} addresses ({args.houses} houses, {n - args.houses} duplicate listings)")
+    print(f"{'step':<10} {'comparisons':>14} {'seconds':>9}")
+    print(f"{'normalise':<10} {'':>14} {normalise_s:>9.2f}")
+    print(f"{'blocked':<10} {comparisons:>14,} {blocked_s:>9.2f}")
+    print(f"{'naive':<10} {all_pairs:>14,} {naive_est:>9.0f}  (estimated from {args.naive} items)")
+    print(f"pairs: {true_pairs} true, {found_pairs} found, {correct} correct -> "
+          f"precision {correct / max(found_pairs, 1):.3f}, recall {correct / max(true_pairs, 1):.3f}")
+
+
+if __name__ == "__main__":
+    main()
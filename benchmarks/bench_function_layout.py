@@ -0,0 +1,165 @@
+"""
+Simulated cold starts and latency: one function per endpoint vs the routed api function.
+
+Nothing is deployed or invoked: this is a model. It replays the same
+synthetic user sessions against two simulated container pools:
+
+    separate   one container pool per endpoint (netlify/functions/<name>.py)
+    api        one shared pool (netlify/functions/api.py); an endpoint's module
+               is imported the first time a container serves it
+
+A container serves one request at a time and is recycled after
+--idle-timeout seconds without traffic. A cold start costs --runtime-init-ms
+plus the import time of the module, measured here with python -X importtime
+(see profile_cold_start.py). Warm service times are fixed per endpoint with
+lognormal jitter; they are assumptions, not measurements. Only the import
+times are measured; cold-start counts and latencies come from the model.
+
+    python benchmarks/bench_function_layout.py [--sessions-per-hour 30 600] [--hours 4]
+"""
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from profile_cold_start import profile
+
+# Warm handler time in ms (database round trips, outbound calls, hashing)
+SERVICE_MS = {
+    "login": 120, "register": 150, "logout": 30, "verify_token": 5,
+    "me_state": 60, "history": 40, "requirements": 40, "shortlist": 45,
+    "scrape": 900, "geocode": 250, "ask_expert": 1500,
+}
+
+# What a user does after the page has loaded, with weights
+ACTIONS = [
+    ("scrape", 25), ("requirements", 20), ("shortlist", 20),
+    ("geocode", 15), ("ask_expert", 10), ("history", 10),
+]
+
+
+def measure_imports(runs):
+    """Import time in ms for every endpoint module, api and utils"""
+    imports = {}
+    for name in list(SERVICE_MS) + ["api", "utils"]:
+        imports[name] = min(profile(name)[0] for _ in range(runs)) / 1000
+    return imports
+
+
+def make_requests(sessions_per_hour, hours, seed):
+    """(time_s, session, endpoint) tuples sorted by time"""
+    rng = random.Random(seed)
+    requests, t, session = [], 0.0, 0
+    end = hours * 3600
+    while True:
+        t += rng.expovariate(sessions_per_hour / 3600)
+        if t >= end:
+            break
+        session += 1
+        at = t
+        if rng.random() < 0.4:
+            requests.append((at, session, "login"))
+            at += 0.5
+        requests.append((at, session, "me_state"))
+        names, weights = zip(*ACTIONS)
+        for _ in range(rng.randint(2, 12)):
+            at += rng.expovariate(1 / 20)
+            requests.append((at, session, rng.choices(names, weights)[0]))
+    requests.sort()
+    return requests
+
+
+class Pool:
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.containers = []  # [busy_until, loaded endpoints]
+
+    def acquire(self, now):
+        """(container, cold) for a request arriving at now"""
+        self.containers = [c for c in self.containers if now - c[0] <= self.idle_timeout]
+        idle = [c for c in self.containers if c[0] <= now]
+        if idle:
+            return max(idle, key=lambda c: c[0]), False
+        container = [now, set()]
+        self.containers.append(container)
+        return container, True
+
+
+def simulate(requests, layout, imports, runtime_init_ms, idle_timeout, seed):
+    rng = random.Random(seed)
+    pools = {}
+    latencies, page_loads, cold_starts = [], [], 0
+    for now, _session, endpoint in requests:
+        pool_key = "api" if layout == "api" else endpoint
+        pool = pools.setdefault(pool_key, Pool(idle_timeout))
+        container, cold = pool.acquire(now)
+
+        ms = SERVICE_MS[endpoint] * rng.lognormvariate(0, 0.3)
+        if cold:
+            cold_starts += 1
+            ms += runtime_init_ms + imports["api" if layout == "api" else endpoint]
+        if layout == "api" and endpoint not in container[1]:
+            # Lazily imported endpoint module: what it adds on top of utils/api
+            ms += max(0.0, imports[endpoint] - imports["utils"])
+        container[1].add(endpoint)
+
+        container[0] = now + ms / 1000
+        latencies.append(ms)
+        if endpoint == "me_state":
+            page_loads.append(ms)
+
+    def pct(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+    return {
+        "layout": layout,
+        "requests": len(requests),
+        "cold_starts": cold_starts,
+        "cold_start_rate": cold_starts / max(1, len(requests)),
+        "p50_ms": pct(latencies, 0.50),
+        "p95_ms": pct(latencies, 0.95),
+        "p99_ms": pct(latencies, 0.99),
+        "page_load_p95_ms": pct(page_loads, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions-per-hour", type=float, nargs="+", default=[30, 600])
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--idle-timeout", type=float, default=600, help="seconds before an idle container is recycled")
+    parser.add_argument("--runtime-init-ms", type=float, default=250, help="runtime start-up before imports")
+    parser.add_argument("--runs", type=int, default=3, help="importtime runs per module (best is used)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    imports = measure_imports(args.runs)
+    print("import ms (measured): " + ", ".join(f"{k} {v:.0f}" for k, v in sorted(imports.items())))
+    print(f"simulated: {args.hours:g} h of sessions, {args.idle_timeout:.0f} s idle timeout, "
+          f"{args.runtime_init_ms:.0f} ms runtime init, assumed service times")
+    print(f"{'sessions/h':>10} {'layout':<9} {'requests':>8} {'cold':>6} {'cold %':>7} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7} {'load p95':>9}")
+
+    results = []
+    for rate in args.sessions_per_hour:
+        requests = make_requests(rate, args.hours, args.seed)
+        for layout in ("separate", "api"):
+            r = simulate(requests, layout, imports, args.runtime_init_ms, args.idle_timeout, args.seed)
+            r["sessions_per_hour"] = rate
+            results.append(r)
+            print(f"{rate:>10.0f} {layout:<9} {r['requests']:>8} {r['cold_starts']:>6} "
+                  f"{r['cold_start_rate'] * 100:>6.1f}% {r['p50_ms']:>7.0f} {r['p95_ms']:>7.0f} "
+                  f"{r['p99_ms']:>7.0f} {r['page_load_p95_ms']:>9.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"imports_ms": imports, "simulated": True, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
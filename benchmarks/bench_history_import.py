@@ -0,0 +1,113 @@
+"""
+Throughput of the NDJSON history import and export against local SQLite.
+
+Writes a synthetic NDJSON file (--rows rows spread over users, URLs and
+days), then for each --batch-size imports it into a fresh migrated SQLite
+database and exports it again, each run in its own process so peak memory
+is reported per run.
+
+    python benchmarks/bench_history_import.py --rows 1000000 --batch-size 1 50 500 2000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "netlify", "functions"))
+
+
+def write_ndjson(path, rows, rng):
+    start = date(2023, 1, 1)
+    urls_per_user, days = 20, 730
+    with open(path, "w") as f:
+        for i in range(rows):
+            user, rest = divmod(i, urls_per_user * days)
+            url, day = divmod(rest, days)
+            f.write(json.dumps({
+                "user_id": user + 1,
+                "url": f"https://www.rightmove.co.uk/property-for-sale/find.html?locationIdentifier=REGION%5E{url}",
+                "date": str(start + timedelta(days=day)),
+                "results": f"{rng.randint(0, 5000):,} results",
+            }) + "\n")
+
+
+def run_child(args):
+    """One import and export in this process; prints a JSON result"""
+    import migrate
+    import history_io
+    from local_db import make_executor
+
+    execute_batch = make_executor(args.db)
+    migrate.migrate(execute_batch, log=lambda *a: None)
+
+    started = time.perf_counter()
+    with open(args.ndjson, encoding="utf-8") as f:
+        for written, skipped in history_io.import_records(execute_batch, history_io.read_records(f),
+                                                           args.child_batch):
+            pass
+    import_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    exported = 0
+    with open(os.devnull, "wb") as out:
+        for page in history_io.export_pages(execute_batch):
+            out.write(history_io.ndjson_lines(page, with_user=True))
+            exported += len(page)
+    export_s = time.perf_counter() - started
+
+    print(json.dumps({
+        "batch_size": args.child_batch, "rows": written, "skipped": skipped,
+        "import_s": round(import_s, 2), "import_rows_per_s": round(written / import_s),
+        "export_s": round(export_s, 2), "export_rows_per_s": round(exported / export_s),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--child-batch", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--ndjson", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_batch:
+        run_child(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="house_finder_import_")
+    ndjson = os.path.join(workdir, "history.ndjson")
+    write_ndjson(ndjson, args.rows, random.Random(7))
+    print(f"{args.rows:,} rows, {os.path.getsize(ndjson) / 1e6:.0f} MB of NDJSON in {workdir}")
+    print(f"{'batch':>6} {'import s':>9} {'rows/s':>9} {'export s':>9} {'rows/s':>9} {'peak MB':>8}")
+
+    results = []
+    for batch_size in args.batch_size:
+        db = os.path.join(workdir, f"batch{batch_size}.db")
+        output = subprocess.run([sys.executable, __file__, "--child-batch", str(batch_size),
+                                 "--ndjson", ndjson, "--db", db],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{batch_size:>6} {result['import_s']:>9.1f} {result['import_rows_per_s']:>9,} "
+              f"{result['export_s']:>9.1f} {result['export_rows_per_s']:>9,} {result['peak_rss_mb']:>8}")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db + suffix):
+                os.remove(db + suffix)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Scoring listings against every user's requirements: inverted index vs per-user loop.
+
+Generates --users checklists of --reqs requirements each (feature words,
+bedroom minimums, price caps) and --listings listings, then times
+
+    compile   compiling every checklist and building one Index
+    index     Index.scores() per listing: every user scored in one pass
+    loop      checking each user's compiled requirements in turn per listing
+    cached    user_index() for one user whose checklist hasn't changed
+
+and checks both approaches find the same (listing, user) matches.
+
+    python benchmarks/bench_matcher.py --users 1000 10000 --listings 2000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import matcher
+
+FEATURES = ["garden", "parking", "garage", "near station", "good schools", "ensuite", "period features",
+            "south facing garden", "conservatory", "utility room", "loft conversion", "open plan kitchen",
+            "quiet street", "cul de sac", "new build", "chain free", "double glazing", "log burner",
+            "home office", "bay window", "walk-in wardrobe", "gas central heating", "cellar", "balcony"]
+TYPES = ["Detached", "Semi-detached", "Terraced", "Flat", "Bungalow", "End of terrace"]
+
+
+def make_requirements(rng, count):
+    requirements = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.2:
+            text = f"{rng.randint(1, 4)}+ bedrooms"
+        elif kind < 0.4:
+            text = f"under £{rng.randrange(150, 800, 25)}k"
+        else:
+            text = rng.choice(FEATURES)
+        requirements.append({"text": text, "checked": rng.random() < 0.2})
+    return requirements
+
+
+def make_listing(rng):
+    return {
+        "address": f"{rng.randint(1, 200)} {rng.choice(['Elm', 'Oak', 'Mill', 'Church'])} Road",
+        "price": f"£{rng.randrange(120, 950) * 1000:,}",
+        "bedrooms": str(rng.randint(1, 5)),
+        "type": rng.choice(TYPES),
+        "description": ", ".join(rng.sample(FEATURES, rng.randint(2, 8))),
+    }
+
+
+def loop_scores(compiled_by_user, listing):
+    """Baseline: evaluate every user's requirements one by one"""
+    terms, numbers = matcher.listing_values(listing)
+    users = {}
+    for user_id, requirements in compiled_by_user.items():
+        met = []
+        for rid, requirement in enumerate(requirements):
+            if not requirement.terms <= terms:
+                continue
+            ok = True
+            for field, low, high in requirement.predicates:
+                value = numbers.get(field)
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    ok = False
+                    break
+            if ok:
+                met.append(rid)
+        if met:
+            users[user_id] = len(met) / len(requirements)
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--reqs", type=int, default=8, help="requirements per user")
+    parser.add_argument("--listings", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'users':>7} {'reqs':>7} {'compile ms':>11} {'index µs/listing':>17} {'loop µs/listing':>16} "
+          f"{'speed-up':>9} {'cached µs':>10}")
+    for users in args.users:
+        rng = random.Random(users)
+        checklists = {user_id: make_requirements(rng, args.reqs) for user_id in range(users)}
+        listings = [make_listing(rng) for _ in range(args.listings)]
+
+        started = time.perf_counter()
+        index = matcher.build_index(checklists)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        compiled = {user_id: matcher.compile_requirements(user_id, checklist)
+                    for user_id, checklist in checklists.items()}
+
+        started = time.perf_counter()
+        indexed = [index.scores(listing) for listing in listings]
+        index_us = (time.perf_counter() - started) / len(listings) * 1e6
+
+        started = time.perf_counter()
+        looped = [loop_scores(compiled, listing) for listing in listings]
+        loop_us = (time.perf_counter() - started) / len(listings) * 1e6
+
+        for a, b in zip(indexed, looped):
+            assert a == b, "results differ"
+
+        matcher.user_index(0, checklists[0])
+        started = time.perf_counter()
+        for _ in range(1000):
+            matcher.user_index(0, checklists[0])
+        cached_us = (time.perf_counter() - started) / 1000 * 1e6
+
+        print(f"{users:>7} {len(index.requirements):>7} {compile_ms:>11.1f} {index_us:>17.1f} {loop_us:>16.1f} "
+              f"{loop_us / index_us:>8.1f}x {cached_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
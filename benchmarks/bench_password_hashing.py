@@ -0,0 +1,74 @@
+"""
+Password hashing throughput at each cost setting.
+
+Reports logins/second/core (one inline verify per login) and the aggregate
+throughput through the process pool, so worker counts can be sized
+deliberately.
+
+    python benchmarks/bench_password_hashing.py [--logins 20] [--workers 4]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import passwords
+
+COST_SETTINGS = [
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+    "scrypt:65536:8:1",
+]
+
+
+def bench_inline(method, logins):
+    stored = passwords._hash("correct horse battery", method)
+    start = time.perf_counter()
+    for _ in range(logins):
+        passwords._check(stored, "correct horse battery")
+    return logins / (time.perf_counter() - start)
+
+
+def bench_pool(method, logins, workers):
+    os.environ["PASSWORD_HASH_WORKERS"] = str(workers)
+    passwords.shutdown_pool()
+    stored = passwords._hash("correct horse battery", method)
+    passwords.verify_password(stored, "warm up")
+
+    from concurrent.futures import ThreadPoolExecutor
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers * 2) as threads:
+        list(threads.map(lambda _: passwords.verify_password(stored, "correct horse battery"), range(logins)))
+    elapsed = time.perf_counter() - start
+    passwords.shutdown_pool()
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'method':<24} {'logins/s/core':>14} {'pool logins/s':>14}  (workers={args.workers})")
+    for method in COST_SETTINGS:
+        per_core = bench_inline(method, args.logins)
+        pooled = bench_pool(method, args.logins * args.workers, args.workers)
+        results.append({"method": method, "logins_per_sec_per_core": per_core,
+                        "pool_logins_per_sec": pooled, "workers": args.workers})
+        print(f"{method:<24} {per_core:>14.1f} {pooled:>14.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Cost of a price-watch pass over a synthetic shortlist population.
+
+--users users each shortlist --items listings drawn from --listings distinct
+pages, spread over --hosts hosts served by a local fake portal with
+--latency-ms per request. Pages carry an ETag and honour If-None-Match.
+Three passes run against a fresh migrated SQLite database:
+
+    first    every listing fetched in full (baseline, nothing recorded)
+    quiet    nothing changed: every listing answers 304
+    churn    --changed of the listings got a new price or status
+
+For each pass: requests the portal saw, full responses, bytes served, wall
+time and history rows written. "per item" is what re-fetching every
+shortlist entry unconditionally would cost.
+
+    python benchmarks/bench_price_watch.py --users 2000 --items 10 --listings 5000
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "netlify", "functions"))
+
+from fake_turso import Server
+
+STATUSES = ["Under offer", "Sold STC", ""]
+
+
+class Portal:
+    """Listing pages whose price/status version can be bumped"""
+
+    def __init__(self, listings, page_bytes, rng):
+        self.prices = [rng.randrange(150, 900) * 1000 for _ in range(listings)]
+        self.statuses = [""] * listings
+        self.versions = [0] * listings
+        self.padding = b"<p>" + b"x" * page_bytes + b"</p>"
+        self.lock = threading.Lock()
+        self.requests = self.full = self.bytes = 0
+
+    def page(self, n):
+        model = {"propertyData": {"prices": {"primaryPrice": f"£{self.prices[n]:,}"},
+                                  "displayStatus": self.statuses[n]}}
+        return (b"<html><body>" + self.padding + b"<script>window.PAGE_MODEL = "
+                + json.dumps(model).encode() + b"</script></body></html>")
+
+    def change(self, n, rng):
+        if rng.random() < 0.7:
+            self.prices[n] -= rng.randrange(1, 20) * 1000
+        else:
+            self.statuses[n] = rng.choice(STATUSES)
+        self.versions[n] += 1
+
+    def handler(self, latency):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(latency)
+                n = int(self.path.rsplit("/", 1)[-1])
+                etag = f'"{n}-{portal.versions[n]}"'
+                with portal.lock:
+                    portal.requests += 1
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = portal.page(n)
+                with portal.lock:
+                    portal.full += 1
+                    portal.bytes += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=10, help="shortlist entries per user")
+    parser.add_argument("--listings", type=int, default=5000, help="distinct listing pages")
+    parser.add_argument("--hosts", type=int, default=3)
+    parser.add_argument("--page-kb", type=int, default=150)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--changed", type=float, default=0.05, help="fraction of listings changed before churn")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=4)
+    args = parser.parse_args()
+
+    import migrate
+    import price_watch
+    from local_db import make_executor
+
+    rng = random.Random(7)
+    portal = Portal(args.listings, args.page_kb * 1024, rng)
+    # One server per host; hosts are told apart by port
+    hosts = []
+    for _ in range(args.hosts):
+        server = Server(("127.0.0.1", 0), portal.handler(args.latency_ms / 1000))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        hosts.append(f"http://127.0.0.1:{server.server_port}")
+
+    db = os.path.join(tempfile.mkdtemp(), "watch.db")
+    execute_batch = make_executor(db)
+    migrate.migrate(execute_batch, log=lambda *a: None)
+    statements = []
+    for user in range(1, args.users + 1):
+        for position, n in enumerate(rng.sample(range(args.listings), args.items)):
+            data = json.dumps({"link": f"{hosts[n % len(hosts)]}/listing/{n}", "price": "£300,000"})
+            statements.append(("INSERT INTO user_shortlist_item (id, user_id, position, data) VALUES (?, ?, ?, ?)",
+                               [f"{user}-{position}", user, position, data]))
+    execute_batch(statements)
+    print(f"{args.users} users x {args.items} items = {args.users * args.items} shortlist entries, "
+          f"{args.page_kb} KB pages, +{args.latency_ms:.0f} ms, "
+          f"concurrency {args.concurrency} / {args.per_host} per host")
+    print(f"{'pass':<8} {'checked':>8} {'requests':>9} {'full':>7} {'MB':>8} {'seconds':>8} {'changes':>8}"
+          f" {'per item MB':>12}")
+
+    session = price_watch.make_session(args.concurrency)
+    now = time.time()
+    for name in ("first", "quiet", "churn"):
+        if name == "churn":
+            for n in rng.sample(range(args.listings), int(args.listings * args.changed)):
+                portal.change(n, rng)
+        portal.requests = portal.full = portal.bytes = 0
+        before = execute_batch([("SELECT COUNT(*) FROM listing_price_history", [])])[0]["results"]["rows"][0][0]
+        started = time.perf_counter()
+        checked = sum(cycle.checked for cycle in price_watch.run_cycle(
+            execute_batch, session, now=now, interval=3600,
+            concurrency=args.concurrency, per_host=args.per_host))
+        seconds = time.perf_counter() - started
+        after = execute_batch([("SELECT COUNT(*) FROM listing_price_history", [])])[0]["results"]["rows"][0][0]
+        naive_mb = args.users * args.items * len(portal.page(0)) / 1e6
+        print(f"{name:<8} {checked:>8} {portal.requests:>9} {portal.full:>7} {portal.bytes / 1e6:>8.1f} "
+              f"{seconds:>8.2f} {after - before:>8} {naive_mb:>12.0f}")
+        # Everything is due again on the next pass
+        now += 2 * 3600
+
+
+if __name__ == "__main__":
+    main()
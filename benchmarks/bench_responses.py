@@ -0,0 +1,89 @@
+"""
+Serialisation time and bytes on the wire for large history responses.
+
+Compares the old encoding (json.dumps with default separators, and Flask's
+pretty-printed debug output) with responses.dumps (orjson or compact json),
+then the size and cost of gzip and brotli on the compact body.
+
+    python benchmarks/bench_responses.py [--rows 1000 5000] [--repeat 20]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import responses
+
+
+def make_history(rows, seed=1):
+    """History entries shaped like GET /history"""
+    rng = random.Random(seed)
+    regions = [rng.randint(1000, 99999) for _ in range(40)]
+    return [
+        {
+            "url": (
+                "https://www.rightmove.co.uk/property-for-sale/find.html?locationIdentifier=REGION%5E"
+                f"{rng.choice(regions)}&maxPrice={rng.choice([250000, 300000, 400000])}"
+                f"&minBedrooms={rng.randint(1, 4)}&propertyTypes=detached%2Csemi-detached"
+            ),
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "results": rng.randint(0, 2500),
+        }
+        for _ in range(rows)
+    ]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) / repeat * 1000, out
+
+
+def bench(rows, repeat):
+    history = make_history(rows)
+    encoders = {
+        "json.dumps (old Netlify)": lambda: json.dumps(history).encode("utf-8"),
+        "json indent=2 (old Flask debug)": lambda: json.dumps(history, indent=2).encode("utf-8"),
+        "responses.dumps": lambda: responses.dumps(history),
+    }
+    results = []
+    for name, fn in encoders.items():
+        ms, body = timed(fn, repeat)
+        results.append({"rows": rows, "encoding": name, "ms": ms, "bytes": len(body)})
+
+    compact = responses.dumps(history)
+    codings = ["gzip"] + (["br"] if responses.brotli is not None else [])
+    for coding in codings:
+        ms, body = timed(lambda: responses.compress(compact, coding), repeat)
+        results.append({"rows": rows, "encoding": f"responses.dumps + {coding}", "ms": ms, "bytes": len(body)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    serializer = "orjson" if responses.orjson is not None else "json (orjson not installed)"
+    print(f"serializer: {serializer}, brotli: {'yes' if responses.brotli is not None else 'no'}")
+    print(f"{'rows':>6} {'encoding':<34} {'ms':>8} {'bytes':>10}")
+    results = []
+    for rows in args.rows:
+        for r in bench(rows, args.repeat):
+            results.append(r)
+            print(f"{r['rows']:>6} {r['encoding']:<34} {r['ms']:>8.2f} {r['bytes']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Per-process caches vs the shared SQLite tier, across worker processes.
+
+--workers processes each serve --requests lookups over --keys keys (Zipf-like
+popularity, like repeated geocodes of popular addresses). A miss costs
+--miss-ms, standing in for a Nominatim call, and the result is cached.
+L1 holds --l1 entries per process. Modes:
+
+    local    shared_cache.Namespace without a tier (what every worker had before)
+    shared   the same with the SQLite tier behind it
+    warm     shared again, after a restart: the file is kept, L1s start empty
+
+For each: upstream calls, hit rate and wall time. Then single-process costs
+of an L1 hit, a shared-tier hit and a write, and an eviction check that the
+file stays under its byte limit while --workers processes write to it.
+
+    python benchmarks/bench_shared_cache.py --workers 4 --requests 5000 --keys 5000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+import shared_cache
+
+
+def zipf_keys(rng, keys, count):
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return rng.choices(range(keys), weights, k=count)
+
+
+def worker(args):
+    seed, path, l1, requests, keys, miss_ms = args
+    tier = shared_cache.SQLiteTier(path) if path else None
+    cache = shared_cache.Namespace("geocode", l1, tier=tier)
+    misses = 0
+    for key in zipf_keys(random.Random(seed), keys, requests):
+        if cache.get(key) is None:
+            misses += 1
+            time.sleep(miss_ms / 1000)
+            cache.set(key, {"lat": 51.45 + key * 1e-5, "lon": -2.58, "display_name": f"{key} Elm Road, Bristol"})
+    return misses
+
+
+def writer(args):
+    seed, path, max_bytes, count = args
+    tier = shared_cache.SQLiteTier(path, max_bytes=max_bytes, timeout=5)
+    rng = random.Random(seed)
+    for n in range(count):
+        tier.set("bench", f"{seed}-{n}", "x" * rng.randint(100, 2000))
+    return tier.stats()
+
+
+def run(pool, label, path, args):
+    started = time.perf_counter()
+    misses = sum(pool.map(worker, [(seed, path, args.l1, args.requests, args.keys, args.miss_ms)
+                                   for seed in range(args.workers)]))
+    seconds = time.perf_counter() - started
+    total = args.workers * args.requests
+    print(f"{label:<8} {misses:>9} {1 - misses / total:>8.1%} {seconds:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5000, help="lookups per worker")
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument("--l1", type=int, default=512, help="L1 entries per process")
+    parser.add_argument("--miss-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "cache.db")
+    print(f"{args.workers} workers x {args.requests} lookups over {args.keys} keys, L1 {args.l1}, "
+          f"miss {args.miss_ms:.0f} ms")
+    print(f"{'mode':<8} {'upstream':>9} {'hit rate':>8} {'seconds':>8}")
+    with multiprocessing.get_context("fork").Pool(args.workers) as pool:
+        run(pool, "local", None, args)
+        run(pool, "shared", path, args)
+        run(pool, "warm", path, args)
+
+    tier = shared_cache.SQLiteTier(path)
+    cache = shared_cache.Namespace("geocode", args.l1, tier=tier)
+    cache.set("hot", {"lat": 51.45, "lon": -2.58})
+    rounds = 20000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cache.get("hot")
+    l1_us = (time.perf_counter() - started) / rounds * 1e6
+    started = time.perf_counter()
+    for n in range(2000):
+        tier.get("geocode", str(n % args.keys))
+    l2_us = (time.perf_counter() - started) / 2000 * 1e6
+    started = time.perf_counter()
+    for n in range(2000):
+        tier.set("geocode", f"new-{n}", {"lat": 51.45, "lon": -2.58})
+    set_us = (time.perf_counter() - started) / 2000 * 1e6
+    print(f"\nL1 hit {l1_us:.2f} µs, shared hit {l2_us:.1f} µs, shared write {set_us:.1f} µs")
+
+    max_bytes = 1024 * 1024
+    evict_path = os.path.join(directory, "evict.db")
+    shared_cache.SQLiteTier(evict_path, max_bytes=max_bytes)
+    started = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(args.workers) as pool:
+        pool.map(writer, [(seed, evict_path, max_bytes, 2000) for seed in range(args.workers)])
+    seconds = time.perf_counter() - started
+    stored, entries = shared_cache.SQLiteTier(evict_path, max_bytes=max_bytes).stats()
+    written = args.workers * 2000
+    print(f"eviction: {args.workers} processes wrote {written} entries (~{written * 1050 / 1e6:.1f} MB) "
+          f"in {seconds:.2f} s; {entries} entries, {stored / 1024:.0f} KB kept (limit {max_bytes // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
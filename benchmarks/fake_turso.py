@@ -0,0 +1,78 @@
+"""
+Fake Turso HTTP endpoint backed by a local SQLite file.
+
+Speaks the same "statements" request and result shape as Turso, adds a
+configurable delay per request to stand in for the network round trip, and
+applies the schema migrations on start. Point TURSO_DATABASE_URL at it to
+run the app or the functions offline.
+
+    python benchmarks/fake_turso.py --port 8081 --db /tmp/fake_turso.db --latency-ms 20
+    TURSO_DATABASE_URL=http://127.0.0.1:8081 TURSO_AUTH_TOKEN=x python app.py
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from local_db import make_executor
+from migrate import migrate
+
+
+def make_handler(execute_batch, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            statements = [(s["q"], s.get("params") or []) for s in body.get("statements", [])]
+            if latency:
+                time.sleep(latency)
+            try:
+                results = execute_batch(statements)
+                status = 200
+            except Exception as e:
+                results = {"error": str(e)}
+                status = 400
+            out = json.dumps(results).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when a worker opens many at once
+    request_queue_size = 256
+
+
+def serve(port, db, latency_ms=0.0):
+    """Start the fake server (blocking)"""
+    execute_batch = make_executor(db)
+    migrate(execute_batch, log=lambda message: None)
+    server = Server(("127.0.0.1", port), make_handler(execute_batch, latency_ms / 1000))
+    print(f"🗄️ Fake Turso on http://127.0.0.1:{server.server_port} ({db}, +{latency_ms:.0f} ms)")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--db", default="fake_turso.db")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="added to every request")
+    args = parser.parse_args()
+    serve(args.port, args.db, args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
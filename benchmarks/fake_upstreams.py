@@ -0,0 +1,150 @@
+"""
+Local stand-ins for the property portal, Nominatim and Groq.
+
+Each runs on its own port with its own added latency, so a benchmark can
+exercise /scrape, /geocode and /ask_expert without touching live services.
+
+    portal     GET  /<name>  serves fixtures/portal/<name>.html (any query string)
+    nominatim  GET  /search  Nominatim-shaped JSON with deterministic coordinates
+    groq       POST /openai/v1/chat/completions  OpenAI-shaped chat completion
+
+    python benchmarks/fake_upstreams.py --portal-port 8082 --nominatim-port 8083 --groq-port 8084
+    NOMINATIM_URL=http://127.0.0.1:8083/search GROQ_BASE_URL=http://127.0.0.1:8084 \\
+        GROQ_API_KEY=x python app.py
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler
+
+from fake_turso import Server
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "portal")
+
+
+def load_fixtures(directory):
+    """{name: bytes} for every saved search page in directory"""
+    pages = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".html"):
+            with open(os.path.join(directory, filename), "rb") as f:
+                pages[filename[:-len(".html")]] = f.read()
+    return pages
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def send(self, status, body, content_type="application/json"):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_portal(pages, latency):
+    class Portal(_Handler):
+        def do_GET(self):
+            name = urlsplit(self.path).path.strip("/")
+            page = pages.get(name)
+            if page is None:
+                self.send(404, b"<html><body>Not found</body></html>", "text/html")
+            else:
+                self.send(200, page, "text/html; charset=utf-8")
+
+    Portal.latency = latency
+    return Portal
+
+
+def make_nominatim(latency):
+    class Nominatim(_Handler):
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query).get("q", [""])[0]
+            if not query.strip():
+                self.send(200, b"[]")
+                return
+            # Stable coordinates inside Great Britain for a given address
+            digest = hashlib.sha256(query.lower().encode("utf-8")).digest()
+            lat = 50.5 + digest[0] / 255 * 4.5
+            lon = -4.5 + digest[1] / 255 * 5.0
+            self.send(200, json.dumps([{
+                "lat": f"{lat:.6f}",
+                "lon": f"{lon:.6f}",
+                "display_name": f"{query}, United Kingdom",
+            }]).encode("utf-8"))
+
+    Nominatim.latency = latency
+    return Nominatim
+
+
+def make_groq(latency):
+    class Groq(_Handler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            messages = body.get("messages") or []
+            question = messages[-1].get("content", "") if messages else ""
+            text = f"[fake-groq] Consider the survey, the chain and the area before offering on: {question[:200]}"
+            prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+            completion_tokens = len(text) // 4
+            self.send(200, json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }).encode("utf-8"))
+
+    Groq.latency = latency
+    return Groq
+
+
+def serve(portal_port, nominatim_port, groq_port, fixtures=FIXTURES,
+          portal_ms=150.0, nominatim_ms=80.0, groq_ms=800.0):
+    """Start the three servers (blocking)"""
+    servers = [
+        ("Portal", Server(("127.0.0.1", portal_port), make_portal(load_fixtures(fixtures), portal_ms / 1000)), portal_ms),
+        ("Nominatim", Server(("127.0.0.1", nominatim_port), make_nominatim(nominatim_ms / 1000)), nominatim_ms),
+        ("Groq", Server(("127.0.0.1", groq_port), make_groq(groq_ms / 1000)), groq_ms),
+    ]
+    for name, server, latency_ms in servers:
+        print(f"🌐 Fake {name} on http://127.0.0.1:{server.server_port} (+{latency_ms:.0f} ms)")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--portal-port", type=int, default=8082)
+    parser.add_argument("--nominatim-port", type=int, default=8083)
+    parser.add_argument("--groq-port", type=int, default=8084)
+    parser.add_argument("--fixtures", default=FIXTURES, help="directory of saved search pages")
+    parser.add_argument("--portal-ms", type=float, default=150.0)
+    parser.add_argument("--nominatim-ms", type=float, default=80.0)
+    parser.add_argument("--groq-ms", type=float, default=800.0)
+    args = parser.parse_args()
+    serve(args.portal_port, args.nominatim_port, args.groq_port, args.fixtures,
+          args.portal_ms, args.nominatim_ms, args.groq_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Closed-loop load test against a running app.
+
+Each virtual user registers and logs in once, then loops over a request mix
+until the duration is up. Reports throughput and latency percentiles
+overall and per route.
+
+    page  state, history, requirements saves and shortlist edits
+    full  page plus scrapes, geocoding and expert questions; needs
+          --portal-url and offline stand-ins (see run_e2e.py)
+
+    python benchmarks/load_test.py http://127.0.0.1:8000 --users 32 --duration 30
+    python benchmarks/load_test.py http://127.0.0.1:8000 --mix full --portal-url http://127.0.0.1:8082
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+import urllib.error
+
+# Saved search pages served by fake_upstreams.py
+PORTAL_PAGES = ("bristol-3-bed", "bath-flats", "leeds-under-250k")
+
+PAGE_MIX = [
+    # (route, method, path, make_body, weight); path and make_body take (rng, options)
+    ("me_state", "GET", "/me/state", None, 40),
+    ("history", "GET", "/history", None, 20),
+    ("requirements", "POST", "/requirements", lambda rng, options: {"requirements": [
+        {"text": f"requirement {i}", "checked": rng.random() < 0.5} for i in range(rng.randint(1, 10))
+    ]}, 20),
+    ("shortlist", "PATCH", "/shortlist", lambda rng, options: {"ops": [
+        {"op": "add", "item": {"address": f"{rng.randint(1, 200)} High Street", "price": "£300,000"}}
+    ]}, 20),
+]
+
+FULL_MIX = PAGE_MIX + [
+    ("scrape", "GET", lambda rng, options: "/scrape?" + urllib.parse.urlencode({
+        "url": f"{options['portal_url']}/{rng.choice(PORTAL_PAGES)}?page={rng.randint(1, 50)}"
+    }), None, 8),
+    ("geocode", "POST", "/geocode", lambda rng, options: {
+        "address": f"{rng.randint(1, 500)} Station Road, Bristol"
+    }, 8),
+    ("ask_expert", "POST", "/ask_expert", lambda rng, options: {
+        "question": f"Is a {rng.randint(1, 5)} bedroom house near a station a good investment?",
+        "use_context": rng.random() < 0.5,
+    }, 4),
+]
+
+MIXES = {"page": PAGE_MIX, "full": FULL_MIX}
+
+
+def request(base, method, path, body=None, token=None, timeout=30):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", "Bearer " + token)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def timed_request(samples, route, *args, **kwargs):
+    """request() that records (route, ms, status) in samples"""
+    started = time.perf_counter()
+    try:
+        status, body = request(*args, **kwargs)
+    except Exception:
+        status, body = 0, b""
+    samples.append((route, (time.perf_counter() - started) * 1000, status))
+    return status, body
+
+
+def login(base, samples):
+    name = "load_" + uuid.uuid4().hex[:12]
+    password = "load-test-password"
+    registered, detail = timed_request(samples, "register", base, "POST", "/register", {
+        "username": name, "email": name + "@example.com",
+        "password": password, "confirm_password": password,
+    })
+    status, body = timed_request(samples, "login", base, "POST", "/login",
+                                 {"username": name, "password": password})
+    if status != 200:
+        raise RuntimeError(f"login failed: register {registered} {detail[:200]}, login {status} {body[:200]}")
+    return json.loads(body)["token"]
+
+
+def virtual_user(base, deadline, seed, mix, options, setup, samples):
+    # list.append is atomic, so users share the sample lists without a lock
+    rng = random.Random(seed)
+    token = login(base, setup)
+    names = list(range(len(mix)))
+    weights = [m[4] for m in mix]
+    while time.monotonic() < deadline:
+        route, method, path, make_body, _ = mix[rng.choices(names, weights)[0]]
+        if callable(path):
+            path = path(rng, options)
+        body = make_body(rng, options) if make_body else None
+        timed_request(samples, route, base, method, path, body, token)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def summarize(samples, elapsed):
+    """Throughput and latency percentiles for (route, ms, status) samples"""
+    latencies = [ms for _, ms, _ in samples]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, status in samples if status >= 400 or status == 0),
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def run(base, users, duration, mix="page", portal_url=None, seed=1):
+    """Run the load test and return overall and per-route results.
+
+    Registration and login are timed separately (under "setup") so they
+    don't skew the steady-state figures.
+    """
+    if mix == "full" and not portal_url:
+        raise ValueError("the full mix needs a portal URL")
+    options = {"portal_url": (portal_url or "").rstrip("/")}
+    setup, samples = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=virtual_user,
+                         args=(base, deadline, seed + i, MIXES[mix], options, setup, samples))
+        for i in range(users)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    by_route = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    result = {"users": users, "mix": mix, "duration_s": elapsed}
+    result.update(summarize(samples, elapsed))
+    result["routes"] = {route: summarize(rows, elapsed) for route, rows in sorted(by_route.items())}
+    result["setup"] = {route: summarize([s for s in setup if s[0] == route], elapsed)
+                       for route in ("register", "login")}
+    return result
+
+
+def print_result(label, result):
+    print(f"{label}: {result['requests']} requests, {result['errors']} errors, "
+          f"{result['rps']:.1f} req/s, p50 {result['p50_ms']:.0f} ms, p95 {result['p95_ms']:.0f} ms, "
+          f"p99 {result['p99_ms']:.0f} ms")
+    for route, stats in result["routes"].items():
+        print(f"  {route:<14} {stats['requests']:>6} req {stats['errors']:>4} err "
+              f"{stats['rps']:>7.1f} req/s  p50 {stats['p50_ms']:>6.0f}  p95 {stats['p95_ms']:>6.0f}  "
+              f"p99 {stats['p99_ms']:>6.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base_url")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="page")
+    parser.add_argument("--portal-url", help="fake portal base URL (required by --mix full)")
+    parser.add_argument("--label", default="", help="name for this run in the output")
+    parser.add_argument("--json", help="append the result to this JSON lines file")
+    args = parser.parse_args()
+
+    result = run(args.base_url.rstrip("/"), args.users, args.duration, args.mix, args.portal_url)
+    result["label"] = args.label
+    print_result(args.label or args.base_url, result)
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if result["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Serve the Netlify functions over local HTTP for benchmarks.
+
+Each request becomes a Netlify-style event and goes through the routed api
+function, so the same paths work here as against app.py (/me/state,
+/history, ...) and the /.netlify/functions/<name> form works too. Requests
+are served on threads in one process, which is closer to one warm container
+per concurrent request than to a single container; cold starts are not
+modelled (see bench_function_layout.py for those).
+
+    python benchmarks/netlify_local.py --port 8888
+"""
+import os
+import sys
+import base64
+import signal
+import argparse
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from fake_turso import Server
+
+
+def make_handler(function):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def invoke(self):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            event = {
+                "httpMethod": self.command,
+                "path": parts.path,
+                "headers": {k.lower(): v for k, v in self.headers.items()},
+                "queryStringParameters": dict(parse_qsl(parts.query)),
+                "body": self.rfile.read(length).decode("utf-8") if length else None,
+                "isBase64Encoded": False,
+            }
+            event["headers"].setdefault("client-ip", self.client_address[0])
+            response = function(event, None)
+
+            body = response.get("body") or ""
+            body = base64.b64decode(body) if response.get("isBase64Encoded") else body.encode("utf-8")
+            self.send_response(response.get("statusCode", 200))
+            for name, value in (response.get("headers") or {}).items():
+                self.send_header(name, str(value))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_OPTIONS = invoke
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port):
+    """Start the local function server (blocking)"""
+    from api import handler
+    from passwords import shutdown_pool
+    server = Server(("127.0.0.1", port), make_handler(handler))
+    print(f"⚡ Netlify functions on http://127.0.0.1:{server.server_port}")
+    # Hashing pool workers are forked with the listening socket; stop them on
+    # SIGTERM so the port is released
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8888)
+    args = parser.parse_args()
+    serve(args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cold-start import profile of each Netlify function.
+
+Imports every function module in a fresh interpreter with
+`python -X importtime` and reports the total import time and the direct
+imports that cost the most. Runs each import several times and keeps the
+fastest, since the first run also warms the OS file cache.
+
+    python benchmarks/profile_cold_start.py [history scrape ...] [--runs 5] [--top 5]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def function_names():
+    """Modules in netlify/functions that define a handler"""
+    names = []
+    for filename in sorted(os.listdir(FUNCTIONS_DIR)):
+        if filename.endswith(".py"):
+            with open(os.path.join(FUNCTIONS_DIR, filename), encoding="utf-8") as f:
+                if "\ndef handler(" in f.read():
+                    names.append(filename[:-3])
+    return names
+
+
+def profile(name):
+    """(total_us, [(module, cumulative_us)] of direct imports) for one fresh import"""
+    code = f"import sys; sys.path.insert(0, {FUNCTIONS_DIR!r}); import {name}"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {name} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines come in post-order: a module's imports are listed just before it
+    total, direct, children = 0, [], []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, module = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+        if depth == 1:
+            children.append((module, cumulative))
+        elif depth == 0:
+            if module == name:
+                total, direct = cumulative, children
+            children = []
+    return total, direct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("functions", nargs="*", help="function modules (default: all)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.functions or function_names():
+        total, direct = min((profile(name) for _ in range(args.runs)), key=lambda r: r[0])
+        heaviest = sorted(direct, key=lambda d: -d[1])[:args.top]
+        results.append({"function": name, "import_ms": total / 1000,
+                        "heaviest": [{"module": m, "ms": us / 1000} for m, us in heaviest]})
+        print(f"{name:<14} {total / 1000:>7.1f} ms   " +
+              ", ".join(f"{m} {us / 1000:.1f}" for m, us in heaviest))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Offline end-to-end benchmark of app.py and the Netlify functions.
+
+Starts the local stand-ins (fake_turso.py over a fresh SQLite file and
+fake_upstreams.py for the portal, Nominatim and Groq), then for each target
+starts the server, runs load_test.py against it and stops it:
+
+    app      app.py under gunicorn (gunicorn.conf.py, GUNICORN_PRESET)
+    netlify  the functions behind netlify_local.py
+
+Results for every target, overall and per route, are written to one JSON
+file; --compare prints the change against an earlier file.
+
+    python benchmarks/run_e2e.py --users 16 --duration 30 --out e2e.json
+    python benchmarks/run_e2e.py --out e2e-new.json --compare e2e.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+from datetime import datetime, timezone
+
+import load_test
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+PORTS = {"turso": 8081, "portal": 8082, "nominatim": 8083, "groq": 8084, "app": 8000, "netlify": 8888}
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process on port {port} exited with {process.returncode}")
+        if port_in_use(port):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout} s")
+
+
+def port_in_use(port):
+    try:
+        socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+def start(args, env, port, log):
+    if port_in_use(port):
+        raise RuntimeError(f"port {port} is already in use; stop the old server first")
+    process = subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for_port(port, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def groq_installed():
+    # Only whether the SDK is there; the benchmark runner never calls it
+    return importlib.util.find_spec("groq") is not None
+
+
+def target_env(options):
+    env = dict(os.environ)
+    env.update({
+        "TURSO_DATABASE_URL": f"http://127.0.0.1:{PORTS['turso']}",
+        "TURSO_AUTH_TOKEN": "benchmark",
+        "SECRET_KEY": "offline-benchmark-secret-key-0123456789",
+        "NOMINATIM_URL": f"http://127.0.0.1:{PORTS['nominatim']}/search",
+        "PASSWORD_HASH_METHOD": options.hash_method,
+        "RATE_LIMIT_STORE": "memory",
+        "GUNICORN_BIND": f"127.0.0.1:{PORTS['app']}",
+        "GUNICORN_PRESET": options.preset,
+        "GUNICORN_ACCESSLOG": os.devnull,
+    })
+    # An empty limit disables it: measure the routes, not the limiter
+    for route in ("SCRAPE", "GEOCODE", "ASK_EXPERT"):
+        env["RATE_LIMIT_" + route] = ""
+        env["RATE_LIMIT_" + route + "_IP"] = ""
+    if groq_installed():
+        env.update({
+            "LLM_PROVIDER": "groq",
+            "GROQ_API_KEY": "benchmark",
+            "GROQ_BASE_URL": f"http://127.0.0.1:{PORTS['groq']}",
+        })
+    else:
+        env.update({"LLM_PROVIDER": "stub", "LLM_STUB_LATENCY_MS": str(options.groq_ms)})
+    return env
+
+
+TARGETS = {
+    "app": lambda: [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+    "netlify": lambda: [sys.executable, os.path.join(HERE, "netlify_local.py"), "--port", str(PORTS["netlify"])],
+}
+
+
+def compare(current, baseline):
+    """Print per-route throughput and p95 changes against a baseline result file"""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+
+    print(f"\nCompared with {baseline.get('created', 'baseline')}:")
+    for name, result in current["targets"].items():
+        old = baseline.get("targets", {}).get(name)
+        if not old:
+            continue
+        rows = [("all", result, old)] + [
+            (route, stats, old["routes"][route])
+            for route, stats in result["routes"].items() if route in old.get("routes", {})
+        ]
+        for route, new_stats, old_stats in rows:
+            print(f"  {name:<8} {route:<14} req/s {change(new_stats['rps'], old_stats['rps']):>6}  "
+                  f"p50 {change(new_stats['p50_ms'], old_stats['p50_ms']):>6}  "
+                  f"p95 {change(new_stats['p95_ms'], old_stats['p95_ms']):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=["app", "netlify"])
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", choices=sorted(load_test.MIXES), default="full")
+    parser.add_argument("--preset", default="gthread", help="GUNICORN_PRESET for the app target")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:1000",
+                        help="PASSWORD_HASH_METHOD; cheap by default so registration doesn't dominate")
+    parser.add_argument("--turso-ms", type=float, default=20.0)
+    parser.add_argument("--portal-ms", type=float, default=150.0)
+    parser.add_argument("--nominatim-ms", type=float, default=80.0)
+    parser.add_argument("--groq-ms", type=float, default=800.0)
+    parser.add_argument("--out", default="e2e.json", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="house_finder_e2e_")
+    log = open(os.path.join(workdir, "servers.log"), "ab")
+    fakes = []
+    try:
+        fakes.append(start([
+            sys.executable, os.path.join(HERE, "fake_turso.py"), "--port", str(PORTS["turso"]),
+            "--db", os.path.join(workdir, "turso.db"), "--latency-ms", str(args.turso_ms),
+        ], os.environ, PORTS["turso"], log))
+        fakes.append(start([
+            sys.executable, os.path.join(HERE, "fake_upstreams.py"),
+            "--portal-port", str(PORTS["portal"]), "--nominatim-port", str(PORTS["nominatim"]),
+            "--groq-port", str(PORTS["groq"]), "--portal-ms", str(args.portal_ms),
+            "--nominatim-ms", str(args.nominatim_ms), "--groq-ms", str(args.groq_ms),
+        ], os.environ, PORTS["groq"], log))
+
+        results = {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "host": {"python": platform.python_version(), "platform": platform.platform(),
+                     "cpus": os.cpu_count()},
+            "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+            "llm": "groq (fake)" if groq_installed() else "stub",
+            "targets": {},
+        }
+        for name in args.targets:
+            server = start(TARGETS[name](), target_env(args), PORTS[name], log)
+            try:
+                result = load_test.run(f"http://127.0.0.1:{PORTS[name]}", args.users, args.duration,
+                                       args.mix, f"http://127.0.0.1:{PORTS['portal']}")
+            finally:
+                stop(server)
+            results["targets"][name] = result
+            load_test.print_result(name, result)
+    finally:
+        for process in fakes:
+            stop(process)
+        log.close()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results written to {args.out} (server logs in {workdir})")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
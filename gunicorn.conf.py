@@ -0,0 +1,101 @@
+"""
+Gunicorn settings for wsgi:app.
+
+The app is I/O bound: nearly every request waits on Turso, the property
+portal, Nominatim or the LLM API. Pick a preset with GUNICORN_PRESET:
+
+    gthread  (default) few processes, many threads each; no extra packages
+    gevent   greenlets, hundreds of concurrent requests per process;
+             needs `pip install gevent`
+    sync     one request per process, for comparison only
+
+WEB_CONCURRENCY overrides the process count and GUNICORN_THREADS the
+threads per gthread worker. See benchmarks/README.md for a load test of
+the presets.
+"""
+import os
+import tempfile
+import multiprocessing
+
+PRESET = os.getenv("GUNICORN_PRESET", "gthread")
+CPUS = multiprocessing.cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:" + os.getenv("PORT", "8000"))
+
+if PRESET == "gevent":
+    worker_class = "gevent"
+    workers = int(os.getenv("WEB_CONCURRENCY", CPUS))
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 200))
+    # gevent must patch the standard library before the app imports ssl and
+    # friends, so each worker loads the app itself
+    preload_app = False
+elif PRESET == "sync":
+    worker_class = "sync"
+    workers = int(os.getenv("WEB_CONCURRENCY", 2 * CPUS + 1))
+    preload_app = True
+else:
+    worker_class = "gthread"
+    workers = int(os.getenv("WEB_CONCURRENCY", max(2, CPUS)))
+    threads = int(os.getenv("GUNICORN_THREADS", 16))
+    preload_app = True
+
+# Saves are buffered per process: with more than one worker, a read served
+# by another worker wouldn't see them. Production runs several workers, so
+# saves are written through there, one round trip each; only a single
+# worker coalesces them (see netlify/functions/write_buffer.py). Set before
+# the app is imported; a window set explicitly brings back stale reads.
+if workers > 1:
+    os.environ.setdefault("WRITE_BUFFER_WINDOW", "0")
+
+# Rate-limit buckets go in a SQLite file every worker shares; in-process
+# buckets would give each worker its own budget
+if workers > 1 and os.getenv("RATE_LIMIT_STORE", "").strip() == "memory":
+    raise SystemExit("RATE_LIMIT_STORE=memory multiplies every limit by the worker count; "
+                     "use sqlite:<path> or turso with more than one worker")
+os.environ.setdefault("RATE_LIMIT_STORE", "sqlite:" + os.path.join(
+    tempfile.gettempdir(), "house_finder_ratelimit_" + bind.rsplit(":", 1)[-1] + ".db"))
+
+# Scrapes and expert answers can take several seconds
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+# Recycle workers now and then; max_requests_jitter avoids restarting all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+
+# Workers write metric snapshots here and /metrics sums them (see
+# netlify/functions/metrics.py). Set before the app is imported.
+os.environ.setdefault("METRICS_DIR", os.path.join(
+    tempfile.gettempdir(), "house_finder_metrics_" + bind.rsplit(":", 1)[-1]))
+
+
+def on_starting(server):
+    # Counters restart from zero with the server: drop an earlier run's snapshots
+    directory = os.environ["METRICS_DIR"]
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+
+
+def post_fork(server, worker):
+    # With preload_app the master built the app; give this worker its own
+    # HTTP connections, hashing pool, limiter and write-behind buffer
+    if preload_app:
+        import app
+        app.init_worker(worker.app.wsgi().config)
+
+
+def post_worker_init(worker):
+    # Warn about pending migrations once per server start, from the first
+    # worker: in the master a query would open a connection every worker inherits
+    if worker.age == 1:
+        import app
+        app.check_schema()
+
+
+def worker_exit(server, worker):
+    # Runs on graceful shutdown and max_requests recycling: write buffered saves
+    import app
+    app.shutdown_worker()
@@ -0,0 +1,315 @@
+"""
+Trend analytics over a user's tracked searches (GET /history/analytics).
+
+A user's history is held as NumPy arrays (URL index, day number and result
+count per row) and spread into one URLs x days matrix, on which every
+statistic is computed for all URLs at once:
+
+- gap filling: days without a scrape carry the last known count forward
+- rolling mean of the scraped counts over the last `window` days
+- day-over-day and week-over-week deltas of the filled counts
+- anomaly flags: scraped days whose day-over-day change is more than
+  `z` standard deviations from that URL's mean change
+
+Turning Turso's rows into arrays costs far more than the statistics, so the
+arrays are kept per user and only new rows are decoded. Each request runs
+one aggregate query (row count, highest id and the sum of the counts):
+
+- unchanged: the cached result for these parameters is served, or computed
+  from the cached arrays
+- only rows with a higher id were added: just those are fetched (with their
+  own count and sum, in the same batch) and appended
+- anything else, e.g. a re-scrape updating today's count or a compaction
+  run (history_rollup.py): full reload, including rolled-up weeks and
+  months as one observation each
+
+Query parameters: days (series length, default 30), window (rolling mean,
+default 7) and z (anomaly threshold, default 3).
+
+Configuration (environment variables):
+    ANALYTICS_CACHE_SIZE   users whose arrays and results are kept per process (default 256)
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import cache_lookup
+from history_io import parse_count
+
+CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 256))
+DEFAULT_DAYS = 30
+MAX_DAYS = 3660
+DEFAULT_WINDOW = 7
+DEFAULT_Z = 3.0
+# Parameter combinations whose results are kept per user
+RESULTS_PER_USER = 4
+
+_TOTAL = "TOTAL(CAST(REPLACE(results, ',', '') AS INTEGER))"
+FINGERPRINT_SQL = f"SELECT COUNT(*), MAX(id), {_TOTAL} FROM user_history WHERE user_id = ?"
+# Oldest first, so a later scrape of the same URL and day wins
+ROWS_SQL = "SELECT id, url, date, results FROM user_history WHERE user_id = ? AND id > ? ORDER BY id"
+DELTA_SQL = f"SELECT COUNT(*), {_TOTAL} FROM user_history WHERE user_id = ? AND id > ?"
+# Rolled-up weeks and months (history_rollup.py) count as their last observation;
+# id 0 puts them before every daily row
+ROLLUP_SQL = "SELECT 0, url, last_date, last_results FROM user_history_rollup WHERE user_id = ? ORDER BY last_date"
+
+def _factorize(values, index):
+    """Code per value, numbering distinct values in order of appearance"""
+    return [index[v] if v in index else index.setdefault(v, len(index)) for v in values]
+
+
+class History:
+    """One user's rows as arrays, built from (id, url, date, results) rows in id order.
+
+    Cached instances are shared by request threads, so appending returns a
+    new History instead of changing this one.
+    """
+
+    def __init__(self):
+        self.urls = {}
+        self.url_ids = np.empty(0, dtype=np.int64)
+        self.day_numbers = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.float64)
+        self.last_id = 0
+        self.fingerprint = None
+        # (days, window, z) -> computed result
+        self.results = OrderedDict()
+
+    def appended(self, rows):
+        """New History with rows added after these.
+
+        URLs, dates and result strings repeat, so each column is factorized
+        with a dict and only the distinct dates and strings are parsed.
+        """
+        history = History()
+        history.urls = dict(self.urls)
+        history.last_id = self.last_id
+        if not rows:
+            history.url_ids, history.day_numbers, history.counts = self.url_ids, self.day_numbers, self.counts
+            return history
+
+        dates, results = {}, {}
+        url_ids = _factorize((r[1] for r in rows), history.urls)
+        date_ids = np.array(_factorize((r[2] for r in rows), dates), dtype=np.int64)
+        result_ids = np.array(_factorize((r[3] for r in rows), results), dtype=np.int64)
+        day_numbers = np.array(list(dates), dtype="datetime64[D]").astype(np.int64)
+        # None (no number) becomes NaN
+        counts = np.array([parse_count(text) for text in results], dtype=np.float64)
+
+        history.url_ids = np.concatenate([self.url_ids, url_ids])
+        history.day_numbers = np.concatenate([self.day_numbers, day_numbers[date_ids]])
+        history.counts = np.concatenate([self.counts, counts[result_ids]])
+        history.last_id = max(self.last_id, int(rows[-1][0]))
+        return history
+
+    def __len__(self):
+        return len(self.counts)
+
+
+def forward_fill(matrix):
+    """Carry the last non-NaN value along each row; leading NaNs stay"""
+    rows, width = matrix.shape
+    # Column of the last observation at or before each day, -1 before the first
+    last = np.where(np.isnan(matrix), -1, np.arange(width))
+    np.maximum.accumulate(last, axis=1, out=last)
+    before_first = last < 0
+    # Gather through the flat array: cheaper than 2-D fancy indexing
+    last += np.arange(0, rows * width, width)[:, None]
+    filled = matrix.ravel().take(last)
+    filled[before_first] = np.nan
+    return filled
+
+
+def rolling_mean(matrix, window):
+    """Mean of the non-NaN values in the trailing window (NaN if none)"""
+    valid = ~np.isnan(matrix)
+    sums = np.nan_to_num(matrix)
+    np.cumsum(sums, axis=1, out=sums)
+    counts = np.cumsum(valid, axis=1, dtype=np.int32)
+    if window < matrix.shape[1]:
+        sums[:, window:] -= sums[:, :-window].copy()
+        counts[:, window:] -= counts[:, :-window].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sums /= counts
+    sums[counts == 0] = np.nan
+    return sums
+
+
+def lagged_delta(matrix, lag):
+    delta = np.full(matrix.shape, np.nan)
+    if lag < matrix.shape[1]:
+        delta[:, lag:] = matrix[:, lag:] - matrix[:, :-lag]
+    return delta
+
+
+def anomalies(observed, dod, z):
+    """Flag observed days whose day-over-day change has |z-score| > z"""
+    valid = ~(np.isnan(observed) | np.isnan(dod))
+    n = valid.sum(axis=1, keepdims=True)
+    diffs = np.where(valid, dod, 0.0)
+    # nanmean/nanstd warn on all-NaN rows; do the sums by hand instead
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = diffs.sum(axis=1, keepdims=True) / n
+        diffs -= mean
+        diffs[~valid] = 0.0
+        std = np.sqrt(np.einsum("ij,ij->i", diffs, diffs)[:, None] / n)
+        np.abs(diffs, out=diffs)
+        return valid & (diffs > z * std) & (std > 0)
+
+
+def _columns(matrix, start):
+    """Rows of matrix[:, start:] as lists rounded to 2 places, NaN as None"""
+    window = np.round(matrix[:, start:], 2).astype(object)
+    window[np.isnan(matrix[:, start:])] = None
+    return window.tolist()
+
+
+def _scalars(values):
+    out = np.round(values, 2).astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def compute(history, days=DEFAULT_DAYS, window=DEFAULT_WINDOW, z=DEFAULT_Z):
+    """Analytics for a History; series cover the last `days` days"""
+    if not len(history):
+        return {"start": None, "end": None, "dates": [], "window": window, "z": z, "urls": []}
+
+    urls = list(history.urls)
+    first_day = int(history.day_numbers.min())
+    width = int(history.day_numbers.max()) - first_day + 1
+
+    observed = np.full((len(urls), width), np.nan)
+    # Fancy assignment keeps the last write for duplicate (url, day) pairs
+    observed[history.url_ids, history.day_numbers - first_day] = history.counts
+
+    filled = forward_fill(observed)
+    mean = rolling_mean(observed, window)
+    dod = lagged_delta(filled, 1)
+    wow = lagged_delta(filled, 7)
+    flags = anomalies(observed, dod, z)
+    seen = np.count_nonzero(~np.isnan(observed), axis=1).tolist()
+
+    # Anomalous days grouped by URL: np.nonzero walks rows in order
+    flagged_rows, flagged_days = np.nonzero(flags)
+    flagged_dates = (flagged_days + first_day).astype("datetime64[D]").astype(str).tolist()
+    bounds = np.searchsorted(flagged_rows, np.arange(len(urls) + 1)).tolist()
+
+    start = max(0, width - days)
+    dates = np.arange(first_day + start, first_day + width).astype("datetime64[D]").astype(str).tolist()
+    series = {name: _columns(matrix, start) for name, matrix in
+              (("value", observed), ("filled", filled), ("rolling_mean", mean), ("dod", dod), ("wow", wow))}
+    latest = {name: _scalars(matrix[:, -1]) for name, matrix in
+              (("latest", filled), ("rolling_mean", mean), ("dod", dod), ("wow", wow))}
+
+    return {
+        "start": str(np.datetime64(first_day, "D")),
+        "end": str(np.datetime64(first_day + width - 1, "D")),
+        "dates": dates,
+        "window": window,
+        "z": z,
+        "urls": [
+            {
+                "url": url,
+                "observations": seen[i],
+                "latest": latest["latest"][i],
+                "rolling_mean": latest["rolling_mean"][i],
+                "dod": latest["dod"][i],
+                "wow": latest["wow"][i],
+                "anomalies": flagged_dates[bounds[i]:bounds[i + 1]],
+                "series": {name: values[i] for name, values in series.items()},
+            }
+            for i, url in enumerate(urls)
+        ],
+    }
+
+
+class AnalyticsCache:
+    """Per-user LRU of History objects"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            history = self._entries.get(user_id)
+            if history is not None:
+                self._entries.move_to_end(user_id)
+            return history
+
+    def set(self, user_id, history):
+        with self._lock:
+            self._entries[user_id] = history
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+analytics_cache = AnalyticsCache()
+
+
+def parse_params(params):
+    """(days, window, z) from query parameters, clamped; ValueError when malformed"""
+    days = min(MAX_DAYS, max(1, int(params.get("days", DEFAULT_DAYS))))
+    window = min(365, max(1, int(params.get("window", DEFAULT_WINDOW))))
+    z = max(0.5, float(params.get("z", DEFAULT_Z)))
+    return days, window, z
+
+
+def _rows(result):
+    return (result or {}).get("results", {}).get("rows", [])
+
+
+def _refresh(execute_batch, user_id, history, fingerprint):
+    """History matching fingerprint: history itself, history with new rows appended, or a reload"""
+    count, max_id, total = fingerprint
+    if history is not None and history.fingerprint is not None:
+        old_count, old_max_id, old_total = history.fingerprint
+        if fingerprint == history.fingerprint:
+            return history
+        if max_id is not None and old_max_id is not None and max_id > old_max_id:
+            rows_result, delta_result = execute_batch([
+                (ROWS_SQL, [user_id, history.last_id]),
+                (DELTA_SQL, [user_id, history.last_id]),
+            ])
+            rows = _rows(rows_result)
+            delta_count, delta_total = _rows(delta_result)[0]
+            # The old rows are untouched when they still add up to what we hold
+            if count - delta_count == old_count and total - delta_total == old_total:
+                history = history.appended(rows)
+                history.fingerprint = fingerprint
+                return history
+
+    rollup_result, rows_result = execute_batch([(ROLLUP_SQL, [user_id]), (ROWS_SQL, [user_id, 0])])
+    history = History().appended(_rows(rollup_result) + _rows(rows_result))
+    history.fingerprint = fingerprint
+    return history
+
+
+def load_analytics(execute_batch, user_id, days=DEFAULT_DAYS, window=DEFAULT_WINDOW, z=DEFAULT_Z):
+    """Analytics for one user, recomputed only when their history has changed"""
+    rows = _rows(execute_batch([(FINGERPRINT_SQL, [user_id])])[0])
+    fingerprint = tuple(rows[0]) if rows else (0, None, 0.0)
+
+    cached = analytics_cache.get(user_id)
+    history = _refresh(execute_batch, user_id, cached, fingerprint)
+    if history is not cached:
+        analytics_cache.set(user_id, history)
+
+    params = (days, window, z)
+    result = history.results.get(params)
+    cache_lookup("analytics", result is not None)
+    if result is None:
+        result = compute(history, days, window, z)
+        history.results[params] = result
+        while len(history.results) > RESULTS_PER_USER:
+            history.results.popitem(last=False)
+    return result
@@ -0,0 +1,77 @@
+"""
+Single routed function serving every endpoint (optional deployment layout).
+
+Instead of one container per endpoint, each with its own cold start and its
+own caches, api dispatches on path and method to the existing handlers.
+Endpoint modules are imported on first use, so a cold api container pays
+only for the endpoint it is serving, and everything held at module level
+(the Turso connection, token cache, revocation list, geocode cache) is
+shared by all endpoints served by the container.
+
+Paths are matched on the endpoint name after /.netlify/functions/, with an
+optional api/ segment, so both /.netlify/functions/history (via the rewrite
+in netlify.toml) and /.netlify/functions/api/history work. Nested paths map
+like the frontend's getApiUrl: /me/state is the me_state endpoint.
+"""
+import sys
+import os
+import importlib
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import create_response
+
+# endpoint: methods its handler accepts (OPTIONS is always passed through)
+ROUTES = {
+    "register": ("POST",),
+    "login": ("POST",),
+    "logout": ("POST",),
+    "verify_token": ("GET",),
+    "me_state": ("GET",),
+    "history": ("GET",),
+    "history_analytics": ("GET",),
+    "history_export": ("GET",),
+    "scrape": ("GET",),
+    "geocode": ("POST",),
+    "requirements": ("GET", "POST"),
+    "shortlist": ("GET", "POST", "PATCH"),
+    "shortlist_changes": ("GET",),
+    "matches": ("GET", "POST"),
+    "ask_expert": ("POST",),
+}
+
+PREFIXES = ("/.netlify/functions/", "/api/", "/")
+
+_handlers = {}
+
+
+def endpoint_for(path):
+    """Endpoint name for a request path, e.g. /.netlify/functions/me/state -> me_state"""
+    path = path or ""
+    for prefix in PREFIXES:
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    if path.startswith("api/"):
+        path = path[len("api/"):]
+    return path.strip("/").replace("/", "_")
+
+
+def get_handler(endpoint):
+    if endpoint not in _handlers:
+        _handlers[endpoint] = importlib.import_module(endpoint).handler
+    return _handlers[endpoint]
+
+
+def handler(event, context):
+    """Route a request to the endpoint's handler"""
+    endpoint = endpoint_for(event.get('path'))
+    methods = ROUTES.get(endpoint)
+    if methods is None:
+        return create_response(404, {'error': 'Not found'})
+
+    method = event.get('httpMethod')
+    if method != 'OPTIONS' and method not in methods:
+        return create_response(405, {'error': 'Method not allowed'},
+                               {'Allow': ', '.join(methods + ('OPTIONS',))})
+
+    return get_handler(endpoint)(event, context)
@@ -2,17 +2,15 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import create_response, get_request_body
-from groq import Groq
-import os
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY not found in environment variables")
-
-client = Groq(api_key=GROQ_API_KEY)
-
+from utils import create_response, get_request_body, get_user_from_token, execute_batch, rate_limit, compressed, timed
+from llm import get_provider, build_messages
+from prompt_builder import load_user_context
+from tracing import span
+import metrics
+
+@timed
+@compressed
+@rate_limit("ask_expert")
 def handler(event, context):
     """Handle expert chat questions"""
     if event.get('httpMethod') == 'OPTIONS':
@@ -28,22 +26,19 @@ def handler(event, context):
         if not question:
             return create_response(400, {'error': 'No question provided'})
 
-        response = client.chat.completions.create(
-            model="meta-llama/llama-4-maverick-17b-128e-instruct",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional real estate advisor. Give clear, practical, and honest advice about house buying in the UK."
-                },
-                {"role": "user", "content": question}
-            ],
-            temperature=0.7,
-            max_tokens=1024,
-        )
+        # Opt-in: personalise the answer with the user's stored requirements and shortlist
+        user_context = None
+        if data.get('use_context'):
+            user_data = get_user_from_token(event)
+            if not user_data:
+                return create_response(401, {'error': 'Unauthorized'})
+            user_context = load_user_context(execute_batch, user_data.get('user_id'))
 
-        answer = response.choices[0].message.content
-        return create_response(200, {"answer": answer})
+        # Provider is built on the first question and reused across warm invocations
+        with span("llm"), metrics.upstream("llm"):
+            completion = get_provider().complete(build_messages(question, context=user_context))
+        metrics.observe_tokens(completion.prompt_tokens, completion.completion_tokens)
+        return create_response(200, {"answer": completion.text})
 
     except Exception as e:
         return create_response(500, {'error': str(e)})
-
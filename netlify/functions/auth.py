@@ -0,0 +1,127 @@
+"""
+Shared JWT authentication.
+
+Tokens are decoded once and the claims are kept in a small cache keyed by
+the token's SHA-256 until the token's own `exp`, so repeat requests with the
+same bearer token skip jwt.decode. Logged-out tokens go into an in-memory
+revocation set (O(1) lookups). The set is persisted to the revoked_token
+table and re-synced at most every AUTH_REVOCATION_REFRESH seconds, not on
+every request.
+"""
+import os
+import time
+import hashlib
+import threading
+from logs import get_logger
+from metrics import cache_lookup
+import shared_cache
+
+log = get_logger("auth")
+
+CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 4096))
+REVOCATION_REFRESH = float(os.getenv("AUTH_REVOCATION_REFRESH", 60))
+
+
+def extract_token(auth_header):
+    """Return the token from an Authorization header value, or ''"""
+    auth_header = (auth_header or "").strip()
+    if auth_header[:7].lower() == "bearer ":
+        return auth_header[7:].strip()
+    return auth_header
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class RevocationList:
+    """Revoked token hashes with their expiry, synced from revoked_token"""
+
+    def __init__(self, refresh_interval=REVOCATION_REFRESH):
+        self.refresh_interval = refresh_interval
+        self._revoked = {}
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        expires_at = self._revoked.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def add(self, key, expires_at):
+        with self._lock:
+            self._revoked[key] = expires_at
+
+    def sync(self, execute_query):
+        """Reload unexpired revocations from the database"""
+        now = time.time()
+        result = execute_query(
+            "SELECT token_hash, expires_at FROM revoked_token WHERE expires_at > ?",
+            [int(now)]
+        )
+        rows = result[0].get("results", {}).get("rows", [])
+        with self._lock:
+            # Drop expired entries so the set stays proportional to live tokens
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+            for key, expires_at in rows:
+                self._revoked[key] = float(expires_at)
+            self._last_sync = now
+
+    def maybe_sync(self, execute_query):
+        if time.time() - self._last_sync < self.refresh_interval:
+            return
+        try:
+            self.sync(execute_query)
+        except Exception as e:
+            # Keep serving from the in-memory set; retry after the next interval
+            self._last_sync = time.time()
+            log.warning("⚠️ Revocation sync failed: %s", e)
+
+
+# Claims by token hash; gunicorn workers share it when "tokens" is in SHARED_CACHE_NAMESPACES
+token_cache = shared_cache.namespace("tokens", CACHE_SIZE)
+revocations = RevocationList()
+
+
+def authenticate(token, secret, execute_query=None):
+    """Return the claims for a valid, unrevoked token, or None.
+
+    Pass execute_query to let the revocation list re-sync when it is stale.
+    """
+    if not token or not secret:
+        return None
+
+    if execute_query is not None:
+        revocations.maybe_sync(execute_query)
+
+    key = token_hash(token)
+    if key in revocations:
+        token_cache.discard(key)
+        return None
+
+    claims = token_cache.get(key)
+    cache_lookup("token", claims is not None)
+    if claims is not None:
+        return claims
+
+    import jwt
+    try:
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+
+    token_cache.set(key, claims, ttl=float(claims.get("exp", time.time() + 60)) - time.time())
+    return claims
+
+
+def revoke(token, claims, execute_query=None):
+    """Revoke a verified token until it would have expired anyway"""
+    key = token_hash(token)
+    expires_at = float(claims.get("exp", time.time()))
+    revocations.add(key, expires_at)
+    token_cache.discard(key)
+
+    if execute_query is not None:
+        execute_query(
+            "INSERT OR REPLACE INTO revoked_token (token_hash, expires_at) VALUES (?, ?)",
+            [key, int(expires_at)]
+        )
@@ -0,0 +1,151 @@
+"""
+Versioned codec for JSON values stored in TEXT columns.
+
+Encoded values carry a short ASCII header so every reader can tell them
+apart from the plain JSON rows written before the codec existed:
+
+    ~1<format><compression>:<base64 payload>
+
+    format       j = compact JSON, m = msgpack
+    compression  z = zstd, d = zlib deflate (when zstandard isn't installed),
+                 omitted = none
+
+Plain JSON never starts with "~", so anything without a header is decoded
+as JSON. Values are stored as text because the Turso HTTP API carries
+parameters as JSON; base64 costs a third on top of the payload, so small
+values (below CODEC_COMPRESS_MIN_BYTES of JSON) and anything that doesn't
+come out smaller stay plain JSON.
+
+CODEC_FORMAT picks what new writes use: "json" (default), "msgpack", or
+"plain" to turn encoding off. Compressed JSON beats compressed msgpack on
+our rows (see benchmarks/bench_codec.py), and msgpack without compression
+loses to plain JSON once base64-encoded. Decoding understands every version.
+"""
+import os
+import json
+import zlib
+import base64
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+HEADER_PREFIX = "~1"
+CODEC_FORMAT = os.getenv("CODEC_FORMAT", "json")
+COMPRESS_MIN_BYTES = int(os.getenv("CODEC_COMPRESS_MIN_BYTES", 256))
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _pack(value, fmt):
+    if fmt == "m":
+        return msgpack.packb(value, use_bin_type=True)
+    return _json(value).encode("utf-8")
+
+
+def _unpack(data, fmt):
+    if fmt == "m":
+        if msgpack is None:
+            raise ValueError("msgpack is required to decode this value")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data.decode("utf-8"))
+
+
+def _compress(data, compression):
+    if compression == "z":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(data, compression):
+    if compression == "z":
+        if zstandard is None:
+            raise ValueError("zstandard is required to decode this value")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "d":
+        return zlib.decompress(data)
+    return data
+
+
+def is_encoded(text):
+    return isinstance(text, str) and text.startswith(HEADER_PREFIX)
+
+
+def encode(value):
+    """Encode a JSON-compatible value into the text stored in the database"""
+    plain = _json(value)
+    if CODEC_FORMAT == "plain" or len(plain) < COMPRESS_MIN_BYTES:
+        return plain
+
+    fmt = "m" if CODEC_FORMAT == "msgpack" and msgpack is not None else "j"
+    compression = "z" if zstandard is not None else "d"
+    data = plain.encode("utf-8") if fmt == "j" else _pack(value, fmt)
+    payload = _compress(data, compression)
+    encoded = f"{HEADER_PREFIX}{fmt}{compression}:" + base64.b64encode(payload).decode("ascii")
+    return encoded if len(encoded) < len(plain) else plain
+
+
+def decode(text):
+    """Decode a stored value: a headered codec value or legacy plain JSON"""
+    if text is None:
+        return None
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    if not is_encoded(text):
+        return json.loads(text)
+
+    header, _, payload = text.partition(":")
+    spec = header[len(HEADER_PREFIX):]
+    if not spec or spec[0] not in "mj" or spec[1:] not in ("", "z", "d"):
+        raise ValueError(f"Unknown codec header: {header}")
+    data = _decompress(base64.b64decode(payload), spec[1:])
+    return _unpack(data, spec[0])
+
+
+def reencode_statements(table, column, rows):
+    """UPDATE statements re-encoding (rowid, text) rows of table.column.
+
+    Each update only applies if the row still holds the text that was read,
+    so a concurrent save is never overwritten with older data.
+    """
+    statements = []
+    for rowid, text in rows:
+        encoded = encode(decode(text))
+        if encoded != text:
+            statements.append((
+                f"UPDATE {table} SET {column} = ? WHERE rowid = ? AND {column} = ?",
+                [encoded, rowid, text]
+            ))
+    return statements
+
+
+def migrate_column(execute_batch, table, column, batch_size=200, after_rowid=0):
+    """Re-encode every plain JSON value in table.column, batch by batch.
+
+    Yields (last_rowid, rows_seen, rows_rewritten) after each batch so
+    callers can report progress, pause, or resume from last_rowid.
+    """
+    while True:
+        (result,) = execute_batch([(
+            f"SELECT rowid, {column} FROM {table} WHERE rowid > ? AND {column} NOT LIKE '~%' "
+            f"ORDER BY rowid LIMIT ?",
+            [after_rowid, batch_size]
+        )])
+        rows = (result or {}).get("results", {}).get("rows", [])
+        if not rows:
+            return
+        statements = reencode_statements(table, column, rows)
+        if statements:
+            execute_batch(statements)
+        after_rowid = rows[-1][0]
+        yield after_rowid, len(rows), len(statements)
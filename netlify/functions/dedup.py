@@ -0,0 +1,310 @@
+"""
+Duplicate detection for shortlist items: the same house saved twice from
+different portals or agents, with differently written addresses.
+
+Addresses are normalised once: upper case, a UK postcode pulled out and
+formatted ("bs81aa" -> "BS8 1AA"), a flat number and the house number
+separated, and the remaining words reduced to street tokens with common
+abbreviations expanded (Rd -> ROAD, St -> STREET, ...).
+
+Instead of comparing every pair, each item is put in a few blocks by key:
+    P  postcode + house number
+    S  house number + first street word (meets items without a postcode)
+    H  postcode + first word, for named houses without a number
+    L  the listing link
+Only items sharing a block are compared, so the work is near-linear in the
+number of items. A block larger than DEDUP_MAX_BLOCK is skipped as too
+generic to mean anything.
+
+A candidate pair is confirmed when the links are equal (tracking
+parameters aside), or when nothing contradicts it (a different postcode,
+house or flat number or street, coordinates more than DEDUP_MAX_DISTANCE_M
+apart) and the street tokens agree: the share of the shorter address's
+tokens found in the other is at least DEDUP_MIN_SIMILARITY. Confirmed
+pairs are joined with union-find, never across two postcodes; the first
+item of each group (in shortlist order) is kept and the others point at it.
+
+Saving a shortlist flags duplicates with a stored "duplicate_of" field
+(the map and the price watcher skip them), or merges them into the kept
+item when asked to.
+
+Configuration (environment variables):
+    DEDUP_MIN_SIMILARITY    street token overlap needed to confirm a pair (default 0.8)
+    DEDUP_MAX_DISTANCE_M    coordinates further apart than this are different houses (default 150)
+    DEDUP_MAX_BLOCK         blocks with more items than this are not compared (default 200)
+"""
+import os
+import re
+import math
+from collections import namedtuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import shortlist_store
+
+MIN_SIMILARITY = float(os.getenv("DEDUP_MIN_SIMILARITY", 0.8))
+MAX_DISTANCE_M = float(os.getenv("DEDUP_MAX_DISTANCE_M", 150))
+MAX_BLOCK = int(os.getenv("DEDUP_MAX_BLOCK", 200))
+
+# Fields whose change can make or break a duplicate
+ADDRESS_FIELDS = ("address", "link", "coordinates")
+TRACKING_PARAMS = frozenset({"channel", "ref", "source", "fbclid", "gclid"})
+
+Address = namedtuple("Address", ["postcode", "number", "flat", "tokens", "first"])
+
+_POSTCODE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})\b")
+_FLAT = re.compile(r"\b(?:FLAT|APARTMENT|APT|UNIT|SUITE)\s*(\d+[A-Z]?)\b")
+_NUMBER = re.compile(r"\b(\d+[A-Z]?)\b")
+_WORD = re.compile(r"[A-Z]+")
+
+ABBREVIATIONS = {
+    "RD": "ROAD", "ST": "STREET", "AVE": "AVENUE", "AV": "AVENUE", "LN": "LANE", "DR": "DRIVE",
+    "CL": "CLOSE", "CT": "COURT", "PL": "PLACE", "CRES": "CRESCENT", "GDNS": "GARDENS",
+    "GRN": "GREEN", "GR": "GROVE", "GRO": "GROVE", "TER": "TERRACE", "TCE": "TERRACE",
+    "SQ": "SQUARE", "PK": "PARK", "HSE": "HOUSE", "MT": "MOUNT", "N": "NORTH", "S": "SOUTH",
+    "E": "EAST", "W": "WEST", "UPR": "UPPER", "LWR": "LOWER",
+}
+STOPWORDS = frozenset({"THE", "OF", "AND", "UK", "UNITED", "KINGDOM", "ENGLAND", "FLAT", "APARTMENT"})
+
+
+def normalise(address):
+    """Address tuple for a free-text UK address"""
+    text = (address or "").upper()
+
+    postcode = None
+    match = _POSTCODE.search(text)
+    if match:
+        postcode = f"{match.group(1)} {match.group(2)}"
+        text = text[:match.start()] + " " + text[match.end():]
+
+    flat = None
+    match = _FLAT.search(text)
+    if match:
+        flat = match.group(1)
+        text = text[:match.start()] + " " + text[match.end():]
+
+    number = None
+    first = None
+    match = _NUMBER.search(text)
+    if match:
+        number = match.group(1)
+        # The street is the first word after the house number
+        following = [w for w in _WORD.findall(text[match.end():]) if w not in STOPWORDS]
+        if following:
+            first = ABBREVIATIONS.get(following[0], following[0])
+
+    words = [ABBREVIATIONS.get(w, w) for w in _WORD.findall(_NUMBER.sub(" ", text))]
+    tokens = frozenset(w for w in words if w not in STOPWORDS and len(w) > 1)
+    if first is None and words:
+        first = next((w for w in words if w not in STOPWORDS), None)
+    return Address(postcode, number, flat, tokens, first)
+
+
+def _link(item):
+    """Listing link without fragment, tracking parameters or trailing slash"""
+    link = item.get("link")
+    if not isinstance(link, str) or not link.strip():
+        return None
+    parts = urlsplit(link.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query)
+                       if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), query, ""))
+
+
+def blocking_keys(address, link=None):
+    keys = []
+    if address.postcode and address.number:
+        keys.append(("P", address.postcode, address.number))
+    if address.number and address.first:
+        keys.append(("S", address.number, address.first))
+    if address.postcode and not address.number and address.first:
+        keys.append(("H", address.postcode, address.first))
+    if link:
+        keys.append(("L", link))
+    return keys
+
+
+def distance_m(a, b):
+    """Great-circle distance between two {"lat", "lon"} points in metres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a["lat"], a["lon"], b["lat"], b["lon"]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 12_742_000 * math.asin(math.sqrt(h))
+
+
+def _coordinates(item):
+    point = item.get("coordinates")
+    if isinstance(point, dict):
+        try:
+            return {"lat": float(point["lat"]), "lon": float(point["lon"])}
+        except (KeyError, TypeError, ValueError):
+            return None
+    return None
+
+
+def similarity(a, b):
+    """Share of the shorter address's street tokens found in the other"""
+    if not a.tokens or not b.tokens:
+        # Only postcode and number to go on: they already agreed
+        return 1.0 if a.postcode and a.postcode == b.postcode and a.number == b.number else 0.0
+    return len(a.tokens & b.tokens) / min(len(a.tokens), len(b.tokens))
+
+
+def confirm(a, b, link_a=None, link_b=None, point_a=None, point_b=None):
+    """Whether two normalised addresses (and their links/coordinates) are the same house"""
+    if link_a and link_a == link_b:
+        return True
+    for x, y in ((a.postcode, b.postcode), (a.number, b.number), (a.flat, b.flat), (a.first, b.first)):
+        if x and y and x != y:
+            return False
+    if (a.flat is None) != (b.flat is None) and a.number and b.number:
+        # "Flat 2, 10 Mill Lane" is not the whole of "10 Mill Lane"
+        return False
+    if point_a and point_b and distance_m(point_a, point_b) > MAX_DISTANCE_M:
+        return False
+    return similarity(a, b) >= MIN_SIMILARITY
+
+
+class _UnionFind:
+    """Groups that never join two different postcodes.
+
+    An address without a postcode can match houses in two postcodes; it
+    joins whichever it met first rather than chaining them together.
+    """
+
+    def __init__(self, postcodes):
+        self.parent = list(range(len(postcodes)))
+        self.postcode = list(postcodes)
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return
+        if self.postcode[i] and self.postcode[j] and self.postcode[i] != self.postcode[j]:
+            return
+        # The earlier item stays the root, so it is the one kept
+        if j < i:
+            i, j = j, i
+        self.parent[j] = i
+        self.postcode[i] = self.postcode[i] or self.postcode[j]
+
+
+def find_groups(items):
+    """Union-find parents of items: parent[i] == i for kept items.
+
+    Returns (parents, comparisons made).
+    """
+    normalised = [normalise(item.get("address")) if isinstance(item.get("address"), str) else None
+                  for item in items]
+    links = [_link(item) for item in items]
+    points = [_coordinates(item) for item in items]
+
+    blocks = {}
+    for i, address in enumerate(normalised):
+        keys = blocking_keys(address, links[i]) if address else ([("L", links[i])] if links[i] else [])
+        for key in keys:
+            blocks.setdefault(key, []).append(i)
+
+    groups = _UnionFind([address.postcode if address else None for address in normalised])
+    seen = set()
+    comparisons = 0
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK:
+            continue
+        for x in range(len(members)):
+            i = members[x]
+            for j in members[x + 1:]:
+                if (i, j) in seen:
+                    continue
+                seen.add((i, j))
+                comparisons += 1
+                a, b = normalised[i], normalised[j]
+                if a is None or b is None:
+                    same = links[i] is not None and links[i] == links[j]
+                else:
+                    same = confirm(a, b, links[i], links[j], points[i], points[j])
+                if same:
+                    groups.union(i, j)
+    return [groups.find(i) for i in range(len(items))], comparisons
+
+
+def find_duplicates(items):
+    """{duplicate item id: kept item id}"""
+    parents, _ = find_groups(items)
+    return {items[i]["id"]: items[root]["id"] for i, root in enumerate(parents) if root != i}
+
+
+def flag(items):
+    """Set "duplicate_of" on duplicates (and clear stale flags) in place; returns the mapping"""
+    duplicates = find_duplicates(items)
+    for item in items:
+        if item["id"] in duplicates:
+            item["duplicate_of"] = duplicates[item["id"]]
+        else:
+            item.pop("duplicate_of", None)
+    return duplicates
+
+
+def merge(items):
+    """Fold duplicates into the item they duplicate.
+
+    The kept item's fields win; fields it lacks are filled from its
+    duplicates in order. Returns (items left, {removed id: kept id}).
+    """
+    duplicates = find_duplicates(items)
+    by_id = {item["id"]: item for item in items}
+    for duplicate_id, kept_id in duplicates.items():
+        kept = by_id[kept_id]
+        for key, value in by_id[duplicate_id].items():
+            if key not in ("id", "duplicate_of") and value not in (None, "") and kept.get(key) in (None, ""):
+                kept[key] = value
+    kept = [item for item in items if item["id"] not in duplicates]
+    for item in kept:
+        item.pop("duplicate_of", None)
+    return kept, duplicates
+
+
+def affects_duplicates(ops):
+    """Whether PATCH operations can create or break a duplicate"""
+    for op in ops:
+        kind = op.get("op")
+        if kind in ("add", "remove"):
+            return True
+        if kind == "update" and any(key in (op.get("fields") or {}) for key in ADDRESS_FIELDS):
+            return True
+    return False
+
+
+def flag_ops(items):
+    """(update ops bringing stored "duplicate_of" flags up to date, {duplicate id: kept id})"""
+    duplicates = find_duplicates(items)
+    ops = []
+    for item in items:
+        wanted = duplicates.get(item["id"])
+        if item.get("duplicate_of") != wanted:
+            ops.append({"op": "update", "id": item["id"], "fields": {"duplicate_of": wanted}})
+    return ops, duplicates
+
+
+def dedupe_items(items, mode=None):
+    """Flag (default) or merge duplicates in a shortlist about to be saved.
+
+    Returns (items to store, {duplicate id: kept id}).
+    """
+    if mode == "merge":
+        return merge(items)
+    return items, flag(items)
+
+
+def refresh_flags(execute_batch, user_id):
+    """Re-check a stored shortlist after a PATCH and write changed flags; returns the duplicates"""
+    items = shortlist_store.load_items(execute_batch, user_id)
+    ops, duplicates = flag_ops(items)
+    if ops:
+        shortlist_store.apply_patch(execute_batch, user_id, ops)
+    return duplicates
@@ -2,21 +2,67 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import create_response, get_request_body, get_user_from_token
+from utils import create_response, get_request_body, require_auth, rate_limit, timed
+from tracing import span
+import metrics
+import shared_cache
 import requests
+from logs import get_logger
 
-def handler(event, context):
-    """Handle geocoding requests"""
-    if event.get('httpMethod') == 'OPTIONS':
-        return create_response(200, {})
+log = get_logger("geocode")
+
+# Reused by warm invocations: keeps the connection to Nominatim alive
+session = requests.Session()
+session.headers['User-Agent'] = 'HouseHuntingApp/1.0'  # Required by Nominatim
+
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+
+# Addresses geocoded by this container (shared by every endpoint under api.py)
+CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", 1024))
+CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", 30 * 86400))
+_cache = shared_cache.namespace("geocode", CACHE_SIZE, CACHE_TTL)
+# "Not found" is cached too, as a null result
+_MISSING = object()
+
+def geocode_address(address):
+    """Nominatim lookup with an LRU cache; returns the result dict or None"""
+    key = " ".join(address.lower().split())
+    cached = _cache.get(key, _MISSING)
+    metrics.cache_lookup("geocode", cached is not _MISSING)
+    if cached is not _MISSING:
+        return cached
+    
+    # Use Nominatim API (free OpenStreetMap geocoding)
+    url = NOMINATIM_URL
+    params = {
+        'q': address,
+        'format': 'json',
+        'limit': 1,
+        'countrycodes': 'gb'  # Restrict to UK
+    }
+    with span("nominatim"), metrics.upstream("nominatim") as call:
+        response = session.get(url, params=params, timeout=10)
+        call.status = response.status_code
+    results = response.json()
     
+    result = None
+    if results:
+        result = {
+            'lat': float(results[0]['lat']),
+            'lon': float(results[0]['lon']),
+            'display_name': results[0]['display_name']
+        }
+    _cache.set(key, result)
+    return result
+
+@timed
+@require_auth
+@rate_limit("geocode")
+def handler(event, context, user_data):
+    """Handle geocoding requests"""
     if event.get('httpMethod') != 'POST':
         return create_response(405, {'error': 'Method not allowed'})
     
-    user_data = get_user_from_token(event)
-    if not user_data:
-        return create_response(401, {'error': 'Unauthorized'})
-    
     data = get_request_body(event)
     address = data.get('address')
     
@@ -24,30 +70,14 @@ def handler(event, context):
         return create_response(400, {'error': 'Address is required'})
     
     try:
-        # Use Nominatim API (free OpenStreetMap geocoding)
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': address,
-            'format': 'json',
-            'limit': 1,
-            'countrycodes': 'gb'  # Restrict to UK
-        }
-        headers = {
-            'User-Agent': 'HouseHuntingApp/1.0'  # Required by Nominatim
-        }
-        
-        response = requests.get(url, params=params, headers=headers)
-        results = response.json()
+        result = geocode_address(address)
         
-        if results:
-            return create_response(200, {
-                'lat': float(results[0]['lat']),
-                'lon': float(results[0]['lon']),
-                'display_name': results[0]['display_name']
-            })
+        if result:
+            return create_response(200, result)
         else:
             return create_response(404, {'error': 'Address not found'})
             
     except Exception as e:
+        log.exception("❌ Geocoding error: %s", e)
         return create_response(500, {'error': 'Failed to geocode address'})
 
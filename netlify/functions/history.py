@@ -2,25 +2,21 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import execute_query, create_response, get_user_from_token
+from utils import execute_query, create_response, require_auth, compressed, timed
 
-def handler(event, context):
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
     """Get user search history"""
-    if event.get('httpMethod') == 'OPTIONS':
-        return create_response(200, {})
-    
     if event.get('httpMethod') != 'GET':
         return create_response(405, {'error': 'Method not allowed'})
-    
-    user_data = get_user_from_token(event)
-    if not user_data:
-        return create_response(401, {'error': 'Unauthorized'})
 
     user_id = user_data.get('user_id')
 
     try:
         result = execute_query(
-            "SELECT url, date, results FROM user_history WHERE user_id = ? ORDER BY date DESC, created_at DESC",
+            "SELECT url, date, results FROM user_history_merged WHERE user_id = ? ORDER BY date DESC, created_at DESC",
             [user_id]
         )
         rows = result[0].get("results", {}).get("rows", [])
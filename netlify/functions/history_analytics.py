@@ -0,0 +1,24 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import execute_batch, create_response, get_query_params, require_auth, compressed, timed
+from analytics import load_analytics, parse_params
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
+    """Rolling means, deltas and anomaly flags for every tracked search"""
+    if event.get('httpMethod') != 'GET':
+        return create_response(405, {'error': 'Method not allowed'})
+
+    try:
+        days, window, z = parse_params(get_query_params(event))
+    except ValueError:
+        return create_response(400, {'error': 'days and window must be integers, z a number'})
+
+    try:
+        return create_response(200, load_analytics(execute_batch, user_data.get('user_id'), days, window, z))
+    except Exception as e:
+        return create_response(500, {'error': str(e)})
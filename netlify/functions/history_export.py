@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import execute_batch, create_response, get_query_params, require_auth, compressed, timed
+from history_io import export_pages, ndjson_lines, EXPORT_MAX_ROWS, NDJSON_TYPE
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
+    """The user's history as NDJSON, EXPORT_MAX_ROWS rows per response.
+
+    Function responses are buffered, so a long history comes in pages: while
+    rows remain, a Link header points at the next one (?after=<last id>).
+    """
+    if event.get('httpMethod') != 'GET':
+        return create_response(405, {'error': 'Method not allowed'})
+
+    try:
+        after = int(get_query_params(event).get('after', 0))
+    except ValueError:
+        return create_response(400, {'error': 'after must be an integer'})
+
+    try:
+        body, last_id, rows = [], after, 0
+        for page in export_pages(execute_batch, user_data.get('user_id'), after, limit=EXPORT_MAX_ROWS):
+            body.append(ndjson_lines(page))
+            last_id, rows = page[-1][0], rows + len(page)
+
+        headers = {
+            'Content-Type': NDJSON_TYPE,
+            'Content-Disposition': 'attachment; filename="history.ndjson"',
+            'Access-Control-Expose-Headers': 'Link',
+        }
+        if rows == EXPORT_MAX_ROWS:
+            headers['Link'] = f'<?after={last_id}>; rel="next"'
+        response = create_response(200, None, headers)
+        response['body'] = b"".join(body).decode("utf-8")
+        return response
+    except Exception as e:
+        return create_response(500, {'error': str(e)})
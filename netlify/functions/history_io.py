@@ -0,0 +1,217 @@
+"""
+Bulk export and import of search history as NDJSON.
+
+Export walks user_history in id order a page at a time (keyset pagination,
+WHERE id > last id), so memory stays constant however many rows there are
+and an interrupted export resumes from the last id written. Each row is one
+JSON line:
+
+    {"url": "...", "date": "2025-10-01", "results": "197 results", "count": 197}
+
+("user_id" is added when exporting every user.) Only daily rows are
+exported; periods already rolled up by history_rollup.py are not.
+
+Import reads NDJSON, or the legacy results_history.json array of
+{"date", "results"} objects (which has no URL or user, so both come from
+the caller). Records are streamed too: NDJSON line by line, the legacy
+array one element at a time. Every record's result count is parsed; records
+without a valid date or count are skipped. Rows are written with multi-row
+UPSERTs on (user_id, url, date), one statement of batch_size rows per
+round trip, so re-importing the same file changes nothing.
+
+Configuration (environment variables):
+    HISTORY_IMPORT_BATCH       rows per UPSERT statement (default 500)
+    HISTORY_EXPORT_PAGE        rows fetched per export query (default 1000)
+    HISTORY_EXPORT_MAX_ROWS    rows per /history/export response on Netlify (default 20000)
+"""
+import os
+import re
+import json
+import functools
+import itertools
+from datetime import date
+
+from logs import get_logger
+from responses import dumps
+
+log = get_logger("history_io")
+
+IMPORT_BATCH = int(os.getenv("HISTORY_IMPORT_BATCH", 500))
+EXPORT_PAGE = int(os.getenv("HISTORY_EXPORT_PAGE", 1000))
+EXPORT_MAX_ROWS = int(os.getenv("HISTORY_EXPORT_MAX_ROWS", 20000))
+
+NDJSON_TYPE = "application/x-ndjson"
+# SQLite 3.32+ and libSQL allow 32766 bound parameters per statement
+MAX_BATCH = 32766 // 4
+# Skipped records logged individually before only counting them
+LOGGED_SKIPS = 10
+
+EXPORT_USER_SQL = ("SELECT id, user_id, url, date, results FROM user_history "
+                   "WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?")
+EXPORT_ALL_SQL = "SELECT id, user_id, url, date, results FROM user_history WHERE id > ? ORDER BY id LIMIT ?"
+
+_NUMBER = re.compile(r"\d[\d,]*")
+
+
+def parse_count(text):
+    """'1,234 results' -> 1234; None when there is no number"""
+    match = _NUMBER.search(text or "")
+    return int(match.group().replace(",", "")) if match else None
+
+
+@functools.lru_cache(maxsize=16)
+def upsert_sql(rows):
+    """INSERT of `rows` history rows that overwrites the result of an existing (user, url, day)"""
+    values = ", ".join(["(?, ?, ?, ?)"] * rows)
+    return (f"INSERT INTO user_history (user_id, url, date, results) VALUES {values} "
+            "ON CONFLICT(user_id, url, date) DO UPDATE SET results = excluded.results")
+
+
+# -------------------------
+# Export
+# -------------------------
+
+def export_pages(execute_batch, user_id=None, after=0, page_size=EXPORT_PAGE, limit=None):
+    """Yield lists of (id, user_id, url, date, results) rows with id > after.
+
+    user_id None exports every user. Stops after `limit` rows when given.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        if user_id is None:
+            statement = (EXPORT_ALL_SQL, [after, size])
+        else:
+            statement = (EXPORT_USER_SQL, [user_id, after, size])
+        (result,) = execute_batch([statement])
+        rows = (result or {}).get("results", {}).get("rows", [])
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+
+def ndjson_lines(rows, with_user=False):
+    """NDJSON bytes for a page of export rows"""
+    lines = []
+    for _, user_id, url, day, results in rows:
+        record = {"url": url, "date": day, "results": results, "count": parse_count(results)}
+        if with_user:
+            record = {"user_id": user_id, **record}
+        lines.append(dumps(record))
+    return b"\n".join(lines) + b"\n"
+
+
+# -------------------------
+# Import
+# -------------------------
+
+def _json_array(stream, chunk_size=1 << 16):
+    """Yield (index, element) of a JSON array whose "[" has been read, one element at a time"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof, index = "", 0, False, 0
+    while True:
+        # Skip whitespace and separators, reading more when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = stream.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+        if pos >= len(buffer):
+            raise ValueError("unexpected end of JSON array")
+        if buffer[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f"item {index}: {e}") from None
+            # Probably an element cut off at the end of the buffer
+            chunk = stream.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        yield index, value
+        index += 1
+        pos = end
+
+
+def _ndjson(lines, start=1):
+    for number, line in enumerate(lines, start):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}") from None
+
+
+def read_records(stream):
+    """Yield (position, record) from a text stream of NDJSON or a legacy JSON array"""
+    head, blank_lines = stream.read(1), 0
+    while head.isspace():
+        blank_lines += head == "\n"
+        head = stream.read(1)
+    if head == "[":
+        return _json_array(stream)
+    # Keep line numbers in error messages right after leading blank lines
+    return _ndjson(itertools.chain([head + stream.readline()], stream), 1 + blank_lines)
+
+
+def to_row(record, user_id=None, url=None):
+    """(user_id, url, date, results) for an import record; ValueError when it isn't usable"""
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    row_user = record.get("user_id", user_id)
+    row_url = record.get("url") or url
+    if row_user is None:
+        raise ValueError("no user_id (pass --user-id)")
+    if not row_url:
+        raise ValueError("no url (pass --url for legacy records)")
+
+    day = record.get("date")
+    try:
+        day = date.fromisoformat(str(day)).isoformat()
+    except ValueError:
+        raise ValueError(f"bad date {day!r}") from None
+
+    results = record.get("results")
+    if results is None and isinstance(record.get("count"), int):
+        results = f"{record['count']:,} results"
+    if not isinstance(results, str) or parse_count(results) is None:
+        raise ValueError(f"no result count in {results!r}")
+    return int(row_user), row_url, day, results
+
+
+def import_records(execute_batch, records, batch_size=IMPORT_BATCH, user_id=None, url=None):
+    """UPSERT (position, record) pairs in batches of batch_size rows.
+
+    Yields (rows_written, records_skipped) totals after each batch.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH))
+    written = skipped = 0
+    params, count = [], 0
+    for position, record in records:
+        try:
+            params.extend(to_row(record, user_id, url))
+        except ValueError as e:
+            skipped += 1
+            if skipped <= LOGGED_SKIPS:
+                log.warning("⚠️ Skipping record %s: %s", position, e)
+            continue
+        count += 1
+        if count == batch_size:
+            execute_batch([(upsert_sql(count), params)])
+            written += count
+            params, count = [], 0
+            yield written, skipped
+    if count:
+        execute_batch([(upsert_sql(count), params)])
+        written += count
+    yield written, skipped
@@ -0,0 +1,200 @@
+"""
+History retention: roll old daily rows up into weekly and monthly aggregates.
+
+Daily user_history rows are kept for HISTORY_DAILY_DAYS. Older rows are
+folded into user_history_rollup, one row per user, URL and period holding
+samples, min, max, average and the last observation:
+
+    newer than HISTORY_DAILY_DAYS     daily rows, untouched
+    up to HISTORY_WEEKLY_DAYS         one weekly row per ISO week (Monday start)
+    older                             one monthly row per month
+
+Both cutoffs are moved back to a Monday, so a week is never split between
+daily and rolled-up rows. A week belongs to the month its Monday falls in,
+which lets weekly rows that age past HISTORY_WEEKLY_DAYS be merged into
+monthly ones exactly.
+
+compact() works in batches of batch_size source rows, walked in id order.
+Each batch's rollup upserts and the deletion of its source rows are one
+batch (one transaction), so the table is never locked for long, a run can
+be stopped at any point, and no row is counted twice. Upserts merge into
+existing rollups, so a period split across batches or runs is still one row.
+
+Readers use the user_history_merged view (migration 0006), in which a
+rollup appears as one history row: its last date and result.
+
+Configuration (environment variables):
+    HISTORY_DAILY_DAYS      days of daily rows to keep (default 90)
+    HISTORY_WEEKLY_DAYS     days before weekly rollups become monthly (default 365)
+    HISTORY_COMPACT_BATCH   source rows per batch (default 500)
+"""
+import os
+import functools
+from collections import namedtuple
+from datetime import date, timedelta
+
+from history_io import parse_count
+
+DAILY_DAYS = int(os.getenv("HISTORY_DAILY_DAYS", 90))
+WEEKLY_DAYS = int(os.getenv("HISTORY_WEEKLY_DAYS", 365))
+COMPACT_BATCH = int(os.getenv("HISTORY_COMPACT_BATCH", 500))
+
+Cutoffs = namedtuple("Cutoffs", ["daily", "weekly"])
+# One batch's work: rows read, rollup rows upserted, last id/rowid done
+Progress = namedtuple("Progress", ["stage", "rows", "rollups", "last_id"])
+
+RAW_SQL = ("SELECT id, user_id, url, date, results FROM user_history "
+           "WHERE date < ? AND id > ? ORDER BY id LIMIT ?")
+DELETE_RAW_SQL = "DELETE FROM user_history WHERE id > ? AND id <= ? AND date < ?"
+WEEKLY_SQL = ("SELECT rowid, user_id, url, period_start, samples, min_count, max_count, avg_count, "
+              "last_date, last_results FROM user_history_rollup "
+              "WHERE period = 'week' AND period_start < ? AND rowid > ? ORDER BY rowid LIMIT ?")
+DELETE_WEEKLY_SQL = ("DELETE FROM user_history_rollup "
+                     "WHERE period = 'week' AND period_start < ? AND rowid > ? AND rowid <= ?")
+
+# SQLite expressions matching monday() and month() below
+_MONDAY = "date({0}, 'weekday 0', '-6 days')"
+_MONTH = "strftime('%Y-%m-01', " + _MONDAY + ")"
+REPORT_SQL = [
+    ("daily -> weekly",
+     "SELECT COUNT(*), COUNT(DISTINCT user_id || '|' || url || '|' || " + _MONDAY.format("date") + ") "
+     "FROM user_history WHERE date < ? AND date >= ?"),
+    ("daily -> monthly",
+     "SELECT COUNT(*), COUNT(DISTINCT user_id || '|' || url || '|' || " + _MONTH.format("date") + ") "
+     "FROM user_history WHERE date < ?"),
+    ("weekly -> monthly",
+     "SELECT COUNT(*), COUNT(DISTINCT user_id || '|' || url || '|' || strftime('%Y-%m-01', period_start)) "
+     "FROM user_history_rollup WHERE period = 'week' AND period_start < ?"),
+]
+
+COLUMNS = 10
+
+
+@functools.lru_cache(maxsize=16)
+def upsert_sql(rows):
+    """Upsert of `rows` partial aggregates, merged into an existing rollup row"""
+    values = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"] * rows)
+    # Every right-hand side sees the row as it was before this update
+    return (
+        "INSERT INTO user_history_rollup (user_id, url, period, period_start, samples, min_count, "
+        f"max_count, avg_count, last_date, last_results) VALUES {values} "
+        "ON CONFLICT(user_id, url, period, period_start) DO UPDATE SET "
+        "samples = samples + excluded.samples, "
+        "min_count = MIN(min_count, excluded.min_count), "
+        "max_count = MAX(max_count, excluded.max_count), "
+        "avg_count = (avg_count * samples + excluded.avg_count * excluded.samples) "
+        "/ (samples + excluded.samples), "
+        "last_results = CASE WHEN excluded.last_date >= last_date "
+        "THEN excluded.last_results ELSE last_results END, "
+        "last_date = MAX(last_date, excluded.last_date), "
+        "updated_at = CURRENT_TIMESTAMP"
+    )
+
+
+def monday(day):
+    return day - timedelta(days=day.weekday())
+
+
+def month(day):
+    """Month (as its first day) of the week day is in"""
+    return monday(day).replace(day=1)
+
+
+def cutoffs(today=None, daily_days=DAILY_DAYS, weekly_days=WEEKLY_DAYS):
+    """Dates before which rows are rolled up weekly and monthly (both Mondays)"""
+    if weekly_days < daily_days:
+        raise ValueError("HISTORY_WEEKLY_DAYS must not be less than HISTORY_DAILY_DAYS")
+    today = today or date.today()
+    return Cutoffs(monday(today - timedelta(days=daily_days)), monday(today - timedelta(days=weekly_days)))
+
+
+class _Aggregate:
+    __slots__ = ("samples", "min", "max", "total", "last_date", "last_results")
+
+    def __init__(self):
+        self.samples, self.min, self.max, self.total = 0, None, None, 0.0
+        self.last_date = self.last_results = None
+
+    def add(self, samples, low, high, avg, last_date, last_results):
+        self.samples += samples
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.total += avg * samples
+        if self.last_date is None or last_date >= self.last_date:
+            self.last_date, self.last_results = last_date, last_results
+
+    def params(self, key):
+        return list(key) + [self.samples, self.min, self.max, self.total / self.samples,
+                            self.last_date, self.last_results]
+
+
+def _rows(result):
+    return (result or {}).get("results", {}).get("rows", [])
+
+
+def _upserts(aggregates):
+    params = []
+    for key, aggregate in aggregates.items():
+        params.extend(aggregate.params(key))
+    return [(upsert_sql(len(aggregates)), params)] if aggregates else []
+
+
+def _roll_raw(execute_batch, limits, batch_size):
+    """Stage 1: daily rows older than the daily cutoff"""
+    after = 0
+    while True:
+        rows = _rows(execute_batch([(RAW_SQL, [limits.daily.isoformat(), after, batch_size])])[0])
+        if not rows:
+            return
+        aggregates = {}
+        for _, user_id, url, day, results in rows:
+            day = date.fromisoformat(day)
+            if day >= limits.weekly:
+                key = (user_id, url, "week", monday(day).isoformat())
+            else:
+                key = (user_id, url, "month", month(day).isoformat())
+            count = parse_count(results) or 0
+            aggregates.setdefault(key, _Aggregate()).add(1, count, count, count, day.isoformat(), results)
+        last_id = rows[-1][0]
+        execute_batch(_upserts(aggregates) + [(DELETE_RAW_SQL, [after, last_id, limits.daily.isoformat()])])
+        yield Progress("daily", len(rows), len(aggregates), last_id)
+        after = last_id
+
+
+def _roll_weekly(execute_batch, limits, batch_size):
+    """Stage 2: weekly rollups older than the weekly cutoff"""
+    after = 0
+    cutoff = limits.weekly.isoformat()
+    while True:
+        rows = _rows(execute_batch([(WEEKLY_SQL, [cutoff, after, batch_size])])[0])
+        if not rows:
+            return
+        aggregates = {}
+        for _, user_id, url, start, samples, low, high, avg, last_date, last_results in rows:
+            key = (user_id, url, "month", month(date.fromisoformat(start)).isoformat())
+            aggregates.setdefault(key, _Aggregate()).add(samples, low, high, avg, last_date, last_results)
+        last_rowid = rows[-1][0]
+        execute_batch(_upserts(aggregates) + [(DELETE_WEEKLY_SQL, [cutoff, after, last_rowid])])
+        yield Progress("weekly", len(rows), len(aggregates), last_rowid)
+        after = last_rowid
+
+
+def compact(execute_batch, limits=None, batch_size=COMPACT_BATCH):
+    """Roll up everything older than the cutoffs, yielding Progress after each batch"""
+    limits = limits or cutoffs()
+    # Bound parameters per upsert stay under SQLite's 32766
+    batch_size = max(1, min(batch_size, 32766 // COLUMNS))
+    yield from _roll_raw(execute_batch, limits, batch_size)
+    yield from _roll_weekly(execute_batch, limits, batch_size)
+
+
+def report(execute_batch, limits=None):
+    """Dry run: [(stage, rows that would be removed, rollup rows they land in)]"""
+    limits = limits or cutoffs()
+    params = [
+        [limits.daily.isoformat(), limits.weekly.isoformat()],
+        [limits.weekly.isoformat()],
+        [limits.weekly.isoformat()],
+    ]
+    results = execute_batch([(sql, p) for (_, sql), p in zip(REPORT_SQL, params)])
+    return [(stage, *_rows(result)[0]) for (stage, _), result in zip(REPORT_SQL, results)]
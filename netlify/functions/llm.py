@@ -0,0 +1,150 @@
+"""
+LLM providers for the "Ask an Expert" feature.
+
+Nothing here imports an SDK at module load. The configured provider is
+built on the first call to get_provider(), so app.py, the scraper and every
+non-LLM Netlify function start without paying for the groq import or
+needing a GROQ_API_KEY.
+
+Configuration (environment variables):
+    LLM_PROVIDER          groq (default) or stub
+    LLM_MODEL             model name passed to the provider
+    LLM_MAX_TOKENS        completion token limit (default 1024)
+    LLM_TEMPERATURE       sampling temperature (default 0.7)
+    LLM_STUB_LATENCY_MS   artificial delay for the stub provider (default 0)
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import namedtuple
+
+SYSTEM_PROMPT = (
+    "You are a professional real estate advisor. Give clear, practical, "
+    "and honest advice about house buying in the UK."
+)
+DEFAULT_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
+DEFAULT_MAX_TOKENS = 1024
+DEFAULT_TEMPERATURE = 0.7
+
+Completion = namedtuple("Completion", ["text", "prompt_tokens", "completion_tokens"])
+
+
+class LLMProvider:
+    """Base class for chat completion backends"""
+
+    name = "base"
+
+    def __init__(self, model=None, max_tokens=None, temperature=None):
+        self.model = model or os.getenv("LLM_MODEL", DEFAULT_MODEL)
+        self.max_tokens = int(max_tokens or os.getenv("LLM_MAX_TOKENS", DEFAULT_MAX_TOKENS))
+        self.temperature = float(
+            temperature if temperature is not None
+            else os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE)
+        )
+
+    def complete(self, messages, max_tokens=None, temperature=None):
+        """Return a Completion for a list of chat messages"""
+        raise NotImplementedError
+
+
+class GroqProvider(LLMProvider):
+    """Groq chat completions; the SDK is imported when the provider is built"""
+
+    name = "groq"
+
+    def __init__(self, api_key=None, **kwargs):
+        super().__init__(**kwargs)
+        api_key = api_key or os.getenv("GROQ_API_KEY", "")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY not found in environment variables")
+
+        from groq import Groq
+        self.client = Groq(api_key=api_key)
+
+    def complete(self, messages, max_tokens=None, temperature=None):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature if temperature is None else temperature,
+            max_tokens=max_tokens or self.max_tokens,
+        )
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+
+class StubProvider(LLMProvider):
+    """Deterministic offline provider for tests and benchmarks"""
+
+    name = "stub"
+
+    def __init__(self, latency_ms=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = float(
+            latency_ms if latency_ms is not None
+            else os.getenv("LLM_STUB_LATENCY_MS", 0)
+        ) / 1000.0
+
+    def complete(self, messages, max_tokens=None, temperature=None):
+        if self.latency:
+            time.sleep(self.latency)
+
+        question = messages[-1]["content"] if messages else ""
+        digest = hashlib.sha256(question.encode("utf-8")).hexdigest()[:12]
+        text = f"[stub:{self.model}] Advice {digest} for: {question[:200]}"
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        return Completion(text, prompt_tokens, len(text) // 4)
+
+
+PROVIDERS = {
+    "groq": GroqProvider,
+    "stub": StubProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def register_provider(name, factory):
+    """Make a provider class (or factory callable) selectable via LLM_PROVIDER"""
+    PROVIDERS[name] = factory
+
+
+def get_provider():
+    """Return the configured provider, constructing it on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                name = os.getenv("LLM_PROVIDER", "groq").lower()
+                if name not in PROVIDERS:
+                    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
+                _provider = PROVIDERS[name]()
+    return _provider
+
+
+def reset_provider():
+    """Drop the cached provider so the next call re-reads configuration"""
+    global _provider
+    with _provider_lock:
+        _provider = None
+
+
+def build_messages(question, context=None, system_prompt=SYSTEM_PROMPT):
+    """Build the chat message list for an expert question.
+
+    context is an optional pre-built block describing the user's search.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    if context:
+        messages.append({
+            "role": "system",
+            "content": "What this buyer has told us about their search:\n" + context,
+        })
+    messages.append({"role": "user", "content": question})
+    return messages
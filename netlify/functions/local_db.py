@@ -0,0 +1,56 @@
+"""
+Local SQLite executor that speaks the same result shape as the Turso HTTP API.
+
+make_executor(path) returns an execute_batch(statements) callable, so code
+written against utils.execute_batch can run on a local SQLite file (shared
+between gunicorn workers on one host, or for offline benchmarks).
+"""
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(path, timeout=30):
+    """Open a connection in WAL mode, suitable for several processes"""
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _connection(path):
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        conns[path] = connect(path)
+    return conns[path]
+
+
+def to_result(cursor):
+    """Convert a cursor into a Turso-style {"results": {...}} entry"""
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    return {
+        "results": {
+            "columns": columns,
+            "rows": [list(row) for row in cursor.fetchall()],
+        }
+    }
+
+
+def make_executor(path):
+    """Return execute_batch(statements) running in one transaction on path"""
+    def execute_batch(statements):
+        conn = _connection(path)
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                results.append(to_result(conn.execute(sql, params or [])))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+    return execute_batch
@@ -2,10 +2,12 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import execute_query, create_response, get_request_body, check_password_hash, SECRET_KEY
+from utils import execute_query, create_response, get_request_body, SECRET_KEY, timed
+from passwords import verify_password, hash_password, needs_rehash
 from datetime import datetime, timedelta
 import jwt
 
+@timed
 def handler(event, context):
     """Handle user login"""
     if event.get('httpMethod') == 'OPTIONS':
@@ -33,9 +35,16 @@ def handler(event, context):
         stored_username = user[1]
         password_hash = user[3]
 
-        if not check_password_hash(password_hash, password):
+        if not verify_password(password_hash, password):
             return create_response(401, {'error': 'Invalid username or password'})
 
+        # Upgrade hashes made with outdated method/cost parameters
+        if needs_rehash(password_hash):
+            execute_query(
+                "UPDATE user SET password_hash = ? WHERE id = ?",
+                [hash_password(password), user_id]
+            )
+
         token = jwt.encode(
             {
                 "user_id": user_id,
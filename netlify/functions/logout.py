@@ -0,0 +1,21 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import create_response, revoke_token, timed
+
+@timed
+def handler(event, context):
+    """Revoke the caller's token"""
+    if event.get('httpMethod') == 'OPTIONS':
+        return create_response(200, {})
+    
+    if event.get('httpMethod') != 'POST':
+        return create_response(405, {'error': 'Method not allowed'})
+    
+    try:
+        if not revoke_token(event):
+            return create_response(401, {'error': 'Invalid or expired token'})
+        return create_response(200, {'message': 'Logged out'})
+    except Exception as e:
+        return create_response(500, {'error': str(e)})
@@ -0,0 +1,246 @@
+"""
+Logging shared by app.py and the Netlify functions.
+
+Loggers from get_logger() hand records to a bounded queue; a listener
+thread formats and writes them, so request threads never wait on stdout.
+Payloads are wrapped in payload(): the request thread only takes a small,
+redacted snapshot (passwords and tokens masked, strings, lists and dicts
+cut to a few items) and the listener renders it.
+
+Sampling is decided once per request by begin_request(route), so a
+sampled request logs all of its lines and the rest log only warnings and
+errors. Netlify handlers call flush() before returning, because nothing may
+run once the invocation has ended.
+
+Configuration (environment variables):
+    LOG_LEVEL            DEBUG, INFO (default), WARNING or ERROR
+    LOG_FORMAT           text (default) or json (one object per line)
+    LOG_SAMPLE           fraction of requests whose info/debug lines are kept (default 1)
+    LOG_SAMPLE_<ROUTE>   per-route override, e.g. LOG_SAMPLE_ME_STATE=0.01
+    LOG_PAYLOAD_CHARS    longest string kept in a payload (default 200)
+    LOG_PAYLOAD_ITEMS    list items / dict keys kept in a payload (default 5)
+    LOG_QUEUE_SIZE       records buffered before new ones are dropped (default 10000)
+    LOG_ASYNC            0 to write on the calling thread (default 1)
+"""
+import os
+import sys
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT = "house_finder"
+LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+SAMPLE = float(os.getenv("LOG_SAMPLE", 1.0))
+PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", 200))
+PAYLOAD_ITEMS = int(os.getenv("LOG_PAYLOAD_ITEMS", 5))
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+
+REDACTED_KEYS = frozenset({
+    "password", "confirm_password", "password_hash", "token", "authorization",
+    "secret_key", "api_key", "groq_api_key", "turso_auth_token",
+})
+MAX_DEPTH = 4
+
+# (route, sampled) for the request being served on this thread/greenlet
+_request = contextvars.ContextVar("log_request", default=(None, True))
+
+_setup_lock = threading.Lock()
+_queue = None
+_listener = None
+dropped = 0
+
+
+# -------------------------
+# Payloads
+# -------------------------
+
+def redact(value, depth=0):
+    """Bounded copy of value with secrets masked and long parts cut"""
+    if isinstance(value, (str, bytes)):
+        if len(value) > PAYLOAD_CHARS:
+            return f"{value[:PAYLOAD_CHARS]!s}…(+{len(value) - PAYLOAD_CHARS} chars)"
+        return value
+    if depth >= MAX_DEPTH:
+        return "…"
+    if isinstance(value, dict):
+        out = {}
+        for i, (key, item) in enumerate(value.items()):
+            if i == PAYLOAD_ITEMS:
+                out["…"] = f"+{len(value) - PAYLOAD_ITEMS} more"
+                break
+            out[key] = "***" if str(key).lower() in REDACTED_KEYS else redact(item, depth + 1)
+        return out
+    if isinstance(value, (list, tuple)):
+        out = [redact(item, depth + 1) for item in value[:PAYLOAD_ITEMS]]
+        if len(value) > PAYLOAD_ITEMS:
+            out.append(f"… +{len(value) - PAYLOAD_ITEMS} more")
+        return out
+    return value
+
+
+class Payload:
+    """Lazily redacted log argument; see payload()"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return redact(self.value)
+
+    def __str__(self):
+        return str(self.snapshot())
+
+
+def payload(value):
+    """Wrap a request/response body or query result for logging"""
+    return Payload(value)
+
+
+# -------------------------
+# Requests and sampling
+# -------------------------
+
+def sample_rate(route):
+    if not route:
+        return SAMPLE
+    return float(os.getenv("LOG_SAMPLE_" + route.upper(), SAMPLE))
+
+
+def begin_request(route):
+    """Mark the start of a request; returns a token for end_request()"""
+    rate = sample_rate(route)
+    sampled = rate >= 1 or random.random() < rate
+    return _request.set((route, sampled))
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+class _RequestFilter(logging.Filter):
+    def filter(self, record):
+        route, sampled = _request.get()
+        record.route = route or "-"
+        return sampled or record.levelno >= logging.WARNING
+
+
+# -------------------------
+# Handlers
+# -------------------------
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        from responses import dumps
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "route": getattr(record, "route", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return dumps(entry).decode("utf-8")
+
+
+class _Enqueue(QueueHandler):
+    """QueueHandler that leaves formatting to the listener and never blocks"""
+
+    def prepare(self, record):
+        # Snapshot payloads now so later changes by the caller can't race the
+        # listener; rendering happens on the listener thread
+        if isinstance(record.args, tuple):
+            record.args = tuple(a.snapshot() if isinstance(a, Payload) else a for a in record.args)
+        elif isinstance(record.args, Payload):
+            record.args = record.args.snapshot()
+        if record.exc_info:
+            # Tracebacks keep whole frames alive; render them while they are valid
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
+
+
+def _output_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    if FORMAT == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(route)s] %(message)s"))
+    return handler
+
+
+def _start():
+    """Attach the handler to the root logger (again, in a forked child)"""
+    global _queue, _listener
+    root = logging.getLogger(ROOT)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(LEVEL)
+    root.propagate = False
+
+    if ASYNC:
+        _queue = queue.Queue(QUEUE_SIZE)
+        handler = _Enqueue(_queue)
+        _listener = QueueListener(_queue, _output_handler())
+        _listener.start()
+    else:
+        _queue = _listener = None
+        handler = _output_handler()
+    handler.addFilter(_RequestFilter())
+    root.addHandler(handler)
+
+
+def _setup():
+    if _listener is not None or logging.getLogger(ROOT).handlers:
+        return
+    with _setup_lock:
+        if _listener is None and not logging.getLogger(ROOT).handlers:
+            _start()
+            atexit.register(shutdown)
+            # The listener thread doesn't survive fork (gunicorn preload)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_start)
+
+
+def get_logger(name):
+    """Logger for a module, e.g. get_logger("scrape")"""
+    _setup()
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def flush(timeout=1.0):
+    """Wait (up to timeout seconds) until every queued record is written"""
+    if _queue is None:
+        return
+    deadline = time.monotonic() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            _queue.all_tasks_done.wait(remaining)
+
+
+def shutdown():
+    """Write what is queued and stop the listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
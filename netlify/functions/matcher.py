@@ -0,0 +1,448 @@
+"""
+Requirements matching: score listings against users' checklists.
+
+Each unchecked requirement is compiled once into
+    terms        normalised words that must all appear in the listing
+                 ("garden", "station"; plurals, "semi-detached" and a few
+                 synonyms such as driveway/garage -> parking are folded)
+    predicates   numeric ranges on a listing field: "2+ bedrooms" is
+                 bedrooms >= 2, "under £350k" is price <= 350000; a
+                 number is only a price with £, k/m or a money word
+                 ("budget", "price"), so "at least 2 bathrooms" and
+                 "under 10 minutes" are not
+A requirement with neither (only filler words) is ignored. Checked items are
+done, so they are not scored.
+
+An Index holds the compiled requirements of one or many users:
+    postings     term -> requirement ids
+    bounds       per field, requirements sorted by their lower bound, by
+                 their upper bound, and the few with both
+Matching a listing tokenises it once, walks the postings of its own terms
+and bisects each field's bounds, counting hits per requirement; a
+requirement is met when every term and predicate hit. The work is
+proportional to the listing's words and to the requirements it touches, not
+to the number of users, so one pass scores a listing for everyone.
+
+A user's score is met / scored requirements. A listing field that is
+missing (no bedrooms given) fails the predicates on it.
+
+Two paths use it:
+    - request handlers (GET /shortlist, /matches) score for the signed-in
+      user only, with a single-user index cached per user and keyed by a
+      fingerprint of the requirements list, so it is rebuilt only when the
+      list changes
+    - match_all() loads every user's requirements into one index and scores
+      a batch of scraped listings for all of them in one pass
+      (scripts/match_listings.py)
+
+Configuration (environment variables):
+    MATCHER_CACHE_SIZE    users whose compiled requirements are kept per process (default 1024)
+"""
+import os
+import re
+import json
+import bisect
+import hashlib
+import threading
+from collections import Counter, OrderedDict, namedtuple
+
+import shortlist_store
+import requirements_store
+from metrics import cache_lookup
+
+CACHE_SIZE = int(os.getenv("MATCHER_CACHE_SIZE", 1024))
+MAX_LISTINGS = 500
+
+# Listing fields that are never matched as text
+SKIP_FIELDS = frozenset({"id", "link", "url", "coordinates", "match", "lat", "lon"})
+NUMERIC_FIELDS = ("price", "bedrooms")
+
+Requirement = namedtuple("Requirement", ["user_id", "text", "terms", "predicates"])
+# field, inclusive bounds (None = open)
+Predicate = namedtuple("Predicate", ["field", "low", "high"])
+
+STOPWORDS = frozenset("""
+    a an the and or of to in on at for with within near nearby close by from
+    must should need needs want wants would like prefer preferably ideally
+    have has having good nice decent big large small some any plenty lots
+    is are be there it its my our we i own proper walking walk distance
+    minute minutes min mins house home property
+    over under above below least more less than up max maximum minimum
+    price prices priced budget cost costs asking guide mile km
+""".split())
+
+# Listing words folded onto the term a requirement is likely to use
+SYNONYMS = {
+    "apartment": "flat",
+    "maisonette": "flat",
+    "garage": "parking",
+    "driveway": "parking",
+    "carport": "parking",
+    "railway": "station",
+    "train": "station",
+    "tube": "station",
+    "underground": "station",
+    "yard": "garden",
+    "lawn": "garden",
+    "patio": "garden",
+    "ensuite": "bathroom",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_COMPOUNDS = [
+    (re.compile(r"\bsemi[\s-]+detached\b"), "semidetached"),
+    (re.compile(r"\ben[\s-]+suite\b"), "ensuite"),
+    (re.compile(r"\boff[\s-]+(?:street|road)\b"), "parking"),
+    (re.compile(r"\bsold\s+stc\b"), "soldstc"),
+]
+
+_LOWER = r"(?:at\s+least|min(?:imum)?\b|over|above|more\s+than|from)"
+_UPPER = r"(?:up\s+to|max(?:imum)?\b|under|below|less\s+than|no\s+more\s+than|budget(?:\s+of)?)"
+_BEDROOMS = re.compile(
+    rf"(?:(?P<low>{_LOWER})|(?P<high>{_UPPER}))?\s*(?P<n>\d{{1,2}})\s*(?P<plus>\+|or\s+more)?"
+    r"\s*(?:bed(?:room)?s?|br)\b(?:\s*(?P<after>(?:min(?:imum)?|max(?:imum)?)\b|or\s+more|or\s+less|or\s+fewer))?"
+)
+_BETWEEN = re.compile(
+    r"between\s*£?\s*(?P<a>\d[\d,.]*)\s*(?P<ua>k|m|million)?\s*(?:and|-|to)\s*£?\s*(?P<b>\d[\d,.]*)\s*(?P<ub>k|m|million)?"
+)
+_PRICE = re.compile(
+    rf"(?:(?P<low>{_LOWER})|(?P<high>{_UPPER}))?\s*(?P<pound>£)?\s*(?P<n>\d[\d,.]*)\s*(?P<unit>k|m|million)?\b"
+    r"(?:\s*(?P<after>(?:max(?:imum)?|min(?:imum)?)\b|or\s+less|or\s+more))?"
+)
+# A bound word and a number make a price only when the requirement is about money
+_PRICE_WORDS = re.compile(r"\b(?:prices?|priced|budget|costs?|spend|pay|afford|asking|offers?|guide)\b")
+# Sizes can't be checked against listing text either
+_AREA = re.compile(r"\b\d[\d,.]*\s*(?:sq(?:uare)?\.?\s*(?:m|ft|feet|foot|metres?|meters?)|m2|m²|ft2|sqm|sqft)(?!\w)")
+_AMOUNT = re.compile(r"\d[\d,]*(?:\.\d+)?")
+UNITS = {"k": 1_000, "m": 1_000_000, "million": 1_000_000}
+
+
+def _normalise(text):
+    text = (text or "").lower()
+    for pattern, replacement in _COMPOUNDS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _stem(word):
+    """Cheap plural folding: gardens -> garden, but not glass -> glas"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokens(text):
+    """Normalised, synonym-folded terms of a piece of listing text"""
+    out = set()
+    for word in _WORD.findall(_normalise(text)):
+        word = _stem(word)
+        out.add(word)
+        if word in SYNONYMS:
+            out.add(SYNONYMS[word])
+    return out
+
+
+def parse_amount(number, unit=None):
+    """'350' 'k' -> 350000, '1.2' 'm' -> 1200000, '£450,000' -> 450000; None when there's no number"""
+    match = _AMOUNT.search(number or "")
+    if not match:
+        return None
+    value = float(match.group().replace(",", ""))
+    return int(value * UNITS.get((unit or "").strip(), 1))
+
+
+def _bounds(match, value):
+    after = (match.group("after") or "").replace(" ", "")
+    if match.group("high") or after in ("max", "maximum", "orless", "orfewer"):
+        return None, value
+    return value, None
+
+
+def compile_requirement(text):
+    """(terms, predicates) for one requirement's text"""
+    text = _normalise(text)
+    predicates = []
+
+    for match in _BEDROOMS.finditer(text):
+        predicates.append(Predicate("bedrooms", *_bounds(match, int(match.group("n")))))
+    text = _BEDROOMS.sub(" ", text)
+
+    text = _AREA.sub(" ", text)
+    about_money = _PRICE_WORDS.search(text) is not None
+
+    def between(match):
+        if not ("£" in match.group() or match.group("ua") or match.group("ub") or about_money):
+            # "between 2 and 3 bathrooms": a count, not a price
+            return " "
+        low = parse_amount(match.group("a"), match.group("ua") or match.group("ub"))
+        high = parse_amount(match.group("b"), match.group("ub"))
+        predicates.append(Predicate("price", low, high))
+        return " "
+    text = _BETWEEN.sub(between, text)
+
+    def price(match):
+        # A price needs £, k/m or a bound word in a requirement about money;
+        # "at least 2 bathrooms" and "under 10 minutes" are not prices
+        bound = match.group("low") or match.group("high") or match.group("after")
+        if not (match.group("pound") or match.group("unit") or (bound and about_money)):
+            return " " if bound else match.group()
+        predicates.append(Predicate("price", *_bounds(match, parse_amount(match.group("n"), match.group("unit")))))
+        return " "
+    text = _PRICE.sub(price, text)
+
+    # Counts without a unit ("2 bathrooms") can't be checked against text
+    words = {_stem(word) for word in _WORD.findall(text) if not word.isdigit()} - STOPWORDS
+    return frozenset(SYNONYMS.get(word, word) for word in words), tuple(predicates)
+
+
+def compile_requirements(user_id, requirements):
+    """Requirements worth scoring from a user's checklist"""
+    compiled = []
+    for item in requirements or []:
+        if not isinstance(item, dict) or item.get("checked"):
+            continue
+        text = str(item.get("text") or "").strip()
+        terms, predicates = compile_requirement(text)
+        if terms or predicates:
+            compiled.append(Requirement(user_id, text, terms, predicates))
+    return compiled
+
+
+def listing_values(listing):
+    """(terms, {field: number}) of a shortlist item or scraped listing"""
+    text = " ".join(
+        str(value) for key, value in listing.items()
+        if key not in SKIP_FIELDS and isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    )
+    numbers = {}
+    for field in NUMERIC_FIELDS:
+        value = listing.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            numbers[field] = value
+        elif isinstance(value, str):
+            match = re.search(r"(\d[\d,.]*)\s*(k|m)?\b", value.lower())
+            if match:
+                numbers[field] = parse_amount(match.group(1), match.group(2))
+    return tokens(text), numbers
+
+
+def _sorted_bounds(entries):
+    single, counted = sorted(entries[0]), sorted(entries[1])
+    return ([b for b, _ in single], [rid for _, rid in single], [b for b, _ in counted], [rid for _, rid in counted])
+
+
+class Index:
+    """Inverted index over the compiled requirements of one or more users.
+
+    Requirements with a single term or predicate (most of them) are met by
+    one hit, so their postings are kept apart and taken whole; only the rest
+    need hits counted.
+    """
+
+    def __init__(self, requirements):
+        self.requirements = list(requirements)
+        self.need = [len(r.terms) + len(r.predicates) for r in self.requirements]
+        self.owner = [r.user_id for r in self.requirements]
+        self.per_user = {}
+        # term -> (single ids, counted ids)
+        self.postings = {}
+        lower, upper, self.ranges = {}, {}, {}
+        for rid, requirement in enumerate(self.requirements):
+            self.per_user.setdefault(requirement.user_id, []).append(rid)
+            single = self.need[rid] == 1
+            for term in requirement.terms:
+                self.postings.setdefault(term, ([], []))[0 if single else 1].append(rid)
+            for field, low, high in requirement.predicates:
+                if high is None:
+                    lower.setdefault(field, ([], []))[0 if single else 1].append((low, rid))
+                elif low is None:
+                    upper.setdefault(field, ([], []))[0 if single else 1].append((high, rid))
+                else:
+                    self.ranges.setdefault(field, []).append((low, high, rid, single))
+        # field -> (single keys, single ids, counted keys, counted ids), sorted by bound
+        self.lower = {field: _sorted_bounds(entries) for field, entries in lower.items()}
+        self.upper = {field: _sorted_bounds(entries) for field, entries in upper.items()}
+
+    def __bool__(self):
+        return bool(self.requirements)
+
+    def met(self, listing):
+        """Ids of the requirements a listing meets"""
+        terms, numbers = listing_values(listing)
+        met, hits = [], {}
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry:
+                met.extend(entry[0])
+                for rid in entry[1]:
+                    hits[rid] = hits.get(rid, 0) + 1
+        for field, value in numbers.items():
+            if value is None:
+                continue
+            if field in self.lower:
+                single_keys, single_ids, keys, ids = self.lower[field]
+                met.extend(single_ids[:bisect.bisect_right(single_keys, value)])
+                for rid in ids[:bisect.bisect_right(keys, value)]:
+                    hits[rid] = hits.get(rid, 0) + 1
+            if field in self.upper:
+                single_keys, single_ids, keys, ids = self.upper[field]
+                met.extend(single_ids[bisect.bisect_left(single_keys, value):])
+                for rid in ids[bisect.bisect_left(keys, value):]:
+                    hits[rid] = hits.get(rid, 0) + 1
+            for low, high, rid, single in self.ranges.get(field, ()):
+                if low <= value <= high:
+                    if single:
+                        met.append(rid)
+                    else:
+                        hits[rid] = hits.get(rid, 0) + 1
+        need = self.need
+        met.extend(rid for rid, count in hits.items() if count == need[rid])
+        return met
+
+    def match(self, listing):
+        """{user_id: met requirement ids} for every user meeting at least one requirement"""
+        users = {}
+        owner = self.owner
+        for rid in self.met(listing):
+            user_id = owner[rid]
+            if user_id in users:
+                users[user_id].append(rid)
+            else:
+                users[user_id] = [rid]
+        return users
+
+    def scores(self, listing):
+        """{user_id: score} for every user meeting at least one requirement"""
+        counts = Counter(map(self.owner.__getitem__, self.met(listing)))
+        return {user_id: count / len(self.per_user[user_id]) for user_id, count in counts.items()}
+
+    def result(self, user_id, met):
+        """Score and met/missing requirement texts of one user for one listing"""
+        ids = self.per_user.get(user_id, [])
+        met = set(met)
+        return {
+            "score": round(len(met) / len(ids), 3) if ids else None,
+            "matched": [self.requirements[rid].text for rid in ids if rid in met],
+            "missing": [self.requirements[rid].text for rid in ids if rid not in met],
+        }
+
+    def score(self, user_id, listing):
+        return self.result(user_id, self.match(listing).get(user_id, ()))
+
+
+def build_index(requirements_by_user):
+    """Index over {user_id: requirements list}"""
+    compiled = []
+    for user_id, requirements in requirements_by_user.items():
+        compiled.extend(compile_requirements(user_id, requirements))
+    return Index(compiled)
+
+
+class MatcherCache:
+    """Per-user LRU of single-user indexes, keyed by a fingerprint of the requirements"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, fingerprint):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, fingerprint, index):
+        with self._lock:
+            self._entries[user_id] = (fingerprint, index)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+matcher_cache = MatcherCache()
+
+
+def user_index(user_id, requirements):
+    """The user's (cached) index"""
+    fingerprint = hashlib.sha1(
+        json.dumps(requirements, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    index = matcher_cache.get(user_id, fingerprint)
+    cache_lookup("matcher", index is not None)
+    if index is None:
+        index = build_index({user_id: requirements})
+        matcher_cache.set(user_id, fingerprint, index)
+    return index
+
+
+def annotate(items, user_id, requirements):
+    """Add a "match" result to every item; nothing when no requirement can be scored"""
+    index = user_index(user_id, requirements)
+    if index:
+        for item in items:
+            item["match"] = index.score(user_id, item)
+    return items
+
+
+def score_listings(listings, user_id, requirements):
+    """/matches body: each listing's match, best first"""
+    if not isinstance(listings, list):
+        raise ValueError("listings must be a list")
+    if len(listings) > MAX_LISTINGS:
+        raise ValueError(f"At most {MAX_LISTINGS} listings per request")
+    index = user_index(user_id, requirements)
+    scored = []
+    for position, listing in enumerate(listings):
+        if not isinstance(listing, dict):
+            continue
+        result = index.score(user_id, listing) if index else {"score": None, "matched": [], "missing": []}
+        scored.append({"id": listing.get("id", position), **result})
+    scored.sort(key=lambda entry: -(entry["score"] or 0))
+    return {"requirements": len(index.requirements), "matches": scored}
+
+
+def _load(execute_batch, user_id, requirements=None):
+    """(shortlist items, requirements) in one round trip; known requirements aren't re-read"""
+    statements = shortlist_store.select_statements(user_id)
+    if requirements is None:
+        statements += requirements_store.select_statements(user_id)
+    results = execute_batch(statements)
+    items = shortlist_store.load_items(execute_batch, user_id, results[:2])
+    if requirements is None:
+        requirements = requirements_store.load_requirements(execute_batch, user_id, results[2:])
+    return items, requirements
+
+
+def load_scored_items(execute_batch, user_id, requirements=None):
+    """The user's shortlist with each item's "match" (GET /shortlist)"""
+    items, requirements = _load(execute_batch, user_id, requirements)
+    return annotate(items, user_id, requirements)
+
+
+def match_all(execute_batch, listings, min_score=0.0):
+    """[{"id", "users": {user_id: score}}] for scraped listings, scored for every user in one pass"""
+    index = build_index(dict(requirements_store.iter_all_requirements(execute_batch)))
+    matches = []
+    for position, listing in enumerate(listings):
+        if not isinstance(listing, dict):
+            continue
+        users = {user_id: round(score, 3) for user_id, score in index.scores(listing).items()
+                 if score >= min_score} if index else {}
+        matches.append({"id": listing.get("id", listing.get("link", position)), "users": users})
+    return matches
+
+
+def load_matches(execute_batch, user_id, listings=None, requirements=None):
+    """/matches body for the given listings, or for the user's shortlist when there are none"""
+    if listings is None:
+        listings, requirements = _load(execute_batch, user_id, requirements)
+    elif requirements is None:
+        requirements = requirements_store.load_requirements(execute_batch, user_id)
+    return score_listings(listings, user_id, requirements)
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import execute_batch, create_response, get_request_body, require_auth, compressed, timed
+from matcher import load_matches
+from logs import get_logger
+
+log = get_logger("matches")
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
+    """Score the shortlist (GET) or posted listings (POST {"listings": [...]}) against the user's requirements"""
+    user_id = user_data.get("user_id")
+    method = event.get('httpMethod')
+    if method not in ('GET', 'POST'):
+        return create_response(405, {'error': 'Method not allowed'})
+
+    try:
+        body = get_request_body(event) if method == 'POST' else {}
+        listings = body.get('listings') if isinstance(body, dict) else None
+        if method == 'POST' and listings is None:
+            return create_response(400, {'error': 'Missing listings'})
+        return create_response(200, load_matches(execute_batch, user_id, listings))
+    except ValueError as e:
+        return create_response(400, {'error': str(e)})
+    except Exception as e:
+        log.exception("❌ Error scoring listings: %s", e)
+        return create_response(500, {'error': 'Failed to score listings'})
@@ -0,0 +1,28 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import execute_batch, create_response, require_auth, compressed, timed
+from user_state import load_state, state_etag, etag_matches, CACHE_HEADERS
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
+    """History page, requirements and shortlist in one batched read"""
+    if event.get('httpMethod') != 'GET':
+        return create_response(405, {'error': 'Method not allowed'})
+
+    try:
+        state = load_state(execute_batch, user_data)
+
+        headers = dict(CACHE_HEADERS, ETag=state_etag(state))
+        request_headers = event.get('headers') or {}
+        if_none_match = request_headers.get('if-none-match') or request_headers.get('If-None-Match')
+        if etag_matches(if_none_match, headers['ETag']):
+            response = create_response(304, None, headers)
+            response['body'] = ''
+            return response
+        return create_response(200, state, headers)
+    except Exception as e:
+        return create_response(500, {'error': str(e)})
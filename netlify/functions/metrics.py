@@ -0,0 +1,451 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters and fixed-bucket histograms keep one small object per label set;
+an update takes that series' own lock, so requests on different routes
+don't contend. Values are plain numbers, so a snapshot is JSON and
+snapshots from several processes can be summed:
+
+- app.py serves /metrics. Under gunicorn each worker writes its snapshot to
+  METRICS_DIR every METRICS_WRITE_INTERVAL seconds, and a scrape merges
+  every file in the directory (gunicorn.conf.py sets it up). A worker that
+  exits (or died without exiting cleanly) is folded into one "retired"
+  aggregate, so totals never go down and recycled workers don't leave a
+  file each behind.
+- Netlify functions can't be scraped. With METRICS_PUSH set, utils.timed
+  pushes the container's totals at the end of each invocation: "log"
+  writes them as one JSON log line, a URL PUTs the text format to a
+  Prometheus Pushgateway under this container's instance id.
+
+Configuration (environment variables):
+    METRICS_DIR              directory shared by the workers of one server
+    METRICS_WRITE_INTERVAL   seconds between snapshot writes (default 5)
+    METRICS_PUSH             "log" or a Pushgateway base URL (Netlify; default off)
+"""
+import os
+import re
+import json
+import time
+import uuid
+import bisect
+import atexit
+import threading
+import functools
+from logs import get_logger
+
+log = get_logger("metrics")
+
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+WRITE_INTERVAL = float(os.getenv("METRICS_WRITE_INTERVAL", 5))
+PUSH = os.getenv("METRICS_PUSH", "")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+class _CounterSeries:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def snapshot(self):
+        return self.value
+
+
+class _HistogramSeries:
+    __slots__ = ("lock", "counts", "sum")
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        # Per-bucket (not cumulative) counts; the last one is +Inf
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+
+    def snapshot(self):
+        return [list(self.counts), self.sum]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            REGISTRY[name] = self
+
+    def _get(self, labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new())
+        return series
+
+    def snapshot(self):
+        entry = {"type": self.kind, "help": self.help, "labels": list(self.labelnames)}
+        with self._lock:
+            items = list(self._series.items())
+        entry["series"] = [[list(key), series.snapshot()] for key, series in items]
+        return entry
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new(self):
+        return _CounterSeries()
+
+    def inc(self, amount=1, **labels):
+        series = self._get(labels)
+        with series.lock:
+            series.value += amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new(self):
+        return _HistogramSeries(len(self.buckets))
+
+    def observe(self, value, **labels):
+        series = self._get(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with series.lock:
+            series.counts[index] += 1
+            series.sum += value
+
+    def snapshot(self):
+        entry = super().snapshot()
+        entry["buckets"] = list(self.buckets)
+        return entry
+
+
+# -------------------------
+# Metrics
+# -------------------------
+
+REQUESTS = Counter("http_requests_total", "Requests served", ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency", ("route",))
+TURSO_STATEMENTS = Counter("turso_statements_total", "Statements sent to Turso", ("query",))
+TURSO_SECONDS = Histogram("turso_batch_duration_seconds",
+                          "Turso round trip latency, by the batch's first statement", ("query",))
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Outbound calls", ("upstream", "outcome"))
+UPSTREAM_SECONDS = Histogram("upstream_request_duration_seconds", "Outbound call latency", ("upstream",))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used", ("kind",))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ("cache", "result"))
+
+
+def observe_request(route, method, status, seconds):
+    REQUESTS.inc(route=route, method=method, status=status)
+    REQUEST_SECONDS.observe(seconds, route=route)
+
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+"?(\w+)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=512)
+def query_name(sql):
+    """Short label for a statement, e.g. select_user_history"""
+    words = sql.split(None, 1)
+    if not words:
+        return "empty"
+    verb = words[0].lower()
+    match = _TABLE.search(sql)
+    return f"{verb}_{match.group(1).lower()}" if match else verb
+
+
+def observe_batch(statements, seconds):
+    names = [query_name(sql) for sql, _ in statements]
+    for name in names:
+        TURSO_STATEMENTS.inc(query=name)
+    TURSO_SECONDS.observe(seconds, query=names[0] if names else "empty")
+
+
+class upstream:
+    """Context manager timing an outbound call; set .status to the HTTP status.
+
+        with metrics.upstream("portal") as call:
+            response = session.get(url)
+            call.status = response.status_code
+    """
+    __slots__ = ("name", "status", "started")
+
+    def __init__(self, name):
+        self.name = name
+        self.status = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_SECONDS.observe(time.perf_counter() - self.started, upstream=self.name)
+        failed = exc_type is not None or (self.status is not None and self.status >= 400)
+        UPSTREAM_REQUESTS.inc(upstream=self.name, outcome="error" if failed else "ok")
+        return False
+
+
+def observe_tokens(prompt_tokens, completion_tokens):
+    LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# -------------------------
+# Snapshots and exposition
+# -------------------------
+
+def snapshot():
+    """This process's metrics as a JSON-serialisable dict"""
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
+
+
+def merge(snapshots):
+    """Sum snapshots from several processes"""
+    merged = {}
+    for snap in snapshots:
+        for name, entry in snap.items():
+            target = merged.setdefault(name, dict(entry, series={}))
+            for key, value in entry["series"]:
+                key = tuple(key)
+                old = target["series"].get(key)
+                if old is None:
+                    target["series"][key] = json.loads(json.dumps(value))
+                elif entry["type"] == "histogram":
+                    old[0] = [a + b for a, b in zip(old[0], value[0])]
+                    old[1] += value[1]
+                else:
+                    target["series"][key] = old + value
+    for entry in merged.values():
+        entry["series"] = [[list(key), value] for key, value in entry["series"].items()]
+    return merged
+
+
+def _labels(names, values, extra=None):
+    pairs = [(n, v) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(snap):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, entry in sorted(snap.items()):
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for key, value in sorted(entry["series"], key=lambda s: s[0]):
+            if entry["type"] == "histogram":
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(list(entry["buckets"]) + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(entry['labels'], key, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(entry['labels'], key)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(entry['labels'], key)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(entry['labels'], key)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Multiprocess (gunicorn)
+# -------------------------
+
+_snapshot_file = None
+_snapshot_pid = None
+_writer = None
+
+
+def write_snapshot():
+    """Write this process's snapshot to METRICS_DIR (atomically)"""
+    if not METRICS_DIR or _snapshot_file is None:
+        return
+    tmp = _snapshot_file + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, _snapshot_file)
+    except OSError as e:
+        log.warning("⚠️ Could not write metrics snapshot %s: %s", _snapshot_file, e)
+
+
+def _write_loop(stop):
+    while not stop.wait(WRITE_INTERVAL):
+        write_snapshot()
+
+
+def start_worker():
+    """Start writing snapshots for this process (call after fork)"""
+    global _snapshot_file, _snapshot_pid, _writer
+    if not METRICS_DIR:
+        return
+    if _writer is not None:
+        _writer.set()
+    if _snapshot_pid is not None and _snapshot_pid != os.getpid():
+        # Forked from a process with its own file: start from zero so the
+        # parent's counts aren't summed twice
+        with _registry_lock:
+            for metric in REGISTRY.values():
+                with metric._lock:
+                    metric._series.clear()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _snapshot_pid = os.getpid()
+    # Recycled workers leave their final totals behind, so names never repeat
+    _snapshot_file = os.path.join(METRICS_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+    _writer = threading.Event()
+    threading.Thread(target=_write_loop, args=(_writer,), daemon=True).start()
+
+
+RETIRED_FILE = "retired.agg"
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Missing, or being replaced right now
+        return None
+
+
+def _read_retired():
+    retired = _read_json(os.path.join(METRICS_DIR, RETIRED_FILE))
+    return retired or {"folded": [], "metrics": {}}
+
+
+def _alive(filename):
+    try:
+        os.kill(int(filename.split("-", 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, OSError):
+        pass
+    return True
+
+
+def _fold(filenames):
+    """Add snapshot files to the retired aggregate, then delete them.
+
+    The aggregate lists the files it holds and collect() skips those, so a
+    scrape between the two steps doesn't count them twice.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return
+    with open(os.path.join(METRICS_DIR, "retired.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired = _read_retired()
+        present = set(os.listdir(METRICS_DIR))
+        folded = [name for name in retired["folded"] if name in present]
+        snapshots = [retired["metrics"]]
+        for filename in filenames:
+            if filename in folded:
+                continue
+            snap = _read_json(os.path.join(METRICS_DIR, filename))
+            if snap is not None:
+                snapshots.append(snap)
+                folded.append(filename)
+        path = os.path.join(METRICS_DIR, RETIRED_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"folded": folded, "metrics": merge(snapshots)}, f)
+        os.replace(path + ".tmp", path)
+    for filename in folded:
+        try:
+            os.remove(os.path.join(METRICS_DIR, filename))
+        except OSError:
+            pass
+
+
+def stop_worker():
+    """Final snapshot of this process, folded into the retired aggregate"""
+    global _snapshot_file
+    if _writer is not None:
+        _writer.set()
+    if _snapshot_file is None:
+        return
+    write_snapshot()
+    try:
+        _fold([os.path.basename(_snapshot_file)])
+    except OSError as e:
+        log.warning("⚠️ Could not retire metrics snapshot %s: %s", _snapshot_file, e)
+    _snapshot_file = None
+
+
+def collect():
+    """Text exposition of every worker's metrics (or just this process's)"""
+    if not METRICS_DIR:
+        return render(snapshot())
+    write_snapshot()
+    filenames = [name for name in os.listdir(METRICS_DIR) if name.endswith(".json")]
+    dead = [name for name in filenames if not _alive(name)]
+    if dead:
+        # Killed without running stop_worker (e.g. a timed-out worker)
+        try:
+            _fold(dead)
+        except OSError as e:
+            log.warning("⚠️ Could not retire metrics snapshots: %s", e)
+    retired = _read_retired()
+    skip = set(retired["folded"])
+    snapshots = [retired["metrics"]]
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith(".json") or filename in skip:
+            continue
+        snap = _read_json(os.path.join(METRICS_DIR, filename))
+        if snap is not None:
+            snapshots.append(snap)
+    return render(merge(snapshots))
+
+
+atexit.register(stop_worker)
+
+
+# -------------------------
+# Push mode (Netlify)
+# -------------------------
+
+INSTANCE = uuid.uuid4().hex[:12]
+
+
+def push():
+    """Publish this container's totals (METRICS_PUSH); no-op when unset"""
+    if not PUSH:
+        return
+    if PUSH == "log":
+        from responses import dumps
+        log.info("📈 %s", dumps({"instance": INSTANCE, "metrics": snapshot()}).decode("utf-8"))
+        return
+
+    import urllib.request
+    url = f"{PUSH.rstrip('/')}/metrics/job/house_finder/instance/{INSTANCE}"
+    request = urllib.request.Request(url, data=render(snapshot()).encode("utf-8"), method="PUT",
+                                     headers={"Content-Type": "text/plain; version=0.0.4"})
+    try:
+        urllib.request.urlopen(request, timeout=2).close()
+    except Exception as e:
+        log.warning("⚠️ Metrics push to %s failed: %s", PUSH, e)
@@ -0,0 +1,113 @@
+"""
+Versioned schema migrations.
+
+Migrations are the numbered SQL files in migrations/ (NNNN_name.sql),
+applied in order. Each one runs as a single batch together with the
+INSERT that records it in schema_version, so it is applied entirely or
+not at all. Two runners racing on the same version collide on the
+schema_version primary key and the loser's batch rolls back.
+
+Checking whether the schema is current is one round trip (see
+schema_status), which is all a server does at startup. Applying
+migrations is an explicit step: python scripts/migrate.py
+"""
+import os
+import re
+import time
+from collections import namedtuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+VERSION_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at REAL NOT NULL
+    )
+"""
+
+Migration = namedtuple("Migration", ["version", "name", "statements"])
+Status = namedtuple("Status", ["current", "latest", "pending"])
+
+FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def split_statements(sql):
+    """Split a migration file into statements, dropping -- comments"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [s.strip() for s in "\n".join(lines).split(";") if s.strip()]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """All migrations in directory, ordered by version"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            statements = split_statements(f.read())
+        migrations.append(Migration(int(match.group(1)), match.group(2), statements))
+    migrations.sort(key=lambda m: m.version)
+
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _check(results):
+    """Raise on a Turso error response (local executors raise by themselves)"""
+    if isinstance(results, dict):
+        raise MigrationError(results.get("error") or results)
+    for result in results:
+        if isinstance(result, dict) and result.get("error"):
+            raise MigrationError(result["error"])
+    return results
+
+
+def current_version(execute_batch):
+    """Highest applied version (0 for a new database), in one round trip"""
+    results = _check(execute_batch([
+        (VERSION_TABLE_SQL, []),
+        ("SELECT COALESCE(MAX(version), 0) FROM schema_version", []),
+    ]))
+    rows = results[1].get("results", {}).get("rows", [])
+    return int(rows[0][0]) if rows else 0
+
+
+def schema_status(execute_batch, migrations=None):
+    migrations = load_migrations() if migrations is None else migrations
+    current = current_version(execute_batch)
+    pending = [m for m in migrations if m.version > current]
+    latest = migrations[-1].version if migrations else 0
+    return Status(current, latest, pending)
+
+
+def apply_migration(execute_batch, migration):
+    """Apply one migration and record it, as a single batch"""
+    statements = [(sql, []) for sql in migration.statements]
+    statements.append((
+        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+        [migration.version, migration.name, time.time()]
+    ))
+    _check(execute_batch(statements))
+
+
+def migrate(execute_batch, migrations=None, log=print):
+    """Apply every pending migration in order; returns the new version"""
+    status = schema_status(execute_batch, migrations)
+    if not status.pending:
+        log(f"✅ Schema is current (version {status.current})")
+        return status.current
+
+    for migration in status.pending:
+        started = time.perf_counter()
+        apply_migration(execute_batch, migration)
+        log(f"✅ Applied {migration.version:04d}_{migration.name} "
+            f"({len(migration.statements)} statements, {(time.perf_counter() - started) * 1000:.0f} ms)")
+    return status.pending[-1].version
@@ -0,0 +1,10 @@
+-- One row per shortlisted property (replaces the user_shortlist blob)
+CREATE TABLE IF NOT EXISTS user_shortlist_item (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_shortlist_item_user ON user_shortlist_item(user_id, position);
@@ -0,0 +1,5 @@
+-- Revoked (logged-out) tokens, kept until they would have expired
+CREATE TABLE IF NOT EXISTS revoked_token (
+    token_hash TEXT PRIMARY KEY,
+    expires_at INTEGER NOT NULL
+);
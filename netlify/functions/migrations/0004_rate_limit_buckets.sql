@@ -0,0 +1,6 @@
+-- Token buckets for rate limiting when RATE_LIMIT_STORE=turso
+CREATE TABLE IF NOT EXISTS rate_limit_bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
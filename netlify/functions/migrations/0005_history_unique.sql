@@ -0,0 +1,6 @@
+-- One history row per user, URL and day, so imports and scrapes can upsert.
+-- Older check-then-insert scrapes could race and leave duplicates; keep the newest.
+DELETE FROM user_history
+WHERE id NOT IN (SELECT MAX(id) FROM user_history GROUP BY user_id, url, date);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_history_unique ON user_history(user_id, url, date);
@@ -0,0 +1,22 @@
+-- Weekly and monthly aggregates of history rows older than the retention
+-- window (see history_rollup.py). A week belongs to the month its Monday is in.
+CREATE TABLE IF NOT EXISTS user_history_rollup (
+    user_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    period TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    min_count INTEGER NOT NULL,
+    max_count INTEGER NOT NULL,
+    avg_count REAL NOT NULL,
+    last_date TEXT NOT NULL,
+    last_results TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, url, period, period_start)
+);
+
+-- Daily rows and rollups in one shape; a rollup reads as its last observation
+CREATE VIEW IF NOT EXISTS user_history_merged AS
+    SELECT user_id, url, date, results, created_at FROM user_history
+    UNION ALL
+    SELECT user_id, url, last_date, last_results, updated_at FROM user_history_rollup;
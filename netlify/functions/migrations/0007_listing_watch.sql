@@ -0,0 +1,30 @@
+-- Shortlisted listing pages re-fetched by price_watch.py: one row per
+-- distinct link, whoever shortlisted it, with its validators and last state
+CREATE TABLE IF NOT EXISTS listing_watch (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    price INTEGER,
+    status TEXT,
+    checked_at REAL,
+    next_check REAL NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_watch_due ON listing_watch(next_check);
+
+-- Only observed changes of price or status; the first observation is the baseline
+CREATE TABLE IF NOT EXISTS listing_price_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    old_price INTEGER,
+    price INTEGER,
+    old_status TEXT,
+    status TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_price_history_url ON listing_price_history(url, observed_at);
+
+-- Lets the watcher collect distinct links and a user's links without reading item JSON
+CREATE INDEX IF NOT EXISTS idx_shortlist_item_link ON user_shortlist_item(json_extract(data, '$.link'));
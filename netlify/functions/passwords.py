@@ -0,0 +1,126 @@
+"""
+Password hashing off the request thread.
+
+scrypt/pbkdf2 are deliberately CPU-heavy and hold the GIL, so a burst of
+logins hashed inline stalls every other route in the process. Hashes are
+computed in a small, bounded process pool instead. When a pool cannot be
+used (PASSWORD_HASH_WORKERS=0, or platforms such as AWS Lambda that lack
+the shared memory multiprocessing needs) hashing falls back to inline.
+
+Configuration (environment variables):
+    PASSWORD_HASH_METHOD    Werkzeug method string, e.g. "scrypt:32768:8:1"
+                            or "pbkdf2:sha256:600000" (default: scrypt)
+    PASSWORD_HASH_WORKERS   pool size; 0 hashes inline (default: min(4, CPUs),
+                            inline on Lambda/Netlify)
+    PASSWORD_HASH_QUEUE     max hashes in flight per worker (default 8)
+    PASSWORD_HASH_TIMEOUT   seconds to wait for a pool slot/result (default 10)
+"""
+import os
+import threading
+from tracing import span
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def _hash(password, method):
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password, method=method)
+
+
+def _check(stored_hash, password):
+    from werkzeug.security import check_password_hash
+    return check_password_hash(stored_hash, password)
+
+
+def canonical_method(method):
+    """Expand shorthand methods ("scrypt", "pbkdf2") to the prefix Werkzeug stores"""
+    parts = method.split(":")
+    if parts[0] == "scrypt":
+        defaults = ["scrypt", "32768", "8", "1"]
+    elif parts[0] == "pbkdf2":
+        from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+        defaults = ["pbkdf2", "sha256", str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ":".join(parts + defaults[len(parts):])
+
+
+def configured_method():
+    return canonical_method(os.getenv("PASSWORD_HASH_METHOD", DEFAULT_METHOD))
+
+
+def _worker_count():
+    configured = os.getenv("PASSWORD_HASH_WORKERS")
+    if configured is not None:
+        return int(configured)
+    if os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        return 0
+    return min(4, os.cpu_count() or 1)
+
+
+def _get_pool():
+    """Create the process pool on first use; None means hash inline"""
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = _worker_count()
+                if workers <= 0:
+                    _pool = False
+                else:
+                    try:
+                        from concurrent.futures import ProcessPoolExecutor
+                        _pool = ProcessPoolExecutor(max_workers=workers)
+                        queue = int(os.getenv("PASSWORD_HASH_QUEUE", 8))
+                        _pool_slots = threading.BoundedSemaphore(workers * queue)
+                    except (OSError, NotImplementedError, ImportError):
+                        _pool = False
+    return _pool or None
+
+
+def _run(fn, *args):
+    with span("hash"):
+        return _run_in_pool(fn, *args)
+
+
+def _run_in_pool(fn, *args):
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+
+    timeout = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+    if not _pool_slots.acquire(timeout=timeout):
+        raise RuntimeError("Password hashing queue is full")
+    try:
+        return pool.submit(fn, *args).result(timeout=timeout)
+    finally:
+        _pool_slots.release()
+
+
+def hash_password(password, method=None):
+    """Hash a password with the configured (or given) method"""
+    return _run(_hash, password, method or configured_method())
+
+
+def verify_password(stored_hash, password):
+    """Check a password against a stored Werkzeug hash"""
+    return _run(_check, stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """True when a stored hash was made with different method/cost parameters"""
+    return stored_hash.split("$", 1)[0] != configured_method()
+
+
+def shutdown_pool():
+    """Stop the worker processes (on shutdown, or after fork in a child)"""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_slots = None
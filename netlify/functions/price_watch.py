@@ -0,0 +1,380 @@
+"""
+Price watch: re-fetch shortlisted listing pages and record price/status changes.
+
+Work scales with distinct listings, not with users x shortlist size:
+
+- sync_listings() copies every distinct shortlisted link into listing_watch
+  (one INSERT ... SELECT DISTINCT over the link index) and drops links nobody
+  shortlists any more, so a listing saved by fifty users is fetched once.
+- run_cycle() takes the listings that are due, a page of WATCH_BATCH at a
+  time, and fetches them with conditional requests (If-None-Match /
+  If-Modified-Since from the last response). A 304 costs a round trip and
+  no body. Fetches run in a bounded pool of WATCH_CONCURRENCY threads with
+  at most WATCH_PER_HOST in flight per host; a host's queue waits for a free
+  slot instead of occupying pool threads.
+- A 200 body is not parsed as HTML: extract() runs a few targeted patterns
+  (the portal's embedded page model, og/product meta tags, schema.org
+  offers) over at most WATCH_MAX_BYTES of the raw page.
+- Each page's results are written in one batch: a multi-row UPSERT of the
+  listings' new validators and schedule, plus a listing_price_history row
+  only where price or status differs from the last observation. The first
+  observation of a listing is its baseline and records nothing.
+
+Failed fetches back off exponentially (up to a day) without touching the
+stored price. A 404 or 410 marks the listing "removed".
+
+A run stops after WATCH_MAX_RUN seconds, and as soon as a page brings back a
+listing it has already checked (its write did not take), rather than
+fetching the same listings again.
+
+changed_since() answers "what moved since I last looked" for one user by
+joining the history against the links in their shortlist.
+
+Configuration (environment variables):
+    WATCH_INTERVAL       seconds between checks of one listing (default 21600)
+    WATCH_CONCURRENCY    fetches in flight in total (default 8)
+    WATCH_PER_HOST       fetches in flight per host (default 2)
+    WATCH_TIMEOUT        seconds per fetch (default 15)
+    WATCH_BATCH          listings per page of work (default 100)
+    WATCH_MAX_BYTES      bytes of a listing page read for extraction (default 2000000)
+    WATCH_MAX_RUN        seconds one run_cycle() keeps taking new pages (default 3600)
+"""
+import os
+import re
+import time
+import random
+import functools
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import metrics
+from logs import get_logger
+
+log = get_logger("price_watch")
+
+INTERVAL = float(os.getenv("WATCH_INTERVAL", 6 * 3600))
+CONCURRENCY = int(os.getenv("WATCH_CONCURRENCY", 8))
+PER_HOST = int(os.getenv("WATCH_PER_HOST", 2))
+TIMEOUT = float(os.getenv("WATCH_TIMEOUT", 15))
+BATCH = int(os.getenv("WATCH_BATCH", 100))
+MAX_BYTES = int(os.getenv("WATCH_MAX_BYTES", 2_000_000))
+MAX_RUN = float(os.getenv("WATCH_MAX_RUN", 3600))
+
+MAX_BACKOFF = 24 * 3600
+# Spread checks of listings added together over time
+JITTER = 0.1
+CHANGES_LIMIT = 500
+
+# Listing state after one check; price/status None means "unknown, keep the stored value"
+Outcome = namedtuple("Outcome", ["url", "http_status", "etag", "last_modified", "price", "status", "error"])
+Cycle = namedtuple("Cycle", ["checked", "not_modified", "changed", "failed"])
+
+_LINK = "json_extract(data, '$.link')"
+# Items flagged as another item's duplicate are not watched separately
+_KEPT = "json_extract(data, '$.duplicate_of') IS NULL"
+SYNC_SQL = [
+    (f"INSERT OR IGNORE INTO listing_watch (url) SELECT DISTINCT {_LINK} FROM user_shortlist_item "
+     f"WHERE {_LINK} LIKE 'http%' AND {_KEPT}", []),
+    (f"DELETE FROM listing_watch WHERE url NOT IN "
+     f"(SELECT {_LINK} FROM user_shortlist_item WHERE {_LINK} IS NOT NULL AND {_KEPT})", []),
+]
+DUE_SQL = ("SELECT url, etag, last_modified, price, status, failures FROM listing_watch "
+           "WHERE next_check <= ? ORDER BY next_check LIMIT ?")
+HISTORY_SQL = ("INSERT INTO listing_price_history (url, observed_at, old_price, price, old_status, status) "
+               "VALUES (?, ?, ?, ?, ?, ?)")
+CHANGES_SQL = ("SELECT id, url, observed_at, old_price, price, old_status, status FROM listing_price_history "
+               f"WHERE observed_at > ? AND url IN (SELECT {_LINK} FROM user_shortlist_item WHERE user_id = ?) "
+               "ORDER BY observed_at, id LIMIT ?")
+CHANGES_ALL_SQL = ("SELECT id, url, observed_at, old_price, price, old_status, status FROM listing_price_history "
+                   "WHERE observed_at > ? ORDER BY observed_at, id LIMIT ?")
+
+COLUMNS = 8
+
+# -------------------------
+# Extraction
+# -------------------------
+
+_PRICE_PATTERNS = [
+    # Rightmove's embedded page model
+    re.compile(rb'"primaryPrice"\s*:\s*"([^"]{1,40})"'),
+    re.compile(rb'<meta[^>]+property="(?:og|product):price:amount"[^>]+content="([^"]{1,40})"', re.IGNORECASE),
+    # schema.org Offer in JSON-LD
+    re.compile(rb'"@type"\s*:\s*"Offer"[^}]{0,400}?"price"\s*:\s*"?([\d.,]{1,20})'),
+]
+_DISPLAY_STATUS = re.compile(rb'"displayStatus"\s*:\s*"([^"]{0,40})"')
+_ARCHIVED = re.compile(rb'"archived"\s*:\s*true')
+_AVAILABILITY = re.compile(rb'"availability"\s*:\s*"(?:https?://schema\.org/)?(\w+)"')
+_DIGITS = re.compile(r"\d[\d,]*")
+_ESCAPES = re.compile(r"\\u[0-9a-fA-F]{4}|&#?\w+;")
+
+STATUSES = {
+    "under offer": "under_offer",
+    "sold stc": "sold_stc",
+    "sold subject to contract": "sold_stc",
+    "sold": "sold",
+    "let agreed": "let_agreed",
+    "reserved": "under_offer",
+}
+# schema.org ItemAvailability; anything else reads as "removed"
+AVAILABILITY = {
+    b"InStock": "available",
+    b"InStoreOnly": "available",
+    b"OnlineOnly": "available",
+    b"LimitedAvailability": "available",
+    b"PreOrder": "under_offer",
+    b"SoldOut": "sold",
+}
+
+
+def parse_price(text):
+    """'£450,000' -> 450000; None when there is no amount"""
+    # Drop the currency sign whether it is raw, a JSON escape or an HTML entity
+    match = _DIGITS.search(_ESCAPES.sub("", text or ""))
+    return int(match.group().replace(",", "")) if match else None
+
+
+def extract(body):
+    """(price, status) from a listing page's raw bytes; either may be None"""
+    price = None
+    for pattern in _PRICE_PATTERNS:
+        match = pattern.search(body)
+        if match:
+            price = parse_price(match.group(1).decode("utf-8", "replace"))
+            if price is not None:
+                break
+
+    status = None
+    match = _DISPLAY_STATUS.search(body)
+    if match:
+        status = STATUSES.get(match.group(1).decode("utf-8", "replace").strip().lower(), "available")
+    if _ARCHIVED.search(body):
+        status = "removed"
+    elif status is None:
+        match = _AVAILABILITY.search(body)
+        if match:
+            status = AVAILABILITY.get(match.group(1), "removed")
+        elif price is not None:
+            status = "available"
+    return price, status
+
+
+# -------------------------
+# Fetching
+# -------------------------
+
+def make_session(concurrency=CONCURRENCY):
+    # Imported here: the shortlist_changes function loads this module for its queries only
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.headers["User-Agent"] = "Mozilla/5.0"
+    # Keep one pooled connection per worker thread and host
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch(session, url, etag=None, last_modified=None, timeout=TIMEOUT, max_bytes=MAX_BYTES):
+    """Conditionally GET one listing page and extract its price and status"""
+    from requests import RequestException
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        with metrics.upstream("listing") as call:
+            with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+                call.status = response.status_code
+                if response.status_code == 304:
+                    return Outcome(url, 304, response.headers.get("ETag", etag),
+                                   response.headers.get("Last-Modified", last_modified), None, None, None)
+                etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+                if response.status_code in (404, 410):
+                    return Outcome(url, response.status_code, None, None, None, "removed", None)
+                if response.status_code != 200:
+                    return Outcome(url, response.status_code, None, None, None, None, f"HTTP {response.status_code}")
+                body = bytearray()
+                for chunk in response.iter_content(1 << 16):
+                    body += chunk
+                    if len(body) >= max_bytes:
+                        break
+    except RequestException as e:
+        return Outcome(url, None, None, None, None, None, str(e))
+
+    price, status = extract(bytes(body))
+    if price is None and status is None:
+        # Don't keep validators for a page we couldn't read: refetch it in full next time
+        return Outcome(url, 200, None, None, None, None, "no price or status found")
+    return Outcome(url, 200, etag, last_modified, price, status, None)
+
+
+def fetch_all(session, listings, concurrency=CONCURRENCY, per_host=PER_HOST):
+    """Yield an Outcome for every (url, etag, last_modified), as fetches complete.
+
+    At most `concurrency` fetches run at once and at most `per_host` against
+    any one host; queued fetches for a busy host wait without holding a thread.
+    """
+    queues = {}
+    for url, etag, last_modified in listings:
+        queues.setdefault(urlsplit(url).netloc, deque()).append((url, etag, last_modified))
+    in_flight = dict.fromkeys(queues, 0)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        running = {}
+        while queues or running:
+            # Round-robin, one fetch per host per turn, until the pool or every host is full
+            submitted = True
+            while submitted and len(running) < concurrency:
+                submitted = False
+                for host in list(queues):
+                    if len(running) >= concurrency:
+                        break
+                    if in_flight[host] < per_host:
+                        running[pool.submit(fetch, session, *queues[host].popleft())] = host
+                        in_flight[host] += 1
+                        submitted = True
+                        if not queues[host]:
+                            del queues[host]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight[running.pop(future)] -= 1
+                yield future.result()
+
+
+# -------------------------
+# Storage
+# -------------------------
+
+def _rows(result):
+    return (result or {}).get("results", {}).get("rows", [])
+
+
+@functools.lru_cache(maxsize=16)
+def upsert_sql(rows):
+    """Write back `rows` checked listings: validators, last state and next check time"""
+    values = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?)"] * rows)
+    return (
+        "INSERT INTO listing_watch (url, etag, last_modified, price, status, checked_at, next_check, failures) "
+        f"VALUES {values} ON CONFLICT(url) DO UPDATE SET "
+        "etag = excluded.etag, last_modified = excluded.last_modified, price = excluded.price, "
+        "status = excluded.status, checked_at = excluded.checked_at, "
+        "next_check = excluded.next_check, failures = excluded.failures"
+    )
+
+
+def _next_check(now, interval, failures):
+    delay = interval if not failures else min(interval * 2 ** failures, MAX_BACKOFF)
+    return now + delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def sync_listings(execute_batch):
+    """Add newly shortlisted links to listing_watch and drop unshortlisted ones"""
+    execute_batch(SYNC_SQL)
+
+
+def run_cycle(execute_batch, session=None, now=None, interval=INTERVAL, batch_size=BATCH,
+              concurrency=CONCURRENCY, per_host=PER_HOST, max_run=MAX_RUN):
+    """Check every listing that is due, yielding a Cycle of counts after each page.
+
+    Stops after max_run seconds, or when a page holds a listing already
+    checked in this run (its write was lost), whatever is still due.
+    """
+    session = session or make_session(concurrency)
+    now = now or time.time()
+    deadline = time.monotonic() + max_run
+    batch_size = max(1, min(batch_size, 32766 // COLUMNS))
+    sync_listings(execute_batch)
+
+    checked = set()
+    while True:
+        if time.monotonic() >= deadline:
+            log.warning("⚠️ Price watch stopped after %.0f s with listings still due", max_run)
+            return
+        due = _rows(execute_batch([(DUE_SQL, [now, batch_size])])[0])
+        if not due:
+            return
+        stored = {row[0]: row[1:] for row in due}
+        if not checked.isdisjoint(stored):
+            log.error("❌ Price watch stopped: %d listings checked in this run are due again",
+                      len(checked.intersection(stored)))
+            return
+        checked.update(stored)
+
+        params, history = [], []
+        not_modified = changed = failed = 0
+        for outcome in fetch_all(session, [row[:3] for row in due], concurrency, per_host):
+            etag, last_modified, old_price, old_status, failures = stored[outcome.url]
+            # Never before `now`, so a listing checked in this run is not due again in it
+            checked_at = max(time.time(), now)
+            if outcome.error:
+                failed += 1
+                failures += 1
+                log.warning("⚠️ %s: %s", outcome.url, outcome.error)
+                params.extend([outcome.url, etag, last_modified, old_price, old_status,
+                               checked_at, _next_check(checked_at, interval, failures), failures])
+                continue
+
+            not_modified += outcome.http_status == 304
+            price = old_price if outcome.price is None else outcome.price
+            status = old_status if outcome.status is None else outcome.status
+            # No stored state yet: this is the baseline, not a change
+            if (old_price, old_status) != (None, None) and (price, status) != (old_price, old_status):
+                changed += 1
+                history.append((HISTORY_SQL, [outcome.url, checked_at, old_price, price, old_status, status]))
+            params.extend([outcome.url, outcome.etag, outcome.last_modified, price, status,
+                           checked_at, _next_check(checked_at, interval, 0), 0])
+
+        execute_batch([(upsert_sql(len(due)), params)] + history)
+        yield Cycle(len(due), not_modified, changed, failed)
+
+
+# -------------------------
+# Queries
+# -------------------------
+
+def parse_since(value):
+    """A Unix timestamp or an ISO 8601 date/time (UTC unless it says otherwise)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def changed_since(execute_batch, since, user_id=None, limit=CHANGES_LIMIT):
+    """Price/status changes observed after `since` (a Unix timestamp), oldest first.
+
+    With user_id, only listings in that user's shortlist.
+    """
+    if user_id is None:
+        statement = (CHANGES_ALL_SQL, [since, limit])
+    else:
+        statement = (CHANGES_SQL, [since, user_id, limit])
+    return [
+        {
+            "id": change_id,
+            "link": url,
+            "observed_at": datetime.fromtimestamp(observed_at, timezone.utc).isoformat(),
+            "timestamp": observed_at,
+            "old_price": old_price,
+            "price": price,
+            "old_status": old_status,
+            "status": status,
+        }
+        for change_id, url, observed_at, old_price, price, old_status, status in _rows(execute_batch([statement])[0])
+    ]
+
+
+def load_changes(execute_batch, user_id, since, limit=CHANGES_LIMIT):
+    """/shortlist/changes body: the user's changes and, when there may be more, the next `since`"""
+    changes = changed_since(execute_batch, since, user_id, limit)
+    return {"changes": changes, "next": changes[-1]["timestamp"] if len(changes) == limit else None}
@@ -0,0 +1,246 @@
+"""
+Token-budgeted context for "Ask an Expert".
+
+When a logged-in user opts in, their stored requirements and shortlist are
+compacted (deduplicated, truncated, numeric fields summarised) into a
+context block that never exceeds EXPERT_CONTEXT_TOKENS estimated tokens.
+Built blocks are cached per user and served without a database read until
+a save invalidates them (re-checked against the rows every
+EXPERT_CONTEXT_RECHECK seconds, for saves made by other processes).
+"""
+import os
+import re
+import json
+import time
+import hashlib
+
+import codec
+import shared_cache
+from metrics import cache_lookup
+
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("EXPERT_CONTEXT_TOKENS", 600))
+RECHECK_SECONDS = float(os.getenv("EXPERT_CONTEXT_RECHECK", 300))
+MAX_FIELD_CHARS = 80
+CACHE_SIZE = 1024
+
+_PRICE_RE = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*([km])?", re.IGNORECASE)
+_INT_RE = re.compile(r"\d+")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (no tokenizer): the larger of chars/4 and words*4/3"""
+    if not text:
+        return 0
+    return max(len(text) // 4, (len(text.split()) * 4) // 3) + 1
+
+
+def _clean(value, limit=MAX_FIELD_CHARS):
+    text = " ".join(str(value or "").split())
+    if len(text) > limit:
+        text = text[:limit - 1].rstrip() + "…"
+    return text
+
+
+def _key(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def parse_price(value):
+    """Parse '£250,000', '250k' or '1.2m' into a number, or None"""
+    match = _PRICE_RE.search(str(value or ""))
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", ""))
+    suffix = (match.group(2) or "").lower()
+    if suffix == "k":
+        amount *= 1_000
+    elif suffix == "m":
+        amount *= 1_000_000
+    return amount
+
+
+def parse_int(value):
+    match = _INT_RE.search(str(value or ""))
+    return int(match.group(0)) if match else None
+
+
+def _money(amount):
+    if amount >= 1_000_000:
+        return f"£{amount / 1_000_000:.2f}m"
+    if amount >= 1_000:
+        return f"£{amount / 1_000:.0f}k"
+    return f"£{amount:.0f}"
+
+
+def compact_requirements(requirements):
+    """Deduplicate requirements; return (open, met) lists of cleaned text"""
+    seen = set()
+    open_items, met_items = [], []
+    for req in requirements or []:
+        if not isinstance(req, dict):
+            req = {"text": req, "checked": False}
+        text = _clean(req.get("text"))
+        key = _key(text)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        (met_items if req.get("checked") else open_items).append(text)
+    return open_items, met_items
+
+
+def compact_shortlist(shortlist):
+    """Deduplicate shortlist entries; return (lines, summary)"""
+    seen = set()
+    lines, prices, bedrooms = [], [], []
+    for item in shortlist or []:
+        if not isinstance(item, dict):
+            continue
+        key = _key(item.get("link")) or _key(item.get("address"))
+        if not key or key in seen:
+            continue
+        seen.add(key)
+
+        price = parse_price(item.get("price"))
+        beds = parse_int(item.get("bedrooms"))
+        if price is not None:
+            prices.append(price)
+        if beds is not None:
+            bedrooms.append(beds)
+
+        parts = [_clean(item.get("address")) or "Unnamed property"]
+        if price is not None:
+            parts.append(_money(price))
+        if beds is not None:
+            parts.append(f"{beds} bed")
+        if item.get("type"):
+            parts.append(_clean(item.get("type"), 30))
+        lines.append(" | ".join(parts))
+
+    summary = f"{len(lines)} shortlisted"
+    if prices:
+        prices.sort()
+        summary += (f", price {_money(prices[0])}–{_money(prices[-1])}"
+                    f" (median {_money(prices[(len(prices) - 1) // 2])})")
+    if bedrooms:
+        summary += f", {min(bedrooms)}–{max(bedrooms)} bedrooms"
+    return lines, summary
+
+
+def build_context_block(requirements, shortlist, budget_tokens=DEFAULT_CONTEXT_TOKENS):
+    """Render requirements and shortlist into a block within budget_tokens"""
+    open_items, met_items = compact_requirements(requirements)
+    shortlist_lines, summary = compact_shortlist(shortlist)
+
+    # Highest-value sections first; each section is filled until the budget runs out
+    sections = [
+        ("Shortlist summary", [summary] if shortlist_lines else []),
+        ("Requirements still to find", open_items),
+        ("Shortlisted properties", shortlist_lines),
+        ("Requirements already met", met_items),
+    ]
+
+    out = []
+    used = 0
+    for title, items in sections:
+        if not items:
+            continue
+        header = f"{title}:"
+        cost = estimate_tokens(header)
+        if used + cost > budget_tokens:
+            break
+        out.append(header)
+        used += cost
+        first_line = len(out)
+
+        for index, item in enumerate(items):
+            line = f"- {item}"
+            cost = estimate_tokens(line)
+            if used + cost > budget_tokens:
+                # The marker must fit too: give up lines of this section for it
+                omitted = len(items) - index
+                marker = f"- (+{omitted} more omitted)"
+                while used + estimate_tokens(marker) > budget_tokens and len(out) > first_line:
+                    used -= estimate_tokens(out.pop())
+                    omitted += 1
+                    marker = f"- (+{omitted} more omitted)"
+                if used + estimate_tokens(marker) <= budget_tokens:
+                    out.append(marker)
+                    used += estimate_tokens(marker)
+                break
+            out.append(line)
+            used += cost
+
+    return "\n".join(out)
+
+
+class ContextCache:
+    """Per-user built context blocks with the fingerprint of the rows they came from.
+
+    Kept in the "context" shared_cache namespace, so gunicorn workers can
+    share them (SHARED_CACHE_NAMESPACES).
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self._entries = shared_cache.namespace("context", maxsize)
+
+    def get(self, user_id, budget_tokens):
+        """(fingerprint, block, checked_at) for this budget, or None"""
+        entry = self._entries.get(user_id)
+        if entry is None or len(entry) != 4 or entry[3] != budget_tokens:
+            return None
+        return entry[0], entry[1], entry[2]
+
+    def set(self, user_id, fingerprint, block, budget_tokens, checked_at):
+        self._entries.set(user_id, [fingerprint, block, checked_at, budget_tokens])
+
+    def invalidate(self, user_id):
+        self._entries.discard(user_id)
+
+
+context_cache = ContextCache()
+
+
+def context_statements(user_id):
+    """Statements that load a user's raw requirements and shortlist rows"""
+    return [
+        ("SELECT requirements FROM user_requirements WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1", [user_id]),
+        ("SELECT data FROM user_shortlist_item WHERE user_id = ? ORDER BY position, id", [user_id]),
+    ]
+
+
+def _first_value(result):
+    rows = (result or {}).get("results", {}).get("rows", [])
+    return rows[0][0] if rows else None
+
+
+def load_user_context(execute_batch, user_id, budget_tokens=DEFAULT_CONTEXT_TOKENS):
+    """A user's context block: cached without a database read until their data changes.
+
+    Saves call context_cache.invalidate(). Saves made by another process
+    (a Netlify function, another gunicorn worker) can't, so a cached block
+    is re-checked against the rows, in one round trip, once it is
+    EXPERT_CONTEXT_RECHECK seconds old; it is only rebuilt if they changed.
+    """
+    now = time.time()
+    cached = context_cache.get(user_id, budget_tokens)
+    if cached is not None and now - cached[2] < RECHECK_SECONDS:
+        cache_lookup("context", True)
+        return cached[1]
+
+    req_result, short_result = execute_batch(context_statements(user_id))
+    raw_requirements = _first_value(req_result) or "[]"
+    raw_shortlist = "[" + ",".join(
+        row[0] for row in (short_result or {}).get("results", {}).get("rows", [])
+    ) + "]"
+
+    fingerprint = hashlib.sha1(
+        f"{budget_tokens}\0{raw_requirements}\0{raw_shortlist}".encode("utf-8")
+    ).hexdigest()
+    block = cached[1] if cached is not None and cached[0] == fingerprint else None
+    cache_lookup("context", block is not None)
+    if block is None:
+        block = build_context_block(
+            codec.decode(raw_requirements), json.loads(raw_shortlist), budget_tokens
+        )
+    context_cache.set(user_id, fingerprint, block, budget_tokens, now)
+    return block
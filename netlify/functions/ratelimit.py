@@ -0,0 +1,236 @@
+"""
+Token-bucket rate limiting for the expensive endpoints.
+
+Each limited route gets two buckets per request: one for the user (when
+logged in) and one for the client IP. A bucket holds up to `capacity`
+tokens and refills at capacity/period tokens per second.
+
+Limits are "capacity/period_seconds" strings. They can be overridden with
+RATE_LIMIT_<ROUTE> (per user) and RATE_LIMIT_<ROUTE>_IP (per IP), e.g.
+RATE_LIMIT_SCRAPE="20/60". An empty value disables a limit.
+
+A request is allowed only when every bucket it touches has room, and then
+all of them are debited; a denial debits none.
+
+Stores (RATE_LIMIT_STORE):
+    memory           in-process buckets (single process only: every gunicorn
+                     worker would get its own budget, see gunicorn.conf.py)
+    sqlite:<path>    local SQLite file in WAL mode, shared by every worker on a host
+    turso            the Turso database, shared by all instances and Netlify functions
+"""
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from logs import get_logger
+
+log = get_logger("ratelimit")
+
+DEFAULT_LIMITS = {
+    # route: (per user, per IP)
+    "scrape": ("10/60", "30/60"),
+    # Nominatim's usage policy is 1 request/second for the whole app
+    "geocode": ("5/5", "10/5"),
+    "ask_expert": ("5/60", "10/60"),
+}
+
+Limit = namedtuple("Limit", ["capacity", "period"])
+Decision = namedtuple("Decision", ["allowed", "limit", "remaining", "reset", "retry_after"])
+
+
+def parse_limit(value):
+    """Parse "capacity/period" into a Limit, or None when empty"""
+    if not value:
+        return None
+    capacity, _, period = value.partition("/")
+    return Limit(int(capacity), float(period or 1))
+
+
+def route_limits(route):
+    """(per-user Limit, per-IP Limit) for a route, after env overrides"""
+    user_default, ip_default = DEFAULT_LIMITS.get(route, ("", ""))
+    env = "RATE_LIMIT_" + route.upper()
+    return (
+        parse_limit(os.getenv(env, user_default)),
+        parse_limit(os.getenv(env + "_IP", ip_default)),
+    )
+
+
+def _decision(limit, tokens, cost, allowed):
+    rate = limit.capacity / limit.period
+    remaining = max(0, int(tokens))
+    reset = math.ceil((limit.capacity - tokens) / rate) if tokens < limit.capacity else 0
+    retry_after = 0 if allowed else math.ceil((cost - tokens) / rate)
+    return Decision(allowed, limit.capacity, remaining, reset, retry_after)
+
+
+class MemoryStore:
+    """In-process buckets; state is per process.
+
+    Beyond max_keys, buckets that have refilled completely are dropped (they
+    are the same as a new bucket), then the least recently seen ones, so a
+    client spraying keys can't reset everyone else's budget at once.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, capacity, period), least recently seen first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        full = [key for key, (tokens, updated, capacity, period) in self._buckets.items()
+                if tokens + (now - updated) * capacity / period >= capacity]
+        for key in full:
+            del self._buckets[key]
+        # Down to 90%, so the scan above runs once per max_keys/10 new keys
+        while len(self._buckets) > self.max_keys * 0.9:
+            self._buckets.popitem(last=False)
+
+    def consume(self, requests):
+        """requests: list of (key, Limit, cost). Returns a Decision per request."""
+        now = time.time()
+        with self._lock:
+            available = []
+            for key, limit, cost in requests:
+                rate = limit.capacity / limit.period
+                tokens, updated = self._buckets.get(key, (limit.capacity, now))[:2]
+                available.append(min(limit.capacity, tokens + (now - updated) * rate))
+            allowed = all(tokens >= cost for tokens, (_, _, cost) in zip(available, requests))
+
+            decisions = []
+            for tokens, (key, limit, cost) in zip(available, requests):
+                if allowed:
+                    tokens -= cost
+                self._buckets[key] = (tokens, now, limit.capacity, limit.period)
+                self._buckets.move_to_end(key)
+                decisions.append(_decision(limit, tokens, cost, tokens >= cost or allowed))
+            if len(self._buckets) > self.max_keys:
+                self._evict(now)
+        return decisions
+
+
+class SQLStore:
+    """Buckets in a rate_limit_bucket table, updated atomically.
+
+    execute_batch is utils.execute_batch (Turso) or local_db.make_executor
+    (SQLite). All keys for a request are checked and debited by one
+    statement, in one round trip: it reads every bucket before writing any,
+    and writes only when all of them have room.
+    """
+
+    PURGE_INTERVAL = 3600
+
+    PEEK_SQL = "SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?"
+
+    def __init__(self, execute_batch):
+        self.execute_batch = execute_batch
+        self._last_purge = 0.0
+
+    @staticmethod
+    def consume_sql(count):
+        """Debit `count` buckets if every one of them has room"""
+        values = ", ".join(["(?, ?, ?, ?)"] * count)
+        return f"""
+            WITH request (key, capacity, cost, rate) AS (VALUES {values}),
+            state AS (
+                SELECT request.key, request.cost, COALESCE(
+                    MIN(request.capacity, bucket.tokens + (? - bucket.updated_at) * request.rate),
+                    request.capacity) AS available
+                FROM request LEFT JOIN rate_limit_bucket AS bucket ON bucket.key = request.key
+            )
+            INSERT INTO rate_limit_bucket (key, tokens, updated_at)
+            SELECT key, available - cost, ? FROM state
+            WHERE NOT EXISTS (SELECT 1 FROM state WHERE available < cost)
+            ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            RETURNING key
+        """
+
+    def consume(self, requests):
+        now = time.time()
+        params = []
+        for key, limit, cost in requests:
+            params.extend([key, limit.capacity, cost, limit.capacity / limit.period])
+        params.extend([now, now])
+        statements = [(self.consume_sql(len(requests)), params)]
+        statements.extend((self.PEEK_SQL, [key]) for key, _, _ in requests)
+
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            # Buckets idle for a day are full again; dropping them changes nothing
+            statements.append(("DELETE FROM rate_limit_bucket WHERE updated_at < ?", [now - 86400]))
+            self._last_purge = now
+
+        results = self.execute_batch(statements)
+        allowed = bool(results[0].get("results", {}).get("rows", []))
+
+        decisions = []
+        for index, (key, limit, cost) in enumerate(requests):
+            peek = results[1 + index].get("results", {}).get("rows", [])
+            tokens, updated = (float(peek[0][0]), float(peek[0][1])) if peek else (limit.capacity, now)
+            rate = limit.capacity / limit.period
+            tokens = min(limit.capacity, tokens + (now - updated) * rate)
+            decisions.append(_decision(limit, tokens, cost, allowed or tokens >= cost))
+        return decisions
+
+
+class RateLimiter:
+    def __init__(self, store):
+        self.store = store
+
+    def check(self, route, user_id=None, ip=None, cost=1):
+        """Consume from the user and IP buckets; return the most restrictive Decision"""
+        user_limit, ip_limit = route_limits(route)
+        requests = []
+        if user_limit and user_id is not None:
+            requests.append((f"{route}:user:{user_id}", user_limit, cost))
+        if ip_limit and ip:
+            requests.append((f"{route}:ip:{ip}", ip_limit, cost))
+        if not requests:
+            return None
+
+        try:
+            decisions = self.store.consume(requests)
+        except Exception as e:
+            # Fail open: a store outage must not take the endpoints down with it
+            log.warning("⚠️ Rate limit store error: %s", e)
+            return None
+        denied = [d for d in decisions if not d.allowed]
+        if denied:
+            return max(denied, key=lambda d: d.retry_after)
+        return min(decisions, key=lambda d: d.remaining)
+
+
+def create_store(spec, execute_batch=None):
+    """Build a store from a RATE_LIMIT_STORE value"""
+    if spec.startswith("sqlite:"):
+        from local_db import make_executor
+        execute_local = make_executor(spec[len("sqlite:"):])
+        execute_local([(TABLE_SQL, [])])
+        return SQLStore(execute_local)
+    if spec == "turso":
+        return SQLStore(execute_batch)
+    return MemoryStore()
+
+
+def rate_limit_headers(decision):
+    """RateLimit-* headers (plus Retry-After when denied) for a Decision"""
+    if decision is None:
+        return {}
+    headers = {
+        "RateLimit-Limit": str(decision.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(decision.reset),
+    }
+    if not decision.allowed:
+        headers["Retry-After"] = str(decision.retry_after)
+    return headers
+
+
+TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS rate_limit_bucket (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+"""
@@ -2,8 +2,10 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import execute_query, create_response, get_request_body, generate_password_hash
+from utils import execute_query, create_response, get_request_body, timed
+from passwords import hash_password
 
+@timed
 def handler(event, context):
     """Handle user registration"""
     if event.get('httpMethod') == 'OPTIONS':
@@ -38,7 +40,7 @@ def handler(event, context):
         if result and result[0].get("results", {}).get("rows"):
             return create_response(400, {'error': 'Email already exists'})
 
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         execute_query(
             "INSERT INTO user (username, email, password_hash) VALUES (?, ?, ?)",
             [username, email, password_hash]
@@ -1,37 +1,27 @@
 import sys
 import os
+import time
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import execute_query, create_response, get_request_body, get_user_from_token
-import json
+from utils import execute_batch, create_response, get_request_body, require_auth, compressed, timed
+from requirements_store import load_requirements, replace_statements
+from logs import get_logger
 
-def handler(event, context):
+log = get_logger("requirements")
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
     """Handle requirements GET and POST"""
-    if event.get('httpMethod') == 'OPTIONS':
-        return create_response(200, {})
-    
-    user_data = get_user_from_token(event)
-    if not user_data:
-        return create_response(401, {'error': 'Unauthorized'})
-    
     user_id = user_data.get("user_id")
     
     if event.get('httpMethod') == 'GET':
         try:
-            result = execute_query(
-                "SELECT requirements FROM user_requirements WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1",
-                [user_id]
-            )
-            
-            rows = result[0].get("results", {}).get("rows", [])
-            
-            if rows:
-                requirements = json.loads(rows[0][0])
-                return create_response(200, requirements)
-            else:
-                return create_response(200, [])
+            return create_response(200, load_requirements(execute_batch, user_id))
                 
         except Exception as e:
+            log.exception("❌ Error fetching requirements: %s", e)
             return create_response(500, {'error': 'Failed to fetch requirements'})
     
     elif event.get('httpMethod') == 'POST':
@@ -41,34 +31,14 @@ def handler(event, context):
             if 'requirements' not in data:
                 return create_response(400, {'error': 'Missing requirements data'})
             
-            requirements_json = json.dumps(data['requirements'])
+            # Functions can't buffer past the response, so write through in one round trip
+            execute_batch(replace_statements(user_id, data['requirements']))
             
-            # Check if user already has requirements
-            result = execute_query(
-                "SELECT id FROM user_requirements WHERE user_id = ?",
-                [user_id]
-            )
-            
-            existing = result[0].get("results", {}).get("rows", [])
-            
-            if existing:
-                # Update existing
-                execute_query(
-                    "UPDATE user_requirements SET requirements = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-                    [requirements_json, user_id]
-                )
-            else:
-                # Insert new
-                execute_query(
-                    "INSERT INTO user_requirements (user_id, requirements) VALUES (?, ?)",
-                    [user_id, requirements_json]
-                )
-            
-            return create_response(200, {'success': True})
+            return create_response(200, {'success': True, 'version': int(time.time() * 1000)})
             
         except Exception as e:
+            log.exception("❌ Error saving requirements: %s", e)
             return create_response(500, {'error': 'Failed to save requirements'})
     
     else:
         return create_response(405, {'error': 'Method not allowed'})
-
@@ -0,0 +1,48 @@
+"""
+Requirements checklist storage: one user_requirements row per user holding
+the list of {"text", "checked"} items, encoded with codec.
+"""
+import codec
+
+SELECT_SQL = "SELECT requirements FROM user_requirements WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1"
+# Keyset page over every user; a user's newest row comes first
+SELECT_ALL_SQL = """
+    SELECT user_id, requirements FROM user_requirements WHERE user_id > ?
+    ORDER BY user_id, updated_at DESC LIMIT ?
+"""
+
+
+def select_statements(user_id):
+    return [(SELECT_SQL, [user_id])]
+
+
+def load_requirements(execute_batch, user_id, results=None):
+    """Return the user's requirements list ([] when none are saved)"""
+    (result,) = results or execute_batch(select_statements(user_id))
+    rows = (result or {}).get("results", {}).get("rows", [])
+    return codec.decode(rows[0][0]) if rows else []
+
+
+def iter_all_requirements(execute_batch, batch_size=500):
+    """(user_id, requirements list) for every user with saved requirements, a page at a time"""
+    after = -1
+    while True:
+        (result,) = execute_batch([(SELECT_ALL_SQL, [after, batch_size])])
+        rows = (result or {}).get("results", {}).get("rows", [])
+        for user_id, blob in rows:
+            if user_id != after:
+                after = user_id
+                yield user_id, codec.decode(blob)
+        if len(rows) < batch_size:
+            return
+
+
+def replace_statements(user_id, requirements):
+    """Statements that store requirements as the user's single row"""
+    return [
+        ("DELETE FROM user_requirements WHERE user_id = ?", [user_id]),
+        (
+            "INSERT INTO user_requirements (user_id, requirements) VALUES (?, ?)",
+            [user_id, codec.encode(requirements)]
+        ),
+    ]
@@ -0,0 +1,101 @@
+"""
+Response encoding shared by app.py and the Netlify functions.
+
+JSON is serialised compactly with orjson when it is installed (falling back
+to the standard library), and bodies above COMPRESS_MIN_BYTES are compressed
+with brotli (if installed) or gzip, whichever the client's Accept-Encoding
+prefers.
+"""
+import os
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/x-ndjson")
+
+
+def _default(obj):
+    # Dates, Decimals and the like: same text the old json.dumps(default=str) gave
+    return str(obj)
+
+
+def dumps(obj):
+    """Serialise obj to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _accepted(accept_encoding):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick "br", "gzip" or None for an Accept-Encoding header"""
+    accepted = _accepted(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output deterministic for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type):
+    return (content_type or "").startswith(COMPRESSIBLE_TYPES)
+
+
+def encode_body(body, accept_encoding, content_type="application/json"):
+    """Return (body, content_encoding) for a response body in bytes.
+
+    content_encoding is None when the body is left as it is: too small,
+    not a text type, or the client accepts no supported coding.
+    """
+    if len(body) < COMPRESS_MIN_BYTES or not is_compressible(content_type):
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress(body, encoding), encoding
@@ -2,22 +2,25 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import execute_query, create_response, get_query_params, get_user_from_token
+from utils import execute_query, create_response, get_query_params, require_auth, rate_limit, compressed, timed
+from tracing import span
+from history_io import upsert_sql
+import metrics
 from datetime import date
 import requests
-from bs4 import BeautifulSoup
 
-def handler(event, context):
+# Reused by warm invocations: keeps the connection to the portal alive
+session = requests.Session()
+session.headers['User-Agent'] = 'Mozilla/5.0'
+
+@timed
+@compressed
+@require_auth
+@rate_limit("scrape")
+def handler(event, context, user_data):
     """Handle property scraping"""
-    if event.get('httpMethod') == 'OPTIONS':
-        return create_response(200, {})
-    
     if event.get('httpMethod') != 'GET':
         return create_response(405, {'error': 'Method not allowed'})
-    
-    user_data = get_user_from_token(event)
-    if not user_data:
-        return create_response(401, {'error': 'Unauthorized'})
 
     user_id = user_data.get('user_id')
     
@@ -28,33 +31,25 @@ def handler(event, context):
         return create_response(400, {'error': 'No URL provided'})
 
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, "html.parser")
-        result_count = soup.find("div", class_="ResultsCount_resultsCount__Kqeah")
+        # bs4 is only needed once there is a page to parse
+        from bs4 import BeautifulSoup
+        with span("portal"), metrics.upstream("portal") as call:
+            response = session.get(url, timeout=30)
+            call.status = response.status_code
+        with span("parse"):
+            soup = BeautifulSoup(response.text, "html.parser")
+            result_count = soup.find("div", class_="ResultsCount_resultsCount__Kqeah")
 
         count_text = result_count.text.strip() if result_count else "0"
         today = str(date.today())
 
-        # Check if entry exists for same user, date, and URL
-        check_query = "SELECT * FROM user_history WHERE user_id = ? AND date = ? AND url = ?"
-        check_result = execute_query(check_query, [user_id, today, url])
-
-        existing_rows = []
-        if check_result and "results" in check_result[0] and "rows" in check_result[0]["results"]:
-            existing_rows = check_result[0]["results"]["rows"]
-
-        if existing_rows:
-            update_query = "UPDATE user_history SET results = ? WHERE user_id = ? AND date = ? AND url = ?"
-            execute_query(update_query, [count_text, user_id, today, url])
-        else:
-            insert_query = "INSERT INTO user_history (user_id, url, date, results) VALUES (?, ?, ?, ?)"
-            execute_query(insert_query, [user_id, url, today, count_text])
+        # One row per user, URL and day: a re-scrape overwrites today's count
+        execute_query(upsert_sql(1), [user_id, url, today, count_text])
 
         # Fetch ALL history for this user
         history_query = """
             SELECT url, date, results
-            FROM user_history
+            FROM user_history_merged
             WHERE user_id = ?
             ORDER BY date DESC, created_at DESC
         """
@@ -0,0 +1,316 @@
+"""
+Per-process LRU caches with an optional tier shared by every worker on a host.
+
+Each cache is a named namespace:
+
+    geocodes = shared_cache.namespace("geocode", maxsize=1024)
+    geocodes.set(key, value, ttl=3600)
+    geocodes.get(key)            # None (or default) when missing or expired
+    geocodes.discard(key)
+
+Every namespace has an in-process L1: a bounded LRU. Namespaces listed in
+SHARED_CACHE_NAMESPACES also read through to, and write to, a local SQLite
+file in WAL mode (SHARED_CACHE_PATH). Gunicorn workers on one host then
+share one copy of each entry, and entries survive restarts.
+
+The shared tier:
+    - stores values as compact JSON, so only JSON-friendly values can opt in
+    - keeps a running byte total in cache_stats via triggers; a write that
+      takes it over SHARED_CACHE_MAX_MB drops expired entries, then the
+      least recently used ones, down to 90% of the limit
+    - refreshes an entry's access time at most once a minute, so reads
+      rarely take the write lock
+    - is best effort: a locked or broken file counts as a miss and is logged
+    - trusts what it reads (cached token claims among it), so the file is
+      created private to this user and refused if anyone else can write it
+
+An L1 copy of a shared entry is trusted for SHARED_CACHE_L1_TTL seconds.
+discard() removes the entry from the file, but other workers' L1 copies
+can live that long.
+
+Configuration (environment variables):
+    SHARED_CACHE_NAMESPACES   comma-separated namespaces to share, or * for all (default none)
+    SHARED_CACHE_PATH         SQLite file of the shared tier (default <tmp>/house_finder_cache.db)
+    SHARED_CACHE_MAX_MB       size limit of the stored values (default 64)
+    SHARED_CACHE_L1_TTL       seconds an L1 copy of a shared entry is used unchecked (default 30)
+    SHARED_CACHE_TIMEOUT      seconds to wait for the file's write lock (default 0.5)
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+
+from logs import get_logger
+from metrics import cache_lookup
+
+log = get_logger("shared_cache")
+
+NAMESPACES = frozenset(n.strip() for n in os.getenv("SHARED_CACHE_NAMESPACES", "").split(",") if n.strip())
+PATH = os.getenv("SHARED_CACHE_PATH") or os.path.join(tempfile.gettempdir(), "house_finder_cache.db")
+MAX_BYTES = int(float(os.getenv("SHARED_CACHE_MAX_MB", 64)) * 1024 * 1024)
+L1_TTL = float(os.getenv("SHARED_CACHE_L1_TTL", 30))
+TIMEOUT = float(os.getenv("SHARED_CACHE_TIMEOUT", 0.5))
+
+# Access times closer together than this are not written back
+ACCESS_RESOLUTION = 60
+LOW_WATER = 0.9
+
+SCHEMA_SQL = [
+    """CREATE TABLE IF NOT EXISTS cache_entry (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_cache_entry_accessed ON cache_entry (accessed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_cache_entry_expires ON cache_entry (expires_at)",
+    """CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        bytes INTEGER NOT NULL,
+        entries INTEGER NOT NULL
+    )""",
+    "INSERT OR IGNORE INTO cache_stats (id, bytes, entries) VALUES (0, 0, 0)",
+    """CREATE TRIGGER IF NOT EXISTS cache_entry_insert AFTER INSERT ON cache_entry BEGIN
+        UPDATE cache_stats SET bytes = bytes + NEW.size, entries = entries + 1 WHERE id = 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cache_entry_update AFTER UPDATE OF size ON cache_entry BEGIN
+        UPDATE cache_stats SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cache_entry_delete AFTER DELETE ON cache_entry BEGIN
+        UPDATE cache_stats SET bytes = bytes - OLD.size, entries = entries - 1 WHERE id = 0;
+    END""",
+]
+
+GET_SQL = "SELECT value, expires_at, accessed_at FROM cache_entry WHERE namespace = ? AND key = ?"
+TOUCH_SQL = "UPDATE cache_entry SET accessed_at = ? WHERE namespace = ? AND key = ?"
+SET_SQL = """
+    INSERT INTO cache_entry (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (namespace, key) DO UPDATE SET
+        value = excluded.value, size = excluded.size,
+        expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+"""
+DELETE_SQL = "DELETE FROM cache_entry WHERE namespace = ? AND key = ?"
+CLEAR_SQL = "DELETE FROM cache_entry WHERE namespace = ?"
+STATS_SQL = "SELECT bytes, entries FROM cache_stats WHERE id = 0"
+PURGE_EXPIRED_SQL = "DELETE FROM cache_entry WHERE expires_at <= ?"
+# Keep the most recently used entries that fit in the budget
+EVICT_SQL = """
+    DELETE FROM cache_entry WHERE rowid IN (
+        SELECT rowid FROM (
+            SELECT rowid, SUM(size) OVER (ORDER BY accessed_at DESC, rowid DESC) AS running
+            FROM cache_entry
+        ) WHERE running > ?
+    )
+"""
+
+
+def _check_file(path):
+    """Create path private to this user, or refuse a file someone else could have written"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        st = os.fstat(fd)
+    finally:
+        os.close(fd)
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o022):
+        raise PermissionError(f"{path} is not private to this user")
+
+
+class SQLiteTier:
+    """Entries in a local SQLite file, safe to use from several processes and threads"""
+
+    def __init__(self, path=PATH, max_bytes=MAX_BYTES, timeout=TIMEOUT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        _check_file(path)
+        self._write(SCHEMA_SQL)
+
+    def _connection(self):
+        # A connection must not cross a fork: gunicorn forks after the app is loaded
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            from local_db import connect
+            local.conn = connect(self.path, timeout=self.timeout)
+            local.pid = os.getpid()
+        return local.conn
+
+    def _write(self, statements):
+        """Run statements (SQL strings or (sql, params)) in one write transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = []
+            for statement in statements:
+                sql, params = statement if isinstance(statement, tuple) else (statement, [])
+                results.append(conn.execute(sql, params).fetchall())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def get(self, namespace, key, now=None):
+        """(value, expires_at), or None when missing or expired"""
+        now = now or time.time()
+        row = self._connection().execute(GET_SQL, [namespace, key]).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        if expires_at is not None and expires_at <= now:
+            return None
+        if now - accessed_at > ACCESS_RESOLUTION:
+            try:
+                self._write([(TOUCH_SQL, [now, namespace, key])])
+            except Exception:
+                # Busy: the entry just looks a little older to eviction
+                pass
+        return json.loads(value), expires_at
+
+    def set(self, namespace, key, value, expires_at=None, now=None):
+        now = now or time.time()
+        data = json.dumps(value, separators=(",", ":"))
+        size = len(data) + len(namespace) + len(key)
+        stats = self._write([
+            (SET_SQL, [namespace, key, data, size, expires_at, now]),
+            (STATS_SQL, []),
+        ])[1]
+        if stats and stats[0][0] > self.max_bytes:
+            self.evict(now)
+
+    def evict(self, now=None):
+        """Drop expired entries, then the least recently used, down to the low-water mark"""
+        now = now or time.time()
+        self._write([
+            (PURGE_EXPIRED_SQL, [now]),
+            (EVICT_SQL, [int(self.max_bytes * LOW_WATER)]),
+        ])
+
+    def discard(self, namespace, key):
+        self._write([(DELETE_SQL, [namespace, key])])
+
+    def clear(self, namespace):
+        self._write([(CLEAR_SQL, [namespace])])
+
+    def stats(self):
+        """(bytes, entries) currently stored"""
+        return tuple(self._connection().execute(STATS_SQL).fetchone())
+
+
+class Namespace:
+    """Bounded in-process LRU, reading through to a shared tier when one is given"""
+
+    def __init__(self, name, maxsize, ttl=None, tier=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.tier = tier
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return self.tier is not None
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, valid_until = entry
+                if valid_until is None or valid_until > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.tier is None:
+            return default
+        try:
+            found = self.tier.get(self.name, str(key), now)
+        except Exception as e:
+            log.warning("⚠️ Shared cache read failed (%s): %s", self.name, e)
+            found = None
+        cache_lookup(self.name + "_shared", found is not None)
+        if found is None:
+            return default
+        value, expires_at = found
+        self._remember(key, value, expires_at, now)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store value for ttl seconds (the namespace's default ttl when None)"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl is not None else None
+        self._remember(key, value, expires_at, now)
+        if self.tier is not None:
+            try:
+                self.tier.set(self.name, str(key), value, expires_at, now)
+            except Exception as e:
+                log.warning("⚠️ Shared cache write failed (%s): %s", self.name, e)
+
+    def _remember(self, key, value, expires_at, now):
+        valid_until = expires_at
+        if self.tier is not None:
+            # Another worker may discard or replace the shared entry
+            valid_until = min(expires_at or now + L1_TTL, now + L1_TTL)
+        with self._lock:
+            self._entries[key] = (value, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.tier is not None:
+            try:
+                self.tier.discard(self.name, str(key))
+            except Exception as e:
+                log.warning("⚠️ Shared cache delete failed (%s): %s", self.name, e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.tier is not None:
+            try:
+                self.tier.clear(self.name)
+            except Exception as e:
+                log.warning("⚠️ Shared cache clear failed (%s): %s", self.name, e)
+
+
+_tier = None
+_tier_lock = threading.Lock()
+_namespaces = {}
+
+
+def shared_tier():
+    """The process's SQLiteTier, opened on first use; None if the file can't be used"""
+    global _tier
+    with _tier_lock:
+        if _tier is None:
+            try:
+                _tier = SQLiteTier()
+                log.info("🗄️ Shared cache at %s (%s)", PATH, ", ".join(sorted(NAMESPACES)))
+            except Exception as e:
+                log.warning("⚠️ Shared cache unavailable, caches stay per process: %s", e)
+                _tier = False
+        return _tier or None
+
+
+def is_shared(name):
+    return name in NAMESPACES or "*" in NAMESPACES
+
+
+def namespace(name, maxsize=1024, ttl=None):
+    """The cache called name; the first call decides its size and default ttl"""
+    cache = _namespaces.get(name)
+    if cache is None:
+        tier = shared_tier() if is_shared(name) else None
+        cache = _namespaces.setdefault(name, Namespace(name, maxsize, ttl, tier))
+    return cache
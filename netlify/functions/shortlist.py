@@ -2,36 +2,28 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import execute_query, create_response, get_request_body, get_user_from_token
-import json
+from utils import execute_batch, create_response, get_request_body, require_auth, compressed, timed
+from shortlist_store import replace_items, apply_patch, prepare_items
+from matcher import load_scored_items
+from dedup import dedupe_items, affects_duplicates, refresh_flags
+from logs import get_logger
 
-def handler(event, context):
-    """Handle shortlist GET and POST"""
-    if event.get('httpMethod') == 'OPTIONS':
-        return create_response(200, {})
-    
-    user_data = get_user_from_token(event)
-    if not user_data:
-        return create_response(401, {'error': 'Unauthorized'})
-    
+log = get_logger("shortlist")
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
+    """Handle shortlist GET, POST (full replace) and PATCH (per-item operations)"""
     user_id = user_data.get("user_id")
     
     if event.get('httpMethod') == 'GET':
         try:
-            result = execute_query(
-                "SELECT shortlist FROM user_shortlist WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1",
-                [user_id]
-            )
-            
-            rows = result[0].get("results", {}).get("rows", [])
-            
-            if rows:
-                shortlist = json.loads(rows[0][0])
-                return create_response(200, shortlist)
-            else:
-                return create_response(200, [])
+            # Each item carries its "match" against the user's requirements
+            return create_response(200, load_scored_items(execute_batch, user_id))
                 
         except Exception as e:
+            log.exception("❌ Error fetching shortlist: %s", e)
             return create_response(500, {'error': 'Failed to fetch shortlist'})
     
     elif event.get('httpMethod') == 'POST':
@@ -41,34 +33,34 @@ def handler(event, context):
             if 'shortlist' not in data:
                 return create_response(400, {'error': 'Missing shortlist data'})
             
-            shortlist_json = json.dumps(data['shortlist'])
-            
-            # Check if user already has shortlist
-            result = execute_query(
-                "SELECT id FROM user_shortlist WHERE user_id = ?",
-                [user_id]
-            )
-            
-            existing = result[0].get("results", {}).get("rows", [])
-            
-            if existing:
-                # Update existing
-                execute_query(
-                    "UPDATE user_shortlist SET shortlist = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-                    [shortlist_json, user_id]
-                )
-            else:
-                # Insert new
-                execute_query(
-                    "INSERT INTO user_shortlist (user_id, shortlist) VALUES (?, ?)",
-                    [user_id, shortlist_json]
-                )
-            
-            return create_response(200, {'success': True})
+            # Same house from two portals: flag it, or fold it into the first copy
+            items, duplicates = dedupe_items(prepare_items(data['shortlist']), data.get('dedupe'))
+            items = replace_items(execute_batch, user_id, items)
+            return create_response(200, {'success': True, 'ids': [item['id'] for item in items],
+                                         'duplicates': duplicates})
             
+        except ValueError as e:
+            return create_response(400, {'error': str(e)})
         except Exception as e:
+            log.exception("❌ Error saving shortlist: %s", e)
             return create_response(500, {'error': 'Failed to save shortlist'})
     
+    elif event.get('httpMethod') == 'PATCH':
+        try:
+            data = get_request_body(event)
+            ops = data.get('ops')
+            added_ids = apply_patch(execute_batch, user_id, ops)
+            response = {'success': True, 'ids': added_ids}
+            # Adds, removes and address edits can make or break duplicates
+            if affects_duplicates(ops):
+                response['duplicates'] = refresh_flags(execute_batch, user_id)
+            return create_response(200, response)
+            
+        except ValueError as e:
+            return create_response(400, {'error': str(e)})
+        except Exception as e:
+            log.exception("❌ Error patching shortlist: %s", e)
+            return create_response(500, {'error': 'Failed to update shortlist'})
+    
     else:
         return create_response(405, {'error': 'Method not allowed'})
-
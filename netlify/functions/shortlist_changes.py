@@ -0,0 +1,24 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils import execute_batch, create_response, get_query_params, require_auth, compressed, timed
+from price_watch import load_changes, parse_since
+
+@timed
+@compressed
+@require_auth
+def handler(event, context, user_data):
+    """Price and status changes of shortlisted listings since ?since= (Unix time or ISO 8601)"""
+    if event.get('httpMethod') != 'GET':
+        return create_response(405, {'error': 'Method not allowed'})
+
+    try:
+        since = parse_since(get_query_params(event).get('since', 0))
+    except ValueError:
+        return create_response(400, {'error': 'since must be a Unix timestamp or an ISO 8601 date'})
+
+    try:
+        return create_response(200, load_changes(execute_batch, user_data.get('user_id'), since))
+    except Exception as e:
+        return create_response(500, {'error': str(e)})
@@ -0,0 +1,301 @@
+"""
+Row-per-item shortlist storage.
+
+Each shortlisted property is one user_shortlist_item row with a stable id,
+an integer position and its fields as a JSON object. GET still returns the
+familiar array of item objects, each now carrying its "id".
+
+PATCH accepts a list of operations so a write only touches what changed:
+    {"op": "add", "item": {...}, "position": 3}      position is optional (append)
+    {"op": "update", "id": "...", "fields": {...}}   JSON merge patch; null removes a field
+    {"op": "remove", "id": "..."}
+    {"op": "reorder", "ids": ["...", "..."]}
+
+Users whose shortlist is still a legacy user_shortlist blob are migrated to
+rows the first time it is read or patched (appended after any rows already
+there), and a full replacement deletes the blob along with the old rows, so
+the legacy list can neither come back nor be hidden. Fields computed for
+responses (the id, the requirements "match") are never stored.
+"""
+import json
+import uuid
+
+import codec
+
+MAX_ITEMS = 200
+MAX_OPS = 100
+DERIVED_FIELDS = ("id", "match")
+
+SELECT_ITEMS_SQL = "SELECT id, data FROM user_shortlist_item WHERE user_id = ? ORDER BY position, id"
+SELECT_LEGACY_SQL = "SELECT shortlist FROM user_shortlist WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1"
+DELETE_LEGACY_SQL = "DELETE FROM user_shortlist WHERE user_id = ?"
+APPEND_ITEM_SQL = ("INSERT INTO user_shortlist_item (id, user_id, position, data) "
+                   "SELECT ?, ?, COALESCE(MAX(position), -1) + 1, ? FROM user_shortlist_item WHERE user_id = ?")
+
+# Users this process has seen without a legacy blob; once gone it never returns
+_migrated = set()
+MAX_MIGRATED = 100_000
+
+
+def _rows(result):
+    return (result or {}).get("results", {}).get("rows", [])
+
+
+def _item_data(item):
+    """Serialise an item's stored fields"""
+    return json.dumps({k: v for k, v in item.items() if k not in DERIVED_FIELDS}, separators=(",", ":"))
+
+
+def new_item_id():
+    return uuid.uuid4().hex
+
+
+def select_statements(user_id):
+    """Statements whose results load_items() understands (items, legacy blob)"""
+    return [
+        (SELECT_ITEMS_SQL, [user_id]),
+        (SELECT_LEGACY_SQL, [user_id]),
+    ]
+
+
+def items_from_rows(rows):
+    items = []
+    for item_id, data in rows:
+        item = json.loads(data)
+        item["id"] = item_id
+        items.append(item)
+    return items
+
+
+def load_items(execute_batch, user_id, results=None):
+    """Return the user's shortlist as a list of item dicts (with ids).
+
+    results may hold pre-fetched results of select_statements() from a
+    larger batch; otherwise they are fetched here.
+    """
+    items_result, legacy_result = results or execute_batch(select_statements(user_id))
+    items = items_from_rows(_rows(items_result))
+
+    legacy = _rows(legacy_result)
+    if not legacy:
+        _remember_migrated(user_id)
+        return items
+
+    # One-time migration of the legacy blob into rows, after any rows added
+    # before it was read
+    legacy_items = [item for item in codec.decode(legacy[0][0]) if isinstance(item, dict)]
+    legacy_items = prepare_items(legacy_items[:max(0, MAX_ITEMS - len(items))])
+    statements = [(APPEND_ITEM_SQL, [item["id"], user_id, _item_data(item), user_id]) for item in legacy_items]
+    statements.append((DELETE_LEGACY_SQL, [user_id]))
+    execute_batch(statements)
+    _remember_migrated(user_id)
+    return items + legacy_items
+
+
+def _remember_migrated(user_id):
+    if len(_migrated) >= MAX_MIGRATED:
+        _migrated.clear()
+    _migrated.add(user_id)
+
+
+def ensure_migrated(execute_batch, user_id):
+    """Move a legacy blob into rows before a PATCH adds rows next to it"""
+    if user_id not in _migrated:
+        load_items(execute_batch, user_id)
+
+
+def prepare_items(items):
+    """Validate a full shortlist and give every item a unique id"""
+    if not isinstance(items, list):
+        raise ValueError("shortlist must be a list")
+    items = [dict(item) for item in items if isinstance(item, dict)]
+    if len(items) > MAX_ITEMS:
+        raise ValueError(f"A shortlist can hold at most {MAX_ITEMS} items")
+    seen = set()
+    for item in items:
+        item_id = str(item.get("id") or "")
+        if not item_id or item_id in seen:
+            item_id = new_item_id()
+        seen.add(item_id)
+        item["id"] = item_id
+    return items
+
+
+def replace_statements(user_id, items):
+    """Statements replacing the whole shortlist"""
+    items = prepare_items(items)
+    statements = [
+        ("DELETE FROM user_shortlist_item WHERE user_id = ?", [user_id]),
+        # The new list supersedes a legacy blob that was never read
+        (DELETE_LEGACY_SQL, [user_id]),
+    ]
+    for position, item in enumerate(items):
+        statements.append((
+            "INSERT INTO user_shortlist_item (id, user_id, position, data) VALUES (?, ?, ?, ?)",
+            [item["id"], user_id, position, _item_data(item)]
+        ))
+    return statements
+
+
+def prepare_ops(ops):
+    """Validate PATCH operations and assign ids to added items.
+
+    Returns the added ids. Prepared ops render the same statements every
+    time, so they can be buffered and written later.
+    """
+    for op in ops if isinstance(ops, list) else []:
+        if isinstance(op, dict) and op.get("op") == "add":
+            op["id"] = new_item_id()
+    return patch_statements(None, ops)[1]
+
+
+def patch_statements(user_id, ops):
+    """Translate PATCH operations into statements.
+
+    Returns (statements, added_ids). Raises ValueError on malformed input.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise ValueError("ops must be a non-empty list")
+    if len(ops) > MAX_OPS:
+        raise ValueError(f"At most {MAX_OPS} operations per request")
+
+    statements = []
+    added_ids = []
+    for op in ops:
+        kind = op.get("op") if isinstance(op, dict) else None
+
+        if kind == "add":
+            item = op.get("item") or {}
+            if not isinstance(item, dict):
+                raise ValueError("add requires an item object")
+            item_id = str(op.get("id") or new_item_id())
+            data = _item_data(item)
+            if op.get("position") is not None:
+                # Open a gap at the requested position
+                position = int(op["position"])
+                statements.append((
+                    "UPDATE user_shortlist_item SET position = position + 1 WHERE user_id = ? AND position >= ?",
+                    [user_id, position]
+                ))
+                statements.append((
+                    "INSERT INTO user_shortlist_item (id, user_id, position, data) VALUES (?, ?, ?, ?)",
+                    [item_id, user_id, position, data]
+                ))
+            else:
+                statements.append((APPEND_ITEM_SQL, [item_id, user_id, data, user_id]))
+            added_ids.append(item_id)
+
+        elif kind == "update":
+            fields = op.get("fields")
+            if not op.get("id") or not isinstance(fields, dict):
+                raise ValueError("update requires an id and a fields object")
+            for key in DERIVED_FIELDS:
+                fields.pop(key, None)
+            statements.append((
+                "UPDATE user_shortlist_item SET data = json_patch(data, ?), updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND user_id = ?",
+                [json.dumps(fields, separators=(",", ":")), str(op["id"]), user_id]
+            ))
+
+        elif kind == "remove":
+            if not op.get("id"):
+                raise ValueError("remove requires an id")
+            statements.append((
+                "DELETE FROM user_shortlist_item WHERE id = ? AND user_id = ?",
+                [str(op["id"]), user_id]
+            ))
+
+        elif kind == "reorder":
+            ids = op.get("ids")
+            if not isinstance(ids, list):
+                raise ValueError("reorder requires a list of ids")
+            for position, item_id in enumerate(ids):
+                statements.append((
+                    "UPDATE user_shortlist_item SET position = ? WHERE id = ? AND user_id = ?",
+                    [position, str(item_id), user_id]
+                ))
+
+        else:
+            raise ValueError(f"Unknown op: {kind}")
+
+    return statements, added_ids
+
+
+def apply_patch(execute_batch, user_id, ops):
+    """Apply PATCH operations in one round trip; returns the ids of added items"""
+    added_ids = prepare_ops(ops)
+    ensure_migrated(execute_batch, user_id)
+    execute_batch(patch_statements(user_id, ops)[0])
+    return added_ids
+
+
+def replace_items(execute_batch, user_id, items):
+    """Replace the whole shortlist (legacy POST); returns the items with ids"""
+    items = prepare_items(items)
+    execute_batch(replace_statements(user_id, items))
+    return items
+
+
+# -------------------------
+# Write-behind support
+# -------------------------
+# A buffered shortlist write is {"replace": items or None, "ops": [...]}:
+# an optional full replacement followed by prepared PATCH operations.
+
+def _merge_patch(target, patch):
+    """Compose two JSON merge patches (patch applied after target)"""
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_patch(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def compact_ops(ops):
+    """Fold repeated updates of an item into one, and drop items added then removed"""
+    out = []
+    updates = {}
+    added = {}
+    for op in ops:
+        kind = op.get("op")
+        item_id = op.get("id")
+        if kind == "update" and item_id in updates:
+            _merge_patch(updates[item_id]["fields"], op["fields"])
+        elif kind == "update":
+            op = {"op": "update", "id": item_id, "fields": dict(op["fields"])}
+            updates[item_id] = op
+            out.append(op)
+        elif kind == "remove" and item_id in added:
+            # Never written: drop the add and its updates instead of writing them
+            dropped = (added.pop(item_id), updates.pop(item_id, None))
+            out = [o for o in out if not any(o is d for d in dropped)]
+        elif kind == "remove":
+            updates.pop(item_id, None)
+            out.append(op)
+        else:
+            if kind == "add":
+                added[item_id] = op
+            out.append(op)
+    return out
+
+
+def buffered_value(replace=None, ops=None):
+    return {"replace": replace, "ops": ops or []}
+
+
+def coalesce(old, new):
+    """Combine two buffered writes (old first)"""
+    if new["replace"] is not None:
+        return new
+    return buffered_value(old["replace"], compact_ops(old["ops"] + new["ops"]))
+
+
+def buffered_statements(user_id, value):
+    """Render a buffered write into statements"""
+    statements = []
+    if value["replace"] is not None:
+        statements.extend(replace_statements(user_id, value["replace"]))
+    if value["ops"]:
+        statements.extend(patch_statements(user_id, value["ops"])[0])
+    return statements
@@ -0,0 +1,150 @@
+"""
+Per-request timing spans shared by app.py and the Netlify functions.
+
+A request starts a Trace; code on the request's path wraps its slow steps
+in span("db"), span("portal"), ... and the finished trace becomes a
+Server-Timing header (one entry per span name, durations summed) and,
+optionally, a line in a JSON-lines span log.
+
+The active trace lives in a context variable, so threads and greenlets
+serving other requests don't see it, and code running outside a request
+(the write-behind flusher, scripts) records nothing. When tracing is off,
+start() returns None and span() hands back one shared no-op context
+manager, so instrumented code pays a context variable lookup per span.
+
+Configuration (environment variables):
+    TRACING      1 to add Server-Timing headers (default off)
+    TRACE_LOG    path of a JSON-lines span log; setting it enables tracing
+"""
+import os
+import time
+import functools
+import threading
+import contextvars
+from logs import get_logger
+
+log = get_logger("tracing")
+
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+ENABLED = os.getenv("TRACING", "").lower() in ("1", "true", "yes") or bool(TRACE_LOG)
+
+_current = contextvars.ContextVar("trace", default=None)
+_log_lock = threading.Lock()
+
+
+class Trace:
+    __slots__ = ("route", "started", "wall", "spans", "_token")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        # (name, start offset, duration) in seconds
+        self.spans = []
+        self._token = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ended = time.perf_counter()
+        self.trace.spans.append((self.name, self.started - self.trace.started, ended - self.started))
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def start(route):
+    """Begin a trace for the current request; None when tracing is off or one is active"""
+    if not ENABLED or _current.get() is not None:
+        return None
+    trace = Trace(route)
+    trace._token = _current.set(trace)
+    return trace
+
+
+def finish(trace, status=None, method=None):
+    """End a trace started by start() and write it to the span log"""
+    if trace is None:
+        return
+    _current.reset(trace._token)
+    if TRACE_LOG:
+        _write_log(trace, status, method)
+
+
+def span(name):
+    """Context manager timing a step of the current request"""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name)
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(trace):
+    """Server-Timing header value for a trace: per-name totals plus the request total"""
+    totals = {}
+    for name, _, duration in trace.spans:
+        total, count = totals.get(name, (0.0, 0))
+        totals[name] = (total + duration, count + 1)
+    parts = []
+    for name, (total, count) in totals.items():
+        part = f"{name};dur={total * 1000:.1f}"
+        if count > 1:
+            part += f';desc="{count} calls"'
+        parts.append(part)
+    parts.append(f"total;dur={trace.elapsed() * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _write_log(trace, status, method):
+    from responses import dumps
+    line = dumps({
+        "ts": trace.wall,
+        "route": trace.route,
+        "method": method,
+        "status": status,
+        "total_ms": round(trace.elapsed() * 1000, 3),
+        "spans": [
+            {"name": name, "start_ms": round(offset * 1000, 3), "dur_ms": round(duration * 1000, 3)}
+            for name, offset, duration in trace.spans
+        ],
+    }) + b"\n"
+    try:
+        with _log_lock, open(TRACE_LOG, "ab") as f:
+            f.write(line)
+    except OSError as e:
+        log.warning("⚠️ Could not write span log %s: %s", TRACE_LOG, e)
@@ -0,0 +1,131 @@
+"""
+Minimal Turso HTTP client on the standard library.
+
+Functions only need one POST per batch, so this avoids importing requests
+(about 90 ms of a cold start) and keeps its keep-alive connections at
+module level, reused by every warm invocation of the same container. A
+function only ever needs one; threaded app workers take one per request in
+flight and return it afterwards.
+
+A non-2xx response, or an error in any statement's result, raises
+TursoError: Turso rolls the whole batch back, and callers (the write-behind
+retries, the price watcher) must not treat it as written.
+"""
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+from responses import dumps, loads
+from tracing import span
+from metrics import observe_batch
+
+TIMEOUT = 30
+MAX_IDLE = 32
+
+
+class TursoError(Exception):
+    """The database refused a batch (HTTP error status or a failed statement)"""
+
+
+class TursoClient:
+    def __init__(self, database_url, auth_token, timeout=TIMEOUT, max_idle=MAX_IDLE):
+        parts = urlsplit(database_url.replace("libsql://", "https://"))
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.path = parts.path or "/"
+        self.headers = {
+            "Authorization": f"Bearer {auth_token}",
+            "Content-Type": "application/json",
+        }
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+
+    def _acquire(self):
+        """(connection, reused): the most recently used idle one, or a new one"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _post(self, conn, body):
+        """(status, body) of one POST"""
+        conn.request("POST", self.path, body=body, headers=self.headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def execute(self, statements):
+        started = time.perf_counter()
+        with span("db"):
+            try:
+                return self._execute(statements)
+            finally:
+                observe_batch(statements, time.perf_counter() - started)
+
+    def _execute(self, statements):
+        """POST (sql, params) statements in one request; returns the decoded results"""
+        body = dumps({
+            "statements": [{"q": sql, "params": params or []} for sql, params in statements]
+        })
+        conn, reused = self._acquire()
+        try:
+            status, data = self._post(conn, body)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed the idle connection between invocations; the
+            # request never reached it, so it is safe to send again
+            conn.close()
+            if not reused:
+                raise
+            conn = self._connect()
+            try:
+                status, data = self._post(conn, body)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        return _check(status, data)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _message(error):
+    return error.get("message", error) if isinstance(error, dict) else error
+
+
+def _check(status, data):
+    """Decoded results of a response, or TursoError"""
+    try:
+        results = loads(data)
+    except ValueError:
+        results = None
+    if not 200 <= status < 300:
+        error = results.get("error") if isinstance(results, dict) else None
+        detail = _message(error) or data[:200].decode("utf-8", "replace")
+        raise TursoError(f"HTTP {status}: {detail}")
+    if not isinstance(results, list):
+        raise TursoError(f"Unexpected response: {data[:200]!r}")
+    for index, result in enumerate(results):
+        if isinstance(result, dict) and result.get("error"):
+            raise TursoError(f"Statement {index + 1}: {_message(result['error'])}")
+    return results
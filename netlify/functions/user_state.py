@@ -0,0 +1,88 @@
+"""
+Everything the page needs after login, in one response.
+
+GET /me/state validates the token once and runs the history, requirements
+and shortlist reads as a single batch:
+
+    {
+        "user": {"user_id": ..., "username": ...},
+        "history_page": {"items": [...], "has_more": false},
+        "requirements": [...],
+        "shortlist": [...]
+    }
+
+The response carries an ETag over the whole state; a client revalidating
+with If-None-Match gets a 304 when nothing has changed.
+"""
+import os
+import json
+import hashlib
+
+import requirements_store
+import shortlist_store
+
+HISTORY_PAGE_SIZE = int(os.getenv("STATE_HISTORY_PAGE_SIZE", 20))
+
+HISTORY_SQL = (
+    "SELECT url, date, results FROM user_history_merged WHERE user_id = ? "
+    "ORDER BY date DESC, created_at DESC LIMIT ?"
+)
+
+
+def state_statements(user_id, history_limit=HISTORY_PAGE_SIZE):
+    """All reads for one user: history page, requirements, shortlist"""
+    return (
+        # One extra row tells us whether there is a next page
+        [(HISTORY_SQL, [user_id, history_limit + 1])]
+        + requirements_store.select_statements(user_id)
+        + shortlist_store.select_statements(user_id)
+    )
+
+
+def load_state(execute_batch, user_data, history_limit=HISTORY_PAGE_SIZE, requirements=None):
+    """Load the user's state in one round trip.
+
+    requirements, when given, replaces the stored list (e.g. a value still
+    waiting in a write-behind buffer).
+    """
+    user_id = user_data.get("user_id")
+    results = execute_batch(state_statements(user_id, history_limit))
+
+    rows = (results[0] or {}).get("results", {}).get("rows", [])
+    history = [{"url": r[0], "date": r[1], "results": r[2]} for r in rows[:history_limit]]
+
+    if requirements is None:
+        requirements = requirements_store.load_requirements(execute_batch, user_id, results[1:2])
+
+    return {
+        "user": {"user_id": user_id, "username": user_data.get("username")},
+        "history_page": {"items": history, "has_more": len(rows) > history_limit},
+        "requirements": requirements,
+        "shortlist": shortlist_store.load_items(execute_batch, user_id, results[2:4]),
+    }
+
+
+def state_etag(state):
+    """Weak ETag over the whole state"""
+    canonical = json.dumps(state, sort_keys=True, separators=(",", ":"))
+    return 'W/"%s"' % hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value matches etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+# Headers for state responses: always revalidate, never share between users
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
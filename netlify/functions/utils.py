@@ -1,16 +1,37 @@
+"""
+Shared helpers for the Netlify functions.
+
+Keep this module cheap to import: every function loads it on a cold start.
+Heavy dependencies are imported where they are used, and clients and caches
+live at module level so warm invocations reuse them.
+"""
 import os
 import json
-import requests
-import jwt
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import base64
+import functools
+from auth import extract_token, authenticate, revoke
+from ratelimit import RateLimiter, create_store, rate_limit_headers
+from responses import dumps, encode_body, is_compressible, COMPRESS_MIN_BYTES
+from turso import TursoClient
+import tracing
+import logs
+import metrics
 
-# Re-export password hashing functions for convenience
+# Password hashing is re-exported lazily (see __getattr__ below)
 __all__ = [
     'execute_query',
+    'execute_batch',
     'verify_token',
+    'get_token',
     'get_user_from_token',
+    'require_auth',
+    'rate_limit',
+    'get_client_ip',
+    'revoke_token',
     'create_response',
+    'compressed',
+    'timed',
     'get_request_body',
     'get_query_params',
     'generate_password_hash',
@@ -24,49 +45,42 @@ __all__ = [
 TURSO_DATABASE_URL = os.getenv("TURSO_DATABASE_URL", "")
 TURSO_AUTH_TOKEN = os.getenv("TURSO_AUTH_TOKEN", "")
 SECRET_KEY = os.getenv("SECRET_KEY", "")
+# Function containers don't share memory, so buckets live in Turso by default
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "turso")
 
 def execute_query(sql, params=None):
     """Execute SQL query on Turso database via HTTP API"""
+    return execute_batch([(sql, params)])
+
+_turso = None
+
+def execute_batch(statements):
+    """Execute several (sql, params) statements in a single HTTP round trip.
+
+    Returns one result per statement, in order. The connection is kept
+    open for later invocations of a warm function.
+    """
+    global _turso
     if not TURSO_DATABASE_URL or not TURSO_AUTH_TOKEN:
         raise ValueError("TURSO_DATABASE_URL and TURSO_AUTH_TOKEN must be set")
     
-    url = TURSO_DATABASE_URL.replace("libsql://", "https://")
-    
-    headers = {
-        "Authorization": f"Bearer {TURSO_AUTH_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "statements": [
-            {
-                "q": sql,
-                "params": params or []
-            }
-        ]
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    return response.json()
+    if _turso is None:
+        _turso = TursoClient(TURSO_DATABASE_URL, TURSO_AUTH_TOKEN)
+    return _turso.execute(statements)
 
 def verify_token(token):
-    """Verify JWT token and return user data"""
-    try:
-        if not SECRET_KEY:
-            return None
-        data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return data
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
+    """Verify JWT token and return user data (cached until the token expires)"""
+    return authenticate(token, SECRET_KEY, execute_query)
+
+def get_token(event):
+    """Extract the bearer token from the request headers"""
+    headers = event.get('headers') or {}
+    auth_header = headers.get('authorization', '') or headers.get('Authorization', '')
+    return extract_token(auth_header)
 
 def get_user_from_token(event):
     """Extract user_id and username from JWT token in request headers"""
-    headers = event.get('headers', {})
-    auth_header = headers.get('authorization', '') or headers.get('Authorization', '')
-    
-    token = auth_header.replace("Bearer ", "").replace("bearer ", "")
+    token = get_token(event)
     
     if not token:
         return None
@@ -74,13 +88,80 @@ def get_user_from_token(event):
     user_data = verify_token(token)
     return user_data
 
+def revoke_token(event):
+    """Revoke the request's token (logout). Returns False if it was not valid."""
+    token = get_token(event)
+    user_data = verify_token(token) if token else None
+    if not user_data:
+        return False
+    revoke(token, user_data, execute_query)
+    return True
+
+def require_auth(handler):
+    """Decorator for Netlify handlers that need a logged-in user.
+
+    Answers CORS preflight, returns 401 without a valid token, and otherwise
+    calls handler(event, context, user_data).
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if event.get('httpMethod') == 'OPTIONS':
+            return create_response(200, {})
+        
+        user_data = get_user_from_token(event)
+        if not user_data:
+            return create_response(401, {'error': 'Unauthorized'})
+        
+        return handler(event, context, user_data)
+    return wrapper
+
+_rate_limiter = None
+
+def get_client_ip(event):
+    """Best-effort client IP for a Netlify event"""
+    headers = event.get('headers') or {}
+    ip = headers.get('x-nf-client-connection-ip') or headers.get('client-ip')
+    if not ip:
+        forwarded = headers.get('x-forwarded-for', '')
+        ip = forwarded.split(',')[0].strip()
+    return ip or None
+
+def rate_limit(route):
+    """Decorator applying the per-user and per-IP token buckets for route.
+
+    Works on plain handlers and on handlers wrapped by require_auth (the
+    user_data argument is picked up when present).
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context, *args):
+            global _rate_limiter
+            if event.get('httpMethod') == 'OPTIONS':
+                return handler(event, context, *args)
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(create_store(RATE_LIMIT_STORE, execute_batch))
+            
+            user_data = args[0] if args else get_user_from_token(event)
+            decision = _rate_limiter.check(
+                route, (user_data or {}).get('user_id'), get_client_ip(event)
+            )
+            if decision and not decision.allowed:
+                return create_response(429, {'error': 'Too many requests, please slow down'},
+                                       rate_limit_headers(decision))
+            
+            response = handler(event, context, *args)
+            response['headers'].update(rate_limit_headers(decision))
+            return response
+        return wrapper
+    return decorator
+
 def create_response(status_code, body, headers=None):
     """Create a standardized Netlify Function response"""
     default_headers = {
         "Content-Type": "application/json",
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Headers": "Content-Type, Authorization",
-        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS"
+        "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS"
     }
     
     if headers:
@@ -89,9 +170,67 @@ def create_response(status_code, body, headers=None):
     return {
         "statusCode": status_code,
         "headers": default_headers,
-        "body": json.dumps(body)
+        "body": dumps(body).decode("utf-8")
     }
 
+def compress_response(response, event):
+    """Compress a create_response() result for the request's Accept-Encoding"""
+    headers = response.setdefault('headers', {})
+    body = response.get('body')
+    if not body or response.get('isBase64Encoded') or 'Content-Encoding' in headers:
+        return response
+    
+    raw = body.encode('utf-8')
+    content_type = headers.get('Content-Type')
+    if len(raw) < COMPRESS_MIN_BYTES or not is_compressible(content_type):
+        return response
+    
+    headers['Vary'] = ', '.join(filter(None, [headers.get('Vary'), 'Accept-Encoding']))
+    request_headers = event.get('headers') or {}
+    accept_encoding = request_headers.get('accept-encoding') or request_headers.get('Accept-Encoding')
+    encoded, encoding = encode_body(raw, accept_encoding, content_type)
+    if encoding:
+        response['body'] = base64.b64encode(encoded).decode('ascii')
+        response['isBase64Encoded'] = True
+        headers['Content-Encoding'] = encoding
+    return response
+
+def compressed(handler):
+    """Decorator compressing a handler's responses (apply it outermost)"""
+    @functools.wraps(handler)
+    def wrapper(event, context, *args):
+        return compress_response(handler(event, context, *args), event)
+    return wrapper
+
+def timed(handler):
+    """Decorator for per-invocation instrumentation (apply it outermost).
+
+    Decides log sampling for the request, adds a Server-Timing header and
+    span log entry when tracing is on, records request metrics, and pushes
+    metrics and writes queued log lines before the invocation ends.
+    """
+    route = handler.__module__
+    
+    @functools.wraps(handler)
+    def wrapper(event, context, *args):
+        started = time.perf_counter()
+        log_token = logs.begin_request(route)
+        trace = tracing.start(route)
+        response = None
+        try:
+            response = handler(event, context, *args)
+            if trace is not None:
+                response.setdefault('headers', {})['Server-Timing'] = tracing.server_timing(trace)
+            return response
+        finally:
+            status = (response or {}).get('statusCode', 500)
+            tracing.finish(trace, status, event.get('httpMethod'))
+            metrics.observe_request(route, event.get('httpMethod'), status, time.perf_counter() - started)
+            logs.end_request(log_token)
+            metrics.push()
+            logs.flush()
+    return wrapper
+
 def get_request_body(event):
     """Extract and parse JSON body from event"""
     try:
@@ -106,3 +245,9 @@ def get_query_params(event):
     """Extract query string parameters from event"""
     return event.get('queryStringParameters', {}) or {}
 
+def __getattr__(name):
+    # Werkzeug takes ~70 ms to import; only login/register need it
+    if name in ('generate_password_hash', 'check_password_hash'):
+        from werkzeug import security
+        return getattr(security, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
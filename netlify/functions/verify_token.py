@@ -2,8 +2,9 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
-from utils import create_response, verify_token
+from utils import create_response, verify_token, get_token, timed
 
+@timed
 def handler(event, context):
     """Verify JWT token"""
     if event.get('httpMethod') == 'OPTIONS':
@@ -12,9 +13,7 @@ def handler(event, context):
     if event.get('httpMethod') != 'GET':
         return create_response(405, {'error': 'Method not allowed'})
     
-    headers = event.get('headers', {})
-    auth_header = headers.get('authorization', '') or headers.get('Authorization', '')
-    token = auth_header.replace("Bearer ", "").replace("bearer ", "")
+    token = get_token(event)
     
     if not token:
         return create_response(401, {'error': 'No token provided'})
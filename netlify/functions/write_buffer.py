@@ -0,0 +1,207 @@
+"""
+Write-behind buffer for per-user saves.
+
+Checklist ticks and shortlist typing arrive as a stream of small saves.
+Instead of a Turso round trip per save, the buffer accepts each save
+immediately (returning a version number), keeps only the coalesced pending
+state per (kind, user), and a background thread flushes everything that has
+been pending for WRITE_BUFFER_WINDOW seconds in batched statements.
+
+Read-your-writes: callers read a user's pending value with pending(), or
+force it to the database with flush_user() before reading. A value being
+written stays visible to pending() until its write has committed.
+
+The buffer is per process: a save buffered by one gunicorn worker is not
+seen by a read served by another until it is flushed. With a window of 0
+put() writes before returning. That is the intended production setup:
+gunicorn.conf.py sets it whenever it runs more than one worker, trading
+the coalescing for read-your-writes across workers. Coalescing applies to
+single-process servers (python app.py, or gunicorn with one worker).
+
+Durability: flush_all() runs at interpreter exit. Servers should also call
+it from their shutdown hooks.
+
+Not used on Netlify, where nothing may run after the response is returned.
+"""
+import os
+import time
+import atexit
+import threading
+from logs import get_logger
+
+log = get_logger("write_buffer")
+
+DEFAULT_WINDOW = float(os.getenv("WRITE_BUFFER_WINDOW", 2.0))
+MAX_BATCH_STATEMENTS = 200
+MAX_RETRIES = 3
+
+
+class _Pending:
+    __slots__ = ("value", "build", "combine", "version", "first_at", "failures")
+
+    def __init__(self, value, build, combine, version, first_at):
+        self.value = value
+        self.build = build
+        self.combine = combine
+        self.version = version
+        self.first_at = first_at
+        self.failures = 0
+
+
+class WriteBehindBuffer:
+    def __init__(self, execute_batch, window=DEFAULT_WINDOW):
+        self.execute_batch = execute_batch
+        self.window = window
+        self._pending = {}
+        # Taken by a flush but not committed yet
+        self._inflight = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.flush_all)
+
+    def _next_version(self, key):
+        # Millisecond-based so versions keep increasing across restarts
+        version = max(self._versions.get(key, 0) + 1, int(time.time() * 1000))
+        self._versions[key] = version
+        return version
+
+    def put(self, kind, user_id, value, build, combine=None):
+        """Buffer a write and return its version.
+
+        build(user_id, value) -> statements renders the pending value.
+        combine(old, new) -> value merges with an earlier pending value;
+        without it the newest value wins.
+        """
+        key = (kind, user_id)
+        with self._lock:
+            version = self._next_version(key)
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = _Pending(value, build, combine, version, time.monotonic())
+            else:
+                entry.value = combine(entry.value, value) if combine else value
+                entry.build = build
+                entry.combine = combine
+                entry.version = version
+        if self.window <= 0:
+            # Unbuffered: write through, so other processes read it at once
+            self._flush(lambda k, e: k == key)
+            return version
+        self._ensure_thread()
+        return version
+
+    def pending(self, kind, user_id):
+        """The not-yet-committed value for (kind, user_id), or None.
+
+        While an older value is being written and a newer one is pending,
+        the newer one is returned; callers that need the combined state
+        should flush_user(), which waits for the write in flight.
+        """
+        with self._lock:
+            entry = self._pending.get((kind, user_id)) or self._inflight.get((kind, user_id))
+            return entry.value if entry else None
+
+    def version(self, kind, user_id):
+        with self._lock:
+            return self._versions.get((kind, user_id))
+
+    def flush_user(self, user_id):
+        """Write every pending value for one user now"""
+        self._flush(lambda key, entry: key[1] == user_id)
+
+    def flush_all(self):
+        self._flush(lambda key, entry: True)
+
+    def flush_due(self):
+        cutoff = time.monotonic() - self.window
+        self._flush(lambda key, entry: entry.first_at <= cutoff)
+
+    def close(self):
+        """Stop the flusher thread and write everything that is pending"""
+        self._closed = True
+        self._wakeup.set()
+        self.flush_all()
+
+    def _take(self, predicate):
+        with self._lock:
+            keys = [key for key, entry in self._pending.items() if predicate(key, entry)]
+            taken = [(key, self._pending.pop(key)) for key in keys]
+            for key, entry in taken:
+                self._inflight[key] = entry
+            return taken
+
+    def _settled(self, key, entry):
+        """entry's write committed, was requeued or was dropped"""
+        with self._lock:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+
+    def _requeue(self, key, entry):
+        with self._lock:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+            newer = self._pending.get(key)
+            if newer is None:
+                self._pending[key] = entry
+            elif newer.combine:
+                # Replay the failed write underneath the newer one
+                newer.value = newer.combine(entry.value, newer.value)
+                newer.failures = entry.failures
+            # Otherwise the newer value supersedes the failed one
+
+    def _flush(self, predicate):
+        with self._flush_lock:
+            entries = self._take(predicate)
+            batch, batch_entries = [], []
+            for key, entry in entries:
+                statements = entry.build(key[1], entry.value)
+                if batch and len(batch) + len(statements) > MAX_BATCH_STATEMENTS:
+                    self._write(batch, batch_entries)
+                    batch, batch_entries = [], []
+                batch.extend(statements)
+                batch_entries.append((key, entry, statements))
+            if batch:
+                self._write(batch, batch_entries)
+
+    def _write(self, statements, entries):
+        try:
+            self.execute_batch(statements)
+            for key, entry, _ in entries:
+                self._settled(key, entry)
+            return
+        except Exception as e:
+            log.warning("⚠️ Write-behind batch of %d failed: %s", len(entries), e)
+
+        # Retry entries one by one so a single bad write can't block the rest
+        for key, entry, entry_statements in entries:
+            try:
+                self.execute_batch(entry_statements)
+                self._settled(key, entry)
+            except Exception as e:
+                entry.failures += 1
+                if entry.failures >= MAX_RETRIES:
+                    log.error("❌ Dropping buffered %s write for user %s: %s", key[0], key[1], e)
+                    self._settled(key, entry)
+                else:
+                    self._requeue(key, entry)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(max(self.window / 2, 0.05))
+            self._wakeup.clear()
+            try:
+                self.flush_due()
+            except Exception as e:
+                log.warning("⚠️ Write-behind flush error: %s", e)
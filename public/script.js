@@ -18,8 +18,8 @@ function getApiUrl(endpoint) {
   if (isDevelopment) {
     return `${API_BASE}${endpoint}`;
   } else {
-    // Remove leading slash from endpoint for Netlify Functions
-    const functionName = endpoint.replace(/^\//, '');
+    // Netlify Functions are flat: "/me/state" is served by me_state
+    const functionName = endpoint.replace(/^\//, '').replace(/\//g, '_');
     return `${API_BASE}/${functionName}`;
   }
 }
@@ -38,30 +38,39 @@ function checkAuth() {
   const storedUsername = localStorage.getItem('currentUsername');
 
   if (storedToken && storedUsername) {
-    verifyTokenWithBackend(storedToken);
+    bootstrapSession(storedToken);
   } else {
     showLoginScreen();
   }
 }
 
-async function verifyTokenWithBackend(token) {
+// Fetch history, requirements and shortlist in one request.
+// The browser revalidates with the ETag, so unchanged state costs a 304.
+async function fetchState(token = authToken) {
+  const response = await fetch(getApiUrl('/me/state'), {
+    headers: { 'Authorization': `Bearer ${token}` }
+  });
+  if (response.status === 401) return null;
+  if (!response.ok) throw new Error(`State fetch failed: ${response.status}`);
+  return response.json();
+}
+
+// Validates the stored token and loads everything for first paint in one round trip
+async function bootstrapSession(token) {
   try {
-    const response = await fetch(getApiUrl('/verify_token'), {
-      method: 'GET',
-      headers: { 'Authorization': `Bearer ${token}` }
-    });
+    const state = await fetchState(token);
 
-    if (response.ok) {
+    if (state) {
       authToken = token;
-      currentUsername = localStorage.getItem('currentUsername');
-      showAppScreen();
+      currentUsername = state.user.username || localStorage.getItem('currentUsername');
+      showAppScreen(state);
     } else {
       localStorage.removeItem('authToken');
       localStorage.removeItem('currentUsername');
       showLoginScreen();
     }
   } catch (err) {
-    console.error('Token verification failed:', err);
+    console.error('Session bootstrap failed:', err);
     showLoginScreen();
   }
 }
@@ -71,15 +80,36 @@ function showLoginScreen() {
   document.getElementById('app').style.display = 'none';
 }
 
-function showAppScreen() {
+function showAppScreen(state = null) {
   document.getElementById('authContainer').style.display = 'none';
   document.getElementById('app').style.display = 'block';
   document.getElementById('userDisplay').textContent = `Welcome, ${currentUsername}!`;
   
   // Load user-specific data after login
-  loadRequirements();
-  loadShortlist();
-  loadHistory();
+  if (state) {
+    renderState(state);
+  } else {
+    loadState();
+  }
+}
+
+async function loadState() {
+  if (!authToken) return;
+
+  try {
+    const state = await fetchState();
+    if (state) renderState(state);
+  } catch (err) {
+    console.error('loadState error', err);
+  }
+}
+
+function renderState(state) {
+  renderRequirements(state.requirements);
+  renderShortlist(state.shortlist);
+  displayHistory(state.history_page.items);
+  // The state carries the first page of history; fetch the rest if there is more
+  if (state.history_page.has_more) loadHistory();
 }
 
 // ============================================
@@ -87,6 +117,14 @@ function showAppScreen() {
 // ============================================
 
 function handleLogout() {
+  // Revoke the token server-side; the UI logs out regardless of the result
+  if (authToken) {
+    fetch(getApiUrl('/logout'), {
+      method: 'POST',
+      headers: { 'Authorization': `Bearer ${authToken}` }
+    }).catch(err => console.error('Logout request failed:', err));
+  }
+  
   authToken = null;
   currentUsername = null;
   localStorage.removeItem('authToken');
@@ -331,8 +369,18 @@ function createHistoryEl() {
 // REQUIREMENTS
 // ============================================
 
-async function saveRequirements() {
+let requirementsSaveTimer = null;
+
+// Coalesce bursts of edits (typing, ticking boxes) into a single save
+function saveRequirements() {
   if (!authToken) return;
+  clearTimeout(requirementsSaveTimer);
+  requirementsSaveTimer = setTimeout(saveRequirementsNow, 300);
+}
+
+async function saveRequirementsNow() {
+  if (!authToken) return;
+  clearTimeout(requirementsSaveTimer);
   
   // Collect requirements from main section
   const list = document.getElementById("list");
@@ -378,11 +426,10 @@ async function saveRequirements() {
       body: JSON.stringify({ requirements: reqs })
     });
     
-    // Refresh side menu and main section after save
+    // Edits made in the full screen side menu: bring the main section up to date
     if (overlay && overlay.style.display === 'flex') {
-      populateSideMenu();
+      loadRequirements();
     }
-    loadRequirements(); // Refresh main section
   } catch (err) {
     console.error('Failed to save requirements:', err);
   }
@@ -401,20 +448,23 @@ async function loadRequirements() {
       return;
     }
     
-    const saved = await response.json();
-    const list = document.getElementById("list");
-    list.innerHTML = "";
-    count = 0;
-    
-    (saved || []).forEach(req => {
-      addRequirement(req.text, req.checked);
-    });
+    renderRequirements(await response.json());
   } catch (err) {
     console.error('Failed to load requirements:', err);
   }
 }
 
-function addRequirement(text = "", checked = false) {
+function renderRequirements(saved) {
+  const list = document.getElementById("list");
+  list.innerHTML = "";
+  count = 0;
+  
+  (saved || []).forEach(req => {
+    addRequirement(req.text, req.checked, false);
+  });
+}
+
+function addRequirement(text = "", checked = false, save = true) {
   if (count >= maxRequirements) return;
   count++;
 
@@ -453,79 +503,82 @@ function addRequirement(text = "", checked = false) {
     document.getElementById("addBtn").disabled = true;
   }
 
-  saveRequirements();
+  // Items loaded from the server are already saved
+  if (save) saveRequirements();
 }
 
 // ============================================
 // SHORTLIST
 // ============================================
 
-async function saveShortlist() {
-  if (!authToken) return;
-  
-  // Collect shortlist items from main section
-  const list = document.getElementById("shortlist");
-  const items = [];
-  if (list) {
-    list.querySelectorAll(".short-item").forEach(itemDiv => {
-      const inputs = itemDiv.querySelectorAll("input[type=text]");
-      if (inputs.length >= 5) {
-        items.push({
-          address: inputs[0].value,
-          price: inputs[1].value,
-          bedrooms: inputs[2].value,
-          type: inputs[3].value,
-          link: inputs[4].value
-        });
-      }
-    });
+// Shortlist edits are sent as per-item PATCH operations, so each write
+// carries only the item that changed instead of the whole list.
+async function patchShortlist(ops) {
+  const response = await fetch(getApiUrl('/shortlist'), {
+    method: 'PATCH',
+    headers: {
+      'Content-Type': 'application/json',
+      'Authorization': `Bearer ${authToken}`
+    },
+    body: JSON.stringify({ ops })
+  });
+  if (!response.ok) {
+    throw new Error(`Shortlist update failed (${response.status})`);
   }
-  
-  // Also collect from side menu if it exists (use side menu as source of truth when in full screen mode)
-  const sideMenuShortlist = document.getElementById('sideMenuShortlist');
-  const overlay = document.getElementById('fullScreenMapOverlay');
-  if (sideMenuShortlist && overlay && overlay.style.display === 'flex') {
-    // When in full screen mode, use side menu data
-    items.length = 0; // Clear existing
-    sideMenuShortlist.querySelectorAll(".short-item").forEach(itemDiv => {
-      const inputs = itemDiv.querySelectorAll("input[type=text]");
-      if (inputs.length >= 5) {
-        items.push({
-          address: inputs[0].value,
-          price: inputs[1].value,
-          bedrooms: inputs[2].value,
-          type: inputs[3].value,
-          link: inputs[4].value
-        });
-      }
-    });
+  return response.json();
+}
+
+function readShortlistItem(itemDiv) {
+  const inputs = itemDiv.querySelectorAll("input[type=text]");
+  return {
+    address: inputs[0].value,
+    price: inputs[1].value,
+    bedrooms: inputs[2].value,
+    type: inputs[3].value,
+    link: inputs[4].value
+  };
+}
+
+// Debounce typing so a burst of keystrokes becomes one update per item
+const shortlistUpdateTimers = {};
+
+function scheduleShortlistUpdate(itemDiv, onSaved) {
+  const id = itemDiv.dataset.id;
+  if (!authToken) return;
+  if (!id) {
+    // Still being added: send the edit once the add returns the id
+    itemDiv.dataset.pendingEdit = '1';
+    return;
   }
-  
-  try {
-    await fetch(getApiUrl('/shortlist'), {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${authToken}`
-      },
-      body: JSON.stringify({ shortlist: items })
-    });
-    
-    // Refresh map if it's visible
-    if (mapInitialized && document.getElementById('mapContainer').style.display !== 'none') {
-      await loadMap();
+
+  clearTimeout(shortlistUpdateTimers[id]);
+  shortlistUpdateTimers[id] = setTimeout(async () => {
+    const fields = readShortlistItem(itemDiv);
+    // A new address invalidates the stored map coordinates
+    if (itemDiv.dataset.addressChanged) {
+      fields.coordinates = null;
+      delete itemDiv.dataset.addressChanged;
     }
-    
-    // Refresh full screen map if it's visible
-    if (overlay && overlay.style.display === 'flex') {
-      await loadFullScreenMap();
-      populateSideMenu();
+    try {
+      await patchShortlist([{ op: 'update', id, fields }]);
+      if (onSaved) await onSaved();
+    } catch (err) {
+      console.error('Failed to save shortlist item:', err);
     }
-    
-    // Also refresh main shortlist
-    await loadShortlist();
-  } catch (err) {
-    console.error('Failed to save shortlist:', err);
+  }, 400);
+}
+
+async function refreshShortlistViews() {
+  // Refresh map if it's visible
+  if (mapInitialized && document.getElementById('mapContainer').style.display !== 'none') {
+    await loadMap();
+  }
+  
+  // Refresh full screen map if it's visible
+  const overlay = document.getElementById('fullScreenMapOverlay');
+  if (overlay && overlay.style.display === 'flex') {
+    await loadFullScreenMap();
+    populateSideMenu();
   }
 }
 
@@ -542,20 +595,23 @@ async function loadShortlist() {
       return;
     }
     
-    const saved = await response.json();
-    const list = document.getElementById("shortlist");
-    list.innerHTML = "";
-    shortlistCount = 0;
-    
-    (saved || []).forEach(item => {
-      addShortlistItem(item.address, item.price, item.bedrooms, item.type, item.link);
-    });
+    renderShortlist(await response.json());
   } catch (err) {
     console.error('Failed to load shortlist:', err);
   }
 }
 
-function addShortlistItem(address = "", price = "", bedrooms = "", type = "", link = "") {
+function renderShortlist(saved) {
+  const list = document.getElementById("shortlist");
+  list.innerHTML = "";
+  shortlistCount = 0;
+  
+  (saved || []).forEach(item => {
+    addShortlistItem(item.address, item.price, item.bedrooms, item.type, item.link, item.id);
+  });
+}
+
+function addShortlistItem(address = "", price = "", bedrooms = "", type = "", link = "", id = null) {
   if (shortlistCount >= maxShortlist) return;
   shortlistCount++;
 
@@ -563,6 +619,7 @@ function addShortlistItem(address = "", price = "", bedrooms = "", type = "", li
 
   const itemDiv = document.createElement("div");
   itemDiv.className = "short-item";
+  if (id) itemDiv.dataset.id = id;
   itemDiv.style.display = "flex";
   itemDiv.style.flexDirection = "column";
   itemDiv.style.gap = "8px";
@@ -579,11 +636,12 @@ function addShortlistItem(address = "", price = "", bedrooms = "", type = "", li
     input.value = value;
     input.style.flex = "1";
     input.style.minWidth = "150px";
-    input.addEventListener("input", saveShortlist);
+    input.addEventListener("input", () => scheduleShortlistUpdate(itemDiv, refreshShortlistViews));
     return input;
   };
 
   const addressInput = createInput("Address", address);
+  addressInput.addEventListener("input", () => { itemDiv.dataset.addressChanged = '1'; });
   const priceInput = createInput("Price", price);
   const bedroomsInput = createInput("Bedrooms", bedrooms);
   const typeInput = createInput("Type", type);
@@ -596,11 +654,17 @@ function addShortlistItem(address = "", price = "", bedrooms = "", type = "", li
   delBtn.textContent = "❌";
   delBtn.style.width = "auto";
   delBtn.style.padding = "8px 14px";
-  delBtn.onclick = () => {
+  delBtn.onclick = async () => {
     list.removeChild(itemDiv);
     shortlistCount--;
     document.getElementById("addShortBtn").disabled = false;
-    saveShortlist();
+    if (!itemDiv.dataset.id) return;
+    try {
+      await patchShortlist([{ op: 'remove', id: itemDiv.dataset.id }]);
+      await refreshShortlistViews();
+    } catch (err) {
+      console.error('Failed to remove shortlist item:', err);
+    }
   };
 
   inputContainer.appendChild(addressInput);
@@ -618,7 +682,25 @@ function addShortlistItem(address = "", price = "", bedrooms = "", type = "", li
     document.getElementById("addShortBtn").disabled = true;
   }
 
-  saveShortlist();
+  // Items loaded from the server already exist; new ones are created with an "add" op
+  if (id || !authToken) return Promise.resolve(itemDiv);
+  return patchShortlist([{ op: 'add', item: readShortlistItem(itemDiv) }])
+    .then(async data => {
+      itemDiv.dataset.id = data.ids[0];
+      if (!itemDiv.isConnected) {
+        // Deleted before the add returned
+        await patchShortlist([{ op: 'remove', id: itemDiv.dataset.id }]);
+      } else if (itemDiv.dataset.pendingEdit) {
+        // Typed into before the add returned
+        delete itemDiv.dataset.pendingEdit;
+        scheduleShortlistUpdate(itemDiv, refreshShortlistViews);
+      }
+      return itemDiv;
+    })
+    .catch(err => {
+      console.error('Failed to add shortlist item:', err);
+      return itemDiv;
+    });
 }
 
 // ============================================
@@ -692,21 +774,22 @@ async function loadMap() {
     markers = [];
     
     const bounds = [];
-    let geocodedCount = 0;
+    const coordinateUpdates = [];
     
     updateMapStatus(`Geocoding ${shortlist.length} properties...`, true);
     
     for (let i = 0; i < shortlist.length; i++) {
       const property = shortlist[i];
       
-      if (!property.address) continue;
+      // Duplicates of another shortlisted house share its marker
+      if (!property.address || property.duplicate_of) continue;
       
       // Check if we already have coordinates
       if (!property.coordinates) {
         const coords = await geocodeAddress(property.address);
         if (coords) {
           property.coordinates = coords;
-          geocodedCount++;
+          coordinateUpdates.push({ op: 'update', id: property.id, fields: { coordinates: coords } });
         }
       }
       
@@ -735,16 +818,9 @@ async function loadMap() {
       updateMapStatus('No properties could be geocoded', false);
     }
     
-    // Save updated shortlist with coordinates
-    if (geocodedCount > 0) {
-      await fetch(getApiUrl('/shortlist'), {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${authToken}`
-        },
-        body: JSON.stringify({ shortlist })
-      });
+    // Save just the newly geocoded coordinates
+    if (coordinateUpdates.length > 0) {
+      await patchShortlist(coordinateUpdates);
     }
     
   } catch (err) {
@@ -869,17 +945,20 @@ async function loadFullScreenMap() {
     fullScreenMarkers = [];
     
     const bounds = [];
+    const coordinateUpdates = [];
     
     for (let i = 0; i < shortlist.length; i++) {
       const property = shortlist[i];
       
-      if (!property.address) continue;
+      // Duplicates of another shortlisted house share its marker
+      if (!property.address || property.duplicate_of) continue;
       
       // Check if we already have coordinates
       if (!property.coordinates) {
         const coords = await geocodeAddress(property.address);
         if (coords) {
           property.coordinates = coords;
+          coordinateUpdates.push({ op: 'update', id: property.id, fields: { coordinates: coords } });
         }
       }
       
@@ -905,6 +984,10 @@ async function loadFullScreenMap() {
       fullScreenMap.fitBounds(bounds, { padding: [50, 50] });
     }
     
+    if (coordinateUpdates.length > 0) {
+      await patchShortlist(coordinateUpdates);
+    }
+    
     // Invalidate size after loading markers
     setTimeout(() => {
       if (fullScreenMap) {
@@ -920,67 +1003,55 @@ async function loadFullScreenMap() {
 async function populateSideMenu() {
   if (!authToken) return;
   
-  // Load shortlist from database
+  // Shortlist and requirements come from the same state request
+  let state;
+  try {
+    state = await fetchState();
+  } catch (err) {
+    console.error('Failed to load side menu:', err);
+  }
+  if (!state) return;
+  
   const sideMenuShortlist = document.getElementById('sideMenuShortlist');
   if (sideMenuShortlist) {
-    try {
-      const response = await fetch(getApiUrl('/shortlist'), {
-        headers: { 'Authorization': `Bearer ${authToken}` }
-      });
-      
-      if (response.ok) {
-        const saved = await response.json();
-        sideMenuShortlist.innerHTML = "";
-        
-        (saved || []).forEach(item => {
-          addShortlistItemToSideMenu(item.address, item.price, item.bedrooms, item.type, item.link);
-        });
-        
-        // Update button state
-        const addShortBtnSideMenu = document.getElementById("addShortBtnSideMenu");
-        if (addShortBtnSideMenu) {
-          addShortBtnSideMenu.disabled = (saved || []).length >= maxShortlist;
-        }
-      }
-    } catch (err) {
-      console.error('Failed to load shortlist for side menu:', err);
+    const saved = state.shortlist || [];
+    sideMenuShortlist.innerHTML = "";
+    
+    saved.forEach(item => {
+      addShortlistItemToSideMenu(item.address, item.price, item.bedrooms, item.type, item.link, item.id);
+    });
+    
+    // Update button state
+    const addShortBtnSideMenu = document.getElementById("addShortBtnSideMenu");
+    if (addShortBtnSideMenu) {
+      addShortBtnSideMenu.disabled = saved.length >= maxShortlist;
     }
   }
   
-  // Load requirements from database
   const sideMenuRequirements = document.getElementById('sideMenuRequirements');
   if (sideMenuRequirements) {
-    try {
-      const response = await fetch(getApiUrl('/requirements'), {
-        headers: { 'Authorization': `Bearer ${authToken}` }
-      });
-      
-      if (response.ok) {
-        const saved = await response.json();
-        sideMenuRequirements.innerHTML = "";
-        
-        (saved || []).forEach(req => {
-          addRequirementToSideMenu(req.text, req.checked);
-        });
-        
-        // Update button state
-        const addReqBtnSideMenu = document.getElementById("addReqBtnSideMenu");
-        if (addReqBtnSideMenu) {
-          addReqBtnSideMenu.disabled = (saved || []).length >= maxRequirements;
-        }
-      }
-    } catch (err) {
-      console.error('Failed to load requirements for side menu:', err);
+    const saved = state.requirements || [];
+    sideMenuRequirements.innerHTML = "";
+    
+    saved.forEach(req => {
+      addRequirementToSideMenu(req.text, req.checked);
+    });
+    
+    // Update button state
+    const addReqBtnSideMenu = document.getElementById("addReqBtnSideMenu");
+    if (addReqBtnSideMenu) {
+      addReqBtnSideMenu.disabled = saved.length >= maxRequirements;
     }
   }
 }
 
-function addShortlistItemToSideMenu(address = "", price = "", bedrooms = "", type = "", link = "") {
+function addShortlistItemToSideMenu(address = "", price = "", bedrooms = "", type = "", link = "", id = null) {
   const sideMenuShortlist = document.getElementById('sideMenuShortlist');
   if (!sideMenuShortlist) return;
 
   const itemDiv = document.createElement("div");
   itemDiv.className = "short-item";
+  if (id) itemDiv.dataset.id = id;
   itemDiv.style.display = "flex";
   itemDiv.style.flexDirection = "column";
   itemDiv.style.gap = "8px";
@@ -997,15 +1068,13 @@ function addShortlistItemToSideMenu(address = "", price = "", bedrooms = "", typ
     input.value = value;
     input.style.flex = "1";
     input.style.minWidth = "150px";
-    input.addEventListener("input", () => {
-      saveShortlist();
-      // Also update main shortlist
-      loadShortlist();
-    });
+    // Also update main shortlist once the edit is saved
+    input.addEventListener("input", () => scheduleShortlistUpdate(itemDiv, loadShortlist));
     return input;
   };
 
   const addressInput = createInput("Address", address);
+  addressInput.addEventListener("input", () => { itemDiv.dataset.addressChanged = '1'; });
   const priceInput = createInput("Price", price);
   const bedroomsInput = createInput("Bedrooms", bedrooms);
   const typeInput = createInput("Type", type);
@@ -1020,7 +1089,13 @@ function addShortlistItemToSideMenu(address = "", price = "", bedrooms = "", typ
   delBtn.style.padding = "8px 14px";
   delBtn.onclick = async () => {
     sideMenuShortlist.removeChild(itemDiv);
-    await saveShortlist(); // This will collect all remaining items and save
+    if (itemDiv.dataset.id) {
+      try {
+        await patchShortlist([{ op: 'remove', id: itemDiv.dataset.id }]);
+      } catch (err) {
+        console.error('Failed to remove shortlist item:', err);
+      }
+    }
     // Refresh both main shortlist and side menu
     await loadShortlist();
     await populateSideMenu();
@@ -1053,27 +1128,20 @@ function addRequirementToSideMenu(text = "", checked = false) {
   const checkbox = document.createElement("input");
   checkbox.type = "checkbox";
   checkbox.checked = checked;
-  checkbox.addEventListener("change", () => {
-    saveRequirements();
-    // Also update main requirements
-    loadRequirements();
-  });
+  // Saving from the side menu also updates the main requirements
+  checkbox.addEventListener("change", saveRequirements);
 
   const textInput = document.createElement("input");
   textInput.type = "text";
   textInput.placeholder = "Enter requirement...";
   textInput.value = text;
-  textInput.addEventListener("input", () => {
-    saveRequirements();
-    // Also update main requirements
-    loadRequirements();
-  });
+  textInput.addEventListener("input", saveRequirements);
 
   const delBtn = document.createElement("button");
   delBtn.textContent = "❌";
   delBtn.onclick = async () => {
     sideMenuRequirements.removeChild(reqDiv);
-    await saveRequirements(); // This will collect all remaining items and save
+    await saveRequirementsNow(); // This will collect all remaining items and save
     // Refresh both main requirements and side menu
     await loadRequirements();
     await populateSideMenu();
@@ -1095,7 +1163,7 @@ async function addShortlistItemFromSideMenu() {
   }
 
   // Add to main shortlist first (which saves to DB)
-  addShortlistItem();
+  await addShortlistItem();
   
   // Refresh side menu to show the new item
   await populateSideMenu();
@@ -1162,11 +1230,17 @@ async function askExpert() {
     return;
   }
   
+  // Opt-in: let the backend add the user's requirements and shortlist to the prompt
+  const useContextEl = document.getElementById("useContext");
+  const useContext = !!(useContextEl && useContextEl.checked && authToken);
+  const headers = { "Content-Type": "application/json" };
+  if (useContext) headers['Authorization'] = `Bearer ${authToken}`;
+  
   try {
     const res = await fetch(getApiUrl('/ask_expert'), {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ question })
+      headers,
+      body: JSON.stringify({ question, use_context: useContext })
     });
     const data = await res.json();
     document.getElementById("answer").textContent = data.answer || data.error;
@@ -0,0 +1,67 @@
+"""
+Roll history older than the retention window into weekly/monthly rollups.
+
+Works a batch at a time; each batch is one short transaction, so it is safe
+to run while the app is serving and to stop at any point and rerun. Run it
+from cron, e.g. nightly.
+
+    python scripts/compact_history.py --dry-run              # report what would change
+    python scripts/compact_history.py                        # Turso (TURSO_* env vars)
+    python scripts/compact_history.py --sqlite local.db --daily-days 30 --batch-size 1000
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import history_rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sqlite", help="path to a local SQLite database instead of Turso")
+    parser.add_argument("--dry-run", action="store_true", help="report rows affected without changing anything")
+    parser.add_argument("--daily-days", type=int, default=history_rollup.DAILY_DAYS)
+    parser.add_argument("--weekly-days", type=int, default=history_rollup.WEEKLY_DAYS)
+    parser.add_argument("--today", type=date.fromisoformat, help="compute cutoffs from this date (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=history_rollup.COMPACT_BATCH)
+    parser.add_argument("--sleep", type=float, default=0.05, help="pause between batches (seconds)")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from local_db import make_executor
+        execute_batch = make_executor(args.sqlite)
+    else:
+        from utils import execute_batch
+
+    try:
+        limits = history_rollup.cutoffs(args.today, args.daily_days, args.weekly_days)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"📅 Daily rows kept from {limits.daily}, weekly rollups from {limits.weekly}, monthly before")
+
+    if args.dry_run:
+        for stage, rows, rollups in history_rollup.report(execute_batch, limits):
+            print(f"  {stage:<18} {rows:>10} rows -> {rollups:>8} rollup rows")
+        return
+
+    totals = {}
+    started = time.perf_counter()
+    for progress in history_rollup.compact(execute_batch, limits, args.batch_size):
+        rows, rollups = totals.get(progress.stage, (0, 0))
+        totals[progress.stage] = (rows + progress.rows, rollups + progress.rollups)
+        print(f"🔄 {progress.stage}: up to id {progress.last_id}, {totals[progress.stage][0]} rows rolled up")
+        time.sleep(args.sleep)
+    for stage, (rows, rollups) in totals.items():
+        print(f"✅ {stage}: {rows} rows merged through {rollups} rollup upserts")
+    print(f"✅ Done in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
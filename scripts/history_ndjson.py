@@ -0,0 +1,99 @@
+"""
+Export or import search history as NDJSON.
+
+Export streams rows in id order with constant memory; import reads NDJSON
+(as written by export) or the legacy results_history.json array and
+upserts it in batches, so running it twice is harmless.
+
+    python scripts/history_ndjson.py export > history.ndjson            # every user (Turso)
+    python scripts/history_ndjson.py export --user-id 3 --out user3.ndjson
+    python scripts/history_ndjson.py import history.ndjson --sqlite local.db
+    python scripts/history_ndjson.py import results_history.json --user-id 3 --url "https://..."
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import history_io
+
+
+def export(args, execute_batch):
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    rows, started = 0, time.perf_counter()
+    try:
+        for page in history_io.export_pages(execute_batch, args.user_id, args.after, args.page_size):
+            out.write(history_io.ndjson_lines(page, with_user=args.user_id is None))
+            rows += len(page)
+            last_id = page[-1][0]
+    finally:
+        if args.out:
+            out.close()
+    elapsed = time.perf_counter() - started
+    resume = f", resume with --after {last_id}" if rows else ""
+    print(f"✅ Exported {rows} rows in {elapsed:.1f} s{resume}", file=sys.stderr)
+
+
+def import_(args, execute_batch):
+    stream = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    written = skipped = 0
+    started = last_report = time.perf_counter()
+    try:
+        records = history_io.read_records(stream)
+        for written, skipped in history_io.import_records(
+            execute_batch, records, args.batch_size, args.user_id, args.url
+        ):
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                print(f"🔄 {written} rows written, {skipped} skipped ({written / (now - started):.0f} rows/s)",
+                      file=sys.stderr)
+                last_report = now
+    except ValueError as e:
+        print(f"❌ {args.file} is not valid NDJSON or a JSON array: {e} ({written} rows written)", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Imported {written} rows ({skipped} skipped) in {elapsed:.1f} s, "
+          f"{written / elapsed if elapsed else 0:.0f} rows/s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sqlite", help="path to a local SQLite database instead of Turso")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write history as NDJSON")
+    export_parser.add_argument("--user-id", type=int, help="only this user (default: everyone, with user_id)")
+    export_parser.add_argument("--after", type=int, default=0, help="resume after this row id")
+    export_parser.add_argument("--page-size", type=int, default=history_io.EXPORT_PAGE)
+    export_parser.add_argument("--out", help="output file (default stdout)")
+
+    import_parser = commands.add_parser("import", help="upsert NDJSON or a legacy JSON array")
+    import_parser.add_argument("file", help="NDJSON or JSON array file, - for stdin")
+    import_parser.add_argument("--user-id", type=int, help="user for records without a user_id")
+    import_parser.add_argument("--url", help="search URL for records without one (legacy file)")
+    import_parser.add_argument("--batch-size", type=int, default=history_io.IMPORT_BATCH,
+                               help="rows per UPSERT statement")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from local_db import make_executor
+        execute_batch = make_executor(args.sqlite)
+    else:
+        from utils import execute_batch
+
+    if args.command == "export":
+        export(args, execute_batch)
+    else:
+        import_(args, execute_batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Score a batch of listings against every user's requirements in one pass.
+
+Listings come from a JSON file: a list of objects, or {"listings": [...]}
+(the /matches request body), with the fields /matches reads (address,
+description, price, bedrooms, link, ...). All saved requirements are loaded
+into one index, so each listing is scored for everyone at once. Prints one
+NDJSON line per listing that meets at least one user's requirements.
+
+    python scripts/match_listings.py listings.json                     # Turso (TURSO_* env vars)
+    python scripts/match_listings.py listings.json --min-score 0.5 --out matches.ndjson
+    python scripts/match_listings.py - --sqlite local.db < listings.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import matcher
+
+
+def read_listings(path):
+    if path == "-":
+        data = json.load(sys.stdin)
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    listings = data.get("listings") if isinstance(data, dict) else data
+    if not isinstance(listings, list):
+        raise ValueError("expected a list of listings or {\"listings\": [...]}")
+    return listings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("listings", help="JSON file of listings, or - for stdin")
+    parser.add_argument("--sqlite", help="path to a local SQLite database instead of Turso")
+    parser.add_argument("--min-score", type=float, default=0.0, help="leave out users scoring below this")
+    parser.add_argument("--out", help="write NDJSON here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        listings = read_listings(args.listings)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.sqlite:
+        from local_db import make_executor
+        execute_batch = make_executor(args.sqlite)
+    else:
+        from utils import execute_batch
+
+    started = time.perf_counter()
+    matches = [m for m in matcher.match_all(execute_batch, listings, args.min_score) if m["users"]]
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for match in matches:
+            out.write(json.dumps(match, separators=(",", ":")) + "\n")
+    finally:
+        if args.out:
+            out.close()
+    print(f"✅ {len(listings)} listings scored in {time.perf_counter() - started:.2f} s, "
+          f"{len(matches)} matched someone", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Apply or inspect database schema migrations.
+
+    python scripts/migrate.py                      # apply pending migrations (Turso)
+    python scripts/migrate.py status               # current and pending versions
+    python scripts/migrate.py --sqlite local.db    # against a local SQLite file
+    python scripts/migrate.py --dry-run            # print the SQL that would run
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import migrate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    parser.add_argument("--sqlite", help="path to a local SQLite database instead of Turso")
+    parser.add_argument("--dry-run", action="store_true", help="show pending migrations without applying them")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from local_db import make_executor
+        execute_batch = make_executor(args.sqlite)
+    else:
+        from utils import execute_batch
+
+    status = migrate.schema_status(execute_batch)
+    if args.command == "status" or args.dry_run:
+        print(f"Schema version {status.current}, latest {status.latest}")
+        for migration in status.pending:
+            print(f"  pending {migration.version:04d}_{migration.name}")
+            if args.dry_run:
+                for sql in migration.statements:
+                    print("    " + sql.replace("\n", "\n    ") + ";")
+        return
+
+    try:
+        migrate.migrate(execute_batch)
+    except migrate.MigrationError as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Re-encode plain JSON blob columns with the storage codec.
+
+Walks each column in rowid order, a batch at a time, rewriting rows that
+still hold plain JSON. Safe to run while the app is serving: a row saved in
+the meantime is left alone, and readers understand both encodings. Stop it
+at any point and rerun (or pass --after) to resume.
+
+    python scripts/reencode_blobs.py                     # Turso (TURSO_* env vars)
+    python scripts/reencode_blobs.py --sqlite local.db   # local SQLite file
+    python scripts/reencode_blobs.py --batch-size 100 --sleep 0.5
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import codec
+
+COLUMNS = [
+    ("user_requirements", "requirements"),
+    # Legacy shortlist blobs not yet migrated to rows
+    ("user_shortlist", "shortlist"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sqlite", help="path to a local SQLite database instead of Turso")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--sleep", type=float, default=0.1, help="pause between batches (seconds)")
+    parser.add_argument("--after", type=int, default=0, help="resume after this rowid")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from local_db import make_executor
+        execute_batch = make_executor(args.sqlite)
+    else:
+        from utils import execute_batch
+
+    for table, column in COLUMNS:
+        seen = rewritten = 0
+        for last_rowid, batch_seen, batch_rewritten in codec.migrate_column(
+            execute_batch, table, column, args.batch_size, args.after
+        ):
+            seen += batch_seen
+            rewritten += batch_rewritten
+            print(f"🔄 {table}.{column}: up to rowid {last_rowid}, {rewritten}/{seen} rewritten")
+            time.sleep(args.sleep)
+        print(f"✅ {table}.{column}: {rewritten} of {seen} rows re-encoded")
+
+
+if __name__ == "__main__":
+    main()
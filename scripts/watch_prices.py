@@ -0,0 +1,65 @@
+"""
+Re-check shortlisted listing pages and record price and status changes.
+
+Each distinct link is fetched once however many users shortlisted it, with
+conditional requests, so an unchanged page costs a 304. Run it once from
+cron, or leave it running with --loop.
+
+    python scripts/watch_prices.py                           # Turso (TURSO_* env vars), one pass
+    python scripts/watch_prices.py --loop --poll 300         # check whatever is due every 5 minutes
+    python scripts/watch_prices.py --sqlite local.db --interval 3600 --concurrency 16
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import price_watch
+
+
+def run_once(execute_batch, session, args):
+    started = time.perf_counter()
+    totals = [0, 0, 0, 0]
+    for cycle in price_watch.run_cycle(execute_batch, session, interval=args.interval, batch_size=args.batch_size,
+                                       concurrency=args.concurrency, per_host=args.per_host, max_run=args.max_run):
+        totals = [total + value for total, value in zip(totals, cycle)]
+        print(f"🔄 {totals[0]} listings checked")
+    checked, not_modified, changed, failed = totals
+    print(f"✅ {checked} checked in {time.perf_counter() - started:.1f} s: "
+          f"{not_modified} not modified, {changed} changed, {failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sqlite", help="path to a local SQLite database instead of Turso")
+    parser.add_argument("--interval", type=float, default=price_watch.INTERVAL,
+                        help="seconds between checks of one listing")
+    parser.add_argument("--concurrency", type=int, default=price_watch.CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=price_watch.PER_HOST)
+    parser.add_argument("--batch-size", type=int, default=price_watch.BATCH)
+    parser.add_argument("--max-run", type=float, default=price_watch.MAX_RUN,
+                        help="seconds one pass keeps taking new pages")
+    parser.add_argument("--loop", action="store_true", help="keep running instead of a single pass")
+    parser.add_argument("--poll", type=float, default=300, help="seconds between passes with --loop")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from local_db import make_executor
+        execute_batch = make_executor(args.sqlite)
+    else:
+        from utils import execute_batch
+
+    session = price_watch.make_session(args.concurrency)
+    run_once(execute_batch, session, args)
+    while args.loop:
+        time.sleep(args.poll)
+        run_once(execute_batch, session, args)
+
+
+if __name__ == "__main__":
+    main()
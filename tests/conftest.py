@@ -0,0 +1,25 @@
+import os
+import sys
+import logging
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "netlify", "functions"))
+os.environ.setdefault("LOG_ASYNC", "0")
+
+import logs
+import migrate
+from local_db import make_executor
+
+# Hand log records to pytest (caplog, reports) instead of the stdout handler
+logs.get_logger("tests")
+logging.getLogger(logs.ROOT).handlers.clear()
+logging.getLogger(logs.ROOT).propagate = True
+
+
+@pytest.fixture
+def execute_batch(tmp_path):
+    """Executor over a fresh SQLite database with every migration applied"""
+    execute = make_executor(str(tmp_path / "test.db"))
+    migrate.migrate(execute, log=lambda *args: None)
+    return execute
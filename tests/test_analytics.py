@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+import analytics
+
+nan = np.nan
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(analytics, "analytics_cache", analytics.AnalyticsCache())
+
+
+class Recorder:
+    """execute_batch wrapper remembering the statements sent"""
+
+    def __init__(self, execute_batch):
+        self.execute_batch = execute_batch
+        self.sql = []
+
+    def __call__(self, statements):
+        self.sql.extend(sql for sql, _ in statements)
+        return self.execute_batch(statements)
+
+
+def add_rows(execute_batch, user_id, rows):
+    execute_batch([("INSERT INTO user_history (user_id, url, date, results) VALUES (?, ?, ?, ?)",
+                    [user_id, url, date, results]) for url, date, results in rows])
+
+
+def test_forward_fill_keeps_leading_gaps():
+    matrix = np.array([[nan, 1, nan, 3, nan], [2, nan, nan, nan, nan]])
+
+    filled = analytics.forward_fill(matrix)
+
+    np.testing.assert_array_equal(filled, [[nan, 1, 1, 3, 3], [2, 2, 2, 2, 2]])
+
+
+def test_rolling_mean_ignores_missing_days():
+    matrix = np.array([[1, nan, 3, 5, nan, nan]])
+
+    mean = analytics.rolling_mean(matrix, 2)
+
+    np.testing.assert_array_equal(mean, [[1, 1, 3, 4, 5, nan]])
+
+
+def test_lagged_delta():
+    matrix = np.array([[1.0, 4, 6]])
+
+    np.testing.assert_array_equal(analytics.lagged_delta(matrix, 1), [[nan, 3, 2]])
+    assert np.isnan(analytics.lagged_delta(matrix, 7)).all()
+
+
+def test_anomalies_flag_outlying_changes_only():
+    observed = np.array([[10.0] * 10 + [100.0], [1.0] * 11])
+    dod = analytics.lagged_delta(observed, 1)
+
+    flags = analytics.anomalies(observed, dod, 2)
+
+    assert flags[0].tolist() == [False] * 10 + [True]
+    # A flat series has no spread to be anomalous against
+    assert not flags[1].any()
+
+
+def test_compute_series_and_latest_values():
+    history = analytics.History().appended([
+        (1, "a", "2024-01-01", "10 results"),
+        (2, "b", "2024-01-02", "1,000 results"),
+        (3, "a", "2024-01-03", "14 results"),
+        (4, "a", "2024-01-03", "16 results"),
+        (5, "b", "2024-01-03", "no results"),
+    ])
+
+    result = analytics.compute(history, days=2, window=7)
+
+    assert (result["start"], result["end"]) == ("2024-01-01", "2024-01-03")
+    assert result["dates"] == ["2024-01-02", "2024-01-03"]
+    a, b = result["urls"]
+    assert a["url"] == "a"
+    # The later scrape of the same day wins
+    assert a["series"]["value"] == [None, 16]
+    assert a["series"]["filled"] == [10, 16]
+    assert (a["latest"], a["dod"], a["observations"]) == (16, 6, 2)
+    assert a["rolling_mean"] == 13
+    # "no results" has no number: a gap, not a zero
+    assert b["series"]["value"] == [1000, None]
+    assert (b["latest"], b["dod"], b["wow"]) == (1000, 0, None)
+
+
+def test_compute_empty_history():
+    result = analytics.compute(analytics.History())
+
+    assert result["urls"] == [] and result["start"] is None
+
+
+def test_appended_leaves_the_original_alone():
+    history = analytics.History().appended([(1, "a", "2024-01-01", "5")])
+
+    longer = history.appended([(2, "a", "2024-01-02", "6")])
+
+    assert (len(history), len(longer)) == (1, 2)
+    assert longer.last_id == 2
+
+
+def test_load_analytics_fetches_only_new_rows(execute_batch):
+    add_rows(execute_batch, 1, [("a", "2024-01-01", "10"), ("a", "2024-01-02", "12")])
+    add_rows(execute_batch, 2, [("other", "2024-01-01", "99")])
+    first = analytics.load_analytics(execute_batch, 1)
+
+    recorder = Recorder(execute_batch)
+    assert analytics.load_analytics(recorder, 1) is first
+    assert recorder.sql == [analytics.FINGERPRINT_SQL]
+
+    add_rows(execute_batch, 1, [("a", "2024-01-03", "15")])
+    recorder.sql.clear()
+    result = analytics.load_analytics(recorder, 1)
+
+    assert recorder.sql == [analytics.FINGERPRINT_SQL, analytics.ROWS_SQL, analytics.DELTA_SQL]
+    assert result["urls"][0]["series"]["value"][-3:] == [10, 12, 15]
+    assert [u["url"] for u in result["urls"]] == ["a"]
+
+
+def test_load_analytics_reloads_after_an_update(execute_batch):
+    add_rows(execute_batch, 1, [("a", "2024-01-01", "10"), ("a", "2024-01-02", "12")])
+    analytics.load_analytics(execute_batch, 1)
+
+    # Re-scraping a day changes an existing row: appending can't account for it
+    execute_batch([("UPDATE user_history SET results = '20' WHERE date = '2024-01-02'", [])])
+    add_rows(execute_batch, 1, [("a", "2024-01-03", "30")])
+    recorder = Recorder(execute_batch)
+    result = analytics.load_analytics(recorder, 1)
+
+    assert analytics.ROLLUP_SQL in recorder.sql
+    assert result["urls"][0]["series"]["value"][-3:] == [10, 20, 30]
+
+
+def test_load_analytics_includes_rolled_up_periods(execute_batch):
+    execute_batch([("INSERT INTO user_history_rollup (user_id, url, period, period_start, samples, "
+                    "min_count, max_count, avg_count, last_date, last_results) "
+                    "VALUES (1, 'a', 'week', '2023-12-25', 3, 1, 9, 5, '2023-12-31', '9')", [])])
+    add_rows(execute_batch, 1, [("a", "2024-01-01", "10")])
+
+    result = analytics.load_analytics(execute_batch, 1)
+
+    assert result["start"] == "2023-12-31"
+    assert result["urls"][0]["observations"] == 2
+
+
+def test_parse_params_clamps_and_rejects():
+    assert analytics.parse_params({}) == (30, 7, 3.0)
+    assert analytics.parse_params({"days": "0", "window": "9999", "z": "0"}) == (1, 365, 0.5)
+    assert analytics.parse_params({"days": "99999"})[0] == analytics.MAX_DAYS
+    with pytest.raises(ValueError):
+        analytics.parse_params({"z": "high"})
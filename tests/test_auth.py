@@ -0,0 +1,97 @@
+import time
+
+import jwt
+import pytest
+
+import auth
+
+SECRET = "s" * 32
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(auth, "revocations", auth.RevocationList())
+    auth.token_cache.clear()
+    yield
+    auth.token_cache.clear()
+
+
+@pytest.fixture
+def query(execute_batch):
+    return lambda sql, params=None: execute_batch([(sql, params)])
+
+
+def token(user_id=1, expires_in=3600, secret=SECRET):
+    return jwt.encode({"user_id": user_id, "username": "bob", "exp": int(time.time() + expires_in)},
+                      secret, algorithm="HS256")
+
+
+def test_extract_token():
+    assert auth.extract_token("Bearer abc ") == "abc"
+    assert auth.extract_token("bearer abc") == "abc"
+    assert auth.extract_token("abc") == "abc"
+    assert auth.extract_token(None) == ""
+
+
+def test_valid_token_is_decoded_once(monkeypatch):
+    value = token()
+    assert auth.authenticate(value, SECRET)["user_id"] == 1
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("decoded again")
+
+    monkeypatch.setattr(jwt, "decode", no_decode)
+    assert auth.authenticate(value, SECRET)["user_id"] == 1
+
+
+@pytest.mark.parametrize("value, secret", [
+    (token(secret="x" * 32), SECRET),
+    (token(expires_in=-10), SECRET),
+    ("not-a-token", SECRET),
+    ("", SECRET),
+    (token(), ""),
+])
+def test_invalid_tokens_are_refused(value, secret):
+    assert auth.authenticate(value, secret) is None
+
+
+def test_revoked_token_is_refused_even_when_cached(query):
+    value = token()
+    claims = auth.authenticate(value, SECRET, query)
+    auth.revoke(value, claims, query)
+    assert auth.authenticate(value, SECRET, query) is None
+    assert auth.authenticate(token(user_id=2), SECRET, query) is not None
+
+
+def test_revocations_reach_other_processes_on_sync(query, monkeypatch):
+    value = token()
+    claims = auth.authenticate(value, SECRET, query)
+    auth.revoke(value, claims, query)
+
+    # Another worker: empty in-memory list, the token still in its cache
+    other = auth.RevocationList(refresh_interval=0)
+    monkeypatch.setattr(auth, "revocations", other)
+    auth.token_cache.set(auth.token_hash(value), claims)
+    assert auth.authenticate(value, SECRET, query) is None
+
+
+def test_sync_is_rate_limited_and_survives_errors():
+    revocations = auth.RevocationList(refresh_interval=60)
+    calls = []
+
+    def broken(sql, params=None):
+        calls.append(sql)
+        raise RuntimeError("database is down")
+
+    revocations.maybe_sync(broken)
+    revocations.maybe_sync(broken)
+    assert len(calls) == 1
+
+
+def test_expired_revocations_are_dropped_on_sync(query):
+    revocations = auth.RevocationList()
+    revocations.add("old", time.time() - 1)
+    revocations.add("live", time.time() + 60)
+    revocations.sync(query)
+    assert "old" not in revocations._revoked
+    assert "live" in revocations
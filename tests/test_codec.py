@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import codec
+
+SMALL = {"text": "garden", "checked": False}
+LARGE = [{"text": f"requirement {n}: near a station with parking", "checked": n % 2 == 0} for n in range(50)]
+
+
+def test_small_values_stay_plain_json():
+    assert codec.encode(SMALL) == json.dumps(SMALL, separators=(",", ":"))
+    assert codec.decode(codec.encode(SMALL)) == SMALL
+
+
+def test_large_values_are_compressed_and_round_trip():
+    encoded = codec.encode(LARGE)
+    assert codec.is_encoded(encoded)
+    assert len(encoded) < len(json.dumps(LARGE))
+    assert codec.decode(encoded) == LARGE
+
+
+@pytest.mark.parametrize("value", [None, 0, "£350k", [], {"nested": {"a": [1, 2.5, None]}}])
+def test_round_trip(value):
+    assert codec.decode(codec.encode(value)) == value
+
+
+def test_decodes_legacy_json_and_bytes():
+    assert codec.decode('[{"text": "garden"}]') == [{"text": "garden"}]
+    assert codec.decode(codec.encode(LARGE).encode("utf-8")) == LARGE
+    assert codec.decode(None) is None
+
+
+def test_zlib_fallback(monkeypatch):
+    monkeypatch.setattr(codec, "zstandard", None)
+    encoded = codec.encode(LARGE)
+    assert encoded.startswith(codec.HEADER_PREFIX + "jd:")
+    assert codec.decode(encoded) == LARGE
+
+
+def test_plain_format_turns_encoding_off(monkeypatch):
+    monkeypatch.setattr(codec, "CODEC_FORMAT", "plain")
+    assert not codec.is_encoded(codec.encode(LARGE))
+
+
+def test_unknown_header_is_rejected():
+    with pytest.raises(ValueError):
+        codec.decode("~1xq:AAAA")
+
+
+def test_reencode_statements_skip_current_rows():
+    current = codec.encode(LARGE)
+    legacy = json.dumps(LARGE)
+    statements = codec.reencode_statements("user_requirements", "requirements", [(1, current), (2, legacy)])
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert params == [current, 2, legacy]
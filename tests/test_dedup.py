@@ -0,0 +1,91 @@
+import dedup
+
+
+def items(*addresses):
+    return [{"id": str(n), "address": address} for n, address in enumerate(addresses)]
+
+
+def test_normalise():
+    address = dedup.normalise("Flat 2, 10 Mill Rd, Bristol bs81aa")
+    assert address.postcode == "BS8 1AA"
+    assert address.flat == "2"
+    assert address.number == "10"
+    assert address.first == "MILL"
+    assert address.tokens == {"MILL", "ROAD", "BRISTOL"}
+
+
+def test_blocking_keys():
+    numbered = dedup.normalise("10 Mill Road, Bristol, BS8 1AA")
+    assert dedup.blocking_keys(numbered, "https://a.example/1") == [
+        ("P", "BS8 1AA", "10"), ("S", "10", "MILL"), ("L", "https://a.example/1"),
+    ]
+    named = dedup.normalise("Rose Cottage, Mill Lane, Bath, BA1 2AB")
+    assert dedup.blocking_keys(named) == [("H", "BA1 2AB", "ROSE")]
+
+
+def test_finds_differently_written_duplicates():
+    found = dedup.find_duplicates(items(
+        "10 Mill Road, Bristol, BS8 1AA",
+        "12 Mill Road, Bristol, BS8 1AA",
+        "10 MILL RD BRISTOL",
+        "10 Mill Road, Bristol, bs81aa",
+    ))
+    assert found == {"2": "0", "3": "0"}
+
+
+def test_contradictions_are_not_duplicates():
+    assert dedup.find_duplicates(items(
+        "10 Mill Road, Bristol, BS8 1AA",
+        "10 Mill Road, Bristol, BS8 2AB",
+        "Flat 2, 10 Mill Road, Bristol, BS8 1AA",
+        "10 Oak Road, Bristol, BS8 1AA",
+    )) == {}
+
+
+def test_links_match_without_tracking_parameters():
+    found = dedup.find_duplicates([
+        {"id": "a", "address": "Rose Cottage, Bath", "link": "https://portal.example/properties/1"},
+        {"id": "b", "address": "Cottage near Bath", "link": "https://Portal.example/properties/1/?utm_source=x"},
+    ])
+    assert found == {"b": "a"}
+
+
+def test_far_apart_coordinates_are_different_houses():
+    near, far = {"lat": 51.45, "lon": -2.58}, {"lat": 51.46, "lon": -2.58}
+    found = dedup.find_duplicates([
+        {"id": "a", "address": "10 Mill Road, Bristol", "coordinates": near},
+        {"id": "b", "address": "10 Mill Road, Bristol", "coordinates": far},
+    ])
+    assert found == {}
+
+
+def test_no_postcode_item_never_joins_two_postcodes():
+    parents, _ = dedup.find_groups(items(
+        "10 Mill Road, Bristol, BS8 1AA",
+        "10 Mill Road, Bristol",
+        "10 Mill Road, Bristol, BS8 2AB",
+    ))
+    assert parents == [0, 0, 2]
+
+
+def test_blocking_skips_unrelated_pairs():
+    addresses = [f"{n} Mill Road, Bristol, BS8 1AA" for n in range(1, 101)]
+    parents, comparisons = dedup.find_groups(items(*addresses))
+    assert parents == list(range(100))
+    assert comparisons == 0
+
+
+def test_flag_and_merge():
+    shortlist = items("10 Mill Road, Bristol, BS8 1AA", "10 Mill Rd, Bristol")
+    shortlist[0]["price"] = ""
+    shortlist[1]["price"] = "£300,000"
+    assert dedup.flag([dict(item) for item in shortlist]) == {"1": "0"}
+    kept, duplicates = dedup.merge(shortlist)
+    assert duplicates == {"1": "0"}
+    assert kept == [{"id": "0", "address": "10 Mill Road, Bristol, BS8 1AA", "price": "£300,000"}]
+
+
+def test_affects_duplicates():
+    assert dedup.affects_duplicates([{"op": "add", "item": {}}])
+    assert dedup.affects_duplicates([{"op": "update", "id": "a", "fields": {"address": "x"}}])
+    assert not dedup.affects_duplicates([{"op": "update", "id": "a", "fields": {"notes": "x"}}])
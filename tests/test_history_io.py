@@ -0,0 +1,119 @@
+import io
+import json
+
+import pytest
+
+import history_io
+
+
+def history(execute_batch):
+    result, = execute_batch([("SELECT user_id, url, date, results FROM user_history ORDER BY id", [])])
+    return [tuple(row) for row in result["results"]["rows"]]
+
+
+def import_all(execute_batch, text, **kwargs):
+    return list(history_io.import_records(execute_batch, history_io.read_records(io.StringIO(text)), **kwargs))
+
+
+@pytest.mark.parametrize("text, count", [
+    ("1,234 results", 1234),
+    ("Showing 12 of many", 12),
+    ("no results", None),
+    (None, None),
+])
+def test_parse_count(text, count):
+    assert history_io.parse_count(text) == count
+
+
+def test_read_records_ndjson_skips_blank_lines():
+    stream = io.StringIO('\n{"a": 1}\n\n  {"a": 2}\n')
+
+    assert list(history_io.read_records(stream)) == [(2, {"a": 1}), (4, {"a": 2})]
+
+
+def test_read_records_ndjson_reports_the_bad_line():
+    with pytest.raises(ValueError, match="line 2"):
+        list(history_io.read_records(io.StringIO('{"a": 1}\n{oops\n')))
+
+
+def test_json_array_elements_split_across_reads():
+    items = [{"date": f"2024-01-{day:02}", "results": f"{day} results"} for day in range(1, 20)]
+    stream = io.StringIO("  " + json.dumps(items, indent=1))
+    head = stream.read(3)
+    assert head.strip() == "["
+
+    records = list(history_io._json_array(stream, chunk_size=7))
+
+    assert records == list(enumerate(items))
+
+
+def test_json_array_truncated():
+    with pytest.raises(ValueError):
+        list(history_io.read_records(io.StringIO('[{"date": "2024-01-01"}, {"da')))
+
+
+def test_to_row_accepts_count_only_records():
+    row = history_io.to_row({"url": "u", "date": "2024-01-02", "count": 1500}, user_id=3)
+
+    assert row == (3, "u", "2024-01-02", "1,500 results")
+
+
+@pytest.mark.parametrize("record, message", [
+    ([], "not an object"),
+    ({"url": "u", "date": "2024-01-01", "results": "1"}, "no user_id"),
+    ({"user_id": 1, "date": "2024-01-01", "results": "1"}, "no url"),
+    ({"user_id": 1, "url": "u", "date": "01/01/2024", "results": "1"}, "bad date"),
+    ({"user_id": 1, "url": "u", "date": "2024-01-01", "results": "none"}, "no result count"),
+])
+def test_to_row_rejects(record, message):
+    with pytest.raises(ValueError, match=message):
+        history_io.to_row(record)
+
+
+def test_import_batches_and_skips(execute_batch):
+    lines = [json.dumps({"user_id": 1, "url": "u", "date": f"2024-01-{day:02}", "results": f"{day} results"})
+             for day in range(1, 6)]
+    lines.insert(2, json.dumps({"user_id": 1, "url": "u", "date": "never", "results": "1"}))
+
+    progress = import_all(execute_batch, "\n".join(lines), batch_size=2)
+
+    assert progress == [(2, 0), (4, 1), (5, 1)]
+    assert len(history(execute_batch)) == 5
+
+
+def test_reimport_overwrites_instead_of_duplicating(execute_batch):
+    legacy = json.dumps([{"date": "2024-01-01", "results": "10 results"}])
+    import_all(execute_batch, legacy, user_id=7, url="search")
+    import_all(execute_batch, legacy.replace("10", "11"), user_id=7, url="search")
+
+    assert history(execute_batch) == [(7, "search", "2024-01-01", "11 results")]
+
+
+def test_export_pages_resume_and_limit(execute_batch):
+    import_all(execute_batch, "\n".join(
+        json.dumps({"user_id": user, "url": "u", "date": f"2024-01-{day:02}", "results": str(day)})
+        for day in range(1, 6) for user in (1, 2)))
+
+    pages = list(history_io.export_pages(execute_batch, user_id=1, page_size=2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert {row[1] for page in pages for row in page} == {1}
+
+    after = pages[0][-1][0]
+    resumed = list(history_io.export_pages(execute_batch, user_id=1, after=after, page_size=2, limit=3))
+    assert [row[0] for page in resumed for row in page] == [row[0] for page in pages[1:] for row in page][:3]
+
+    everyone = list(history_io.export_pages(execute_batch, page_size=4))
+    assert sum(len(page) for page in everyone) == 10
+
+
+def test_ndjson_lines_round_trip(execute_batch):
+    rows = [(1, 5, "u", "2024-01-01", "1,200 results")]
+
+    text = history_io.ndjson_lines(rows, with_user=True).decode()
+
+    assert text.endswith("\n")
+    assert json.loads(text) == {"user_id": 5, "url": "u", "date": "2024-01-01",
+                                "results": "1,200 results", "count": 1200}
+    # The export reads back as an import
+    import_all(execute_batch, text)
+    assert history(execute_batch) == [(5, "u", "2024-01-01", "1,200 results")]
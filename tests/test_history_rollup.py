@@ -0,0 +1,112 @@
+from datetime import date
+
+import pytest
+
+import history_rollup
+from history_rollup import Cutoffs
+
+# Daily rows from 2024-05-27 on, weekly rollups from 2024-04-08
+LIMITS = history_rollup.cutoffs(date(2024, 6, 12), daily_days=14, weekly_days=60)
+
+ROWS = [
+    ("u", "2024-03-04", "5 results"),
+    ("u", "2024-05-20", "10 results"),
+    ("u", "2024-03-12", "7 results"),
+    ("u", "2024-05-22", "20 results"),
+    ("u", "2024-04-01", "9 results"),
+    ("u", "2024-05-21", "30 results"),
+    ("u", "2024-06-10", "100 results"),
+    ("v", "2024-05-21", "no results"),
+]
+
+
+@pytest.fixture
+def seeded(execute_batch):
+    execute_batch([("INSERT INTO user_history (user_id, url, date, results) VALUES (1, ?, ?, ?)", list(row))
+                   for row in ROWS])
+    return execute_batch
+
+
+def rollups(execute_batch):
+    result, = execute_batch([("SELECT url, period, period_start, samples, min_count, max_count, avg_count, "
+                              "last_date, last_results FROM user_history_rollup ORDER BY url, period_start", [])])
+    return [tuple(row) for row in result["results"]["rows"]]
+
+
+def daily(execute_batch):
+    result, = execute_batch([("SELECT url, date FROM user_history ORDER BY date", [])])
+    return [tuple(row) for row in result["results"]["rows"]]
+
+
+def test_cutoffs_are_mondays():
+    assert LIMITS == Cutoffs(date(2024, 5, 27), date(2024, 4, 8))
+    with pytest.raises(ValueError):
+        history_rollup.cutoffs(daily_days=30, weekly_days=7)
+
+
+def test_a_week_belongs_to_the_month_of_its_monday():
+    assert history_rollup.monday(date(2024, 6, 2)) == date(2024, 5, 27)
+    assert history_rollup.month(date(2024, 6, 2)) == date(2024, 5, 1)
+    assert history_rollup.month(date(2024, 6, 3)) == date(2024, 6, 1)
+
+
+def test_compact_rolls_up_across_batches(seeded):
+    progress = list(history_rollup.compact(seeded, LIMITS, batch_size=2))
+
+    assert [p.stage for p in progress] == ["daily"] * 4
+    assert sum(p.rows for p in progress) == 7
+    assert daily(seeded) == [("u", "2024-06-10")]
+    assert rollups(seeded) == [
+        ("u", "month", "2024-03-01", 2, 5, 7, 6.0, "2024-03-12", "7 results"),
+        ("u", "month", "2024-04-01", 1, 9, 9, 9.0, "2024-04-01", "9 results"),
+        # Split over three batches, still one row, last observation by date
+        ("u", "week", "2024-05-20", 3, 10, 30, 20.0, "2024-05-22", "20 results"),
+        ("v", "week", "2024-05-20", 1, 0, 0, 0.0, "2024-05-21", "no results"),
+    ]
+
+
+def test_compact_again_changes_nothing(seeded):
+    list(history_rollup.compact(seeded, LIMITS))
+    before = rollups(seeded)
+
+    assert list(history_rollup.compact(seeded, LIMITS)) == []
+    assert rollups(seeded) == before
+
+
+def test_weekly_rollups_age_into_months(seeded):
+    list(history_rollup.compact(seeded, LIMITS))
+    seeded([("INSERT INTO user_history (user_id, url, date, results) VALUES (1, 'u', '2024-05-08', '40')", [])])
+    later = Cutoffs(LIMITS.daily, date(2024, 6, 3))
+
+    stages = [p.stage for p in history_rollup.compact(seeded, later)]
+
+    assert stages == ["daily", "weekly"]
+    may = [row for row in rollups(seeded) if row[:3] == ("u", "month", "2024-05-01")]
+    # 2024-05-08 (40) merged exactly with the week of 10, 30 and 20
+    assert may == [("u", "month", "2024-05-01", 4, 10, 40, 25.0, "2024-05-22", "20 results")]
+    assert not any(row[1] == "week" and row[2] < "2024-06-03" for row in rollups(seeded))
+
+
+def test_report_matches_what_compact_does(seeded):
+    assert history_rollup.report(seeded, LIMITS) == [
+        ("daily -> weekly", 4, 2),
+        ("daily -> monthly", 3, 2),
+        ("weekly -> monthly", 0, 0),
+    ]
+    # A dry run changes nothing
+    assert len(daily(seeded)) == len(ROWS)
+
+
+def test_merged_view_reads_rollups_as_history(seeded):
+    list(history_rollup.compact(seeded, LIMITS))
+
+    result, = seeded([("SELECT url, date, results FROM user_history_merged WHERE user_id = 1 "
+                       "ORDER BY url, date", [])])
+
+    assert [tuple(row) for row in result["results"]["rows"]] == [
+        ("u", "2024-03-12", "7 results"),
+        ("u", "2024-04-01", "9 results"),
+        ("u", "2024-05-22", "20 results"),
+        ("u", "2024-06-10", "100 results"),
+        ("v", "2024-05-21", "no results"),
+    ]
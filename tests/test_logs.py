@@ -0,0 +1,84 @@
+import io
+import json
+import queue
+import logging
+from logging.handlers import QueueListener
+
+import pytest
+
+import logs
+
+
+def record(level=logging.INFO, msg="saved %s", args=None, exc_info=None):
+    return logging.LogRecord("house_finder.test", level, __file__, 1, msg, args, exc_info)
+
+
+def test_redact_masks_secrets_and_cuts_long_values(monkeypatch):
+    monkeypatch.setattr(logs, "PAYLOAD_CHARS", 5)
+    monkeypatch.setattr(logs, "PAYLOAD_ITEMS", 2)
+    value = {"Password": "hunter2", "username": "bob", "items": [1, 2, 3]}
+    assert logs.redact(value) == {"Password": "***", "username": "bob", "…": "+1 more"}
+    assert logs.redact([1, 2, 3]) == [1, 2, "… +1 more"]
+    assert logs.redact("abcdefgh") == "abcde…(+3 chars)"
+    assert logs.redact({"token": {"nested": 1}, "user": {"id": 1}}) == {"token": "***", "user": {"id": 1}}
+
+
+def test_deep_values_are_cut():
+    value = {"a": {"b": {"c": {"d": {"e": 1}}}}}
+    assert logs.redact(value) == {"a": {"b": {"c": {"d": "…"}}}}
+
+
+@pytest.mark.parametrize("rate, level, kept", [
+    (1, logging.INFO, True),
+    (0, logging.INFO, False),
+    (0, logging.DEBUG, False),
+    (0, logging.WARNING, True),
+    (0, logging.ERROR, True),
+])
+def test_sampling_keeps_warnings(monkeypatch, rate, level, kept):
+    monkeypatch.setenv("LOG_SAMPLE_ME_STATE", str(rate))
+    token = logs.begin_request("me_state")
+    try:
+        entry = record(level)
+        assert logs._RequestFilter().filter(entry) is kept
+        assert entry.route == "me_state"
+    finally:
+        logs.end_request(token)
+
+
+def test_outside_a_request_everything_is_kept():
+    entry = record(logging.DEBUG)
+    assert logs._RequestFilter().filter(entry)
+    assert entry.route == "-"
+
+
+def test_json_format():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        import sys
+        entry = record(logging.ERROR, "failed for %s", ("bob",), sys.exc_info())
+    entry.route = "login"
+    line = json.loads(logs.JSONFormatter().format(entry))
+    assert (line["level"], line["route"], line["msg"]) == ("ERROR", "login", "failed for bob")
+    assert "ValueError: boom" in line["exc"]
+
+
+def test_queue_snapshots_payloads_and_drops_when_full(monkeypatch):
+    monkeypatch.setattr(logs, "dropped", 0)
+    body = {"password": "x", "items": []}
+    records = queue.Queue(1)
+    handler = logs._Enqueue(records)
+    handler.handle(record(args=(logs.payload(body),)))
+    # Changes after the call must not show up in the log line
+    body["items"].append("later")
+    handler.handle(record())
+    assert logs.dropped == 1
+
+    out = io.StringIO()
+    stream = logging.StreamHandler(out)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(records, stream)
+    listener.start()
+    listener.stop()
+    assert out.getvalue() == "saved {'password': '***', 'items': []}\n"
@@ -0,0 +1,97 @@
+import pytest
+
+import matcher
+from matcher import Predicate
+
+
+def requirements(*texts, checked=()):
+    return [{"text": text, "checked": text in checked} for text in texts]
+
+
+@pytest.mark.parametrize("text, terms, predicates", [
+    ("Gardens", {"garden"}, ()),
+    ("near a station", {"station"}, ()),
+    ("driveway", {"parking"}, ()),
+    ("semi-detached", {"semidetached"}, ()),
+    ("2+ bedrooms", set(), (Predicate("bedrooms", 2, None),)),
+    ("3 bed min", set(), (Predicate("bedrooms", 3, None),)),
+    ("max 4 bedrooms", set(), (Predicate("bedrooms", None, 4),)),
+    ("under £350k", set(), (Predicate("price", None, 350000),)),
+    ("up to 1.2m", set(), (Predicate("price", None, 1200000),)),
+    ("budget 300000", set(), (Predicate("price", None, 300000),)),
+    ("price 250,000 minimum", set(), (Predicate("price", 250000, None),)),
+    ("between £300k and 400k", set(), (Predicate("price", 300000, 400000),)),
+    # Bound words with counts, durations and sizes are not prices
+    ("under 10 minutes to station", {"station"}, ()),
+    ("at least 2 bathrooms", {"bathroom"}, ()),
+    ("no more than 2 bathrooms", {"bathroom"}, ()),
+    ("between 2 and 3 bathrooms", {"bathroom"}, ()),
+    ("over 100 sq m", set(), ()),
+    ("garden more than 1500 sq ft", {"garden"}, ()),
+    ("minimum 2 reception rooms", {"reception", "room"}, ()),
+])
+def test_compile_requirement(text, terms, predicates):
+    assert matcher.compile_requirement(text) == (frozenset(terms), predicates)
+
+
+def test_checked_and_empty_requirements_are_not_scored():
+    compiled = matcher.compile_requirements(1, requirements("garden", "must have", "parking", checked=("parking",)))
+    assert [r.text for r in compiled] == ["garden"]
+
+
+def test_score():
+    index = matcher.build_index({1: requirements("garden", "2+ bedrooms", "under £350k", "near a station")})
+    listing = {"description": "Three bed semi with a large rear garden", "bedrooms": 3, "price": "£375,000"}
+    assert index.score(1, listing) == {
+        "score": 0.5,
+        "matched": ["garden", "2+ bedrooms"],
+        "missing": ["under £350k", "near a station"],
+    }
+
+
+def test_missing_fields_fail_their_predicates():
+    index = matcher.build_index({1: requirements("2+ bedrooms")})
+    assert index.score(1, {"description": "garden"})["score"] == 0.0
+
+
+def test_one_pass_scores_every_user():
+    index = matcher.build_index({
+        1: requirements("garden"),
+        2: requirements("garden", "parking"),
+        3: requirements("4+ bedrooms"),
+    })
+    scores = index.scores({"description": "Garden and a garage", "bedrooms": 2})
+    assert scores == {1: 1.0, 2: 1.0}
+    assert index.scores({"description": "garden", "bedrooms": 5}) == {1: 1.0, 2: 0.5, 3: 1.0}
+
+
+def test_multi_term_requirements_need_every_term():
+    index = matcher.build_index({1: requirements("south facing garden")})
+    assert index.scores({"description": "south facing garden"}) == {1: 1.0}
+    assert index.scores({"description": "garden facing north"}) == {}
+
+
+def test_user_index_is_cached_until_the_requirements_change():
+    first = matcher.user_index(99, requirements("garden"))
+    assert matcher.user_index(99, requirements("garden")) is first
+    assert matcher.user_index(99, requirements("parking")) is not first
+
+
+def test_score_listings_best_first():
+    body = matcher.score_listings([{"id": "a", "description": "flat"}, {"id": "b", "description": "garden"}],
+                                  7, requirements("garden"))
+    assert body == {"requirements": 1, "matches": [
+        {"id": "b", "score": 1.0, "matched": ["garden"], "missing": []},
+        {"id": "a", "score": 0.0, "matched": [], "missing": ["garden"]},
+    ]}
+    with pytest.raises(ValueError):
+        matcher.score_listings({"id": "a"}, 7, [])
+
+
+def test_match_all(execute_batch):
+    import requirements_store
+
+    execute_batch(requirements_store.replace_statements(1, requirements("garden")))
+    execute_batch(requirements_store.replace_statements(2, requirements("4+ bedrooms", "garden")))
+    matches = matcher.match_all(execute_batch, [{"id": "a", "description": "garden", "bedrooms": 2}], min_score=0.6)
+    assert matches == [{"id": "a", "users": {1: 1.0}}]
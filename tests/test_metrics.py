@@ -0,0 +1,167 @@
+import os
+import json
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Metrics created by a test stay out of the process-wide registry"""
+    monkeypatch.setattr(metrics, "REGISTRY", {})
+    return metrics.REGISTRY
+
+
+def series(metric):
+    return {tuple(key): value for key, value in metric.snapshot()["series"]}
+
+
+def test_counter_counts_per_label_set(registry):
+    counter = metrics.Counter("things_total", "Things", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(kind="b")
+
+    assert series(counter) == {("a",): 3, ("b",): 1}
+    assert registry["things_total"] is counter
+
+
+def test_histogram_buckets_are_per_bucket_with_overflow(registry):
+    histogram = metrics.Histogram("wait_seconds", "Wait", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+
+    counts, total = series(histogram)[()]
+    assert counts == [2, 1, 1]
+    assert total == pytest.approx(5.65)
+
+
+def test_merge_sums_counters_and_histograms():
+    first = {
+        "c": {"type": "counter", "help": "", "labels": ["k"], "series": [[["a"], 1]]},
+        "h": {"type": "histogram", "help": "", "labels": [], "buckets": [1], "series": [[[], [[1, 0], 0.5]]]},
+    }
+    second = {
+        "c": {"type": "counter", "help": "", "labels": ["k"], "series": [[["a"], 2], [["b"], 5]]},
+        "h": {"type": "histogram", "help": "", "labels": [], "buckets": [1], "series": [[[], [[0, 1], 3.0]]]},
+    }
+
+    merged = metrics.merge([first, second])
+
+    assert dict((tuple(k), v) for k, v in merged["c"]["series"]) == {("a",): 3, ("b",): 5}
+    assert merged["h"]["series"] == [[[], [[1, 1], 3.5]]]
+    # The inputs are left alone
+    assert first["h"]["series"] == [[[], [[1, 0], 0.5]]]
+
+
+def test_render_exposition_format(registry):
+    counter = metrics.Counter("hits_total", "Hits", ("path",))
+    counter.inc(path='/a"b')
+    histogram = metrics.Histogram("took_seconds", "Took", buckets=(1,))
+    histogram.observe(0.25)
+    histogram.observe(2)
+
+    text = metrics.render(metrics.snapshot())
+
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{path="/a\\"b"} 1' in text
+    assert 'took_seconds_bucket{le="1"} 1' in text
+    assert 'took_seconds_bucket{le="+Inf"} 2' in text
+    assert "took_seconds_sum 2.25" in text
+    assert "took_seconds_count 2" in text
+
+
+@pytest.mark.parametrize("sql, name", [
+    ("SELECT * FROM user_history WHERE id = ?", "select_user_history"),
+    ('insert into "shortlist" VALUES (?)', "insert_shortlist"),
+    ("CREATE TABLE IF NOT EXISTS users (id)", "create_users"),
+    ("PRAGMA user_version", "pragma"),
+    ("", "empty"),
+])
+def test_query_name(sql, name):
+    assert metrics.query_name(sql) == name
+
+
+def test_upstream_records_outcome(registry, monkeypatch):
+    requests = metrics.Counter("upstream_requests_total", "", ("upstream", "outcome"))
+    seconds = metrics.Histogram("upstream_request_duration_seconds", "", ("upstream",))
+    monkeypatch.setattr(metrics, "UPSTREAM_REQUESTS", requests)
+    monkeypatch.setattr(metrics, "UPSTREAM_SECONDS", seconds)
+
+    with metrics.upstream("portal") as call:
+        call.status = 200
+    with metrics.upstream("portal") as call:
+        call.status = 503
+    with pytest.raises(RuntimeError):
+        with metrics.upstream("portal"):
+            raise RuntimeError("boom")
+
+    assert series(requests) == {("portal", "ok"): 1, ("portal", "error"): 2}
+    assert sum(series(seconds)[("portal",)][0]) == 3
+
+
+def test_cache_lookup_and_tokens(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "CACHE_REQUESTS", metrics.Counter("cache", "", ("cache", "result")))
+    monkeypatch.setattr(metrics, "LLM_TOKENS", metrics.Counter("tokens", "", ("kind",)))
+
+    metrics.cache_lookup("geocode", True)
+    metrics.cache_lookup("geocode", False)
+    metrics.cache_lookup("geocode", False)
+    metrics.observe_tokens(120, 30)
+
+    assert series(metrics.CACHE_REQUESTS) == {("geocode", "hit"): 1, ("geocode", "miss"): 2}
+    assert series(metrics.LLM_TOKENS) == {("prompt",): 120, ("completion",): 30}
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def _worker_file(directory, name, value):
+    snap = {"jobs_total": {"type": "counter", "help": "Jobs", "labels": [], "series": [[[], value]]}}
+    with open(os.path.join(directory, name), "w") as f:
+        json.dump(snap, f)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fcntl")
+def test_collect_folds_dead_workers_once(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_snapshot_file", None)
+    dead = f"{_dead_pid()}-dead.json"
+    live = f"{os.getpid()}-live.json"
+    _worker_file(tmp_path, dead, 4)
+    _worker_file(tmp_path, live, 1)
+
+    first = metrics.collect()
+    second = metrics.collect()
+
+    assert "jobs_total 5" in first
+    assert "jobs_total 5" in second
+    assert not (tmp_path / dead).exists()
+    assert (tmp_path / live).exists()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fcntl")
+def test_stop_worker_retires_final_snapshot(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_writer", None)
+    monkeypatch.setattr(metrics, "_snapshot_file", str(tmp_path / f"{os.getpid()}-me.json"))
+    metrics.Counter("jobs_total", "Jobs").inc(3)
+
+    metrics.stop_worker()
+
+    assert metrics._snapshot_file is None
+    assert not (tmp_path / f"{os.getpid()}-me.json").exists()
+    assert "jobs_total 3" in metrics.collect()
+
+
+def test_collect_without_directory_renders_this_process(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", "")
+    metrics.Counter("jobs_total", "Jobs").inc()
+
+    assert "jobs_total 1" in metrics.collect()
@@ -0,0 +1,60 @@
+import pytest
+
+import migrate
+from local_db import make_executor
+from migrate import Migration, MigrationError
+
+
+@pytest.fixture
+def empty_db(tmp_path):
+    return make_executor(str(tmp_path / "empty.db"))
+
+
+def tables(execute_batch):
+    (result,) = execute_batch([("SELECT name FROM sqlite_master WHERE type = 'table'", [])])
+    return {row[0] for row in result["results"]["rows"]}
+
+
+def test_split_statements():
+    sql = "-- a comment\nCREATE TABLE a (x INTEGER);\n\nCREATE INDEX i ON a (x);\n-- trailing\n"
+    assert migrate.split_statements(sql) == ["CREATE TABLE a (x INTEGER)", "CREATE INDEX i ON a (x)"]
+
+
+def test_load_migrations(tmp_path):
+    (tmp_path / "0002_second.sql").write_text("SELECT 2;")
+    (tmp_path / "0001_first.sql").write_text("SELECT 1;")
+    (tmp_path / "notes.txt").write_text("ignored")
+    assert migrate.load_migrations(str(tmp_path)) == [
+        Migration(1, "first", ["SELECT 1"]), Migration(2, "second", ["SELECT 2"]),
+    ]
+    (tmp_path / "02_again.sql").write_text("SELECT 2;")
+    with pytest.raises(MigrationError, match="Duplicate"):
+        migrate.load_migrations(str(tmp_path))
+
+
+def test_bundled_migrations_apply_in_order(empty_db):
+    latest = migrate.load_migrations()[-1].version
+    assert migrate.schema_status(empty_db).current == 0
+    assert migrate.migrate(empty_db, log=lambda *args: None) == latest
+    assert {"user", "user_shortlist_item", "revoked_token", "listing_watch"} <= tables(empty_db)
+    status = migrate.schema_status(empty_db)
+    assert (status.current, status.latest, status.pending) == (latest, latest, [])
+    assert migrate.migrate(empty_db, log=lambda *args: None) == latest
+
+
+def test_a_failed_migration_is_not_applied_at_all(empty_db):
+    migrations = [
+        Migration(1, "good", ["CREATE TABLE a (x INTEGER)"]),
+        Migration(2, "bad", ["CREATE TABLE b (x INTEGER)", "INSERT INTO missing VALUES (1)"]),
+    ]
+    with pytest.raises(Exception):
+        migrate.migrate(empty_db, migrations, log=lambda *args: None)
+    assert migrate.current_version(empty_db) == 1
+    assert "a" in tables(empty_db) and "b" not in tables(empty_db)
+
+
+def test_turso_error_results_raise():
+    with pytest.raises(MigrationError, match="no such table"):
+        migrate._check([{"results": {}}, {"error": "no such table: x"}])
+    with pytest.raises(MigrationError):
+        migrate._check({"error": "unauthorized"})
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import passwords
+
+CHEAP = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", CHEAP)
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    passwords.shutdown_pool()
+    yield
+    passwords.shutdown_pool()
+
+
+def test_canonical_method():
+    assert passwords.canonical_method("scrypt") == "scrypt:32768:8:1"
+    assert passwords.canonical_method("scrypt:16384") == "scrypt:16384:8:1"
+    assert passwords.canonical_method("pbkdf2:sha256:1000") == "pbkdf2:sha256:1000"
+    assert passwords.canonical_method("pbkdf2").startswith("pbkdf2:sha256:")
+
+
+def test_hash_and_verify_inline():
+    stored = passwords.hash_password("correct horse")
+    assert stored.startswith(CHEAP + "$")
+    assert passwords.verify_password(stored, "correct horse")
+    assert not passwords.verify_password(stored, "wrong horse")
+    assert passwords._get_pool() is None
+
+
+def test_needs_rehash_when_the_method_changes(monkeypatch):
+    stored = passwords.hash_password("pw")
+    assert not passwords.needs_rehash(stored)
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:2000")
+    assert passwords.needs_rehash(stored)
+    assert not passwords.needs_rehash(passwords.hash_password("pw"))
+
+
+def test_hashes_in_a_process_pool(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "1")
+    stored = passwords.hash_password("pw")
+    assert passwords._get_pool() is not None
+    assert passwords.verify_password(stored, "pw")
+
+
+def test_falls_back_inline_without_a_pool(monkeypatch):
+    import concurrent.futures
+
+    def unavailable(*args, **kwargs):
+        raise OSError("no /dev/shm")
+
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "2")
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", unavailable)
+    assert passwords.verify_password(passwords.hash_password("pw"), "pw")
+    assert passwords._get_pool() is None
+
+
+def test_inline_on_lambda(monkeypatch):
+    monkeypatch.delenv("PASSWORD_HASH_WORKERS")
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "login")
+    assert passwords._worker_count() == 0
+
+
+def test_full_queue_is_refused(monkeypatch):
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "1")
+    monkeypatch.setenv("PASSWORD_HASH_QUEUE", "1")
+    monkeypatch.setenv("PASSWORD_HASH_TIMEOUT", "0.01")
+    passwords._get_pool()
+    passwords._pool_slots.acquire()
+    with pytest.raises(RuntimeError, match="queue is full"):
+        passwords.hash_password("pw")
+
+
+def test_login_rehashes_outdated_hashes(monkeypatch, execute_batch):
+    import login
+
+    old = passwords.hash_password("pw", method="pbkdf2:sha256:500")
+    execute_batch([("INSERT INTO user (username, email, password_hash) VALUES (?, ?, ?)", ["bob", "b@x", old])])
+    monkeypatch.setattr(login, "execute_query", lambda sql, params=None: execute_batch([(sql, params)]))
+    monkeypatch.setattr(login, "SECRET_KEY", "s" * 32)
+
+    def log_in(password):
+        event = {"httpMethod": "POST", "body": json.dumps({"username": "bob", "password": password})}
+        return login.handler(event, None)["statusCode"]
+
+    def stored():
+        (result,) = execute_batch([("SELECT password_hash FROM user WHERE username = ?", ["bob"])])
+        return result["results"]["rows"][0][0]
+
+    assert log_in("wrong") == 401
+    assert stored() == old
+    assert log_in("pw") == 200
+    assert stored().startswith(CHEAP + "$") and passwords.verify_password(stored(), "pw")
@@ -0,0 +1,146 @@
+import time
+import threading
+
+import pytest
+
+import price_watch
+import shortlist_store
+
+
+class Response:
+    def __init__(self, status, body=b"", headers=None):
+        self.status_code = status
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+class Portal:
+    """Session stand-in serving pages from a dict of url -> Response"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        with self._lock:
+            self.requests.append((url, dict(headers or {})))
+        return self.pages[url]
+
+
+def page(price, status="Available", etag='"v1"'):
+    body = f'{{"primaryPrice":"£{price:,}","displayStatus":"{status}"}}'.encode("utf-8")
+    return Response(200, body, {"ETag": etag})
+
+
+def shortlist(execute_batch, *links):
+    shortlist_store.replace_items(execute_batch, 1, [{"address": link, "link": link} for link in links])
+
+
+@pytest.mark.parametrize("body, expected", [
+    (b'"primaryPrice":"\\u00a3450,000"', (450000, "available")),
+    (b'<meta property="og:price:amount" content="325000">', (325000, "available")),
+    (b'"primaryPrice":"POA","displayStatus":"Under offer"', (None, "under_offer")),
+    (b'"@type":"Offer","price":"300000","availability":"https://schema.org/SoldOut"', (300000, "sold")),
+    (b'"primaryPrice":"\xc2\xa3300,000","archived":true', (300000, "removed")),
+    (b"<html>nothing here</html>", (None, None)),
+])
+def test_extract(body, expected):
+    assert price_watch.extract(body) == expected
+
+
+def test_parse_since():
+    assert price_watch.parse_since("1700000000") == 1700000000
+    assert price_watch.parse_since("2024-01-01T00:00:00Z") == 1704067200
+    assert price_watch.parse_since("2024-01-01") == 1704067200
+    with pytest.raises(ValueError):
+        price_watch.parse_since("yesterday")
+
+
+def test_fetch_sends_validators_and_reads_304():
+    portal = Portal({"https://a.example/1": Response(304, headers={"ETag": '"v2"'})})
+    outcome = price_watch.fetch(portal, "https://a.example/1", etag='"v1"', last_modified="Mon")
+    assert portal.requests == [("https://a.example/1", {"If-None-Match": '"v1"', "If-Modified-Since": "Mon"})]
+    assert (outcome.http_status, outcome.etag, outcome.error) == (304, '"v2"', None)
+
+
+def test_fetch_all_caps_requests_per_host():
+    in_flight, peak = {}, {}
+    lock = threading.Lock()
+    release = threading.Event()
+
+    class Slow(Portal):
+        def get(self, url, **kwargs):
+            host = url.split("/")[2]
+            with lock:
+                in_flight[host] = in_flight.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), in_flight[host])
+            release.wait(0.01)
+            with lock:
+                in_flight[host] -= 1
+            return page(100000)
+
+    urls = [(f"https://{host}.example/{n}", None, None) for host in "ab" for n in range(6)]
+    outcomes = list(price_watch.fetch_all(Slow({}), urls, concurrency=4, per_host=2))
+    assert len(outcomes) == 12
+    assert max(peak.values()) <= 2
+
+
+def test_run_cycle_records_changes_after_the_baseline(execute_batch):
+    shortlist(execute_batch, "https://a.example/1", "https://b.example/2")
+    portal = Portal({"https://a.example/1": page(300000), "https://b.example/2": Response(404)})
+    cycles = list(price_watch.run_cycle(execute_batch, portal, now=time.time(), interval=60))
+    assert [tuple(c) for c in cycles] == [(2, 0, 0, 0)]
+    assert price_watch.changed_since(execute_batch, 0) == []
+
+    portal.pages["https://a.example/1"] = page(290000, "Under offer", etag='"v2"')
+    list(price_watch.run_cycle(execute_batch, portal, now=time.time() + 1000, interval=60))
+    assert ("https://a.example/1", {"If-None-Match": '"v1"'}) in portal.requests[2:]
+    (change,) = price_watch.load_changes(execute_batch, 1, 0)["changes"]
+    assert (change["old_price"], change["price"], change["old_status"], change["status"]) == \
+        (300000, 290000, "available", "under_offer")
+    assert price_watch.load_changes(execute_batch, 2, 0)["changes"] == []
+
+
+def test_failures_back_off_and_keep_the_stored_price(execute_batch):
+    shortlist(execute_batch, "https://a.example/1")
+    portal = Portal({"https://a.example/1": page(300000)})
+    list(price_watch.run_cycle(execute_batch, portal, now=time.time(), interval=60))
+    portal.pages["https://a.example/1"] = Response(503)
+    (cycle,) = price_watch.run_cycle(execute_batch, portal, now=time.time() + 1000, interval=60)
+    assert cycle.failed == 1
+    (result,) = execute_batch([("SELECT price, failures, next_check FROM listing_watch", [])])
+    price, failures, next_check = result["results"]["rows"][0]
+    assert (price, failures) == (300000, 1)
+    assert next_check > time.time() + 1000 + 60
+
+
+def test_run_cycle_stops_when_writes_are_lost(execute_batch):
+    shortlist(execute_batch, "https://a.example/1")
+    portal = Portal({"https://a.example/1": page(300000)})
+
+    def losing_writes(statements):
+        if statements[0][0].startswith("INSERT INTO listing_watch (url, etag"):
+            return [{"results": {"rows": []}} for _ in statements]
+        return execute_batch(statements)
+
+    cycles = list(price_watch.run_cycle(losing_writes, portal, now=time.time(), interval=60))
+    assert len(cycles) == 1
+    assert len(portal.requests) == 1
+
+
+def test_run_cycle_stops_at_max_run(execute_batch):
+    shortlist(execute_batch, "https://a.example/1")
+    portal = Portal({"https://a.example/1": page(300000)})
+    assert list(price_watch.run_cycle(execute_batch, portal, now=time.time(), max_run=0)) == []
+    assert portal.requests == []
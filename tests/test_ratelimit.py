@@ -0,0 +1,118 @@
+import pytest
+
+import ratelimit
+from ratelimit import Limit, MemoryStore, RateLimiter, SQLStore
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    # 2 per 10 s per user, 3 per 10 s per IP
+    monkeypatch.setenv("RATE_LIMIT_SCRAPE", "2/10")
+    monkeypatch.setenv("RATE_LIMIT_SCRAPE_IP", "3/10")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path, limits, clock):
+    if request.param == "memory":
+        return RateLimiter(MemoryStore())
+    return RateLimiter(ratelimit.create_store(f"sqlite:{tmp_path / 'ratelimit.db'}"))
+
+
+def test_allows_up_to_capacity_then_denies(limiter):
+    assert limiter.check("scrape", user_id=1, ip="1.1.1.1").allowed
+    second = limiter.check("scrape", user_id=1, ip="1.1.1.1")
+    assert second.allowed and second.remaining == 0
+    denied = limiter.check("scrape", user_id=1, ip="1.1.1.1")
+    assert not denied.allowed
+    assert denied.limit == 2
+    assert denied.retry_after == 5
+
+
+def test_refills_over_time(limiter, clock):
+    for _ in range(2):
+        limiter.check("scrape", user_id=1)
+    assert not limiter.check("scrape", user_id=1).allowed
+    clock.now += 5
+    assert limiter.check("scrape", user_id=1).allowed
+    assert not limiter.check("scrape", user_id=1).allowed
+    clock.now += 60
+    assert limiter.check("scrape", user_id=1).remaining == 1
+
+
+def test_denial_debits_no_bucket(limiter):
+    # Three users share an IP whose bucket holds three tokens
+    for user_id in (1, 2, 3):
+        assert limiter.check("scrape", user_id=user_id, ip="1.1.1.1").allowed
+    assert not limiter.check("scrape", user_id=4, ip="1.1.1.1").allowed
+    # User 4 was refused by the IP bucket, so its own bucket is untouched
+    assert limiter.check("scrape", user_id=4, ip="2.2.2.2").remaining == 1
+
+
+def test_unlimited_routes_and_anonymous_requests(limiter):
+    assert limiter.check("history", user_id=1, ip="1.1.1.1") is None
+    assert limiter.check("scrape") is None
+
+
+def test_store_errors_fail_open(limits):
+    class Broken:
+        def consume(self, requests):
+            raise RuntimeError("database is locked")
+
+    assert RateLimiter(Broken()).check("scrape", user_id=1) is None
+
+
+def test_memory_store_evicts_refilled_buckets_first(clock):
+    store = MemoryStore(max_keys=10)
+    store.consume([("busy", Limit(2, 1000), 2)])
+    for n in range(9):
+        store.consume([(f"idle-{n}", Limit(2, 10), 1)])
+    clock.now += 10
+    store.consume([("new", Limit(2, 10), 1)])
+    # The idle buckets had refilled; the busy one keeps its debt
+    assert list(store._buckets) == ["busy", "new"]
+    assert not store.consume([("busy", Limit(2, 1000), 2)])[0].allowed
+
+
+def test_memory_store_evicts_least_recently_seen(clock):
+    store = MemoryStore(max_keys=10)
+    for n in range(11):
+        store.consume([(f"key-{n}", Limit(2, 1000), 1)])
+    assert len(store._buckets) == 9
+    assert "key-0" not in store._buckets and "key-10" in store._buckets
+
+
+def test_sql_store_checks_all_buckets_in_one_statement(tmp_path, clock):
+    statements = []
+    store = ratelimit.create_store(f"sqlite:{tmp_path / 'ratelimit.db'}")
+    execute = store.execute_batch
+
+    def recording(batch):
+        statements.append(batch)
+        return execute(batch)
+
+    store = SQLStore(recording)
+    store.consume([("a", Limit(1, 10), 1), ("b", Limit(1, 10), 1)])
+    assert len(statements) == 1
+
+
+def test_headers():
+    denied = ratelimit.Decision(False, 10, 0, 6, 6)
+    assert ratelimit.rate_limit_headers(denied) == {
+        "RateLimit-Limit": "10", "RateLimit-Remaining": "0", "RateLimit-Reset": "6", "Retry-After": "6",
+    }
+    assert ratelimit.rate_limit_headers(None) == {}
@@ -0,0 +1,67 @@
+import base64
+import gzip
+import json
+import datetime
+
+import pytest
+
+import responses
+
+
+def test_dumps_is_compact_and_handles_other_types():
+    body = responses.dumps({"a": [1, 2], "when": datetime.date(2024, 1, 2), 3: "x"})
+    assert json.loads(body) == {"a": [1, 2], "when": "2024-01-02", "3": "x"}
+    assert b" " not in responses.dumps({"a": [1, 2]})
+    assert responses.loads(responses.dumps({"£": "é"})) == {"£": "é"}
+
+
+def test_dumps_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    assert responses.dumps({"when": datetime.date(2024, 1, 2)}) == b'{"when":"2024-01-02"}'
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", "gzip"),
+    ("*;q=0, gzip;q=0", None),
+    ("", None),
+    (None, None),
+])
+def test_negotiate_gzip(monkeypatch, header, expected):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert responses.negotiate_encoding(header) == expected
+
+
+def test_negotiate_prefers_the_higher_q(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", object())
+    assert responses.negotiate_encoding("gzip, br") == "br"
+    assert responses.negotiate_encoding("gzip;q=1, br;q=0.5") == "gzip"
+
+
+def test_encode_body():
+    big = responses.dumps([{"address": "10 Mill Road, Bristol"}] * 200)
+    body, encoding = responses.encode_body(big, "gzip")
+    assert encoding == "gzip" and gzip.decompress(body) == big
+    assert responses.encode_body(b"{}", "gzip") == (b"{}", None)
+    assert responses.encode_body(big, "gzip", "image/png") == (big, None)
+    assert responses.encode_body(big, "identity") == (big, None)
+
+
+def test_netlify_responses_are_compressed():
+    import utils
+
+    @utils.compressed
+    def handler(event, context):
+        return utils.create_response(200, [{"address": "10 Mill Road, Bristol"}] * 200)
+
+    response = handler({"headers": {"accept-encoding": "gzip"}}, None)
+    assert response["headers"]["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response["headers"]["Vary"]
+    assert response["isBase64Encoded"]
+    assert json.loads(gzip.decompress(base64.b64decode(response["body"])))[0]["address"] == "10 Mill Road, Bristol"
+
+    plain = handler({"headers": {}}, None)
+    assert "Content-Encoding" not in plain["headers"]
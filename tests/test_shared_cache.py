@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+import shared_cache
+from shared_cache import Namespace, SQLiteTier
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+class BrokenTier:
+    def __getattr__(self, name):
+        def fail(*args):
+            raise OSError("database is locked")
+        return fail
+
+
+def test_lru_drops_least_recently_used():
+    cache = Namespace("lru", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_expired_entries_are_misses():
+    cache = Namespace("ttl", maxsize=8, ttl=3600)
+    cache.set("old", "x", ttl=-1)
+    cache.set("new", "y")
+
+    assert cache.get("old", "missing") == "missing"
+    assert cache.get("new") == "y"
+
+
+def test_tier_round_trip_and_expiry(path):
+    tier = SQLiteTier(path)
+    tier.set("ns", "k", {"lat": 51.5, "tags": ["a"]}, expires_at=200, now=100)
+
+    assert tier.get("ns", "k", now=150) == ({"lat": 51.5, "tags": ["a"]}, 200)
+    assert tier.get("ns", "k", now=200) is None
+    assert tier.get("other", "k", now=150) is None
+
+
+def test_tier_keeps_byte_total(path):
+    tier = SQLiteTier(path)
+    tier.set("ns", "a", "x" * 10)
+    tier.set("ns", "b", "y" * 10)
+    tier.set("ns", "a", "x")
+    tier.discard("ns", "b")
+
+    # '"x"' plus the namespace and key
+    assert tier.stats() == (3 + 2 + 1, 1)
+    tier.clear("ns")
+    assert tier.stats() == (0, 0)
+
+
+def test_tier_evicts_expired_then_least_recently_used(path):
+    tier = SQLiteTier(path, max_bytes=100)
+    tier.set("ns", "expired", "e" * 20, expires_at=50, now=10)
+    tier.set("ns", "old", "o" * 20, now=20)
+    tier.set("ns", "used", "u" * 20, now=30)
+    tier.get("ns", "used", now=200)
+    tier.set("ns", "new", "n" * 40, now=300)
+
+    assert tier.get("ns", "expired", now=300) is None
+    assert tier.get("ns", "old", now=300) is None
+    assert tier.get("ns", "used", now=300) is not None
+    assert tier.get("ns", "new", now=300) is not None
+    assert tier.stats()[0] <= 90
+
+
+def test_workers_share_entries_through_the_file(path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "L1_TTL", 30)
+    first = Namespace("geocode", maxsize=8, tier=SQLiteTier(path))
+    second = Namespace("geocode", maxsize=8, tier=SQLiteTier(path))
+
+    first.set("SW1A 1AA", [51.5, -0.14])
+
+    assert second.get("SW1A 1AA") == [51.5, -0.14]
+
+
+def test_l1_copies_of_shared_entries_are_rechecked(path, monkeypatch):
+    first = Namespace("geocode", maxsize=8, tier=SQLiteTier(path))
+    second = Namespace("geocode", maxsize=8, tier=SQLiteTier(path))
+    monkeypatch.setattr(shared_cache, "L1_TTL", 30)
+    first.set("k", 1)
+    assert second.get("k") == 1
+
+    first.discard("k")
+    # Still trusted within L1_TTL ...
+    assert second.get("k") == 1
+    # ... and gone once it has to be checked again
+    second._entries["k"] = (1, 0)
+    assert second.get("k") is None
+
+
+def test_a_broken_tier_degrades_to_l1(caplog):
+    cache = Namespace("broken", maxsize=8, tier=BrokenTier())
+
+    cache.set("k", "v")
+    cache._entries.clear()
+
+    assert cache.get("k", "default") == "default"
+    assert "Shared cache write failed" in caplog.text
+    assert "Shared cache read failed" in caplog.text
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_refuses_a_file_others_can_write(path):
+    SQLiteTier(path)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    os.chmod(path, 0o666)
+    with pytest.raises(PermissionError):
+        SQLiteTier(path)
+
+
+def test_namespace_shares_only_listed_names(path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "NAMESPACES", frozenset({"geocode"}))
+    monkeypatch.setattr(shared_cache, "PATH", path)
+    monkeypatch.setattr(shared_cache, "_tier", None)
+    monkeypatch.setattr(shared_cache, "_namespaces", {})
+    monkeypatch.setattr(shared_cache, "SQLiteTier", lambda: SQLiteTier(path))
+
+    geocodes = shared_cache.namespace("geocode", maxsize=4)
+
+    assert geocodes.shared
+    assert not shared_cache.namespace("portal").shared
+    assert shared_cache.namespace("geocode", maxsize=99) is geocodes
+    assert shared_cache.shared_tier() is geocodes.tier
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import codec
+import shortlist_store
+
+
+@pytest.fixture(autouse=True)
+def forget_migrations(monkeypatch):
+    monkeypatch.setattr(shortlist_store, "_migrated", set())
+
+
+def test_prepare_ops_assigns_ids_to_adds():
+    ops = [{"op": "add", "item": {"address": "1 Elm Road"}}, {"op": "remove", "id": "x"}]
+    added = shortlist_store.prepare_ops(ops)
+    assert len(added) == 1 and added == [ops[0]["id"]]
+    # Prepared ops render the same statements every time
+    assert shortlist_store.patch_statements(7, ops) == shortlist_store.patch_statements(7, ops)
+
+
+@pytest.mark.parametrize("ops", [
+    [],
+    "add",
+    [{"op": "update", "id": "a"}],
+    [{"op": "remove"}],
+    [{"op": "reorder", "ids": "a,b"}],
+    [{"op": "rename", "id": "a"}],
+    [{"op": "remove", "id": "a"}] * (shortlist_store.MAX_OPS + 1),
+])
+def test_malformed_ops_are_rejected(ops):
+    with pytest.raises(ValueError):
+        shortlist_store.prepare_ops(ops)
+
+
+def test_updates_never_store_derived_fields():
+    ops = [{"op": "update", "id": "a", "fields": {"price": "£300k", "match": {"score": 1}, "id": "b"}}]
+    (sql, params), = shortlist_store.patch_statements(1, ops)[0]
+    assert json.loads(params[0]) == {"price": "£300k"}
+    assert params[1:] == ["a", 1]
+
+
+def test_compact_ops_merges_updates_and_drops_unwritten_items():
+    ops = [
+        {"op": "update", "id": "a", "fields": {"price": "1", "notes": {"x": 1}}},
+        {"op": "add", "id": "b", "item": {"address": "2 Oak Lane"}},
+        {"op": "update", "id": "b", "fields": {"price": "2"}},
+        {"op": "update", "id": "a", "fields": {"notes": {"y": 2}, "price": None}},
+        {"op": "remove", "id": "b"},
+    ]
+    assert shortlist_store.compact_ops(ops) == [
+        {"op": "update", "id": "a", "fields": {"price": None, "notes": {"x": 1, "y": 2}}},
+    ]
+
+
+def test_coalesce():
+    first = shortlist_store.buffered_value(ops=[{"op": "update", "id": "a", "fields": {"price": "1"}}])
+    second = shortlist_store.buffered_value(ops=[{"op": "update", "id": "a", "fields": {"price": "2"}}])
+    assert shortlist_store.coalesce(first, second)["ops"] == [{"op": "update", "id": "a", "fields": {"price": "2"}}]
+
+    replace = shortlist_store.buffered_value(replace=[{"address": "3 Mill Lane"}])
+    assert shortlist_store.coalesce(first, replace) is replace
+    combined = shortlist_store.coalesce(replace, second)
+    assert combined["replace"] == replace["replace"] and combined["ops"] == second["ops"]
+
+
+def test_patch_round_trip(execute_batch):
+    items = shortlist_store.replace_items(execute_batch, 1, [{"address": "1 Elm Road"}, {"address": "2 Oak Lane"}])
+    first, second = (item["id"] for item in items)
+    ops = [
+        {"op": "add", "item": {"address": "3 Mill Lane"}, "position": 0},
+        {"op": "update", "id": first, "fields": {"price": "£300,000"}},
+        {"op": "remove", "id": second},
+    ]
+    (added,) = shortlist_store.apply_patch(execute_batch, 1, ops)
+    assert shortlist_store.load_items(execute_batch, 1) == [
+        {"address": "3 Mill Lane", "id": added},
+        {"address": "1 Elm Road", "price": "£300,000", "id": first},
+    ]
+    assert shortlist_store.load_items(execute_batch, 2) == []
+
+
+def test_legacy_blob_is_migrated_once(execute_batch):
+    legacy = [{"address": "1 Elm Road"}, {"address": "2 Oak Lane"}]
+    execute_batch([("INSERT INTO user_shortlist (user_id, shortlist) VALUES (?, ?)", [1, codec.encode(legacy)])])
+    shortlist_store.apply_patch(execute_batch, 1, [{"op": "add", "item": {"address": "3 Mill Lane"}}])
+    addresses = [item["address"] for item in shortlist_store.load_items(execute_batch, 1)]
+    assert addresses == ["1 Elm Road", "2 Oak Lane", "3 Mill Lane"]
+    (result,) = execute_batch([("SELECT COUNT(*) FROM user_shortlist WHERE user_id = ?", [1])])
+    assert result["results"]["rows"] == [[0]]
+
+
+def test_replace_supersedes_legacy_blob(execute_batch):
+    execute_batch([("INSERT INTO user_shortlist (user_id, shortlist) VALUES (?, ?)",
+                    [1, codec.encode([{"address": "1 Elm Road"}])])])
+    shortlist_store.replace_items(execute_batch, 1, [])
+    assert shortlist_store.load_items(execute_batch, 1) == []
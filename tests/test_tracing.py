@@ -0,0 +1,76 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", True)
+
+
+def test_disabled_tracing_records_nothing(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    assert tracing.start("me_state") is None
+    assert tracing.span("db") is tracing.span("portal")
+    tracing.finish(None)
+
+
+def test_server_timing_sums_spans_by_name(enabled):
+    trace = tracing.start("me_state")
+    try:
+        with tracing.span("db"):
+            pass
+        with tracing.span("db"):
+            pass
+        with tracing.span("hash"):
+            pass
+    finally:
+        tracing.finish(trace)
+    header = tracing.server_timing(trace)
+    names = [part.split(";")[0] for part in header.split(", ")]
+    assert names == ["db", "hash", "total"]
+    assert 'db;dur=' in header and 'desc="2 calls"' in header
+    assert [name for name, _, _ in trace.spans] == ["db", "db", "hash"]
+
+
+def test_nested_start_and_other_threads_do_not_join(enabled):
+    trace = tracing.start("scrape")
+    try:
+        assert tracing.start("inner") is None
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(tracing.span("db")))
+        thread.start()
+        thread.join()
+        assert seen == [tracing._NO_SPAN]
+    finally:
+        tracing.finish(trace)
+    assert tracing.span("db") is tracing._NO_SPAN
+
+
+def test_traced_decorator(enabled):
+    @tracing.traced("geocode")
+    def lookup():
+        return 42
+
+    trace = tracing.start("geocode")
+    try:
+        assert lookup() == 42
+    finally:
+        tracing.finish(trace)
+    assert [name for name, _, _ in trace.spans] == ["geocode"]
+
+
+def test_span_log(enabled, monkeypatch, tmp_path):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_LOG", str(path))
+    trace = tracing.start("history")
+    with tracing.span("db"):
+        pass
+    tracing.finish(trace, 200, "GET")
+    (line,) = path.read_text().splitlines()
+    entry = json.loads(line)
+    assert (entry["route"], entry["method"], entry["status"]) == ("history", "GET", 200)
+    assert [s["name"] for s in entry["spans"]] == ["db"]
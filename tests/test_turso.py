@@ -0,0 +1,64 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from turso import TursoClient, TursoError
+
+
+@pytest.fixture
+def server():
+    """A local endpoint answering every POST with (status, body) from server.reply"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            status, body = httpd.reply
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    client = TursoClient(f"http://127.0.0.1:{server.server_port}", "token")
+    yield client
+    client.close()
+
+
+def test_returns_results(server, client):
+    server.reply = (200, [{"results": {"columns": ["n"], "rows": [[1]]}}])
+    assert client.execute([("SELECT 1", [])]) == [{"results": {"columns": ["n"], "rows": [[1]]}}]
+
+
+def test_error_status_raises(server, client):
+    server.reply = (400, {"error": "no such table: user_shortlist_item"})
+    with pytest.raises(TursoError, match="HTTP 400: no such table"):
+        client.execute([("SELECT * FROM user_shortlist_item", [])])
+
+
+def test_failed_statement_raises(server, client):
+    server.reply = (200, [{"results": {"rows": []}}, {"error": {"message": "UNIQUE constraint failed"}}])
+    with pytest.raises(TursoError, match="Statement 2: UNIQUE constraint failed"):
+        client.execute([("SELECT 1", []), ("INSERT INTO t VALUES (1)", [])])
+
+
+def test_connection_is_reused_after_an_error(server, client):
+    server.reply = (400, {"error": "boom"})
+    with pytest.raises(TursoError):
+        client.execute([("SELECT 1", [])])
+    server.reply = (200, [{"results": {"rows": [[1]]}}])
+    client.execute([("SELECT 1", [])])
+    assert len(client._idle) == 1
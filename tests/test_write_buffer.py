@@ -0,0 +1,135 @@
+import atexit
+
+import pytest
+
+import write_buffer
+from write_buffer import WriteBehindBuffer
+
+
+class FlakyDatabase:
+    """execute_batch that fails the next `failures` calls, then records batches"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, statements):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        self.batches.append(list(statements))
+        return [{"results": {"rows": []}} for _ in statements]
+
+
+def build(user_id, value):
+    return [("UPDATE t SET v = ? WHERE user_id = ?", [value, user_id])]
+
+
+def add(old, new):
+    return old + new
+
+
+@pytest.fixture
+def make_buffer():
+    buffers = []
+
+    def make(execute_batch, window=60):
+        buffer = WriteBehindBuffer(execute_batch, window)
+        buffers.append(buffer)
+        return buffer
+
+    yield make
+    for buffer in buffers:
+        buffer._closed = True
+        atexit.unregister(buffer.flush_all)
+
+
+def test_saves_coalesce_until_flushed(make_buffer):
+    db = FlakyDatabase()
+    buffer = make_buffer(db)
+    first = buffer.put("shortlist", 1, 1, build, add)
+    second = buffer.put("shortlist", 1, 2, build, add)
+    assert second > first
+    assert buffer.pending("shortlist", 1) == 3
+    assert db.batches == []
+    buffer.flush_user(1)
+    assert db.batches == [build(1, 3)]
+    assert buffer.pending("shortlist", 1) is None
+
+
+def test_failed_write_is_requeued_and_retried(make_buffer):
+    db = FlakyDatabase(failures=2)
+    buffer = make_buffer(db)
+    buffer.put("requirements", 1, 5, build)
+    buffer.flush_all()
+    # The batch and the one-by-one retry both failed: still pending, not lost
+    assert buffer.pending("requirements", 1) == 5
+    buffer.flush_all()
+    assert db.batches == [build(1, 5)]
+    assert buffer.pending("requirements", 1) is None
+
+
+def test_requeued_write_is_combined_under_a_newer_save(make_buffer):
+    db = FlakyDatabase(failures=2)
+    buffer = make_buffer(db)
+    buffer.put("shortlist", 1, 1, build, add)
+    buffer.flush_all()
+    buffer.put("shortlist", 1, 2, build, add)
+    assert buffer.pending("shortlist", 1) == 3
+    buffer.flush_all()
+    assert db.batches == [build(1, 3)]
+
+
+def test_write_is_dropped_after_max_retries(make_buffer, caplog):
+    db = FlakyDatabase(failures=100)
+    buffer = make_buffer(db)
+    buffer.put("requirements", 1, 5, build)
+    for _ in range(write_buffer.MAX_RETRIES):
+        assert buffer.pending("requirements", 1) == 5
+        buffer.flush_all()
+    assert buffer.pending("requirements", 1) is None
+    assert not buffer._pending and not buffer._inflight
+    assert "Dropping buffered requirements write for user 1" in caplog.text
+
+
+def test_one_bad_write_does_not_block_the_others(make_buffer):
+    written = []
+
+    def execute_batch(statements):
+        if any(params[1] == 2 for _, params in statements):
+            raise RuntimeError("constraint failed")
+        written.extend(statements)
+
+    buffer = make_buffer(execute_batch)
+    buffer.put("requirements", 1, "a", build)
+    buffer.put("requirements", 2, "b", build)
+    buffer.flush_all()
+    assert written == build(1, "a")
+    assert buffer.pending("requirements", 2) == "b"
+
+
+def test_zero_window_writes_through(make_buffer):
+    db = FlakyDatabase()
+    buffer = make_buffer(db, window=0)
+    buffer.put("requirements", 1, 5, build)
+    assert db.batches == [build(1, 5)]
+    assert buffer.pending("requirements", 1) is None
+
+
+def test_turso_errors_are_retried(make_buffer):
+    from turso import TursoError
+
+    calls = []
+
+    def execute_batch(statements):
+        calls.append(statements)
+        if len(calls) <= 2:
+            raise TursoError("HTTP 400: no such table")
+        return []
+
+    buffer = make_buffer(execute_batch)
+    buffer.put("requirements", 1, 5, build)
+    buffer.flush_all()
+    assert buffer.pending("requirements", 1) == 5
+    buffer.flush_all()
+    assert buffer.pending("requirements", 1) is None and len(calls) == 3
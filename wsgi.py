@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module makes no database calls: with preload_app that
+would open a Turso connection in the master before it forks. Under
+gunicorn the first worker checks the schema version (post_worker_init in
+gunicorn.conf.py); other servers can call app.check_schema() per worker.
+"""
+from app import create_app
+
+app = create_app()